@@ -4,16 +4,39 @@
 """
 
 import argparse
+import json
 import os
 import sys
 import logging
 from logging import Logger
 from functools import partial
-from typing import List
-from service.application_service import ApplicationService
+from typing import Callable, List
 from domain.llm_utils import LLMUtils
+from domain.source_discovery import SourceDiscovery
+from domain.scheduling_policy import SchedulingPolicy
+from domain.uml_project import UMLProjectBuilder
+from domain.symbol_index import SymbolIndex
+from domain.run_report import RunReport
 from typing import Self
 
+class DeferredString:
+    """
+    @brief String computed when it is first formatted, used for help texts which are expensive to build.
+    """
+
+    def __init__(self, build_string: Callable[[], str]):
+        """
+        @brief Initializes the DeferredString object.
+        @param build_string The function building the string.
+        """
+        self.build_string: Callable[[], str] = build_string
+        self._string: str = None
+
+    def __str__(self) -> str:
+        if self._string is None:
+            self._string = self.build_string()
+        return self._string
+
 class CommandLineArgumentsHandler:
     """
     @brief Program name.
@@ -35,6 +58,11 @@ class CommandLineArgumentsHandler:
     """
     default_model_name: str = "llama3-70b"  
 
+    """
+    @brief Default directory of the LLM response cache.
+    """
+    default_cache_directory: str = os.getenv("GPT2CODE_CACHE_DIR", default=os.path.join(os.path.expanduser("~"), ".cache", "gpt2code"))
+
     """
     @brief Default logging level.
     """
@@ -51,14 +79,9 @@ class CommandLineArgumentsHandler:
     llm_utils = LLMUtils(os.getenv("GPT2CODE_EXTERNAL_FILE_CODE_REQUESTS", default=""), logger)  
 
     """
-    @brief List of all code LLM requests.
+    @brief Selected code requests, processed in one pass.
     """
-    all_code_llm_requests: List = [idx for idx in range(len(llm_utils.get_all_code_llm_requests()))]  
-
-    """
-    @brief Selected code request.
-    """
-    selected_code_request_id = 0  
+    selected_code_request_ids: List = [0]
 
     """
     @brief Force full output flag.
@@ -79,8 +102,11 @@ class CommandLineArgumentsHandler:
         self.argument_parser.add_argument('--to_directory', type=str, help='Specify the directory where to store generated files')  # Add argument to specify the directory where to store generated files
         self.argument_parser.add_argument('--model_name', type=str, help=f'Specify the name of the LLM model to use. Default is {self.default_model_name}')  # Add argument to specify the name of the LLM model to use
         self.argument_parser.add_argument('--skip_files', type=self.split_string_by_comma, help='Comma separated list of files to be skipped')  # Add argument to specify a comma separated list of files to be skipped
+        self.argument_parser.add_argument('--exclude_dirs', type=self.split_string_by_comma, help=f'Comma separated list of directory names never descended into, at any depth. Default is {",".join(SourceDiscovery.default_excluded_directory_names)}')  # Add argument to specify the excluded directories
+        self.argument_parser.add_argument('--no_ignore_files', action="store_true", help=f'Do not honour the .gitignore and .gpt2codeignore files of the source directory')  # Add argument to disable the ignore files
         self.argument_parser.add_argument('--language_name', type=str, help='Language name: Java, Python, C++, C, Typescript, Shell, PlantUML, All')  # Add argument to specify the language name
-        self.argument_parser.add_argument('--code_request', type=int, help=f'Specify code request to process from the following list: [[ {self.llm_utils.get_all_code_requests_and_ids_str()} ]], default is {self.selected_code_request_id}')  # Add argument to specify the code request to process
+        code_request_argument = self.argument_parser.add_argument('--code_request', type=self.split_string_by_comma, help=f'Specify code requests to process, separated by commas or as ranges (e.g. 0,1,5 or 0-2), from the following list: [[ %(code_requests)s ]], default is {self.selected_code_request_ids[0]}')  # Add argument to specify the code request to process
+        code_request_argument.code_requests = DeferredString(self.llm_utils.get_all_code_requests_and_ids_str)  # The list of code requests is only built when the help is displayed
         self.argument_parser.add_argument('--debug', action="store_true", help='Set logging to debug')  # Add argument to set logging to debug
         self.argument_parser.add_argument('--show_temperature_recommendations', action="store_true", help='Display values for various use cases')  # Add argument to display values for various use cases
         self.argument_parser.add_argument('--simulate_calls_only', action="store_true", help=f'Do not perform the calls to LLM: used for debugging purpose.')  # Add argument to simulate calls only
@@ -91,9 +117,59 @@ class CommandLineArgumentsHandler:
         self.argument_parser.add_argument('--generated_file_extension', type=str, help=f'Oerride default file extension to be added to the generated file')  # Add extension generated
         self.argument_parser.add_argument('--force_comment_string', type=str, help=f'Specify the string to be used for comments')  # Add argument to specify the string to be used for comments
         self.argument_parser.add_argument('--force_destination_language_name', type=str, help=f'Specify the destination language name that will be used to extract source code from MD file')  # Add argument to specify the destination language name
+        self.argument_parser.add_argument('--jobs', type=int, default=1, help=f'Number of files processed concurrently (requests in flight to the LLM). Default is 1')  # Add argument to specify the number of concurrent jobs
+        self.argument_parser.add_argument('--use_asyncio', action="store_true", help=f'Multiplex the requests on one asyncio event loop instead of one thread per job')  # Add argument to use the asyncio LLM access
+        self.argument_parser.add_argument('--max_connections', type=int, default=100, help=f'Size of the HTTP connection pool shared by the asyncio requests. Default is 100')  # Add argument to specify the connection pool size
+        self.argument_parser.add_argument('--cache_dir', '--cache-dir', type=str, default=self.default_cache_directory, help=f'Directory of the LLM response cache. Default is {self.default_cache_directory}')  # Add argument to specify the cache directory
+        self.argument_parser.add_argument('--no_cache', '--no-cache', action="store_true", help=f'Always send the requests to the LLM, do not read nor store cached responses')  # Add argument to disable the response cache
+        self.argument_parser.add_argument('--cache_stats', '--cache-stats', action="store_true", help=f'Display response cache statistics at the end of the run')  # Add argument to display cache statistics
+        self.argument_parser.add_argument('--cache_max_size_mb', type=int, default=1024, help=f'Size of the response cache in MB above which least recently used responses are evicted. Default is 1024')  # Add argument to specify the cache size
+        self.argument_parser.add_argument('--cache_compress', action="store_true", help=f'Compress the responses stored in the cache')  # Add argument to compress cached responses
+        self.argument_parser.add_argument('--stream', action="store_true", help=f'Stream the completions and write the extracted code while it is generated, the output file replacing the previous one once complete')  # Add argument to stream completions
+        self.argument_parser.add_argument('--context_window_tokens', type=int, help=f'Overide the context window of the model, in tokens: files too big for it are split into chunks at syntactic boundaries')  # Add argument to specify the context window
+        self.argument_parser.add_argument('--requests_per_minute', type=int, help=f'Requests per minute quota of the endpoint: requests are held client side so that the quota is never exceeded')  # Add argument to specify the RPM quota
+        self.argument_parser.add_argument('--tokens_per_minute', type=int, help=f'Tokens per minute quota of the endpoint: requests are held client side so that the quota is never exceeded')  # Add argument to specify the TPM quota
+        self.argument_parser.add_argument('--batch', action="store_true", help=f'Submit all the requests at once to the batch endpoint and write the files once the batches are processed: cheaper, but may take up to 24 hours. An interrupted run resumes its batches when run again')  # Add argument to enable batch mode
+        self.argument_parser.add_argument('--batch_endpoint_dir', type=str, help=f'Submit the batches to a local file based stand-in for the batch endpoint in this directory, used for testing')  # Add argument to specify the local batch endpoint
+        self.argument_parser.add_argument('--batch_poll_interval', type=float, default=60, help=f'Seconds between two polls of the batch endpoint. Default is 60')  # Add argument to specify the batch poll interval
+        self.argument_parser.add_argument('--fsync', action="store_true", help=f'Sync each generated file to disk before it replaces the previous one')  # Add argument to sync generated files
+        self.argument_parser.add_argument('--background_writer', action="store_true", help=f'Commit the generated files from a background thread so that jobs do not wait for slow file systems')  # Add argument to commit files in the background
+        self.argument_parser.add_argument('--metrics_file', type=str, help=f'Write the metrics of the run to this JSON file: latency percentiles, throughput, tokens, retries and output bytes per file')  # Add argument to specify the metrics file
+        self.argument_parser.add_argument('--prometheus_textfile', type=str, help=f'Also write the metrics of the run to this file in the Prometheus text format, for the node exporter textfile collector')  # Add argument to specify the Prometheus textfile
+        self.argument_parser.add_argument('--plan', type=str, help=f'Do not send any request: estimate the tokens, cost and wall time of the run, flag the files too big for the model and write the plan to this JSON file')  # Add argument to plan the run
+        self.argument_parser.add_argument('--execute_plan', type=str, help=f'Only process the files planned in this JSON file, written by --plan with the same source directory, model and code requests')  # Add argument to execute a plan
+        self.argument_parser.add_argument('--sample', type=self.parse_fraction, help=f'With --plan, only plan this share of the source files, as a percentage (5%%) or a fraction (0.05), and extrapolate the totals to the whole tree')  # Add argument to plan a sample of the files
+        self.argument_parser.add_argument('--token_estimator', type=str, choices=['characters', 'tiktoken'], default='characters', help=f'Local estimator counting the tokens of the requests: characters (no dependency) or tiktoken (requires the tiktoken package). Default is characters')  # Add argument to select the token estimator
+        self.argument_parser.add_argument('--token_prices', type=self.parse_token_prices, help=f'With --plan, prices in USD of one million input and output tokens, separated by a comma (e.g. 2.5,10). Default is looked up from the model name')  # Add argument to specify the token prices
+        self.argument_parser.add_argument('--plan_output_ratio', type=float, help=f'With --plan, output tokens projected per token of file content. Default is 1')  # Add argument to specify the projected output ratio
+        self.argument_parser.add_argument('--schedule', type=str, choices=list(SchedulingPolicy.get_policies()), default=SchedulingPolicy.name, help=f'Order in which files are sent: discovery, longest_first (biggest files first, so that concurrent jobs finish together), shortest_first (fast feedback on the first files) or directory_grouped (one directory after the other, biggest first). Default is discovery')  # Add argument to select the scheduling policy
+        self.argument_parser.add_argument('--schedule_by', type=str, choices=['size', 'tokens'], default='size', help=f'With --schedule, estimate the work of a file from its size in bytes or from its tokens, counted with --token_estimator. Default is size')  # Add argument to select how the work of a file is estimated
+        self.argument_parser.add_argument('--dedup', type=str, choices=['copy', 'hardlink', 'off'], default='copy', help=f'Send the requests of identical files (same content, code request and model) once and duplicate the output to every target file, as a copy or a hard link, or off to send every request. Default is copy')  # Add argument to select the deduplication of identical files
+        self.argument_parser.add_argument('--endpoints', type=str, default=None, metavar='ENDPOINTS_FILE', help=f'Spread the requests over the interchangeable OpenAI compatible endpoints listed in this JSON file: a list of objects with a base_url and optionally a name, api_key or api_key_env, weight, max_concurrency, requests_per_minute and tokens_per_minute. Failing endpoints are ejected for a while, half of them at most, and failed requests are retried on another endpoint')  # Add argument to use a pool of endpoints
+        self.argument_parser.add_argument('--routing', type=str, choices=['least_outstanding', 'ewma_latency'], default='least_outstanding', help=f'How the endpoint of each request is selected: fewest requests in flight per unit of weight, or lowest moving average latency weighted by load. Default is least_outstanding')  # Add argument to select the routing policy of the endpoints
+        self.argument_parser.add_argument('--model_rules', type=str, default=None, metavar='RULES_FILE_OR_JSON', help=f'Route each file to a model: a JSON file, or the JSON text itself, listing rules with a model and optionally min_tokens, max_tokens, languages, code_requests and paths (shell patterns relative to the source directory). The first matching rule gives the model, --model_name otherwise. Code requests may declare their own rules under model_routing, evaluated first')  # Add argument to route the files between models
+        self.argument_parser.add_argument('--minify', type=str, default=None, metavar='TRANSFORMATIONS', help=f'Minify the file contents before sending them, for every code request: comma separated transformations among whitespace (trailing whitespace and blank line runs), boilerplate (license headers and headers shared by several files) and comments (every comment), or all, or none. Boilerplate and comments are not removed for the code requests rewriting the source files, whose output would lose them. Default is the minify key of each code request, none if not set')  # Add argument to minify the prompts
+        self.argument_parser.add_argument('--uml_project', action="store_true", help=f'Reverse engineer the UML class diagrams of the whole tree: the class skeletons are extracted locally and sent package by package, and the diagrams are merged into one {UMLProjectBuilder.package_diagram_name} per package and a {UMLProjectBuilder.project_diagram_name} for the project')  # Add argument to generate the project UML diagrams
+        self.argument_parser.add_argument('--symbol_context', action="store_true", help=f'Attach to each request the signatures of the symbols its file uses which other files of the tree define, for every code request, from a symbol index of the source tree kept up to date in the destination directory ({SymbolIndex.index_file_name}). Default is the symbol_context key of each code request')  # Add argument to attach the signatures of the symbols used
+        self.argument_parser.add_argument('--changed_since', type=str, default=None, metavar='GIT_REVISION', help=f'Process only the source files added or modified since this git revision, uncommitted and untracked files included, for instance origin/main. A range such as origin/main...HEAD compares with the point the branch forked from, committed changes only')  # Add argument to process the files changed since a git revision
+        self.argument_parser.add_argument('--changed_files', type=str, default=None, metavar='FILE_LIST', help=f'Process only the source files listed in this file, one path per line, absolute or relative to the current directory, - to read the list from the standard input (e.g. git diff --name-only origin/main | python . --changed_files -)')  # Add argument to process the files of a list
+        self.argument_parser.add_argument('--report', type=str, default=None, metavar='REPORT_FILE', help=f'Write the outcome and the review verdict of every file to this JSON file, and a Markdown summary table next to it, then exit with status 1 if a request failed or a review verdict reached --fail_on')  # Add argument to write the run report
+        self.argument_parser.add_argument('--fail_on', type=str, choices=RunReport.verdicts[1:], default='issues', help=f'With --report, the lowest review verdict failing the run: acceptable (minor issues) or issues (serious issues). Default is issues')  # Add argument to select the failing review verdict
+        self.argument_parser.add_argument('--enqueue', type=str, default=None, metavar='QUEUE_FILE', help=f'Enqueue the source files in this SQLite work queue and exit, to share the run between workers started with --worker, possibly on other hosts sharing the directories')  # Add argument to enqueue the source files in a work queue
+        self.argument_parser.add_argument('--worker', type=str, default=None, metavar='QUEUE_FILE', help=f'Process the source files claimed from this SQLite work queue, filled with --enqueue, until it is empty. Files leased by a worker which stops are processed by the others')  # Add argument to process the files of a work queue
+        self.argument_parser.add_argument('--worker_id', type=str, default=None, help=f'Identifier of the worker in the work queue. Default is the host name and process id')  # Add argument to name the worker
+        self.argument_parser.add_argument('--lease_seconds', type=float, default=300.0, help=f'Duration of the lease on a file claimed from the work queue, renewed while it is processed: the files of a worker which stops are claimed again once it expires. Must be well above the clock differences between the hosts. Default is 300')  # Add argument to set the lease duration
+        self.argument_parser.add_argument('--queue_status', type=str, default=None, metavar='QUEUE_FILE', help=f'Print the progress of a SQLite work queue as JSON and exit')  # Add argument to print the progress of a work queue
+        self.argument_parser.add_argument('--incremental', action="store_true", help=f'Skip files whose source, request, model and sampling parameters did not change since the previous run (tracked in a manifest in the destination directory)')  # Add argument to enable incremental mode
 
         self.args = self.argument_parser.parse_args()  # Parse command line arguments
         self.check_temperature_recommendations()
+        self.check_plan_arguments()
+        self.check_queue_arguments()
+        self.check_endpoint_arguments()
+        self.check_uml_project_arguments()
+        self.check_changed_files_arguments()
+        self.check_queue_status()
 
         return self
 
@@ -106,6 +182,104 @@ class CommandLineArgumentsHandler:
             LLMUtils.print_recommended_temperature_and_top_p_values(self.logger)  # Print recommended temperature and top p
             sys.exit(0)  # Exit the application
 
+    # Check if the planning arguments are consistent
+    def check_plan_arguments(self) -> None:
+        """
+        @brief Check if the planning arguments are consistent.
+        """
+        if self.args.plan is not None and self.args.execute_plan is not None:
+            self.argument_parser.error('--plan and --execute_plan are exclusive')
+        if self.args.sample is not None and self.args.plan is None:
+            self.argument_parser.error('--sample requires --plan')
+
+    # Check if the work queue arguments are consistent
+    def check_queue_arguments(self) -> None:
+        """
+        @brief Check if the work queue arguments are consistent.
+        """
+        if self.args.enqueue is not None and self.args.worker is not None:
+            self.argument_parser.error('--enqueue and --worker are exclusive')
+        if (self.args.enqueue is not None or self.args.worker is not None) and \
+                (self.args.plan is not None or self.args.execute_plan is not None or self.args.batch):
+            self.argument_parser.error('--enqueue and --worker cannot be combined with --plan, --execute_plan or --batch')
+        if self.args.worker_id is not None and self.args.worker is None:
+            self.argument_parser.error('--worker_id requires --worker')
+        if self.args.lease_seconds <= 0:
+            self.argument_parser.error('--lease_seconds must be positive')
+
+    # Check if the endpoint pool arguments are consistent
+    def check_endpoint_arguments(self) -> None:
+        """
+        @brief Check if the endpoint pool arguments are consistent.
+        """
+        if self.args.endpoints is not None and self.args.batch:
+            self.argument_parser.error('--endpoints cannot be combined with --batch, batches are submitted to the default endpoint')
+
+    # Check if the UML project arguments are consistent
+    def check_uml_project_arguments(self) -> None:
+        """
+        @brief Check if the UML project arguments are consistent.
+        """
+        if self.args.uml_project and (self.args.plan is not None or self.args.execute_plan is not None or self.args.batch or \
+                                      self.args.enqueue is not None or self.args.worker is not None):
+            self.argument_parser.error('--uml_project cannot be combined with --plan, --execute_plan, --batch, --enqueue or --worker')
+
+    # Check if the changed files arguments are consistent
+    def check_changed_files_arguments(self) -> None:
+        """
+        @brief Check if the changed files arguments are consistent.
+        """
+        if self.args.changed_since is not None and self.args.changed_files is not None:
+            self.argument_parser.error('--changed_since and --changed_files are mutually exclusive')
+        if (self.args.changed_since is not None or self.args.changed_files is not None) and (self.args.worker is not None or self.args.uml_project):
+            self.argument_parser.error('--changed_since and --changed_files cannot be combined with --worker, which claims the files enqueued, or --uml_project, which reads the whole tree')
+
+    # Check if the progress of a work queue should be displayed
+    def check_queue_status(self) -> None:
+        """
+        @brief Check if the progress of a work queue should be displayed.
+        @note The queue is only imported here, the other arguments are not needed.
+        """
+        if self.args.queue_status is not None:
+            if not os.path.isfile(self.args.queue_status):
+                self.argument_parser.error(f'--queue_status: {self.args.queue_status} does not exist')
+            from infrastructure.work_queue import SQLiteWorkQueue
+
+            work_queue = SQLiteWorkQueue(self.args.queue_status, self.logger)
+            print(json.dumps(dict(work_queue.get_status(), settings=work_queue.get_settings()), indent=2))
+            work_queue.close()
+            sys.exit(0)
+
+    @staticmethod
+    def parse_fraction(value: str) -> float:
+        """
+        @brief Parse a share given as a percentage (5%) or as a fraction (0.05).
+        @param value The share.
+        @return The fraction, greater than 0 and at most 1.
+        """
+        try:
+            fraction: float = float(value[:-1]) / 100 if value.endswith('%') else float(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f'{value} is neither a percentage nor a fraction')
+        if not 0 < fraction <= 1:
+            raise argparse.ArgumentTypeError(f'{value} is not between 0 and 100%')
+        return fraction
+
+    @staticmethod
+    def parse_token_prices(value: str) -> List[float]:
+        """
+        @brief Parse the prices of one million input and output tokens, separated by a comma.
+        @param value The prices.
+        @return The input and output prices.
+        """
+        try:
+            prices: List[float] = [float(price) for price in value.split(',')]
+        except ValueError:
+            prices = []
+        if len(prices) != 2 or min(prices) < 0:
+            raise argparse.ArgumentTypeError(f'{value} is not INPUT_PRICE,OUTPUT_PRICE')
+        return prices
+
     # Update logging level if debug mode is enabled
     def update_logging_level(self) -> Self:
         """
@@ -125,7 +299,12 @@ class CommandLineArgumentsHandler:
         @brief Update selected code request if provided.
         """
         if self.args is not None and self.args.code_request:
-            self.selected_code_request_id = self.args.code_request  # Update selected code request
+            try:
+                # Update selected code requests, each one processed once
+                self.selected_code_request_ids = list(dict.fromkeys(LLMUtils.parse_parameter_list(self.args.code_request)))
+            except ValueError:
+                self.logger.error(f'The selected code requests {",".join(self.args.code_request)} are not valid. Please use the help to see valid code requests: python {self.program_name} -h.')
+                sys.exit(1)
         
         return self
 
@@ -135,7 +314,7 @@ class CommandLineArgumentsHandler:
         @brief Update model name if provided.
         """
         if self.args.model_name:
-            self.default_model_name = args.model_name  # Update model name
+            self.default_model_name = self.args.model_name  # Update model name
         return self
 
     # Update temperature if provided
@@ -170,23 +349,42 @@ class CommandLineArgumentsHandler:
         """
         @brief Check if the selected code request is valid.
         """
-        if not self.llm_utils.code_requests_are_valid([self.selected_code_request_id]):
-            self.logger.error(f'The selected code {self.selected_code_request_id} is not valid. Please use the help to see valid code requests: python {self.program_name} -h.')  # Log an error message
+        if len(self.selected_code_request_ids) == 0 or not self.llm_utils.code_requests_are_valid(self.selected_code_request_ids):
+            self.logger.error(f'The selected code {self.selected_code_request_ids} is not valid. Please use the help to see valid code requests: python {self.program_name} -h.')  # Log an error message
             sys.exit(1)  # Exit the application
         return self
 
     # Create an instance of ApplicationService
-    def create_application_service(self) -> ApplicationService:
+    def create_application_service(self) -> 'ApplicationService':
         """
         @brief Create an instance of ApplicationService.
+        @note The service, the LLM access and their dependencies are only imported here, once the arguments are valid.
         """
+        from service.application_service import ApplicationService
+
         args: argparse.Namespace = self.args
         return ApplicationService(args.from_directory, args.to_directory, args.skip_files, \
                                   args.language_name, args.simulate_calls_only, self.logger, \
-                                  self.llm_utils, self.selected_code_request_id, \
+                                  self.llm_utils, self.selected_code_request_ids, \
                                   self.default_model_name, args.force_source_file_types, \
                                   args.generated_file_extension, args.force_comment_string, \
-                                  args.force_destination_language_name, self.force_full_output_flag)
+                                  args.force_destination_language_name, self.force_full_output_flag, \
+                                  args.jobs, args.use_asyncio, args.max_connections, \
+                                  None if args.no_cache else args.cache_dir, args.cache_max_size_mb, \
+                                  args.cache_compress, args.cache_stats, args.incremental, \
+                                  args.stream, args.context_window_tokens, \
+                                  args.requests_per_minute, args.tokens_per_minute, \
+                                  args.batch, args.batch_endpoint_dir, args.batch_poll_interval, \
+                                  args.fsync, args.background_writer, \
+                                  args.exclude_dirs, not args.no_ignore_files, \
+                                  args.metrics_file, args.prometheus_textfile, \
+                                  args.plan, args.execute_plan, args.sample, \
+                                  args.token_estimator, args.token_prices, args.plan_output_ratio, \
+                                  args.schedule, args.schedule_by == 'tokens', args.dedup, \
+                                  args.enqueue, args.worker, args.worker_id, args.lease_seconds, \
+                                  args.endpoints, args.routing, args.model_rules, args.minify, \
+                                  args.uml_project, args.symbol_context, \
+                                  args.changed_since, args.changed_files, args.report, args.fail_on)
 
 # Main function
 def main() -> None:
@@ -0,0 +1,257 @@
+"""
+@file bench.py
+@brief Benchmark of the local pipeline: runs GPT2Code over a synthetic source tree against a synthetic or recorded LLM endpoint.
+@details Reports the files processed per second, the overhead of the pipeline per file, the request latency percentiles
+         and the memory high-water mark. A previous report can be given as baseline to fail on throughput regressions.
+         Usage, from the root of the repository:
+             python -m benchmarks.bench --files 500 --jobs 8 --latency lognormal:0.2,0.5 --tokens_per_second 400
+             python -m benchmarks.bench --source_directory ../project --language_name python --record session.jsonl
+             python -m benchmarks.bench --source_directory ../project --language_name python --replay session.jsonl --jobs 8
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from logging import Logger
+from typing import Dict, List
+
+from domain.allm_access import AbstractLLMAccess
+from domain.code_request import CodeRequest
+from domain.gpt2code import GPT2Code
+from domain.llm_utils import LLMUtils
+from domain.run_metrics import RunMetrics
+from domain.scheduling_policy import SchedulingPolicy
+from domain.source_chunker import SourceChunker
+from infrastructure.output_sink import AtomicFileOutputSink
+from service.application_service import ApplicationService
+from benchmarks.cassette import Cassette, RecordingLLMAccess, ReplayLLMAccess
+from benchmarks.synthetic_llm_access import AsyncSyntheticLLMAccess, LatencyDistribution, SyntheticBackend, SyntheticLLMAccess
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows: the memory high-water mark of the process is not reported
+    resource = None
+
+
+def generate_synthetic_tree(directory: str, file_count: int, depth: int, directories_per_level: int, lines_per_file: int, seed: int, \
+                            size_skew: float = 0.0) -> None:
+    """
+    @brief Creates a tree of Python source files.
+
+    @param directory The root of the tree.
+    @param file_count The number of files.
+    @param depth The number of directory levels below the root.
+    @param directories_per_level The number of subdirectories of each directory.
+    @param lines_per_file The approximate number of lines of each file.
+    @param seed The seed of the random generator, for reproducible trees.
+    @param size_skew If positive, the number of lines of each file is drawn from a lognormal distribution of this sigma
+                     around lines_per_file, so that a few files are much bigger than the others.
+    """
+    random_generator: random.Random = random.Random(seed)
+    directories: List[str] = ['']
+    for _ in range(depth):
+        directories = [os.path.join(parent, f'package_{index}') for parent in directories for index in range(directories_per_level)]
+    for file_index in range(file_count):
+        file_directory: str = os.path.join(directory, directories[file_index % len(directories)])
+        os.makedirs(file_directory, exist_ok=True)
+        lines: List[str] = [f'"""Synthetic module {file_index}."""', '']
+        file_lines: int = lines_per_file
+        if size_skew > 0:
+            file_lines = max(4, round(random_generator.lognormvariate(math.log(lines_per_file), size_skew)))
+        function_index: int = 0
+        while len(lines) < file_lines:
+            lines.append(f'def function_{function_index}(value):')
+            for statement_index in range(random_generator.randint(2, 8)):
+                lines.append(f'    value = value * {random_generator.randint(1, 9)} + {statement_index}')
+            lines.extend(['    return value', ''])
+            function_index += 1
+        with open(os.path.join(file_directory, f'module_{file_index}.py'), 'w', encoding='utf-8') as source_file:
+            source_file.write('\n'.join(lines))
+
+
+def create_llm_access(args: argparse.Namespace, logger: Logger) -> AbstractLLMAccess:
+    """
+    @brief Creates the LLM access selected by the arguments.
+
+    @param args The parsed arguments.
+    @param logger The logger.
+    @return The LLM access.
+    """
+    if args.record is not None:
+        return RecordingLLMAccess(logger, args.model_name, Cassette(args.record))
+    if args.replay is not None:
+        cassette: Cassette = Cassette(args.replay)
+        logger.warning(f"Replaying {len(cassette)} recorded exchanges from {args.replay}")
+        return ReplayLLMAccess(logger, args.model_name, cassette, args.replay_speed)
+    backend: SyntheticBackend = SyntheticBackend(LatencyDistribution(args.latency), args.tokens_per_second, args.completion_tokens, \
+                                                 args.rate_limit_probability, args.server_error_probability, args.timeout_probability, \
+                                                 args.timeout_seconds, args.retry_after_seconds, args.retry_delay_scale, args.seed, \
+                                                 None, args.prompt_tokens_per_second)
+    if args.use_asyncio:
+        return AsyncSyntheticLLMAccess(logger, args.model_name, backend, args.jobs)
+    return SyntheticLLMAccess(logger, args.model_name, backend)
+
+
+def run_once(args: argparse.Namespace, source_directory: str, logger: Logger, llm_utils: LLMUtils) -> Dict:
+    """
+    @brief Runs GPT2Code once over the source directory into a new target directory.
+
+    @param args The parsed arguments.
+    @param source_directory The source tree.
+    @param logger The logger.
+    @param llm_utils The code requests.
+    @return The measures of the run.
+    """
+    code_request: CodeRequest = ApplicationService.create_code_request(args.code_request, args.language_name, logger, llm_utils, \
+                                                                       None, None, None, None, False)
+    llm_access: AbstractLLMAccess = create_llm_access(args, logger)
+    run_metrics: RunMetrics = RunMetrics(logger, args.jobs)
+    with tempfile.TemporaryDirectory(prefix='gpt2code_bench_') as target_directory:
+        if args.trace_memory:
+            tracemalloc.start()
+        start: float = time.perf_counter()
+        GPT2Code(source_directory, target_directory, [], logger, AtomicFileOutputSink(logger), llm_utils, code_request.request_id, \
+                 llm_access, code_request.language_name, code_request.file_type, code_request.force_full_output, args.jobs, None, \
+                 args.stream, SourceChunker(logger, args.model_name), None, 60, None, None, run_metrics, None, None, \
+                 SchedulingPolicy.create(args.schedule, logger))
+        duration_seconds: float = time.perf_counter() - start
+        traced_peak_bytes: int = None
+        if args.trace_memory:
+            traced_peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    run_metrics.finish()
+    summary: Dict = run_metrics.summarize()
+    written_files: int = summary['outcomes'].get('written', 0)
+    latency: Dict = summary['request_latency_seconds']
+    # Time the endpoint kept the senders busy, spread over the concurrent jobs: what is left is spent in the pipeline
+    endpoint_seconds: float = (latency['mean'] or 0.0) * latency['count'] / max(1, args.jobs)
+    return {
+        'duration_seconds': duration_seconds,
+        'files': summary['totals']['files'],
+        'written_files': written_files,
+        'files_per_second': written_files / duration_seconds if duration_seconds > 0 else None,
+        'pipeline_overhead_ms_per_file': max(0.0, duration_seconds - endpoint_seconds) * 1000 / written_files if written_files > 0 else None,
+        'requests': summary['totals']['requests'],
+        'retries': summary['totals']['retries'],
+        'request_latency_seconds': latency,
+        'queue_wait_seconds': summary['queue_wait_seconds'],
+        'schedule': summary['schedule'],
+        'completion_tokens_per_second': summary['throughput']['completion_tokens_per_second'],
+        'traced_memory_peak_bytes': traced_peak_bytes,
+        'replay_misses': getattr(llm_access, 'misses', None)
+    }
+
+
+def main() -> None:
+    """
+    @brief Runs the benchmark and prints the results.
+    """
+    argument_parser: argparse.ArgumentParser = argparse.ArgumentParser(prog='bench', description='Benchmarks the gpt2code pipeline')
+    argument_parser.add_argument('--source_directory', type=str, help='Benchmark this source tree instead of a synthetic one')
+    argument_parser.add_argument('--language_name', type=str, default='python', help='Language of the source tree. Default is python')
+    argument_parser.add_argument('--code_request', type=int, default=0, help='Code request sent for each file. Default is 0')
+    argument_parser.add_argument('--model_name', type=str, default='synthetic', help='Model name reported in the requests, must match the one of a replayed cassette')
+    argument_parser.add_argument('--files', type=int, default=200, help='Number of files of the synthetic tree. Default is 200')
+    argument_parser.add_argument('--depth', type=int, default=2, help='Directory levels of the synthetic tree. Default is 2')
+    argument_parser.add_argument('--directories_per_level', type=int, default=4, help='Subdirectories of each directory of the synthetic tree. Default is 4')
+    argument_parser.add_argument('--lines_per_file', type=int, default=60, help='Lines of each synthetic file. Default is 60')
+    argument_parser.add_argument('--size_skew', type=float, default=0.0, help='Sigma of the lognormal spread of the file sizes of the synthetic tree, 0 for files of the same size. Default is 0')
+    argument_parser.add_argument('--jobs', type=int, default=1, help='Number of files processed concurrently. Default is 1')
+    argument_parser.add_argument('--schedule', type=str, choices=list(SchedulingPolicy.get_policies()), default=SchedulingPolicy.name, help='Order in which files are sent. Default is discovery')
+    argument_parser.add_argument('--use_asyncio', action='store_true', help='Multiplex the requests on one asyncio event loop')
+    argument_parser.add_argument('--stream', action='store_true', help='Stream the completions')
+    argument_parser.add_argument('--latency', type=str, default='constant:0', help='Time to first token: constant:S, uniform:LOW,HIGH, normal:MEAN,STDDEV, lognormal:MEDIAN,SIGMA or exponential:MEAN. Default is constant:0')
+    argument_parser.add_argument('--tokens_per_second', type=float, help='Generation rate of the synthetic endpoint. Default is instantaneous')
+    argument_parser.add_argument('--prompt_tokens_per_second', type=float, help='Rate the synthetic endpoint reads the prompts at, so that big files take longer. Default is instantaneous')
+    argument_parser.add_argument('--completion_tokens', type=int, default=200, help='Tokens of each synthetic completion. Default is 200')
+    argument_parser.add_argument('--rate_limit_probability', type=float, default=0.0, help='Probability of a 429 response')
+    argument_parser.add_argument('--server_error_probability', type=float, default=0.0, help='Probability of a 503 response')
+    argument_parser.add_argument('--timeout_probability', type=float, default=0.0, help='Probability of a timeout')
+    argument_parser.add_argument('--timeout_seconds', type=float, default=1.0, help='Time a request takes to time out. Default is 1')
+    argument_parser.add_argument('--retry_after_seconds', type=float, default=0.1, help='Delay advertised by the 429 responses. Default is 0.1')
+    argument_parser.add_argument('--retry_delay_scale', type=float, default=0.01, help='Factor applied to the backoff delays of the client. Default is 0.01')
+    argument_parser.add_argument('--seed', type=int, default=1, help='Seed of the synthetic tree and endpoint. Default is 1')
+    argument_parser.add_argument('--record', type=str, help='Send the requests to the real endpoint and record them in this cassette')
+    argument_parser.add_argument('--replay', type=str, help='Replay the exchanges recorded in this cassette instead of the synthetic endpoint')
+    argument_parser.add_argument('--replay_speed', type=float, default=1.0, help='Replay speed, 0 to replay without delay. Default is 1')
+    argument_parser.add_argument('--repeat', type=int, default=1, help='Number of runs, the median run is reported. Default is 1')
+    argument_parser.add_argument('--trace_memory', action='store_true', help='Also report the peak of the Python allocations, which slows the run down')
+    argument_parser.add_argument('--json', type=str, help='Write the report to this JSON file')
+    argument_parser.add_argument('--baseline', type=str, help='Previous JSON report to compare the throughput with')
+    argument_parser.add_argument('--max_regression', type=float, default=0.1, help='Throughput loss against the baseline above which the benchmark fails. Default is 0.1')
+    argument_parser.add_argument('--log_level', type=str, default='ERROR', help='Logging level of the runs. Default is ERROR')
+    args: argparse.Namespace = argument_parser.parse_args()
+
+    if args.record is not None and args.replay is not None:
+        argument_parser.error('--record and --replay are exclusive')
+    if args.use_asyncio and (args.record is not None or args.replay is not None):
+        argument_parser.error('Cassettes are recorded and replayed without asyncio')
+    try:
+        LatencyDistribution(args.latency)
+    except ValueError as err:
+        argument_parser.error(str(err))
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s %(levelname)-8s %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    logger: Logger = logging.getLogger('bench')
+    llm_utils: LLMUtils = LLMUtils(os.getenv("GPT2CODE_EXTERNAL_FILE_CODE_REQUESTS", default=""), logger)
+
+    with tempfile.TemporaryDirectory(prefix='gpt2code_bench_source_') as synthetic_directory:
+        source_directory: str = args.source_directory
+        if source_directory is None:
+            source_directory = synthetic_directory
+            generate_synthetic_tree(source_directory, args.files, args.depth, args.directories_per_level, args.lines_per_file, args.seed, \
+                                    args.size_skew)
+        runs: List[Dict] = [run_once(args, source_directory, logger, llm_utils) for _ in range(max(1, args.repeat))]
+
+    runs.sort(key=lambda run: run['files_per_second'] or 0.0)
+    report: Dict = {
+        'parameters': {key: value for key, value in vars(args).items() if key not in ['json', 'baseline', 'log_level']},
+        'python': sys.version.split()[0],
+        'median_run': runs[len(runs) // 2],
+        'files_per_second_runs': [run['files_per_second'] for run in runs],
+        'max_rss_kilobytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource is not None else None
+    }
+
+    median_run: Dict = report['median_run']
+    latency: Dict = median_run['request_latency_seconds']
+    print(f"files written            {median_run['written_files']} / {median_run['files']}")
+    print(f"duration                 {median_run['duration_seconds']:.3f} s")
+    print(f"files per second         {median_run['files_per_second'] or 0:.1f}")
+    print(f"overhead per file        {median_run['pipeline_overhead_ms_per_file'] or 0:.3f} ms")
+    print(f"requests / retries       {median_run['requests']} / {median_run['retries']}")
+    if median_run['schedule'] is not None and median_run['schedule']['efficiency'] is not None:
+        print(f"makespan / lower bound   {median_run['schedule']['makespan_seconds']:.3f} / {median_run['schedule']['lower_bound_seconds']:.3f} s "
+              f"({median_run['schedule']['efficiency'] * 100:.0f}% efficient)")
+    if latency['count'] > 0:
+        print(f"latency p50/p95/p99      {latency['p50']:.3f} / {latency['p95']:.3f} / {latency['p99']:.3f} s")
+    if report['max_rss_kilobytes'] is not None:
+        print(f"max RSS                  {report['max_rss_kilobytes'] / 1024:.1f} MiB")
+    if median_run['traced_memory_peak_bytes'] is not None:
+        print(f"traced memory peak       {median_run['traced_memory_peak_bytes'] / 1024 / 1024:.1f} MiB")
+    if median_run['replay_misses']:
+        print(f"replay misses            {median_run['replay_misses']}")
+
+    if args.json is not None:
+        with open(args.json, 'w', encoding='utf-8') as json_file:
+            json.dump(report, json_file, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r', encoding='utf-8') as baseline_file:
+            baseline_files_per_second: float = json.load(baseline_file)['median_run']['files_per_second']
+        regression: float = 1.0 - (median_run['files_per_second'] or 0.0) / baseline_files_per_second
+        print(f"against baseline         {-regression * 100:+.1f} %")
+        if regression > args.max_regression:
+            print(f"Throughput regression above {args.max_regression * 100:.0f} %", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+"""
+Module recording the exchanges with an LLM endpoint and replaying them, for benchmarks.
+
+This module provides the class Cassette, a JSON lines file holding one recorded exchange per line,
+RecordingLLMAccess, which sends the requests to the OpenAI API and records them, and ReplayLLMAccess,
+which answers the recorded requests with their recorded response and timing, without any network access.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, List
+
+from domain.allm_access import IResponseStreamConsumer
+from domain.endpoint_pool import Endpoint
+from domain.iresponse_cache import IResponseCache
+from infrastructure.llm_access import LLMAccess
+
+
+class Cassette:
+    """
+    Recorded exchanges, keyed like the response cache: model, messages, temperature and top_p.
+
+    Attributes:
+        file_name (str): The JSON lines file holding the exchanges.
+    """
+
+    def __init__(self, file_name: str):
+        """
+        Initializes the Cassette instance and loads the exchanges already recorded, if any.
+
+        Args:
+            file_name (str): The JSON lines file holding the exchanges.
+        """
+        self.file_name: str = file_name
+        self._exchanges: Dict[str, Dict] = {}
+        self._lock: threading.Lock = threading.Lock()
+        if os.path.isfile(file_name):
+            with open(file_name, 'r', encoding='utf-8') as file:
+                for line in file:
+                    if len(line.strip()) > 0:
+                        exchange: Dict = json.loads(line)
+                        self._exchanges[exchange['key']] = exchange
+
+    def __len__(self) -> int:
+        return len(self._exchanges)
+
+    def get(self, key: str) -> Dict:
+        """
+        Looks a recorded exchange up.
+
+        Args:
+            key (str): The key computed by IResponseCache.compute_key.
+
+        Returns:
+            Dict: The exchange, None if the request was not recorded.
+        """
+        return self._exchanges.get(key)
+
+    def record(self, key: str, request_name: str, response: Dict, latency_seconds: float, chunk_delays: List[float] = None) -> None:
+        """
+        Appends an exchange to the cassette file.
+
+        Args:
+            key (str): The key computed by IResponseCache.compute_key.
+            request_name (str): The name of the request.
+            response (Dict): The response as returned by send_plain_request.
+            latency_seconds (float): The time to the first token, or to the whole response if it was not streamed.
+            chunk_delays (List[float]): The delays between the streamed chunks and the chunks themselves, if streamed.
+        """
+        exchange: Dict = {
+            'key': key,
+            'request_name': request_name,
+            'response': response['response'],
+            'usage': response.get('usage'),
+            'latency_seconds': latency_seconds,
+            'chunks': chunk_delays
+        }
+        with self._lock:
+            self._exchanges[key] = exchange
+            with open(self.file_name, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(exchange, ensure_ascii=False) + '\n')
+
+
+class RecordingStreamConsumer(IResponseStreamConsumer):
+    """
+    Consumer forwarding a streamed completion to the real consumer while recording the pace of its chunks.
+    """
+
+    def __init__(self, stream_consumer: IResponseStreamConsumer):
+        """
+        Initializes the RecordingStreamConsumer instance.
+
+        Args:
+            stream_consumer (IResponseStreamConsumer): The consumer the chunks are forwarded to.
+        """
+        self.stream_consumer: IResponseStreamConsumer = stream_consumer
+        self.start: float = time.perf_counter()
+        self.first_chunk_at: float = None
+        self.chunks: List = []
+        self._last_chunk_at: float = None
+
+    def restart(self) -> None:
+        """
+        Forwards the restart of a retried request.
+        """
+        self.stream_consumer.restart()
+
+    def feed(self, text: str) -> None:
+        """
+        Records the delay since the previous chunk and forwards the chunk.
+
+        Args:
+            text (str): The chunk of the completion.
+        """
+        now: float = time.perf_counter()
+        if self.first_chunk_at is None:
+            self.first_chunk_at = now
+        self.chunks.append([now - self._last_chunk_at if self._last_chunk_at is not None else 0.0, text])
+        self._last_chunk_at = now
+        self.stream_consumer.feed(text)
+
+
+class RecordingLLMAccess(LLMAccess):
+    """
+    Class sending the requests to the OpenAI API and recording each exchange in a cassette.
+
+    Attributes:
+        cassette (Cassette): The cassette the exchanges are recorded in.
+    """
+
+    def __init__(self, logger, model_name: str, cassette: Cassette):
+        """
+        Initializes the RecordingLLMAccess instance.
+
+        Args:
+            logger (Logger): The logger instance used for logging.
+            model_name (str): The name of the LLM model being used.
+            cassette (Cassette): The cassette the exchanges are recorded in.
+        """
+        super().__init__(logger, model_name)
+        self.cassette: Cassette = cassette
+
+    def send_plain_request(self, messages: List, request_name: str, temperature: float, top_p: float, stream_consumer: IResponseStreamConsumer = None, endpoint: Endpoint = None) -> Dict:
+        """
+        Sends a request to the OpenAI API and records the exchange.
+
+        Args:
+            messages (List): The list of messages to send.
+            request_name (str): The name of the request.
+            temperature (float): The temperature for the request.
+            top_p (float): The top_p for the request.
+            stream_consumer (IResponseStreamConsumer): If set, the response is streamed to this consumer while it is generated.
+            endpoint (Endpoint): The endpoint of the pool the request is sent to, None to use the default endpoint.
+
+        Returns:
+            Dict: A dictionary containing the response from the API.
+        """
+        start: float = time.perf_counter()
+        recording_consumer: RecordingStreamConsumer = RecordingStreamConsumer(stream_consumer) if stream_consumer is not None else None
+        response: Dict = super().send_plain_request(messages, request_name, temperature, top_p, recording_consumer, endpoint)
+        if recording_consumer is not None and recording_consumer.first_chunk_at is not None:
+            self.cassette.record(IResponseCache.compute_key(self.model_name, messages, temperature, top_p), request_name, response, \
+                                 recording_consumer.first_chunk_at - start, recording_consumer.chunks)
+        else:
+            self.cassette.record(IResponseCache.compute_key(self.model_name, messages, temperature, top_p), request_name, response, \
+                                 time.perf_counter() - start)
+        return response
+
+
+class ReplayLLMAccess(LLMAccess):
+    """
+    Class answering the requests with the exchanges recorded in a cassette, with their recorded timing.
+
+    A request which was not recorded is answered with an empty completion and counted as a miss.
+
+    Attributes:
+        cassette (Cassette): The cassette the exchanges are replayed from.
+        speed (float): The replay speed, 2 halves the recorded delays, 0 replays without any delay.
+        misses (int): The number of requests which were not recorded.
+    """
+
+    def __init__(self, logger, model_name: str, cassette: Cassette, speed: float = 1.0):
+        """
+        Initializes the ReplayLLMAccess instance.
+
+        Args:
+            logger (Logger): The logger instance used for logging.
+            model_name (str): The name of the LLM model the exchanges were recorded with.
+            cassette (Cassette): The cassette the exchanges are replayed from.
+            speed (float): The replay speed, 2 halves the recorded delays, 0 replays without any delay.
+        """
+        super().__init__(logger, model_name)
+        self.cassette: Cassette = cassette
+        self.speed: float = speed
+        self.misses: int = 0
+        self._misses_lock: threading.Lock = threading.Lock()
+
+    def _sleep(self, seconds: float) -> None:
+        """
+        Waits for a recorded delay, scaled by the replay speed.
+
+        Args:
+            seconds (float): The recorded delay.
+        """
+        if self.speed > 0 and seconds > 0:
+            time.sleep(seconds / self.speed)
+
+    def send_plain_request(self, messages: List, request_name: str, temperature: float, top_p: float, stream_consumer: IResponseStreamConsumer = None, endpoint: Endpoint = None) -> Dict:
+        """
+        Replays the recorded exchange of a request.
+
+        Args:
+            messages (List): The list of messages to send.
+            request_name (str): The name of the request.
+            temperature (float): The temperature for the request.
+            top_p (float): The top_p for the request.
+            stream_consumer (IResponseStreamConsumer): If set, the recorded completion is fed to it at the recorded pace.
+            endpoint (Endpoint): The endpoint of the pool the request is routed to, unused by the replay.
+
+        Returns:
+            Dict: A dictionary containing the recorded response and usage.
+        """
+        exchange: Dict = self.cassette.get(IResponseCache.compute_key(self.model_name, messages, temperature, top_p))
+        if exchange is None:
+            self.logger.error(f"{request_name}: Request not recorded in {self.cassette.file_name}")
+            with self._misses_lock:
+                self.misses += 1
+            return {'request_name': request_name, 'response': ''}
+
+        self._sleep(exchange['latency_seconds'])
+        if stream_consumer is not None:
+            if exchange.get('chunks') is not None:
+                for delay, chunk in exchange['chunks']:
+                    self._sleep(delay)
+                    stream_consumer.feed(chunk)
+            else:
+                stream_consumer.feed(exchange['response'])
+        elif exchange.get('chunks') is not None:
+            self._sleep(sum(delay for delay, _ in exchange['chunks']))
+        return {
+            'request_name': request_name,
+            'response': exchange['response'],
+            'usage': exchange.get('usage')
+        }
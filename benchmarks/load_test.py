@@ -0,0 +1,201 @@
+"""
+@file load_test.py
+@brief End to end load test: runs __main__.py against the local OpenAI compatible mock server at increasing --jobs levels.
+@details Unlike bench.py, the requests go through the real LLMAccess path: OpenAI client, HTTP connection pool, retries,
+         timeouts and streaming. Each level is run in a fresh process over the same synthetic source tree, and the
+         throughput curve is charted with the latency, retries and connections seen by the server.
+         Usage, from the root of the repository:
+             python -m benchmarks.load_test --jobs 1,2,4,8,16,32 --files 64 --latency lognormal:0.5,0.4 --tokens_per_second 80
+             python -m benchmarks.load_test --jobs 4,16,64 --use_asyncio --stream --rate_limit_probability 0.05 --json load.json
+             python -m benchmarks.load_test --base_url http://127.0.0.1:8000/v1 --jobs 1,8
+"""
+
+import argparse
+import json
+import logging
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from logging import Logger
+from typing import Dict, List
+
+from benchmarks.bench import generate_synthetic_tree
+from benchmarks.mock_openai_server import MockOpenAIServer, add_backend_arguments, create_mock_server
+from benchmarks.synthetic_llm_access import LatencyDistribution
+
+"""
+@brief Root of the repository, where __main__.py lives.
+"""
+repository_directory: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+"""
+@brief Width of the bars of the throughput chart, in characters.
+"""
+chart_width: int = 50
+
+
+def request_statistics(base_url: str, method: str) -> Dict:
+    """
+    @brief Reads or resets the counters of the mock server.
+
+    @param base_url The base URL of the mock server.
+    @param method GET to read the counters, DELETE to reset them.
+    @return The counters, None if the endpoint is not a mock server.
+    """
+    try:
+        with urllib.request.urlopen(urllib.request.Request(base_url.rstrip('/') + '/stats', method=method), timeout=10) as response:
+            return json.loads(response.read())
+    except (OSError, ValueError):
+        return None
+
+
+def run_level(args: argparse.Namespace, base_url: str, source_directory: str, work_directory: str, jobs: int) -> Dict:
+    """
+    @brief Runs __main__.py once with the given number of jobs.
+
+    @param args The arguments of the load test.
+    @param base_url The base URL of the endpoint.
+    @param source_directory The source tree.
+    @param work_directory The directory receiving the generated files, metrics and logs of the run.
+    @param jobs The number of jobs.
+    @return The measures of the run.
+    """
+    to_directory: str = os.path.join(work_directory, f'jobs_{jobs}')
+    metrics_file: str = os.path.join(work_directory, f'jobs_{jobs}.json')
+    log_file: str = os.path.join(work_directory, f'jobs_{jobs}.log')
+    command: List[str] = [sys.executable, '__main__.py', '--from_directory', source_directory, '--to_directory', to_directory, \
+                          '--language_name', 'python', '--code_request', str(args.code_request), '--no_cache', '--jobs', str(jobs), \
+                          '--metrics_file', metrics_file]
+    command += ['--stream'] if args.stream else []
+    command += ['--use_asyncio', '--max_connections', str(max(jobs, args.max_connections))] if args.use_asyncio else []
+    command += shlex.split(args.extra_arguments) if args.extra_arguments is not None else []
+    environment: Dict[str, str] = dict(os.environ, OPENAI_BASE_URL=base_url, OPENAI_API_KEY=os.getenv('OPENAI_API_KEY') or 'mock')
+
+    request_statistics(base_url, 'DELETE')
+    start: float = time.perf_counter()
+    with open(log_file, 'w', encoding='utf-8') as log:
+        try:
+            return_code: int = subprocess.run(command, cwd=repository_directory, env=environment, stdout=log, stderr=subprocess.STDOUT, \
+                                              timeout=args.timeout, check=False).returncode
+        except subprocess.TimeoutExpired:
+            return_code = None
+    wall_seconds: float = time.perf_counter() - start
+    server_statistics: Dict = request_statistics(base_url, 'GET')
+
+    result: Dict = {'jobs': jobs, 'return_code': return_code, 'wall_seconds': wall_seconds, 'server': server_statistics}
+    if os.path.isfile(metrics_file):
+        with open(metrics_file, 'r', encoding='utf-8') as metrics:
+            summary: Dict = json.load(metrics)
+        result.update({
+            'files_written': summary['outcomes'].get('written', 0),
+            'files': summary['totals']['files'],
+            'files_per_second': summary['throughput']['files_per_second'],
+            'retries': summary['totals']['retries'],
+            'request_latency_seconds': summary['request_latency_seconds']
+        })
+    else:
+        with open(log_file, 'r', encoding='utf-8') as log:
+            result['log_tail'] = log.read()[-2000:]
+    return result
+
+
+def draw_throughput_chart(results: List[Dict]) -> List[str]:
+    """
+    @brief Draws the files per second of each level as horizontal bars, with the efficiency against linear scaling.
+
+    @param results The measures of the levels, by increasing number of jobs.
+    @return The lines of the chart.
+    """
+    measured: List[Dict] = [result for result in results if result.get('files_per_second') is not None]
+    if len(measured) == 0:
+        return ['No level completed']
+    maximum: float = max(result['files_per_second'] for result in measured) or 1.0
+    reference: Dict = measured[0]
+    lines: List[str] = [f"{'jobs':>6}  {'files/s':<{chart_width}}  {'':>8}  {'linear':>7}"]
+    for result in results:
+        if result.get('files_per_second') is None:
+            lines.append(f"{result['jobs']:>6}  {'failed, see log':<{chart_width}}")
+            continue
+        bar: str = '#' * max(1, round(result['files_per_second'] / maximum * chart_width))
+        linear: float = reference['files_per_second'] * result['jobs'] / reference['jobs']
+        efficiency: str = f"{result['files_per_second'] / linear * 100:6.0f}%" if linear > 0 else f"{'':>7}"
+        lines.append(f"{result['jobs']:>6}  {bar:<{chart_width}}  {result['files_per_second']:8.2f}  {efficiency}")
+    return lines
+
+
+def main() -> None:
+    """
+    @brief Runs the load test and prints the throughput curve.
+    """
+    argument_parser: argparse.ArgumentParser = argparse.ArgumentParser(prog='load_test', description='End to end load test of gpt2code against a local OpenAI compatible endpoint')
+    argument_parser.add_argument('--jobs', type=str, default='1,2,4,8,16,32', help='Comma separated --jobs levels. Default is 1,2,4,8,16,32')
+    argument_parser.add_argument('--files', type=int, default=64, help='Number of files of the synthetic tree. Default is 64')
+    argument_parser.add_argument('--lines_per_file', type=int, default=60, help='Lines of each synthetic file. Default is 60')
+    argument_parser.add_argument('--source_directory', type=str, help='Load test with this Python source tree instead of a synthetic one')
+    argument_parser.add_argument('--code_request', type=int, default=0, help='Code request sent for each file. Default is 0')
+    argument_parser.add_argument('--stream', action='store_true', help='Stream the completions')
+    argument_parser.add_argument('--use_asyncio', action='store_true', help='Multiplex the requests on one asyncio event loop')
+    argument_parser.add_argument('--max_connections', type=int, default=100, help='Connection pool size of the asyncio runs, raised to the number of jobs. Default is 100')
+    argument_parser.add_argument('--extra_arguments', type=str, help='Additional arguments passed to __main__.py, e.g. "--requests_per_minute 600"')
+    argument_parser.add_argument('--timeout', type=float, default=600, help='Seconds after which a level is abandoned. Default is 600')
+    argument_parser.add_argument('--base_url', type=str, help='Load test this endpoint instead of starting the mock server, the backend arguments are then ignored')
+    add_backend_arguments(argument_parser)
+    argument_parser.add_argument('--json', type=str, help='Write the measures of every level to this JSON file')
+    argument_parser.add_argument('--keep', action='store_true', help='Keep the generated files, metrics and logs of the runs, and print where')
+    args: argparse.Namespace = argument_parser.parse_args()
+    try:
+        LatencyDistribution(args.latency)
+        jobs_levels: List[int] = sorted({int(jobs) for jobs in args.jobs.split(',') if len(jobs.strip()) > 0})
+    except ValueError as err:
+        argument_parser.error(str(err))
+    if len(jobs_levels) == 0 or jobs_levels[0] < 1:
+        argument_parser.error('--jobs expects positive levels')
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s %(levelname)-8s %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    logger: Logger = logging.getLogger('load_test')
+    mock_server: MockOpenAIServer = None
+    base_url: str = args.base_url
+    if base_url is None:
+        mock_server = create_mock_server(args, logger).start()
+        base_url = mock_server.base_url
+
+    work_directory: str = tempfile.mkdtemp(prefix='gpt2code_load_test_')
+    results: List[Dict] = []
+    try:
+        source_directory: str = args.source_directory
+        if source_directory is None:
+            source_directory = os.path.join(work_directory, 'source')
+            generate_synthetic_tree(source_directory, args.files, 2, 4, args.lines_per_file, args.seed if args.seed is not None else 1)
+        for jobs in jobs_levels:
+            result: Dict = run_level(args, base_url, source_directory, work_directory, jobs)
+            results.append(result)
+            server: Dict = result['server'] or {}
+            latency: Dict = result.get('request_latency_seconds') or {}
+            print(f"jobs {jobs:>4}: {result.get('files_written', 0)}/{result.get('files', 0)} files in {result['wall_seconds']:.1f} s, "
+                  f"{result.get('files_per_second') or 0:.2f} files/s, latency p50 {latency.get('p50') or 0:.2f} s p95 {latency.get('p95') or 0:.2f} s, "
+                  f"{result.get('retries', 0)} retries, server: {server.get('requests', '?')} requests {server.get('responses_by_status', '')}, "
+                  f"{server.get('connections_opened', '?')} connections, peak {server.get('peak_requests_in_flight', '?')} in flight", flush=True)
+            if 'log_tail' in result:
+                print(result['log_tail'], file=sys.stderr)
+    finally:
+        if mock_server is not None:
+            mock_server.stop()
+        if args.keep:
+            print(f"Runs kept in {work_directory}")
+        else:
+            shutil.rmtree(work_directory, ignore_errors=True)
+
+    print()
+    print('\n'.join(draw_throughput_chart(results)))
+    if args.json is not None:
+        with open(args.json, 'w', encoding='utf-8') as json_file:
+            json.dump({'parameters': vars(args), 'base_url': base_url, 'levels': results}, json_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
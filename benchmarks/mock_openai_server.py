@@ -0,0 +1,575 @@
+"""
+Module serving a local OpenAI compatible endpoint, for end to end load tests.
+
+This module provides the class MockOpenAIServer, an HTTP server answering POST /v1/chat/completions like the
+OpenAI API, plain or streamed as server-sent events, so that the real LLMAccess path (HTTP client, connection pool,
+retries and streaming) can be exercised without a live provider. The behaviour of each request is decided by a
+SyntheticBackend: latency, generation rate and injected 429, 503 and stalled requests. The server can also enforce
+requests and tokens per minute quotas, reporting them in the x-ratelimit headers, and reject the requests exceeding
+a context window with a context_length_exceeded error.
+
+Usage, from the root of the repository:
+    python -m benchmarks.mock_openai_server --port 8000 --latency lognormal:0.5,0.4 --tokens_per_second 60
+    OPENAI_BASE_URL=http://127.0.0.1:8000/v1 OPENAI_API_KEY=mock python __main__.py --from_directory src ...
+
+GET /v1/stats returns the counters of the server as JSON, DELETE /v1/stats resets them.
+"""
+
+import argparse
+import collections
+import json
+import logging
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging import Logger
+from typing import Deque, Dict, List, Tuple
+
+from domain.llm_utils import LLMUtils
+from benchmarks.synthetic_llm_access import LatencyDistribution, SyntheticAPIError, SyntheticBackend, SyntheticResponsePlan
+
+
+class MinuteQuota:
+    """
+    Requests and tokens per minute quotas enforced by the server over a sliding window of one minute.
+
+    Attributes:
+        requests_per_minute (int): The requests quota, None for no quota.
+        tokens_per_minute (int): The tokens quota, None for no quota.
+    """
+
+    def __init__(self, requests_per_minute: int = None, tokens_per_minute: int = None):
+        """
+        Initializes the MinuteQuota instance.
+
+        Args:
+            requests_per_minute (int): The requests quota, None for no quota.
+            tokens_per_minute (int): The tokens quota, None for no quota.
+        """
+        self.requests_per_minute: int = requests_per_minute
+        self.tokens_per_minute: int = tokens_per_minute
+        self._admissions: Deque[Tuple[float, int]] = collections.deque()
+        self._admitted_tokens: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    def admit(self, tokens: int) -> Tuple[bool, Dict[str, str]]:
+        """
+        Charges a request to the quotas if they allow it.
+
+        Args:
+            tokens (int): The tokens the request may consume.
+
+        Returns:
+            Tuple[bool, Dict[str, str]]: Whether the request is admitted, and the x-ratelimit headers to report.
+        """
+        now: float = time.monotonic()
+        with self._lock:
+            while len(self._admissions) > 0 and self._admissions[0][0] <= now - 60:
+                self._admitted_tokens -= self._admissions.popleft()[1]
+            admitted: bool = (self.requests_per_minute is None or len(self._admissions) < self.requests_per_minute) \
+                and (self.tokens_per_minute is None or self._admitted_tokens + tokens <= self.tokens_per_minute)
+            if admitted:
+                self._admissions.append((now, tokens))
+                self._admitted_tokens += tokens
+            headers: Dict[str, str] = {}
+            if self.requests_per_minute is not None:
+                reset_seconds: float = self._admissions[0][0] + 60 - now if len(self._admissions) >= self.requests_per_minute else 0.0
+                headers.update({
+                    'x-ratelimit-limit-requests': str(self.requests_per_minute),
+                    'x-ratelimit-remaining-requests': str(max(0, self.requests_per_minute - len(self._admissions))),
+                    'x-ratelimit-reset-requests': f'{reset_seconds:.3f}s'
+                })
+            if self.tokens_per_minute is not None:
+                reset_seconds = self._get_tokens_reset_seconds(now, tokens)
+                headers.update({
+                    'x-ratelimit-limit-tokens': str(self.tokens_per_minute),
+                    'x-ratelimit-remaining-tokens': str(max(0, self.tokens_per_minute - self._admitted_tokens)),
+                    'x-ratelimit-reset-tokens': f'{reset_seconds:.3f}s'
+                })
+        return admitted, headers
+
+    @staticmethod
+    def get_reset_seconds(headers: Dict[str, str]) -> float:
+        """
+        Reads back the longest reset delay reported in the x-ratelimit headers returned by admit.
+
+        Args:
+            headers (Dict[str, str]): The x-ratelimit headers.
+
+        Returns:
+            float: The delay in seconds, 0 if there is none.
+        """
+        delays: List[float] = [float(headers[name][:-1]) for name in ['x-ratelimit-reset-requests', 'x-ratelimit-reset-tokens'] if name in headers]
+        return max(delays) if len(delays) > 0 else 0.0
+
+    def _get_tokens_reset_seconds(self, now: float, tokens: int) -> float:
+        """
+        Computes when enough tokens leave the window for a request of the given size, the lock being held.
+
+        Args:
+            now (float): The current monotonic time.
+            tokens (int): The tokens of the request.
+
+        Returns:
+            float: The delay in seconds, 0 if the request fits now.
+        """
+        admitted_tokens: int = self._admitted_tokens
+        for admission_time, admission_tokens in self._admissions:
+            if admitted_tokens + tokens <= self.tokens_per_minute:
+                return max(0.0, admission_time - now)
+            admitted_tokens -= admission_tokens
+        return max(0.0, self._admissions[-1][0] + 60 - now) if len(self._admissions) > 0 else 0.0
+
+
+class MockServerStatistics:
+    """
+    Counters of the mock server, updated by the request handlers.
+    """
+
+    def __init__(self):
+        """
+        Initializes the MockServerStatistics instance.
+        """
+        self._lock: threading.Lock = threading.Lock()
+        self.open_connections: int = 0
+        self.requests_in_flight: int = 0
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Resets the counters, the connections and requests currently open excepted.
+        """
+        with self._lock:
+            self.started_at: float = time.monotonic()
+            self.connections_opened: int = 0
+            self.requests: int = 0
+            self.streamed_requests: int = 0
+            self.responses_by_status: Dict[str, int] = {}
+            self.stalled_requests: int = 0
+            self.completion_tokens: int = 0
+            self.peak_requests_in_flight: int = self.requests_in_flight
+            self.peak_open_connections: int = self.open_connections
+
+    def connection_opened(self) -> None:
+        with self._lock:
+            self.connections_opened += 1
+            self.open_connections += 1
+            self.peak_open_connections = max(self.peak_open_connections, self.open_connections)
+
+    def connection_closed(self) -> None:
+        with self._lock:
+            self.open_connections -= 1
+
+    def request_started(self, streamed: bool) -> None:
+        with self._lock:
+            self.requests += 1
+            self.streamed_requests += 1 if streamed else 0
+            self.requests_in_flight += 1
+            self.peak_requests_in_flight = max(self.peak_requests_in_flight, self.requests_in_flight)
+
+    def request_finished(self, status: int, completion_tokens: int = 0) -> None:
+        """
+        Records the outcome of a request.
+
+        Args:
+            status (int): The HTTP status answered, 0 for a stalled request dropped without answer.
+            completion_tokens (int): The tokens generated.
+        """
+        with self._lock:
+            self.requests_in_flight -= 1
+            if status == 0:
+                self.stalled_requests += 1
+            else:
+                self.responses_by_status[str(status)] = self.responses_by_status.get(str(status), 0) + 1
+            self.completion_tokens += completion_tokens
+
+    def to_dict(self) -> Dict:
+        """
+        Provides the counters.
+
+        Returns:
+            Dict: The counters, with the seconds elapsed since the last reset.
+        """
+        with self._lock:
+            return {
+                'elapsed_seconds': time.monotonic() - self.started_at,
+                'connections_opened': self.connections_opened,
+                'open_connections': self.open_connections,
+                'peak_open_connections': self.peak_open_connections,
+                'requests': self.requests,
+                'streamed_requests': self.streamed_requests,
+                'requests_in_flight': self.requests_in_flight,
+                'peak_requests_in_flight': self.peak_requests_in_flight,
+                'responses_by_status': dict(self.responses_by_status),
+                'stalled_requests': self.stalled_requests,
+                'completion_tokens': self.completion_tokens
+            }
+
+
+class MockOpenAIRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handler of the connections to the mock server: one instance per connection, kept alive between requests.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    """
+    Keeps the connections alive so that the connection pool of the client is exercised.
+    """
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.mock_server.statistics.connection_opened()
+
+    def finish(self) -> None:
+        try:
+            super().finish()
+        finally:
+            self.server.mock_server.statistics.connection_closed()
+
+    def log_message(self, format: str, *args) -> None:
+        self.server.mock_server.logger.debug(f"{self.address_string()} {format % args}")
+
+    def send_json(self, status: int, body: Dict, headers: Dict[str, str] = None) -> None:
+        """
+        Sends a complete JSON response.
+
+        Args:
+            status (int): The HTTP status.
+            body (Dict): The body of the response.
+            headers (Dict[str, str]): Additional headers.
+        """
+        content: bytes = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def send_error_json(self, status: int, message: str, error_type: str, code: str, headers: Dict[str, str] = None) -> None:
+        """
+        Sends an error shaped like the errors of the OpenAI API.
+
+        Args:
+            status (int): The HTTP status.
+            message (str): The message of the error.
+            error_type (str): The type of the error.
+            code (str): The code of the error.
+            headers (Dict[str, str]): Additional headers.
+        """
+        self.send_json(status, {'error': {'message': message, 'type': error_type, 'param': None, 'code': code}}, headers)
+
+    def read_json_body(self) -> Dict:
+        """
+        Reads the JSON body of the request.
+
+        Returns:
+            Dict: The body, None if it is not valid JSON.
+        """
+        content: bytes = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            return json.loads(content)
+        except ValueError:
+            return None
+
+    def do_GET(self) -> None:
+        if self.path.rstrip('/').endswith('/stats'):
+            self.send_json(200, self.server.mock_server.statistics.to_dict())
+        elif self.path.rstrip('/').endswith('/models'):
+            self.send_json(200, {'object': 'list', 'data': [{'id': 'mock', 'object': 'model', 'owned_by': 'mock'}]})
+        else:
+            self.send_error_json(404, f"Unknown path {self.path}", 'invalid_request_error', 'unknown_url')
+
+    def do_DELETE(self) -> None:
+        if self.path.rstrip('/').endswith('/stats'):
+            self.server.mock_server.statistics.reset()
+            self.send_json(200, self.server.mock_server.statistics.to_dict())
+        else:
+            self.send_error_json(404, f"Unknown path {self.path}", 'invalid_request_error', 'unknown_url')
+
+    def do_POST(self) -> None:
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.read_json_body()
+            self.send_error_json(404, f"Unknown path {self.path}", 'invalid_request_error', 'unknown_url')
+            return
+        body: Dict = self.read_json_body()
+        if body is None or not isinstance(body.get('messages'), list):
+            self.send_error_json(400, "The body must be a JSON object with a list of messages", 'invalid_request_error', None)
+            return
+        mock_server: MockOpenAIServer = self.server.mock_server
+        streamed: bool = bool(body.get('stream'))
+        mock_server.statistics.request_started(streamed)
+        status: int = 0
+        completion_tokens: int = 0
+        try:
+            status, completion_tokens = self.answer_chat_completion(mock_server, body, streamed)
+        finally:
+            mock_server.statistics.request_finished(status, completion_tokens)
+
+    def answer_chat_completion(self, mock_server: 'MockOpenAIServer', body: Dict, streamed: bool) -> Tuple[int, int]:
+        """
+        Plays the behaviour the backend planned for a chat completion request.
+
+        Args:
+            mock_server (MockOpenAIServer): The server holding the backend, quotas and statistics.
+            body (Dict): The body of the request.
+            streamed (bool): Whether the completion is sent as server-sent events.
+
+        Returns:
+            Tuple[int, int]: The HTTP status answered, 0 if the request was dropped, and the tokens generated.
+        """
+        messages: List = body['messages']
+        model_name: str = body.get('model', 'mock')
+        prompt_tokens: int = LLMUtils.estimate_message_tokens(messages)
+        backend: SyntheticBackend = mock_server.backend
+        if mock_server.context_window_tokens is not None and prompt_tokens + backend.completion_tokens > mock_server.context_window_tokens:
+            self.send_error_json(400, f"This model's maximum context length is {mock_server.context_window_tokens} tokens. However, you "
+                                 f"requested {prompt_tokens + backend.completion_tokens} tokens ({prompt_tokens} in the messages, "
+                                 f"{backend.completion_tokens} in the completion). Please reduce the length of the messages or completion.", \
+                                 'invalid_request_error', 'context_length_exceeded')
+            return 400, 0
+
+        admitted, rate_limit_headers = mock_server.quota.admit(prompt_tokens + backend.completion_tokens)
+        if not admitted:
+            retry_after_seconds: float = max(MinuteQuota.get_reset_seconds(rate_limit_headers), 0.001)
+            rate_limit_headers.update({'retry-after-ms': str(int(retry_after_seconds * 1000)), 'retry-after': str(int(retry_after_seconds + 0.999))})
+            self.send_error_json(429, "Rate limit reached, please try again later.", 'requests', 'rate_limit_exceeded', rate_limit_headers)
+            return 429, 0
+
+        plan: SyntheticResponsePlan = backend.plan_response(messages)
+        time.sleep(plan.latency_seconds)
+        if isinstance(plan.error, SyntheticAPIError):
+            headers: Dict[str, str] = dict(rate_limit_headers)
+            headers.update(plan.error.response.headers)
+            if plan.error.status_code == 429:
+                self.send_error_json(429, "Rate limit reached for requests", 'requests', 'rate_limit_exceeded', headers)
+            else:
+                self.send_error_json(plan.error.status_code, "The server is overloaded or not ready yet.", 'server_error', None, headers)
+            return plan.error.status_code, 0
+        if plan.error is not None:
+            # Stalled request: the connection is dropped without answer once the timeout elapsed
+            self.close_connection = True
+            return 0, 0
+
+        completion_id: str = f'chatcmpl-{uuid.uuid4().hex[:24]}'
+        created: int = int(time.time())
+        usage: Dict = {
+            'prompt_tokens': plan.usage['prompt_tokens'],
+            'completion_tokens': plan.usage['completion_tokens'],
+            'total_tokens': plan.usage['total_tokens']
+        }
+        if streamed:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Transfer-Encoding', 'chunked')
+            for name, value in rate_limit_headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            chunk: Dict = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model_name}
+            self.send_event(dict(chunk, choices=[{'index': 0, 'delta': {'role': 'assistant', 'content': ''}, 'finish_reason': None}]))
+            for piece in plan.pieces:
+                time.sleep(plan.seconds_per_piece)
+                self.send_event(dict(chunk, choices=[{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}]))
+            self.send_event(dict(chunk, choices=[{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]))
+            if (body.get('stream_options') or {}).get('include_usage'):
+                self.send_event(dict(chunk, choices=[], usage=usage))
+            self.send_chunk(b'data: [DONE]\n\n')
+            self.send_chunk(b'')
+        else:
+            time.sleep(plan.seconds_per_piece * len(plan.pieces))
+            self.send_json(200, {
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': created,
+                'model': model_name,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': ''.join(plan.pieces), 'refusal': None},
+                    'finish_reason': 'stop'
+                }],
+                'usage': usage
+            }, rate_limit_headers)
+        return 200, plan.usage['completion_tokens']
+
+    def send_chunk(self, data: bytes) -> None:
+        """
+        Sends one chunk of a response with chunked transfer encoding, an empty chunk ending the response.
+
+        Args:
+            data (bytes): The data of the chunk.
+        """
+        self.wfile.write(f'{len(data):X}\r\n'.encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+    def send_event(self, data: Dict) -> None:
+        """
+        Sends a server-sent event.
+
+        Args:
+            data (Dict): The data of the event.
+        """
+        self.send_chunk(f'data: {json.dumps(data)}\n\n'.encode('utf-8'))
+
+
+class MockHTTPServer(ThreadingHTTPServer):
+    """
+    HTTP server handling each connection in its own thread.
+
+    Attributes:
+        mock_server (MockOpenAIServer): The mock server the handlers answer for.
+    """
+
+    request_queue_size = 256
+    """
+    Number of connections waiting to be accepted, high enough for the concurrency levels of load tests.
+    """
+
+    daemon_threads = True
+    """
+    Does not wait for the open connections when the process exits.
+    """
+
+    def __init__(self, server_address: Tuple[str, int], mock_server: 'MockOpenAIServer'):
+        self.mock_server: MockOpenAIServer = mock_server
+        super().__init__(server_address, MockOpenAIRequestHandler)
+
+
+class MockOpenAIServer:
+    """
+    Local OpenAI compatible endpoint, served from a background thread.
+
+    Attributes:
+        backend (SyntheticBackend): The behaviour of the requests.
+        quota (MinuteQuota): The requests and tokens per minute quotas.
+        context_window_tokens (int): The context window, None for no limit.
+        statistics (MockServerStatistics): The counters of the server.
+        logger (Logger): The logger instance used for logging.
+    """
+
+    def __init__(self, backend: SyntheticBackend, logger: Logger, host: str = '127.0.0.1', port: int = 0, \
+                 quota: MinuteQuota = None, context_window_tokens: int = None):
+        """
+        Initializes the MockOpenAIServer instance and binds its socket.
+
+        Args:
+            backend (SyntheticBackend): The behaviour of the requests.
+            logger (Logger): The logger instance used for logging.
+            host (str): The address to listen on.
+            port (int): The port to listen on, 0 for any free port.
+            quota (MinuteQuota): The requests and tokens per minute quotas, None for no quota.
+            context_window_tokens (int): The context window, None for no limit.
+        """
+        self.backend: SyntheticBackend = backend
+        self.logger: Logger = logger
+        self.quota: MinuteQuota = quota if quota is not None else MinuteQuota()
+        self.context_window_tokens: int = context_window_tokens
+        self.statistics: MockServerStatistics = MockServerStatistics()
+        self._http_server: MockHTTPServer = MockHTTPServer((host, port), self)
+        self._thread: threading.Thread = None
+
+    @property
+    def base_url(self) -> str:
+        """
+        The URL to set in OPENAI_BASE_URL.
+        """
+        host, port = self._http_server.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self) -> 'MockOpenAIServer':
+        """
+        Serves the requests from a background thread.
+
+        Returns:
+            MockOpenAIServer: The server itself.
+        """
+        self._thread = threading.Thread(target=self._http_server.serve_forever, name='mock-openai-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        """
+        Serves the requests from the calling thread until interrupted.
+        """
+        self._http_server.serve_forever()
+
+    def stop(self) -> None:
+        """
+        Stops serving and closes the socket.
+        """
+        self._http_server.shutdown()
+        self._http_server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def add_backend_arguments(argument_parser: argparse.ArgumentParser) -> None:
+    """
+    Adds the arguments defining the behaviour of the mock server.
+
+    Args:
+        argument_parser (ArgumentParser): The parser to add the arguments to.
+    """
+    argument_parser.add_argument('--latency', type=str, default='constant:0.2', help='Time to first token: constant:S, uniform:LOW,HIGH, normal:MEAN,STDDEV, lognormal:MEDIAN,SIGMA or exponential:MEAN. Default is constant:0.2')
+    argument_parser.add_argument('--tokens_per_second', type=float, help='Generation rate of each completion. Default is instantaneous')
+    argument_parser.add_argument('--tokens_per_chunk', type=int, default=SyntheticBackend.tokens_per_piece, help=f'Tokens of each streamed chunk. Default is {SyntheticBackend.tokens_per_piece}')
+    argument_parser.add_argument('--completion_tokens', type=int, default=200, help='Tokens of each completion. Default is 200')
+    argument_parser.add_argument('--rate_limit_probability', type=float, default=0.0, help='Probability of a 429 response')
+    argument_parser.add_argument('--retry_after_seconds', type=float, default=1.0, help='Delay advertised by the random 429 responses. Default is 1')
+    argument_parser.add_argument('--server_error_probability', type=float, default=0.0, help='Probability of a 503 response')
+    argument_parser.add_argument('--stall_probability', type=float, default=0.0, help='Probability of a request stalling then dropped without answer')
+    argument_parser.add_argument('--stall_seconds', type=float, default=5.0, help='Time a stalled request lasts before the connection is dropped. Default is 5')
+    argument_parser.add_argument('--requests_per_minute', type=int, help='Requests per minute quota enforced by the server')
+    argument_parser.add_argument('--tokens_per_minute', type=int, help='Tokens per minute quota enforced by the server')
+    argument_parser.add_argument('--context_window_tokens', type=int, help='Context window of the model: bigger requests get a context_length_exceeded error')
+    argument_parser.add_argument('--seed', type=int, help='Seed of the random behaviours, for reproducible runs')
+
+
+def create_mock_server(args: argparse.Namespace, logger: Logger, host: str = '127.0.0.1', port: int = 0) -> MockOpenAIServer:
+    """
+    Creates a mock server from the arguments added by add_backend_arguments.
+
+    Args:
+        args (Namespace): The parsed arguments.
+        logger (Logger): The logger instance used for logging.
+        host (str): The address to listen on.
+        port (int): The port to listen on, 0 for any free port.
+
+    Returns:
+        MockOpenAIServer: The server, not started yet.
+    """
+    backend: SyntheticBackend = SyntheticBackend(LatencyDistribution(args.latency), args.tokens_per_second, args.completion_tokens, \
+                                                 args.rate_limit_probability, args.server_error_probability, args.stall_probability, \
+                                                 args.stall_seconds, args.retry_after_seconds, seed=args.seed, tokens_per_piece=args.tokens_per_chunk)
+    return MockOpenAIServer(backend, logger, host, port, MinuteQuota(args.requests_per_minute, args.tokens_per_minute), args.context_window_tokens)
+
+
+def main() -> None:
+    """
+    Serves the mock endpoint until interrupted.
+    """
+    argument_parser: argparse.ArgumentParser = argparse.ArgumentParser(prog='mock_openai_server', description='Local OpenAI compatible endpoint for load tests')
+    argument_parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on. Default is 127.0.0.1')
+    argument_parser.add_argument('--port', type=int, default=8000, help='Port to listen on. Default is 8000')
+    add_backend_arguments(argument_parser)
+    argument_parser.add_argument('--log_level', type=str, default='INFO', help='Logging level, DEBUG logs every request. Default is INFO')
+    args: argparse.Namespace = argument_parser.parse_args()
+    try:
+        LatencyDistribution(args.latency)
+    except ValueError as err:
+        argument_parser.error(str(err))
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s %(levelname)-8s %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    logger: Logger = logging.getLogger('mock_openai_server')
+    mock_server: MockOpenAIServer = create_mock_server(args, logger, args.host, args.port)
+    logger.info(f"Serving on {mock_server.base_url}: export OPENAI_BASE_URL={mock_server.base_url} OPENAI_API_KEY=mock")
+    try:
+        mock_server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info(f"Statistics: {json.dumps(mock_server.statistics.to_dict())}")
+
+
+if __name__ == '__main__':
+    main()
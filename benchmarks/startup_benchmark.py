@@ -0,0 +1,142 @@
+"""
+@file startup_benchmark.py
+@brief Measures the cold start of the command line tool: module import, argument parsing and short runs.
+@details Each measure is taken in a fresh interpreter, several times, and the median and minimum are reported.
+         Usage, from the root of the repository:
+             python -m benchmarks.startup_benchmark [--repeat 10] [--json startup.json] [--import_profile 15]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+"""
+@brief Root of the repository, where __main__.py lives.
+"""
+repository_directory: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+"""
+@brief Script run in a fresh interpreter to time the import of __main__.py and the parsing of the arguments.
+"""
+import_and_parse_script: str = """
+import importlib.util, json, sys, time
+start = time.perf_counter()
+specification = importlib.util.spec_from_file_location('gpt2code_main', 'REPOSITORY/__main__.py')
+module = importlib.util.module_from_spec(specification)
+specification.loader.exec_module(module)
+imported = time.perf_counter()
+sys.argv = ['gpt2code', '--from_directory', '.', '--to_directory', 'out', '--language_name', 'python', '--simulate_calls_only']
+handler = module.CommandLineArgumentsHandler().define_command_line_arguments()
+handler.update_logging_level().update_selected_code_request().update_model_name().check_selected_code_request()
+parsed = time.perf_counter()
+print(json.dumps({'import': imported - start, 'parse': parsed - imported}))
+"""
+
+
+def time_command(command: List[str], repeat: int) -> List[float]:
+    """
+    @brief Runs a command several times and measures its wall clock time.
+
+    @param command The command and its arguments.
+    @param repeat The number of runs.
+    @return The durations in seconds.
+    """
+    durations: List[float] = []
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        subprocess.run(command, cwd=repository_directory, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def time_import_and_parse(repeat: int) -> Dict[str, List[float]]:
+    """
+    @brief Measures, from inside fresh interpreters, the import of __main__.py and the parsing of the arguments.
+
+    @param repeat The number of runs.
+    @return The durations in seconds, by phase.
+    """
+    durations: Dict[str, List[float]] = {'import': [], 'parse': []}
+    script: str = import_and_parse_script.replace('REPOSITORY', repository_directory.replace('\\', '/'))
+    for _ in range(repeat):
+        output: str = subprocess.run([sys.executable, '-c', script], cwd=repository_directory, capture_output=True, text=True, check=True).stdout
+        measures: Dict = json.loads(output.strip().splitlines()[-1])
+        for phase, duration in measures.items():
+            durations[phase].append(duration)
+    return durations
+
+
+def get_import_profile(module_count: int) -> List[Dict]:
+    """
+    @brief Lists the slowest modules imported by the service, from the output of python -X importtime.
+
+    @param module_count The number of modules listed.
+    @return The modules with their cumulative import time in milliseconds, slowest first.
+    """
+    errors: str = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import service.application_service'], \
+                                 cwd=repository_directory, capture_output=True, text=True, check=True).stderr
+    modules: List[Dict] = []
+    for line in errors.splitlines():
+        fields: List[str] = line.split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        modules.append({'module': fields[2].strip(), 'cumulative_ms': int(fields[1]) / 1000})
+    return sorted(modules, key=lambda module: module['cumulative_ms'], reverse=True)[:module_count]
+
+
+def summarize(durations: List[float]) -> Dict[str, float]:
+    """
+    @brief Summarizes durations in milliseconds.
+
+    @param durations The durations in seconds.
+    @return The median and minimum durations in milliseconds.
+    """
+    return {'median_ms': round(statistics.median(durations) * 1000, 1), 'min_ms': round(min(durations) * 1000, 1)}
+
+
+def main() -> None:
+    """
+    @brief Runs the startup benchmark and prints the results.
+    """
+    argument_parser: argparse.ArgumentParser = argparse.ArgumentParser(prog='startup_benchmark', description='Measures the cold start of gpt2code')
+    argument_parser.add_argument('--repeat', type=int, default=10, help='Number of runs of each measure. Default is 10')
+    argument_parser.add_argument('--json', type=str, help='Write the results to this JSON file')
+    argument_parser.add_argument('--import_profile', type=int, default=0, help='Also list the given number of slowest imported modules')
+    args: argparse.Namespace = argument_parser.parse_args()
+
+    results: Dict = {'python': sys.version.split()[0], 'repeat': args.repeat, 'measures': {}}
+    results['measures']['interpreter'] = summarize(time_command([sys.executable, '-c', 'pass'], args.repeat))
+    for phase, durations in time_import_and_parse(args.repeat).items():
+        results['measures'][phase] = summarize(durations)
+    results['measures']['help'] = summarize(time_command([sys.executable, '__main__.py', '--help'], args.repeat))
+    results['measures']['temperature_recommendations'] = \
+        summarize(time_command([sys.executable, '__main__.py', '--show_temperature_recommendations'], args.repeat))
+    with tempfile.TemporaryDirectory() as work_directory:
+        source_directory: str = os.path.join(work_directory, 'source')
+        os.makedirs(source_directory)
+        with open(os.path.join(source_directory, 'module.py'), 'w', encoding='utf-8') as source_file:
+            source_file.write('def f():\n    return 1\n')
+        results['measures']['simulated_run'] = summarize(time_command([sys.executable, '__main__.py', '--from_directory', source_directory, \
+                                                                       '--to_directory', os.path.join(work_directory, 'target'), \
+                                                                       '--language_name', 'python', '--simulate_calls_only', '--no_cache'], args.repeat))
+    if args.import_profile > 0:
+        results['import_profile'] = get_import_profile(args.import_profile)
+
+    print(f"{'measure':<30}{'median ms':>12}{'min ms':>12}")
+    for measure, summary in results['measures'].items():
+        print(f"{measure:<30}{summary['median_ms']:>12}{summary['min_ms']:>12}")
+    for module in results.get('import_profile', []):
+        print(f"  {module['module']:<50}{module['cumulative_ms']:>10.1f} ms")
+    if args.json is not None:
+        with open(args.json, 'w', encoding='utf-8') as json_file:
+            json.dump(results, json_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,372 @@
+"""
+Module simulating an LLM endpoint with realistic timings, for benchmarks.
+
+This module provides the class SyntheticBackend, which decides how each request behaves: latency drawn from a
+configurable distribution, generation at a given number of tokens per second, and injected rate limits, server
+errors and timeouts. SyntheticLLMAccess and AsyncSyntheticLLMAccess play these behaviours in place of the OpenAI API.
+"""
+
+import asyncio
+import math
+import random
+import threading
+import time
+from typing import Dict, List
+
+from domain.allm_access import IResponseStreamConsumer
+from domain.endpoint_pool import Endpoint
+from domain.llm_utils import LLMUtils
+from infrastructure.llm_access import LLMAccess
+from infrastructure.llm_access_async import AsyncLLMAccess
+
+
+class LatencyDistribution:
+    """
+    Distribution of the latency of the requests, in seconds.
+
+    Specifications:
+        constant:SECONDS, uniform:LOW,HIGH, normal:MEAN,STDDEV, lognormal:MEDIAN,SIGMA, exponential:MEAN
+
+    Attributes:
+        specification (str): The specification the distribution was created from.
+    """
+
+    def __init__(self, specification: str):
+        """
+        Initializes the LatencyDistribution instance.
+
+        Args:
+            specification (str): The specification, for instance 'lognormal:0.8,0.5'.
+
+        Raises:
+            ValueError: If the specification is not valid.
+        """
+        self.specification: str = specification
+        kind, _, parameters = specification.partition(':')
+        self.kind: str = kind.strip().lower()
+        try:
+            self.parameters: List[float] = [float(parameter) for parameter in parameters.split(',')] if len(parameters) > 0 else []
+        except ValueError:
+            raise ValueError(f"Invalid latency distribution {specification}")
+        expected_parameters: Dict[str, int] = {'constant': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2, 'exponential': 1}
+        if expected_parameters.get(self.kind) != len(self.parameters):
+            raise ValueError(f"Invalid latency distribution {specification}: expected one of constant:SECONDS, uniform:LOW,HIGH, "
+                             "normal:MEAN,STDDEV, lognormal:MEDIAN,SIGMA, exponential:MEAN")
+
+    def sample(self, random_generator: random.Random) -> float:
+        """
+        Draws a latency.
+
+        Args:
+            random_generator (Random): The random generator to draw from.
+
+        Returns:
+            float: The latency in seconds, never negative.
+        """
+        if self.kind == 'constant':
+            latency: float = self.parameters[0]
+        elif self.kind == 'uniform':
+            latency = random_generator.uniform(self.parameters[0], self.parameters[1])
+        elif self.kind == 'normal':
+            latency = random_generator.gauss(self.parameters[0], self.parameters[1])
+        elif self.kind == 'lognormal':
+            latency = random_generator.lognormvariate(math.log(self.parameters[0]), self.parameters[1]) if self.parameters[0] > 0 else 0.0
+        else:
+            latency = random_generator.expovariate(1.0 / self.parameters[0]) if self.parameters[0] > 0 else 0.0
+        return max(0.0, latency)
+
+
+class SyntheticAPIError(Exception):
+    """
+    Error returned by the synthetic endpoint, shaped like the errors of the OpenAI client.
+
+    Attributes:
+        status_code (int): The HTTP status of the error.
+        response: An object holding the headers of the error response.
+    """
+
+    class Response:
+        """
+        Response of a failed request, only its headers are used.
+        """
+
+        def __init__(self, status_code: int, headers: Dict[str, str]):
+            self.status_code: int = status_code
+            self.headers: Dict[str, str] = headers
+
+    def __init__(self, status_code: int, message: str, headers: Dict[str, str] = None):
+        """
+        Initializes the SyntheticAPIError instance.
+
+        Args:
+            status_code (int): The HTTP status of the error.
+            message (str): The message of the error.
+            headers (Dict[str, str]): The headers of the error response.
+        """
+        super().__init__(f"Error code: {status_code} - {message}")
+        self.status_code: int = status_code
+        self.response: SyntheticAPIError.Response = SyntheticAPIError.Response(status_code, headers or {})
+
+
+class SyntheticResponsePlan:
+    """
+    How one request behaves: when it fails or what it returns, and at which pace.
+
+    Attributes:
+        latency_seconds (float): The time before the first token, or before the error.
+        error (Exception): The error raised after the latency, None if the request succeeds.
+        pieces (List[str]): The pieces of the completion, streamed one after the other.
+        seconds_per_piece (float): The generation time of each piece.
+        usage (Dict): The usage reported for the request.
+    """
+
+    def __init__(self, latency_seconds: float, error: Exception = None, pieces: List[str] = None, \
+                 seconds_per_piece: float = 0.0, usage: Dict = None):
+        self.latency_seconds: float = latency_seconds
+        self.error: Exception = error
+        self.pieces: List[str] = pieces if pieces is not None else []
+        self.seconds_per_piece: float = seconds_per_piece
+        self.usage: Dict = usage
+
+
+class SyntheticBackend:
+    """
+    Behaviour of the synthetic endpoint, shared by all the requests of a run.
+
+    The completion is a markdown code block whose size does not depend on the request, so that the cost
+    of the local pipeline can be measured independently from the size of the source files.
+
+    Attributes:
+        latency (LatencyDistribution): The distribution of the time to the first token.
+        tokens_per_second (float): The generation rate, None for an instantaneous generation.
+        completion_tokens (int): The number of tokens of each completion.
+        rate_limit_probability (float): The probability of a 429 response.
+        server_error_probability (float): The probability of a 5xx response.
+        timeout_probability (float): The probability of a request timing out.
+        timeout_seconds (float): The time a request takes to time out.
+        retry_after_seconds (float): The delay advertised by the 429 responses.
+        retry_delay_scale (float): The factor applied to the backoff delays of the client, to keep benchmarks short.
+        prompt_tokens_per_second (float): The rate the prompt is read at, None for a time to first token not depending on the prompt.
+    """
+
+    """
+    Number of tokens of a streamed piece of the completion.
+    """
+    tokens_per_piece: int = 8
+
+    def __init__(self, latency: LatencyDistribution, tokens_per_second: float = None, completion_tokens: int = 200, \
+                 rate_limit_probability: float = 0.0, server_error_probability: float = 0.0, timeout_probability: float = 0.0, \
+                 timeout_seconds: float = 1.0, retry_after_seconds: float = 0.1, retry_delay_scale: float = 0.01, seed: int = None, \
+                 tokens_per_piece: int = None, prompt_tokens_per_second: float = None):
+        """
+        Initializes the SyntheticBackend instance.
+
+        Args:
+            latency (LatencyDistribution): The distribution of the time to the first token.
+            tokens_per_second (float): The generation rate, None for an instantaneous generation.
+            completion_tokens (int): The number of tokens of each completion.
+            rate_limit_probability (float): The probability of a 429 response.
+            server_error_probability (float): The probability of a 5xx response.
+            timeout_probability (float): The probability of a request timing out.
+            timeout_seconds (float): The time a request takes to time out.
+            retry_after_seconds (float): The delay advertised by the 429 responses.
+            retry_delay_scale (float): The factor applied to the backoff delays of the client.
+            seed (int): The seed of the random generator, for reproducible runs.
+            tokens_per_piece (int): The number of tokens of a streamed piece, overrides the class default.
+            prompt_tokens_per_second (float): The rate the prompt is read at, added to the time to first token.
+        """
+        self.latency: LatencyDistribution = latency
+        self.tokens_per_second: float = tokens_per_second
+        self.completion_tokens: int = max(1, completion_tokens)
+        self.rate_limit_probability: float = rate_limit_probability
+        self.server_error_probability: float = server_error_probability
+        self.timeout_probability: float = timeout_probability
+        self.timeout_seconds: float = timeout_seconds
+        self.retry_after_seconds: float = retry_after_seconds
+        self.retry_delay_scale: float = retry_delay_scale
+        self.prompt_tokens_per_second: float = prompt_tokens_per_second
+        if tokens_per_piece is not None:
+            self.tokens_per_piece = max(1, tokens_per_piece)
+        self._random: random.Random = random.Random(seed)
+        self._random_lock: threading.Lock = threading.Lock()
+        self._pieces: List[str] = self._create_completion_pieces()
+
+    def _create_completion_pieces(self) -> List[str]:
+        """
+        Builds the completion returned to every request, split into streamed pieces.
+
+        Returns:
+            List[str]: The pieces of the completion.
+        """
+        code_lines: List[str] = []
+        code_tokens: int = 0
+        while code_tokens < self.completion_tokens:
+            code_lines.append(f"value_{len(code_lines)} = compute({len(code_lines)})\n")
+            code_tokens += LLMUtils.estimate_tokens(code_lines[-1])
+        completion: str = "```python\n" + ''.join(code_lines) + "```\n"
+        piece_characters: int = self.tokens_per_piece * LLMUtils.characters_per_token
+        return [completion[index:index + piece_characters] for index in range(0, len(completion), piece_characters)]
+
+    def plan_response(self, messages: List) -> SyntheticResponsePlan:
+        """
+        Decides how a request behaves.
+
+        Args:
+            messages (List): The messages of the request.
+
+        Returns:
+            SyntheticResponsePlan: The behaviour of the request.
+        """
+        with self._random_lock:
+            latency_seconds: float = self.latency.sample(self._random)
+            draw: float = self._random.random()
+        if draw < self.timeout_probability:
+            return SyntheticResponsePlan(self.timeout_seconds, TimeoutError("Request timed out."))
+        draw -= self.timeout_probability
+        if draw < self.rate_limit_probability:
+            return SyntheticResponsePlan(latency_seconds, SyntheticAPIError(429, "Rate limit reached for requests", \
+                                                                            {'retry-after': str(self.retry_after_seconds)}))
+        draw -= self.rate_limit_probability
+        if draw < self.server_error_probability:
+            return SyntheticResponsePlan(latency_seconds, SyntheticAPIError(503, "The server is overloaded or not ready yet."))
+        seconds_per_piece: float = self.tokens_per_piece / self.tokens_per_second if self.tokens_per_second else 0.0
+        prompt_tokens: int = LLMUtils.estimate_message_tokens(messages)
+        if self.prompt_tokens_per_second:
+            latency_seconds += prompt_tokens / self.prompt_tokens_per_second
+        return SyntheticResponsePlan(latency_seconds, None, self._pieces, seconds_per_piece, {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'total_tokens': prompt_tokens + self.completion_tokens,
+            'cached_tokens': 0
+        })
+
+
+class SyntheticLLMAccess(LLMAccess):
+    """
+    Class sending the requests to the synthetic endpoint instead of the OpenAI API.
+
+    Attributes:
+        backend (SyntheticBackend): The behaviour of the endpoint.
+    """
+
+    def __init__(self, logger, model_name: str, backend: SyntheticBackend):
+        """
+        Initializes the SyntheticLLMAccess instance.
+
+        Args:
+            logger (Logger): The logger instance used for logging.
+            model_name (str): The name of the LLM model reported in the requests.
+            backend (SyntheticBackend): The behaviour of the endpoint.
+        """
+        super().__init__(logger, model_name)
+        self.backend: SyntheticBackend = backend
+
+    def send_plain_request(self, messages: List, request_name: str, temperature: float, top_p: float, stream_consumer: IResponseStreamConsumer = None, endpoint: Endpoint = None) -> Dict:
+        """
+        Plays the behaviour the synthetic endpoint planned for the request.
+
+        Args:
+            messages (List): The list of messages to send.
+            request_name (str): The name of the request.
+            temperature (float): The temperature for the request.
+            top_p (float): The top_p for the request.
+            stream_consumer (IResponseStreamConsumer): If set, the completion is fed to it piece by piece.
+            endpoint (Endpoint): The endpoint of the pool the request is routed to, unused by the synthetic endpoint.
+
+        Returns:
+            Dict: A dictionary containing the response and its usage.
+        """
+        plan: SyntheticResponsePlan = self.backend.plan_response(messages)
+        time.sleep(plan.latency_seconds)
+        if plan.error is not None:
+            raise plan.error
+        if stream_consumer is None:
+            time.sleep(plan.seconds_per_piece * len(plan.pieces))
+        else:
+            for piece in plan.pieces:
+                time.sleep(plan.seconds_per_piece)
+                stream_consumer.feed(piece)
+        return {
+            'request_name': request_name,
+            'response': ''.join(plan.pieces),
+            'usage': plan.usage
+        }
+
+    def get_retry_delay_seconds(self, err: Exception, backoff_seconds: float) -> float:
+        """
+        Scales the delay before retrying a failed request, so that injected failures do not dominate the benchmark.
+
+        Args:
+            err (Exception): The error raised while sending the request.
+            backoff_seconds (float): The current exponential backoff delay.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        return super().get_retry_delay_seconds(err, backoff_seconds) * self.backend.retry_delay_scale
+
+
+class AsyncSyntheticLLMAccess(AsyncLLMAccess):
+    """
+    Class sending the requests to the synthetic endpoint from an asyncio event loop.
+
+    Attributes:
+        backend (SyntheticBackend): The behaviour of the endpoint.
+    """
+
+    def __init__(self, logger, model_name: str, backend: SyntheticBackend, max_connections: int = 100):
+        """
+        Initializes the AsyncSyntheticLLMAccess instance.
+
+        Args:
+            logger (Logger): The logger instance used for logging.
+            model_name (str): The name of the LLM model reported in the requests.
+            backend (SyntheticBackend): The behaviour of the endpoint.
+            max_connections (int): The maximum number of connections, unused by the synthetic endpoint.
+        """
+        super().__init__(logger, model_name, max_connections)
+        self.backend: SyntheticBackend = backend
+
+    async def send_plain_request(self, messages: List, request_name: str, temperature: float, top_p: float, stream_consumer: IResponseStreamConsumer = None, endpoint: Endpoint = None) -> Dict:
+        """
+        Plays the behaviour the synthetic endpoint planned for the request, sleeping on the event loop.
+
+        Args:
+            messages (List): The list of messages to send.
+            request_name (str): The name of the request.
+            temperature (float): The temperature for the request.
+            top_p (float): The top_p for the request.
+            stream_consumer (IResponseStreamConsumer): If set, the completion is fed to it piece by piece.
+            endpoint (Endpoint): The endpoint of the pool the request is routed to, unused by the synthetic endpoint.
+
+        Returns:
+            Dict: A dictionary containing the response and its usage.
+        """
+        plan: SyntheticResponsePlan = self.backend.plan_response(messages)
+        await asyncio.sleep(plan.latency_seconds)
+        if plan.error is not None:
+            raise plan.error
+        if stream_consumer is None:
+            await asyncio.sleep(plan.seconds_per_piece * len(plan.pieces))
+        else:
+            for piece in plan.pieces:
+                await asyncio.sleep(plan.seconds_per_piece)
+                stream_consumer.feed(piece)
+        return {
+            'request_name': request_name,
+            'response': ''.join(plan.pieces),
+            'usage': plan.usage
+        }
+
+    def get_retry_delay_seconds(self, err: Exception, backoff_seconds: float) -> float:
+        """
+        Scales the delay before retrying a failed request, so that injected failures do not dominate the benchmark.
+
+        Args:
+            err (Exception): The error raised while sending the request.
+            backoff_seconds (float): The current exponential backoff delay.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        return super().get_retry_delay_seconds(err, backoff_seconds) * self.backend.retry_delay_scale
@@ -9,6 +9,9 @@ from abc import abstractmethod, ABC
 from typing import List, Dict
 from logging import Logger
 from domain.ichecker import IRequestHandler
+from domain.iresponse_cache import IResponseCache
+from domain.rate_limiter import RateLimiter
+from domain.endpoint_pool import Endpoint, EndpointPool
 from pprint import pprint
 
 # Custom exception for context window exceeded errors
@@ -18,7 +21,45 @@ class ContextWindowExceededError(Exception):
 
     This exception is raised when the context window of an LLM is exceeded.
     """
-    pass
+
+    @staticmethod
+    def is_reported_by(err: Exception) -> bool:
+        """
+        Tells whether an error returned by the LLM endpoint reports an exceeded context window.
+
+        Args:
+            err (Exception): The error raised while sending the request.
+
+        Returns:
+            bool: True if the request was rejected because it is too big.
+        """
+        return "ContextWindowExceededError" in str(err) or "context_length_exceeded" in str(err)
+
+# Interface of the objects receiving a streamed response
+class IResponseStreamConsumer(ABC):
+    """
+    Interface of the objects receiving the response of the LLM while it is generated.
+
+    A request may be sent several times (backoff retries): restart is called before each attempt
+    so that the consumer can drop what it received from a failed attempt.
+    """
+
+    @abstractmethod
+    def restart(self) -> None:
+        """
+        Called before each attempt to send the request.
+        """
+        pass
+
+    @abstractmethod
+    def feed(self, text: str) -> None:
+        """
+        Called with each piece of the response, in order.
+
+        Args:
+            text (str): The next piece of the response.
+        """
+        pass
 
 # Abstract base class for accessing Large Language Models (LLMs)
 class AbstractLLMAccess(ABC):
@@ -49,6 +90,12 @@ class AbstractLLMAccess(ABC):
         self.request_handler: IRequestHandler = None
         # Set the model name
         self.model_name = model_name  # "llama3-70b"  # or use gpt-4o-mini, gpt-4o as per access requested
+        # No response cache unless one is explicitly set
+        self.response_cache: IResponseCache = None
+        # No client side rate limit unless one is explicitly set
+        self.rate_limiter: RateLimiter = None
+        # Requests go to the default endpoint unless a pool is explicitly set
+        self.endpoint_pool: EndpointPool = None
 
     # Set the checker instance
     def set_request_checker(self, request_handler: IRequestHandler):
@@ -60,9 +107,39 @@ class AbstractLLMAccess(ABC):
         """
         self.request_handler = request_handler
 
+    # Set the response cache
+    def set_response_cache(self, response_cache: IResponseCache):
+        """
+        Sets the cache used to serve identical requests locally.
+
+        Args:
+            response_cache (IResponseCache): The cache to be used, None to disable caching.
+        """
+        self.response_cache = response_cache
+
+    # Set the rate limiter
+    def set_rate_limiter(self, rate_limiter: RateLimiter):
+        """
+        Sets the limiter enforcing the quotas of the endpoint.
+
+        Args:
+            rate_limiter (RateLimiter): The limiter to be used, None to send requests without any client side limit.
+        """
+        self.rate_limiter = rate_limiter
+
+    # Set the endpoint pool
+    def set_endpoint_pool(self, endpoint_pool: EndpointPool):
+        """
+        Sets the pool of interchangeable endpoints the requests are spread over, each with its own rate limiter.
+
+        Args:
+            endpoint_pool (EndpointPool): The pool to be used, None to send every request to the default endpoint.
+        """
+        self.endpoint_pool = endpoint_pool
+
     # Prepare and send a request to the LLM
     @abstractmethod
-    def prepare_and_send_llm_request(self, request_inputs: List, language_name: str) -> List:
+    def prepare_and_send_llm_request(self, request_inputs: List, language_name: str, stream_consumer: IResponseStreamConsumer = None) -> List:
         """
         Prepares and sends a request to the LLM.
 
@@ -71,6 +148,7 @@ class AbstractLLMAccess(ABC):
         Args:
             request_inputs (List): The input data for the request.
             language_name (str): The name of the language being used.
+            stream_consumer (IResponseStreamConsumer): If set, the response is streamed to this consumer while it is generated.
 
         Returns:
             List: The response from the LLM.
@@ -78,7 +156,24 @@ class AbstractLLMAccess(ABC):
         pass
 
     @abstractmethod
-    def send_plain_request(self, messages: List, request_name: str, temperature: float, top_p: float) -> str:
+    def create_messages(self, request_input: Dict, file_content: str, language_name: str) -> tuple:
+        """
+        Creates the messages sent to the LLM for one request input.
+
+        This method is abstract and must be implemented by concrete subclasses.
+
+        Args:
+            request_input (Dict): The input dictionary containing the request information.
+            file_content (str): The content of the file.
+            language_name (str): The name of the language.
+
+        Returns:
+            tuple: A tuple containing the messages, request names, temperature, and top_p.
+        """
+        pass
+
+    @abstractmethod
+    def send_plain_request(self, messages: List, request_name: str, temperature: float, top_p: float, stream_consumer: IResponseStreamConsumer = None, endpoint: Endpoint = None) -> str:
         """
         Sends a plain request to the LLM.
 
@@ -89,6 +184,8 @@ class AbstractLLMAccess(ABC):
             request_name (str): The name of the request.
             temperature (float): The temperature parameter for the LLM.
             top_p (float): The top-p parameter for the LLM.
+            stream_consumer (IResponseStreamConsumer): If set, the response is streamed to this consumer while it is generated.
+            endpoint (Endpoint): The endpoint of the pool the request is sent to, None to use the default endpoint.
 
         Returns:
             str: The response from the LLM.
@@ -118,13 +215,31 @@ class AbstractLLMAccess(ABC):
         if self.request_handler is None:
             # Raise an exception if the checker instance is not defined
             raise Exception("Internal error: Checker was not properly defined!") 
+
+        # Call the prepare_and_send_llm_request method to send the request to the LLM
+        return self.prepare_and_send_llm_request([self.build_request_input(self.request_handler, file_content)], language_name)
+
+    def build_request_input(self, request_handler: IRequestHandler, file_content: str) -> Dict:
+        """
+        Builds the request input data for one file.
+
+        Unlike check, this method does not rely on the checker instance stored in the object,
+        which allows several files to be prepared concurrently.
+
+        Args:
+            request_handler (IRequestHandler): The handler providing the request and error information.
+            file_content (str): The content of the file to be checked.
+
+        Returns:
+            Dict: The request input data expected by prepare_and_send_llm_request.
+        """
         # Get the request from the checker instance
-        request: Dict = self.request_handler.retrieve_request_data() 
+        request: Dict = request_handler.retrieve_request_data() 
         # Get the error information from the checker instance
-        error_information: str = self.request_handler.get_error_details() 
+        error_information: str = request_handler.get_error_details() 
 
         # Prepare the request input data
-        request_input: Dict = {
+        return {
             'request_name': request['request_name'],
             'request_llm': request['request'],
             'error_information': error_information,
@@ -132,6 +247,3 @@ class AbstractLLMAccess(ABC):
             'temperature': request["temperature"], 
             'top_p': request["top_p"]
         }  
-
-        # Call the prepare_and_send_llm_request method to send the request to the LLM
-        return self.prepare_and_send_llm_request([request_input], language_name)
@@ -0,0 +1,47 @@
+"""
+@file code_request.py
+@brief This module provides the CodeRequest class, which gathers everything specific to one code request of a run.
+@details Several code requests can be processed in one run: each source file is read once and sent to
+         every code request whose file type accepts it.
+"""
+
+from domain.ifile_type import FileTypeInterface
+
+
+class CodeRequest:
+    """
+    @class CodeRequest
+    @brief A code request processed during a run, with the file type and options it was selected with.
+
+    @param request_id The id of the code request.
+    @param language_name The name of the source language.
+    @param file_type The file type selecting the source files and describing the generated files.
+    @param force_full_output A flag to keep the whole LLM response instead of the code only.
+    @param output_suffix The suffix added to the generated file names, before their extension, to tell the code requests apart.
+    """
+
+    def __init__(self, request_id: int, language_name: str, file_type: FileTypeInterface, force_full_output: bool, output_suffix: str = ''):
+        """
+        @brief Initializes the CodeRequest object.
+
+        @param request_id The id of the code request.
+        @param language_name The name of the source language.
+        @param file_type The file type selecting the source files and describing the generated files.
+        @param force_full_output A flag to keep the whole LLM response instead of the code only.
+        @param output_suffix The suffix added to the generated file names, before their extension, to tell the code requests apart.
+        """
+        self.request_id: int = request_id
+        self.language_name: str = language_name
+        self.file_type: FileTypeInterface = file_type
+        self.force_full_output: bool = force_full_output
+        self.output_suffix: str = output_suffix
+
+    @staticmethod
+    def get_default_output_suffix(request_id: int) -> str:
+        """
+        @brief Provides the suffix telling apart the files generated by a code request when several are processed in one run.
+
+        @param request_id The id of the code request.
+        @return The suffix, for instance '.request5' so that module.py becomes module.request5.py.
+        """
+        return f'.request{request_id}'
@@ -0,0 +1,151 @@
+"""
+@file content_deduplicator.py
+@brief This module provides the ContentDeduplicator class, which sends identical requests only once.
+@details Vendored copies, generated stubs and copy-pasted modules produce requests identical to each other: same file
+         content, code request, model and sampling parameters. The first target file of such a request, the leader,
+         is generated as usual. The others, its followers, are not sent: once the leader is committed its output is
+         duplicated to them.
+"""
+
+import json
+import threading
+from logging import Logger
+from typing import Callable, Dict, List
+
+from domain.incremental_manifest import IncrementalManifest
+
+
+class ContentDeduplicator:
+    """
+    @class ContentDeduplicator
+    @brief This class elects one leader per unique request and hands its output over to the followers, from any thread.
+
+    A request is in one of these states:
+    - pending: the leader is being generated, followers wait for it.
+    - available: the leader is committed, or up to date from a previous run: followers are duplicated right away.
+    - failed: the leader could not be generated, the next identical file becomes the new leader.
+
+    @param logger A logger instance for logging messages.
+    @param duplicate_output Called with the leader target file and the follower file task to duplicate the output.
+    @param fail_output Called with the follower file task and the leader target file when the leader failed.
+    """
+
+    def __init__(self, logger: Logger, duplicate_output: Callable[[str, Dict], None], fail_output: Callable[[Dict, str], None]):
+        """
+        @brief Initializes the ContentDeduplicator object.
+
+        @param logger A logger instance for logging messages.
+        @param duplicate_output Called with the leader target file and the follower file task to duplicate the output.
+        @param fail_output Called with the follower file task and the leader target file when the leader failed.
+        """
+        self.logger: Logger = logger
+        self.duplicate_output: Callable[[str, Dict], None] = duplicate_output
+        self.fail_output: Callable[[Dict, str], None] = fail_output
+        self.duplicates: int = 0
+        self._requests: Dict[str, Dict] = {}
+        self._keys_by_leader: Dict[str, str] = {}
+        self._leaders_by_follower: Dict[str, str] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    @staticmethod
+    def compute_key(manifest_inputs: Dict) -> str:
+        """
+        @brief Computes the key identifying a request: two requests with the same key produce the same output.
+
+        @param manifest_inputs The inputs of the request, as described by IncrementalManifest.describe_inputs.
+        @return The key.
+        """
+        return IncrementalManifest.compute_hash(json.dumps(manifest_inputs, sort_keys=True))
+
+    def claim(self, key: str, file_task: Dict) -> str:
+        """
+        @brief Decides whether a file is generated or duplicated from an identical one.
+
+        @param key The key of the request of the file.
+        @param file_task The dictionary describing the file to process, kept until the leader is committed.
+        @return None if the file is the leader of its request and must be generated, otherwise the target file
+                of the leader, whose output is duplicated to the file as soon as it is available.
+        """
+        with self._lock:
+            request: Dict = self._requests.get(key)
+            if request is None or request['status'] == 'failed':
+                self._requests[key] = {'leader': file_task['to_file'], 'status': 'pending', 'followers': []}
+                self._keys_by_leader[file_task['to_file']] = key
+                return None
+            leader: str = request['leader']
+            self._leaders_by_follower[file_task['to_file']] = leader
+            self.duplicates += 1
+            if request['status'] == 'pending':
+                request['followers'].append(file_task)
+                return leader
+        self.duplicate_output(leader, file_task)
+        return leader
+
+    def make_available(self, key: str, to_file: str) -> None:
+        """
+        @brief Records a target file already generated from the request, which identical files can be duplicated from.
+
+        @param key The key of the request.
+        @param to_file The target file, up to date.
+        """
+        with self._lock:
+            request: Dict = self._requests.get(key)
+            if request is None or request['status'] == 'failed':
+                self._requests[key] = {'leader': to_file, 'status': 'available', 'followers': []}
+                self._keys_by_leader[to_file] = key
+
+    def release(self, to_file: str) -> None:
+        """
+        @brief Records that a target file is committed, and duplicates it to its followers if it is a leader.
+
+        @param to_file The target file.
+        """
+        with self._lock:
+            key: str = self._keys_by_leader.get(to_file)
+            if key is None or self._requests[key]['status'] != 'pending':
+                return
+            request: Dict = self._requests[key]
+            request['status'] = 'available'
+            followers: List[Dict] = request['followers']
+            request['followers'] = []
+        for follower in followers:
+            self.duplicate_output(to_file, follower)
+
+    def fail(self, to_file: str) -> None:
+        """
+        @brief Records that a target file could not be generated, and fails its followers if it is a leader.
+
+        @param to_file The target file.
+        """
+        with self._lock:
+            key: str = self._keys_by_leader.get(to_file)
+            if key is None or self._requests[key]['status'] != 'pending':
+                return
+            request: Dict = self._requests[key]
+            request['status'] = 'failed'
+            followers: List[Dict] = request['followers']
+            request['followers'] = []
+        for follower in followers:
+            self.fail_output(follower, to_file)
+
+    def get_leader(self, to_file: str) -> str:
+        """
+        @brief Provides the target file a file is duplicated from.
+
+        @param to_file The target file.
+        @return The target file of the leader, None if the file is not a follower.
+        """
+        with self._lock:
+            return self._leaders_by_follower.get(to_file)
+
+    def finish(self) -> None:
+        """
+        @brief Ends the run: the followers of leaders which were never committed are failed.
+        """
+        with self._lock:
+            pending_leaders: List[str] = [request['leader'] for request in self._requests.values() \
+                                          if request['status'] == 'pending' and len(request['followers']) > 0]
+        for leader in pending_leaders:
+            self.fail(leader)
+        if self.duplicates > 0:
+            self.logger.info(f"Deduplication: {self.duplicates} files were identical to another one, their requests were not sent")
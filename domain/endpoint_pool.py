@@ -0,0 +1,333 @@
+"""
+@file endpoint_pool.py
+@brief This module provides the EndpointPool class, which spreads the requests over several interchangeable OpenAI compatible endpoints.
+@details Each endpoint has its own weight, concurrency cap and rate limiter. Every attempt to send a request picks
+         the endpoint with the least outstanding requests per unit of weight, or with the lowest latency weighted
+         by its load (peak EWMA). Endpoints failing several times in a row are ejected for a while, as long as enough
+         endpoints stay in rotation, and a request which failed is retried on another endpoint when one is available.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from logging import Logger
+from typing import Dict, List
+
+from domain.rate_limiter import RateLimiter
+
+
+class Endpoint:
+    """
+    @class Endpoint
+    @brief One OpenAI compatible endpoint of a pool, with its health and load.
+    @note The load and health fields are only changed by EndpointPool, under its lock.
+
+    @param name The name of the endpoint, used in the logs.
+    @param base_url The base URL of the endpoint.
+    @param api_key The API key of the endpoint, None to use the default one.
+    @param weight The share of the requests sent to the endpoint, relative to the other endpoints.
+    @param max_concurrency The maximum number of requests in flight on the endpoint, None for no limit.
+    @param rate_limiter The limiter enforcing the quotas of the endpoint.
+    """
+
+    def __init__(self, name: str, base_url: str, api_key: str, weight: float, max_concurrency: int, rate_limiter: RateLimiter):
+        """
+        @brief Initializes a healthy Endpoint object.
+
+        @param name The name of the endpoint, used in the logs.
+        @param base_url The base URL of the endpoint.
+        @param api_key The API key of the endpoint, None to use the default one.
+        @param weight The share of the requests sent to the endpoint, relative to the other endpoints.
+        @param max_concurrency The maximum number of requests in flight on the endpoint, None for no limit.
+        @param rate_limiter The limiter enforcing the quotas of the endpoint.
+        """
+        self.name: str = name
+        self.base_url: str = base_url
+        self.api_key: str = api_key
+        self.weight: float = weight
+        self.max_concurrency: int = max_concurrency
+        self.rate_limiter: RateLimiter = rate_limiter
+        self.outstanding: int = 0
+        self.ewma_latency_seconds: float = None
+        self.consecutive_failures: int = 0
+        self.ejections: int = 0
+        self.ejected_until: float = 0.0
+        self.requests: int = 0
+        self.failures: int = 0
+        self.last_success: float = None
+
+    def is_ejected(self, now: float) -> bool:
+        """
+        @brief Tells whether the endpoint is ejected from the pool.
+
+        @param now The current monotonic time.
+        @return True until the ejection ends.
+        """
+        return now < self.ejected_until
+
+    def is_saturated(self) -> bool:
+        """
+        @brief Tells whether the endpoint already has as many requests in flight as it accepts.
+
+        @return True if its concurrency cap is reached.
+        """
+        return self.max_concurrency is not None and self.outstanding >= self.max_concurrency
+
+
+class EndpointPool:
+    """
+    @class EndpointPool
+    @brief This class selects the endpoint of each attempt and tracks the health of the endpoints, from any thread.
+
+    Routing policies:
+    - least_outstanding: the endpoint with the fewest requests in flight per unit of weight.
+    - ewma_latency: the endpoint with the lowest exponentially weighted moving average of its latency, multiplied
+      by its requests in flight plus one and divided by its weight. Endpoints without latency yet are tried first.
+
+    @param endpoints The endpoints, at least one.
+    @param logger A logger instance for logging messages.
+    @param routing The routing policy, least_outstanding or ewma_latency.
+    """
+
+    """
+    @brief Available routing policies.
+    """
+    routing_policies: List[str] = ['least_outstanding', 'ewma_latency']
+
+    """
+    @brief Weight of the last latency in the moving average.
+    """
+    ewma_alpha: float = 0.3
+
+    """
+    @brief Number of consecutive failures after which an endpoint is ejected.
+    """
+    max_consecutive_failures: int = 3
+
+    """
+    @brief Duration of the first ejection of an endpoint, doubled at each new ejection up to max_ejection_seconds.
+    """
+    ejection_seconds: float = 30.0
+    max_ejection_seconds: float = 300.0
+
+    """
+    @brief Largest share of the endpoints ejected at once, in percent. One endpoint at least always stays in rotation.
+    """
+    max_ejection_percent: float = 50.0
+
+    """
+    @brief Time between two checks of the endpoints while waiting on the event loop for a free one.
+    """
+    poll_seconds: float = 0.05
+
+    def __init__(self, endpoints: List[Endpoint], logger: Logger, routing: str = 'least_outstanding'):
+        """
+        @brief Initializes the EndpointPool object.
+
+        @param endpoints The endpoints, at least one.
+        @param logger A logger instance for logging messages.
+        @param routing The routing policy, least_outstanding or ewma_latency.
+        @exception ValueError If there is no endpoint or the routing policy is unknown.
+        """
+        if len(endpoints) == 0:
+            raise ValueError("An endpoint pool needs at least one endpoint")
+        if routing not in self.routing_policies:
+            raise ValueError(f"Unknown routing policy {routing}: expected one of {', '.join(self.routing_policies)}")
+        self.endpoints: List[Endpoint] = endpoints
+        self.logger: Logger = logger
+        self.routing: str = routing
+        self._endpoint_released: threading.Condition = threading.Condition()
+
+    @classmethod
+    def load(cls, file_name: str, logger: Logger, routing: str = 'least_outstanding', \
+             default_requests_per_minute: int = None, default_tokens_per_minute: int = None) -> 'EndpointPool':
+        """
+        @brief Reads the endpoints of a pool from a JSON file.
+        @details The file holds a list of objects with a base_url and optionally a name, an api_key, or api_key_env
+                 naming the environment variable holding it, a weight, a max_concurrency, requests_per_minute and
+                 tokens_per_minute.
+
+        @param file_name The JSON file.
+        @param logger A logger instance for logging messages.
+        @param routing The routing policy, least_outstanding or ewma_latency.
+        @param default_requests_per_minute The requests per minute quota of the endpoints not setting theirs, None for no limit.
+        @param default_tokens_per_minute The tokens per minute quota of the endpoints not setting theirs, None for no limit.
+        @return The pool.
+        @exception ValueError If the file does not describe a valid pool.
+        """
+        with open(file_name, 'r', encoding='utf-8') as file:
+            descriptions: List = json.load(file)
+        if not isinstance(descriptions, list) or not all(isinstance(description, dict) for description in descriptions):
+            raise ValueError(f"{file_name} is not a list of endpoints")
+        endpoints: List[Endpoint] = []
+        for index, description in enumerate(descriptions):
+            if not isinstance(description.get('base_url'), str):
+                raise ValueError(f"The endpoint {index + 1} of {file_name} has no base_url")
+            name: str = str(description.get('name', description['base_url']))
+            weight: float = float(description.get('weight', 1.0))
+            max_concurrency: int = description.get('max_concurrency')
+            if weight <= 0 or (max_concurrency is not None and int(max_concurrency) <= 0):
+                raise ValueError(f"The weight and the max_concurrency of the endpoint {name} must be positive")
+            api_key: str = description.get('api_key')
+            if description.get('api_key_env') is not None:
+                api_key = os.getenv(description['api_key_env'])
+                if api_key is None:
+                    raise ValueError(f"The environment variable {description['api_key_env']} holding the API key of the endpoint {name} is not set")
+            # Every endpoint has a limiter, even without quota, so that a Retry-After holds only this endpoint
+            rate_limiter: RateLimiter = RateLimiter(logger, description.get('requests_per_minute', default_requests_per_minute), \
+                                                    description.get('tokens_per_minute', default_tokens_per_minute))
+            endpoints.append(Endpoint(name, description['base_url'], api_key, weight, \
+                                      int(max_concurrency) if max_concurrency is not None else None, rate_limiter))
+        if len(set(endpoint.name for endpoint in endpoints)) < len(endpoints):
+            raise ValueError(f"The endpoints of {file_name} must have distinct names")
+        return cls(endpoints, logger, routing)
+
+    def _get_score(self, endpoint: Endpoint) -> tuple:
+        """
+        @brief Ranks an endpoint for the next request, the lowest score being selected.
+
+        @param endpoint The endpoint.
+        @return The score, then the requests already sent per unit of weight to spread ties.
+        """
+        if self.routing == 'ewma_latency':
+            score: float = (endpoint.ewma_latency_seconds or 0.0) * (endpoint.outstanding + 1) / endpoint.weight
+        else:
+            score = (endpoint.outstanding + 1) / endpoint.weight
+        return (score, endpoint.requests / endpoint.weight)
+
+    def _select(self, excluded: List[Endpoint]) -> Endpoint:
+        """
+        @brief Picks and charges the endpoint of the next attempt, if one is free. Must be called under the lock.
+        @details Ejected endpoints, endpoints held by a Retry-After and excluded endpoints are avoided while
+                 another endpoint is available. Should every endpoint be ejected, the one with the fewest consecutive
+                 failures, then the one which succeeded last, is used rather than failing the request.
+
+        @param excluded The endpoints the request already failed on.
+        @return The endpoint, None if every candidate is at its concurrency cap.
+        """
+        now: float = time.monotonic()
+        candidates: List[Endpoint] = [endpoint for endpoint in self.endpoints if not endpoint.is_ejected(now)]
+        if len(candidates) == 0:
+            candidates = [min(self.endpoints, key=lambda endpoint: (endpoint.consecutive_failures, \
+                                                                    -endpoint.last_success if endpoint.last_success is not None else 0.0))]
+        for preferred in [[endpoint for endpoint in candidates if endpoint not in excluded], candidates]:
+            ready: List[Endpoint] = [endpoint for endpoint in preferred if endpoint.rate_limiter.get_pause_seconds() == 0]
+            preferred = ready if len(ready) > 0 else preferred
+            free: List[Endpoint] = [endpoint for endpoint in preferred if not endpoint.is_saturated()]
+            if len(free) > 0:
+                endpoint: Endpoint = min(free, key=self._get_score)
+                endpoint.outstanding += 1
+                endpoint.requests += 1
+                return endpoint
+            if len(preferred) > 0:
+                # The endpoints the request did not fail on are busy: wait for them rather than retrying a failing one
+                return None
+        return None
+
+    def _can_eject(self, now: float) -> bool:
+        """
+        @brief Tells whether one more endpoint can be ejected without exceeding max_ejection_percent. Must be called under the lock.
+
+        @param now The current monotonic time.
+        @return True if the endpoints left in rotation would still be enough.
+        """
+        ejected: int = sum(1 for endpoint in self.endpoints if endpoint.is_ejected(now))
+        return ejected + 1 <= min(len(self.endpoints) - 1, int(len(self.endpoints) * self.max_ejection_percent / 100))
+
+    def has_alternative(self, excluded: List[Endpoint]) -> bool:
+        """
+        @brief Tells whether a failed request can be retried right away on another endpoint.
+
+        @param excluded The endpoints the request already failed on.
+        @return True if an endpoint which is neither excluded, ejected nor held by a Retry-After exists.
+        """
+        now: float = time.monotonic()
+        with self._endpoint_released:
+            return any(endpoint not in excluded and not endpoint.is_ejected(now) and endpoint.rate_limiter.get_pause_seconds() == 0 \
+                       for endpoint in self.endpoints)
+
+    def acquire(self, excluded: List[Endpoint] = None) -> Endpoint:
+        """
+        @brief Blocks until an endpoint is below its concurrency cap, then charges it one request.
+
+        @param excluded The endpoints the request already failed on, avoided if possible.
+        @return The endpoint, to be given back with release.
+        """
+        with self._endpoint_released:
+            endpoint: Endpoint = self._select(excluded or [])
+            while endpoint is None:
+                self._endpoint_released.wait()
+                endpoint = self._select(excluded or [])
+            return endpoint
+
+    async def acquire_asynchronously(self, excluded: List[Endpoint] = None) -> Endpoint:
+        """
+        @brief Waits on the event loop until an endpoint is below its concurrency cap, then charges it one request.
+
+        @param excluded The endpoints the request already failed on, avoided if possible.
+        @return The endpoint, to be given back with release.
+        """
+        while True:
+            with self._endpoint_released:
+                endpoint: Endpoint = self._select(excluded or [])
+            if endpoint is not None:
+                return endpoint
+            await asyncio.sleep(self.poll_seconds)
+
+    def release(self, endpoint: Endpoint, latency_seconds: float = None, failed: bool = False) -> None:
+        """
+        @brief Gives an endpoint back once an attempt ended, and updates its health.
+
+        @param endpoint The endpoint returned by acquire.
+        @param latency_seconds The latency of the attempt, if it succeeded.
+        @param failed True if the endpoint failed the attempt, False if it succeeded or the request itself was rejected.
+        """
+        with self._endpoint_released:
+            endpoint.outstanding -= 1
+            if failed:
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                now: float = time.monotonic()
+                if endpoint.consecutive_failures >= self.max_consecutive_failures and not endpoint.is_ejected(now):
+                    if not self._can_eject(now):
+                        self.logger.debug(f"Endpoint {endpoint.name} failed {endpoint.consecutive_failures} times in a row: "
+                                          f"kept in rotation, {self.max_ejection_percent:.0f}% of the endpoints at most are ejected.")
+                    else:
+                        endpoint.ejections += 1
+                        ejection_seconds: float = min(self.max_ejection_seconds, self.ejection_seconds * 2 ** (endpoint.ejections - 1))
+                        endpoint.ejected_until = now + ejection_seconds
+                        self.logger.warning(f"Endpoint {endpoint.name} failed {endpoint.consecutive_failures} times in a row: "
+                                            f"ejected for {ejection_seconds:.0f} seconds.")
+            elif latency_seconds is not None:
+                endpoint.consecutive_failures = 0
+                endpoint.ejections = 0
+                endpoint.last_success = time.monotonic()
+                endpoint.ewma_latency_seconds = latency_seconds if endpoint.ewma_latency_seconds is None \
+                    else self.ewma_alpha * latency_seconds + (1 - self.ewma_alpha) * endpoint.ewma_latency_seconds
+            self._endpoint_released.notify_all()
+
+    def get_statistics(self) -> List[Dict]:
+        """
+        @brief Provides the activity of each endpoint.
+
+        @return The name, requests, failures, ejections and average latency of each endpoint.
+        """
+        with self._endpoint_released:
+            return [{
+                'name': endpoint.name,
+                'requests': endpoint.requests,
+                'failures': endpoint.failures,
+                'ejected': endpoint.is_ejected(time.monotonic()),
+                'ewma_latency_seconds': round(endpoint.ewma_latency_seconds, 3) if endpoint.ewma_latency_seconds is not None else None
+            } for endpoint in self.endpoints]
+
+    def log_statistics(self) -> None:
+        """
+        @brief Logs the activity of each endpoint.
+        """
+        for statistics in self.get_statistics():
+            latency: str = f", {statistics['ewma_latency_seconds']:.2f} s average latency" if statistics['ewma_latency_seconds'] is not None else ""
+            self.logger.info(f"Endpoint {statistics['name']}: {statistics['requests']} attempts, {statistics['failures']} failures"
+                             f"{latency}{', ejected' if statistics['ejected'] else ''}")
@@ -8,16 +8,37 @@
 
 import os
 import re
+import json
+import time
+import inspect
 import traceback
+from functools import partial
 from pprint import pformat
-from typing import List
+from typing import Callable, List, Dict, Iterator, Set, Tuple
 from logging import Logger
 
 from domain.ichecker import IRequestHandler, CodeCheckerRequestHandler
-from domain.allm_access import AbstractLLMAccess
+from domain.allm_access import AbstractLLMAccess, ContextWindowExceededError
 from domain.llm_utils import LLMUtils
 from domain.ifile_type import FileTypeInterface
-from domain.icontent_out import IContentOut
+from domain.ioutput_sink import IOutputSink
+from domain.staged_pipeline import StagedPipeline, PipelineStage
+from domain.incremental_manifest import IncrementalManifest
+from domain.markdown_code_extractor import MarkdownCodeExtractor, StreamedCodeWriter
+from domain.source_chunker import SourceChunker
+from domain.ibatch_backend import IBatchBackend
+from domain.code_request import CodeRequest
+from domain.scheduling_policy import SchedulingPolicy
+from domain.content_deduplicator import ContentDeduplicator
+from domain.iwork_queue import IWorkQueue
+from domain.work_queue_worker import WorkQueueWorker
+from domain.model_router import ModelRouter
+from domain.prompt_minifier import PromptMinifier
+from domain.uml_project import UMLProjectBuilder
+from domain.symbol_index import SymbolIndex
+from domain.source_discovery import SourceDiscovery
+from domain.run_metrics import RunMetrics
+from domain.run_planner import RunPlanner, RunPlan
 
 class GPT2Code                                                                                                               :
     """
@@ -28,19 +49,67 @@ class GPT2Code
     @param target_directory The directory to write output files to.
     @param files_to_exclude A list of files to skip during processing.
     @param logger A logger instance for logging messages.
-    @param content_writer An instance of IContentOut for writing output.
+    @param output_sink An instance of IOutputSink providing the writers of the output files.
     @param llm_utilities An instance of LLMUtils for LLM-related utilities.
     @param selected_code_request The selected code request to use.
     @param llm_access An instance of AbstractLLMAccess for accessing LLM functionality.
     @param source_language_name The name of the source language.
     @param file_type An instance of IFileType for file type-related functionality.
     @param force_full_output A flag to force full output.
+    @param jobs The number of files processed concurrently.
+    @param incremental_manifest If set, files whose inputs did not change since the previous run are skipped.
+    @param stream A flag to stream the completions and write the extracted code while it is generated.
+    @param source_chunker If set, files too big for the context window of the model are split into chunks.
+    @param batch_backend If set, all the requests are submitted at once to this batch endpoint instead of being sent one by one.
+    @param batch_poll_seconds The time to wait between two polls of the batch endpoint.
+    @param other_code_requests Code requests processed in the same pass as the selected one: each file is read once for all of them.
+    @param source_discovery If set, walks the source directory, otherwise the default excluded directories and the ignore files apply.
+    @param run_metrics If set, records the metrics of every file and request, otherwise they are only kept in this instance.
+    @param run_planner If set, no request is sent: the requests of every file are estimated by this planner instead.
+    @param run_plan If set, only the files planned in it are processed.
+    @param scheduling_policy If set, orders the files sent to the LLM, otherwise they are processed in discovery order.
+    @param deduplicate A flag to send identical requests once, their output being duplicated to every target file.
+    @param work_queue If set, no request is sent: the source files are enqueued in this queue for the workers.
+    @param work_queue_worker If set, the source files are claimed from its work queue instead of discovered.
+    @param model_router If set, selects the model each file is sent to, otherwise every file is sent to the model of llm_access.
+    @param prompt_minifier If set, minifies the file contents of the code requests selecting minification transformations.
+    @param uml_project If set, the UML class diagrams of the packages and of the project are generated from the class skeletons instead of one file at a time.
+    @param symbol_index If set, indexes the symbols of the source tree and attaches the signatures a file uses to its requests, for the code requests enabling it.
     """
 
+    """
+    @brief Chunks are not made smaller than this number of tokens when the LLM rejects a request as too big.
+    """
+    minimum_chunk_tokens: int = 64
+
+    """
+    @brief Name of the directory created in the target directory to store the batch files.
+    """
+    batch_directory_name: str = ".gpt2code_batches"
+
+    """
+    @brief Name of the file of the batch directory listing the batches submitted and not written yet.
+    """
+    batch_state_file_name: str = "submitted_batches.json"
+
+    """
+    @brief Limits of one batch file, more batch files are submitted beyond them.
+    """
+    max_batch_requests: int = 50000
+    max_batch_bytes: int = 190 * 1024 * 1024
+
     def __init__(self, source_directory: str, target_directory: str, files_to_exclude: List[str],\
-                 logger: Logger, content_writer: IContentOut, llm_utils: LLMUtils, \
+                 logger: Logger, output_sink: IOutputSink, llm_utils: LLMUtils, \
                  selected_code_request: int, llm_access: AbstractLLMAccess, source_language_name: str, \
-                 file_type: FileTypeInterface, force_full_output: bool):
+                 file_type: FileTypeInterface, force_full_output: bool, jobs: int = 1, \
+                 incremental_manifest: IncrementalManifest = None, stream: bool = False, \
+                 source_chunker: SourceChunker = None, batch_backend: IBatchBackend = None, \
+                 batch_poll_seconds: float = 60, other_code_requests: List[CodeRequest] = None, \
+                 source_discovery: SourceDiscovery = None, run_metrics: RunMetrics = None, \
+                 run_planner: RunPlanner = None, run_plan: RunPlan = None, scheduling_policy: SchedulingPolicy = None, \
+                 deduplicate: bool = False, work_queue: IWorkQueue = None, work_queue_worker: WorkQueueWorker = None, \
+                 model_router: ModelRouter = None, prompt_minifier: PromptMinifier = None, uml_project: UMLProjectBuilder = None, \
+                 symbol_index: SymbolIndex = None):
         """
         @brief Initializes the GPT2Unittests instance.
 
@@ -48,16 +117,35 @@ class GPT2Code
         @param target_directory The directory to write output files to.
         @param files_to_exclude A list of files to skip during processing.
         @param logger A logger instance for logging messages.
-        @param content_writer An instance of IContentOut for writing output.
+        @param output_sink An instance of IOutputSink providing the writers of the output files.
         @param llm_utilities An instance of LLMUtils for LLM-related utilities.
         @param selected_code_request The selected code request to use.
         @param llm_access An instance of AbstractLLMAccess for accessing LLM functionality.
         @param source_language_name The name of the source language.
         @param file_type An instance of IFileType for file type-related functionality.
         @param force_full_output A flag to force full output.
+        @param jobs The number of files processed concurrently.
+        @param incremental_manifest If set, files whose inputs did not change since the previous run are skipped.
+        @param stream A flag to stream the completions and write the extracted code while it is generated.
+        @param source_chunker If set, files too big for the context window of the model are split into chunks.
+        @param batch_backend If set, all the requests are submitted at once to this batch endpoint instead of being sent one by one.
+        @param batch_poll_seconds The time to wait between two polls of the batch endpoint.
+        @param other_code_requests Code requests processed in the same pass as the selected one: each file is read once for all of them.
+        @param source_discovery If set, walks the source directory, otherwise the default excluded directories and the ignore files apply.
+        @param run_metrics If set, records the metrics of every file and request, otherwise they are only kept in this instance.
+        @param run_planner If set, no request is sent: the requests of every file are estimated by this planner instead.
+        @param run_plan If set, only the files planned in it are processed.
+        @param scheduling_policy If set, orders the files sent to the LLM, otherwise they are processed in discovery order.
+        @param deduplicate A flag to send identical requests once, their output being duplicated to every target file.
+        @param work_queue If set, no request is sent: the source files are enqueued in this queue for the workers.
+        @param work_queue_worker If set, the source files are claimed from its work queue instead of discovered.
+        @param model_router If set, selects the model each file is sent to, otherwise every file is sent to the model of llm_access.
+        @param prompt_minifier If set, minifies the file contents of the code requests selecting minification transformations.
+        @param uml_project If set, the UML class diagrams of the packages and of the project are generated from the class skeletons instead of one file at a time.
+        @param symbol_index If set, indexes the symbols of the source tree and attaches the signatures a file uses to its requests, for the code requests enabling it.
         """
         # Renamed variables to have more meaningful names
-        self.content_writer = content_writer
+        self.output_sink: IOutputSink = output_sink
         self.logger: Logger = logger
         self.llm_utils: LLMUtils = llm_utils
         self.source_directory: str = source_directory
@@ -68,104 +156,978 @@ class GPT2Code
         self.file_type: FileTypeInterface = file_type
         self.source_language_name: str = source_language_name
         self.force_full_output: bool = force_full_output
+        self.code_requests: List[CodeRequest] = [CodeRequest(selected_code_request, source_language_name, file_type, force_full_output)] + \
+            list(other_code_requests if other_code_requests is not None else [])
+        if len(self.code_requests) > 1:
+            # Several code requests generate files from the same source file: their names must differ
+            for code_request in self.code_requests:
+                if len(code_request.output_suffix) == 0:
+                    code_request.output_suffix = CodeRequest.get_default_output_suffix(code_request.request_id)
+        self.jobs: int = max(1, jobs if jobs is not None else 1)
+        self.incremental_manifest: IncrementalManifest = incremental_manifest
+        self.stream: bool = stream
+        self.source_chunker: SourceChunker = source_chunker
+        self.batch_backend: IBatchBackend = batch_backend
+        self.batch_poll_seconds: float = batch_poll_seconds
+        self.source_discovery: SourceDiscovery = source_discovery if source_discovery is not None \
+            else SourceDiscovery(source_directory, logger)
+        self.run_metrics: RunMetrics = run_metrics if run_metrics is not None else RunMetrics(logger)
+        self.run_planner: RunPlanner = run_planner
+        self.run_plan: RunPlan = run_plan
+        self.scheduling_policy: SchedulingPolicy = scheduling_policy if scheduling_policy is not None else SchedulingPolicy(logger)
+        self.content_deduplicator: ContentDeduplicator = ContentDeduplicator(logger, self._duplicate_output, self._fail_duplicated_output) \
+            if deduplicate else None
+        self.work_queue: IWorkQueue = work_queue
+        self.work_queue_worker: WorkQueueWorker = work_queue_worker
+        self.model_router: ModelRouter = model_router
+        self.prompt_minifier: PromptMinifier = prompt_minifier
+        self.uml_project: UMLProjectBuilder = uml_project
+        self.symbol_index: SymbolIndex = symbol_index
+        if self.batch_backend is not None and self.stream:
+            self.logger.warning("Batch responses cannot be streamed: completions will not be streamed.")
+            self.stream = False
+        if self.uml_project is not None and self.stream:
+            self.logger.warning("Package diagrams are merged once every batch is received: completions will not be streamed.")
+            self.stream = False
+        # Set if the processing was aborted, the files not processed yet having no outcome
+        self.processing_error: Exception = None
         try:
             # Renamed method to have a more meaningful name
             self.process_source_files()
         except Exception as err:                    
+            self.processing_error = err
             self.logger.warning(f"Caught exception {err=}\n {type(err)=}\n \
                                 {traceback.print_exc()}\n Leaving application.")
 
-    def reformat_llm_response(self, response: str) -> str:
+    def _create_code_extractor(self, code_request: CodeRequest = None) -> MarkdownCodeExtractor:
         """
-        @brief Reformat the response from the LLM: This using a basic state machine considering mark down is returned from the LLM.
+        @brief Creates the state machine extracting the code from the markdown returned by the LLM.
 
-        @param response The response from the LLM.
-
-        @return The reformatted response.
+        @param code_request The code request the response answers, the selected one if not set.
+        @return A new code extractor.
         """
-        in_code_block: bool = False
-        reformatted_response: List = []
-        code_block_start: str = f'```{self.file_type.get_destination_language_name()}'
-        for line in response.split('\n'):
-            if line == '```':
-                in_code_block = False
-            if not in_code_block:
-                if self.force_full_output: 
-                    # This line adds a comment character to the start of each line when 
-                    # * force_full_output is True
-                    # * the MD file does not describe a code block
-                    reformatted_response.append(self.file_type.get_comment_characters() + ' ' + line)
-            else:
-                reformatted_response.append(line)
+        if code_request is None:
+            code_request = self.code_requests[0]
+        return MarkdownCodeExtractor(code_request.file_type.get_destination_language_name(), \
+                                     code_request.file_type.get_comment_characters(), code_request.force_full_output)
 
-            if line == code_block_start:
-                in_code_block = True
+    def reformat_llm_response(self, response: str, code_request: CodeRequest = None) -> str:
+        """
+        @brief Reformat the response from the LLM: This using a basic state machine considering mark down is returned from the LLM.
 
-        return '\n'.join(reformatted_response)
+        @param response The response from the LLM.
+        @param code_request The code request the response answers, the selected one if not set.
 
-    def send_llm_requests_and_expand_output(self, content_to_check: List) -> None:
+        @return The reformatted response.
         """
-        @brief Send LLM requests and expand the output.
+        code_extractor: MarkdownCodeExtractor = self._create_code_extractor(code_request)
+        return '\n'.join(code_extractor.feed(response) + code_extractor.finish())
 
-        @param content_to_check The content to check.
+    def _create_file_tasks(self, root: str, current_directory: str, file_name: str) -> List[Dict]:
         """
-        result = self.llm_access.check(content_to_check, self.source_language_name)
+        @brief Checks whether a file shall be processed and describes the work to be done for it, one task per code request.
+        @details The tasks of one file share the description of the source file, so that the file is read only once.
 
-        for response in result:
-            self.content_writer.write_content_to_file(
-                self.reformat_llm_response(response['response']))
+        @param root The directory containing the file.
+        @param current_directory The directory of the file relative to the source directory.
+        @param file_name The name of the file.
 
-    def _process_file(self, root: str, current_directory: str, file_name: str):
+        @return The list of dictionaries describing the file to process for each code request accepting it, empty if the file is skipped.
         """
-        @brief Process one source file and generate output based on LLM requests.
-        @param root source_directory.
-
-        """
-        generated_file_extension: str = self.file_type.get_generated_file_extension()
-
         full_file_name: str = os.path.join(current_directory, file_name)
         if self.files_to_exclude is not None and len(self.files_to_exclude) > 0 and \
             full_file_name in self.files_to_exclude:
             self.logger.info(f'Skipping file {full_file_name} as per request')
-            
-        _, file_extension = os.path.splitext(full_file_name)
-        file_extensions: List = self.file_type.get_source_file_extensions_as_regex()
-        if sum([ 1 if re.match(reg_exp_extension, file_extension) else 0 for reg_exp_extension in file_extensions]) > 0:
-            from_file: str = os.path.join(root, file_name)
-            to_file: str = os.path.join(self.target_directory, full_file_name)
+            return []
+
+        file_tasks: List[Dict] = []
+        source_file: Dict = {'from_file': os.path.join(root, file_name), 'readers': 0}
+        base_file_name, file_extension = os.path.splitext(full_file_name)
+        for code_request in self.code_requests:
+            if not code_request.file_type.get_source_file_extensions_matcher().match(file_extension):
+                continue
+            if self.run_plan is not None and not self.run_plan.includes(full_file_name, code_request.request_id):
+                continue
+
+            generated_file_extension: str = code_request.file_type.get_generated_file_extension()
+            to_file: str = os.path.join(self.target_directory, base_file_name + code_request.output_suffix + file_extension)
             if generated_file_extension is not None:
                 to_file += generated_file_extension
-            os.makedirs(os.path.dirname(to_file), exist_ok=True)
-            
-            self.logger.info(f"Processing {from_file} into {to_file}.")
-            self.content_writer.configure_output_file(to_file)
-            file_content: List = []
-            # CUse 'utf-8' encoding
-            with open(from_file, 'r', encoding="utf-8") as file:
-                file_content = file.read()
-
-            code_checker: IRequestHandler = CodeCheckerRequestHandler(self.llm_utils, self.selected_code_request, f' ({file_name})')
-            self.llm_access.set_request_checker(code_checker)
-            self.send_llm_requests_and_expand_output(file_content)
+            source_file['readers'] += 1
+            file_tasks.append({
+                'file_name': file_name,
+                'from_file': source_file['from_file'],
+                'to_file': to_file,
+                'code_request': code_request,
+                'source_file': source_file
+            })
 
-        else:
+        if len(file_tasks) == 0:
             self.logger.debug(f"Skipping file {full_file_name} with extension {file_extension}.")
-        
+        return file_tasks
+
+    def _read_source_file(self, file_task: Dict) -> Dict:
+        """
+        @brief Pipeline stage: reads the content of the source file.
+        @details The content is read by the first task of the file and kept until every code request got it.
+                 A file which cannot be read, or is not UTF-8, is recorded as failed for every code request.
+
+        @param file_task The dictionary describing the file to process.
+        @return The updated file task, None if the file cannot be read.
+        """
+        source_file: Dict = file_task.pop('source_file')
+        if 'content' not in source_file and 'error' not in source_file:
+            try:
+                # CUse 'utf-8' encoding
+                with open(file_task['from_file'], 'r', encoding="utf-8") as file:
+                    source_file['content'] = file.read()
+            except (OSError, UnicodeDecodeError) as err:
+                source_file['error'] = err
+        source_file['readers'] -= 1
+        if 'error' in source_file:
+            self.logger.error(f"Skipping {file_task['from_file']}: it cannot be read ({source_file['error']}).")
+            self.run_metrics.record_file_source(file_task['to_file'], file_task['from_file'], file_task['code_request'].request_id)
+            self._record_failure(file_task['to_file'], 'failed')
+            return None
+        file_task['file_content'] = source_file['content']
+        if source_file['readers'] == 0:
+            del source_file['content']
+        return file_task
+
+    def _build_request(self, file_task: Dict) -> Dict:
+        """
+        @brief Pipeline stage: builds the LLM request input for the file.
+
+        @param file_task The dictionary describing the file to process.
+        @return The updated file task.
+        """
+        code_request: CodeRequest = file_task['code_request']
+        code_checker: IRequestHandler = CodeCheckerRequestHandler(self.llm_utils, code_request.request_id, f' ({file_task["file_name"]})')
+        transformations: List[str] = self.prompt_minifier.get_transformations(code_request.request_id) if self.prompt_minifier is not None else []
+        if len(transformations) > 0:
+            file_task['content_tokens'] = self.prompt_minifier.estimate_tokens(file_task['file_content'])
+            file_task['file_content'] = self.prompt_minifier.minify(file_task['file_content'], file_task['file_name'], code_request.file_type, \
+                                                                    transformations)
+        file_task['model_name'] = self.model_router.select_model(file_task['file_content'], code_request, \
+                                                                 os.path.relpath(file_task['from_file'], self.source_directory)) \
+            if self.model_router is not None else self.llm_access.model_name
+        file_task['request_input'] = self._get_llm_access(file_task).build_request_input(code_checker, file_task.pop('file_content'))
+        if self.symbol_index is not None and self.symbol_index.is_enabled(code_request.request_id):
+            symbol_context: str = self.symbol_index.get_context(os.path.relpath(file_task['from_file'], self.source_directory))
+            if len(symbol_context) > 0:
+                file_task['request_input']['symbol_context'] = symbol_context
+
+        if self.incremental_manifest is not None or self.content_deduplicator is not None:
+            request_input: Dict = file_task['request_input']
+            # The output depends on the context attached as much as on the request itself
+            request_text = request_input['request_llm'] if 'symbol_context' not in request_input \
+                else [request_input['request_llm'], request_input['symbol_context']]
+            file_task['manifest_inputs'] = IncrementalManifest.describe_inputs(request_input['file_content'], code_request.request_id, \
+                                                                              request_text, file_task['model_name'], \
+                                                                              request_input['temperature'], request_input['top_p'])
+        if self.incremental_manifest is not None:
+            if self.incremental_manifest.is_up_to_date(file_task['to_file'], file_task['manifest_inputs']):
+                self.logger.info(f"Skipping {file_task['from_file']}: {file_task['to_file']} is up to date.")
+                self.run_metrics.record_file_source(file_task['to_file'], file_task['from_file'], code_request.request_id)
+                self._record_outcome(file_task['to_file'], 'up_to_date')
+                if self.content_deduplicator is not None:
+                    self.content_deduplicator.make_available(ContentDeduplicator.compute_key(file_task['manifest_inputs']), file_task['to_file'])
+                return None
+        if self.content_deduplicator is not None:
+            leader_to_file: str = self.content_deduplicator.claim(ContentDeduplicator.compute_key(file_task['manifest_inputs']), file_task)
+            if leader_to_file is not None:
+                self.logger.info(f"Skipping {file_task['from_file']}: identical to the source of {leader_to_file}, which is duplicated into {file_task['to_file']}.")
+                self.run_metrics.record_file_source(file_task['to_file'], file_task['from_file'], code_request.request_id)
+                return None
+
+        self.logger.info(f"Processing {file_task['from_file']} into {file_task['to_file']}.")
+        self.run_metrics.record_file_queued(file_task['to_file'], file_task['from_file'], code_request.request_id, file_task['model_name'])
+        if 'content_tokens' in file_task:
+            self.run_metrics.record_file_minified(file_task['to_file'], file_task.pop('content_tokens'), \
+                                                  self.prompt_minifier.estimate_tokens(file_task['request_input']['file_content']))
+        return file_task
+
+    def _send_request(self, file_task: Dict) -> Dict:
+        """
+        @brief Pipeline stage: sends the request to the LLM and waits for the responses.
+        @details A file too big for the context window is sent as several chunks whose responses are kept in order.
+
+        @param file_task The dictionary describing the file to process.
+        @return The updated file task, None if the file cannot fit in the context window even once split.
+        """
+        request_input: Dict = file_task.pop('request_input')
+        budget_tokens: int = self._get_content_budget_tokens(file_task, request_input)
+        self.run_metrics.record_file_sent(file_task['to_file'])
+        while True:
+            chunk_request_inputs: List[Dict] = self._split_request_input(file_task, request_input, budget_tokens)
+            streamed_code_writer: StreamedCodeWriter = self._create_streamed_code_writer(file_task, len(chunk_request_inputs))
+            try:
+                responses: List = []
+                for chunk_request_input in chunk_request_inputs:
+                    responses.extend(self._get_llm_access(file_task).prepare_and_send_llm_request([chunk_request_input], \
+                                                                                                  file_task['code_request'].language_name, \
+                                                                                                  streamed_code_writer))
+                break
+            except ContextWindowExceededError as err:
+                self._abort_streamed_code_writer(streamed_code_writer)
+                budget_tokens = self._reduce_content_budget_tokens(file_task, request_input, budget_tokens, err)
+                if budget_tokens is None:
+                    return None
+            except BaseException:
+                self._abort_streamed_code_writer(streamed_code_writer)
+                self._record_failure(file_task['to_file'], 'failed')
+                raise
+        return self._store_responses(file_task, responses, streamed_code_writer)
+
+    async def _send_request_asynchronously(self, file_task: Dict) -> Dict:
+        """
+        @brief Pipeline stage: sends the request to an asyncio LLM access and awaits the responses.
+        @details A file too big for the context window is sent as several chunks whose responses are kept in order.
+
+        @param file_task The dictionary describing the file to process.
+        @return The updated file task, None if the file cannot fit in the context window even once split.
+        """
+        request_input: Dict = file_task.pop('request_input')
+        budget_tokens: int = self._get_content_budget_tokens(file_task, request_input)
+        self.run_metrics.record_file_sent(file_task['to_file'])
+        while True:
+            chunk_request_inputs: List[Dict] = self._split_request_input(file_task, request_input, budget_tokens)
+            streamed_code_writer: StreamedCodeWriter = self._create_streamed_code_writer(file_task, len(chunk_request_inputs))
+            try:
+                responses: List = []
+                for chunk_request_input in chunk_request_inputs:
+                    responses.extend(await self._get_llm_access(file_task).prepare_and_send_llm_request([chunk_request_input], \
+                                                                                                        file_task['code_request'].language_name, \
+                                                                                                        streamed_code_writer))
+                break
+            except ContextWindowExceededError as err:
+                self._abort_streamed_code_writer(streamed_code_writer)
+                budget_tokens = self._reduce_content_budget_tokens(file_task, request_input, budget_tokens, err)
+                if budget_tokens is None:
+                    return None
+            except BaseException:
+                self._abort_streamed_code_writer(streamed_code_writer)
+                self._record_failure(file_task['to_file'], 'failed')
+                raise
+        return self._store_responses(file_task, responses, streamed_code_writer)
+
+    def _get_llm_access(self, file_task: Dict) -> AbstractLLMAccess:
+        """
+        @brief Provides the LLM access sending the requests of a file to its model.
+
+        @param file_task The dictionary describing the file to process, once its model is selected.
+        @return The LLM access.
+        """
+        if self.model_router is None:
+            return self.llm_access
+        return self.model_router.get_llm_access(file_task['model_name'])
+
+    def _get_source_chunker(self, file_task: Dict) -> SourceChunker:
+        """
+        @brief Provides the chunker splitting a file for the context window of its model.
+
+        @param file_task The dictionary describing the file to process, once its model is selected.
+        @return The chunker, None if files are never split.
+        """
+        if self.model_router is None:
+            return self.source_chunker
+        return self.model_router.get_source_chunker(file_task['model_name'])
+
+    def _get_content_budget_tokens(self, file_task: Dict, request_input: Dict) -> int:
+        """
+        @brief Provides the number of tokens the content of one request may have.
+
+        @param file_task The dictionary describing the file to process.
+        @param request_input The request input of the whole file.
+        @return The budget in tokens, None if files are never split.
+        """
+        source_chunker: SourceChunker = self._get_source_chunker(file_task)
+        if source_chunker is None:
+            return None
+        return source_chunker.get_content_budget_tokens(str(request_input['request_llm']) + request_input.get('symbol_context', ''))
+
+    def _split_request_input(self, file_task: Dict, request_input: Dict, budget_tokens: int) -> List[Dict]:
+        """
+        @brief Splits the request input of a file into one request input per chunk of the file content.
+
+        @param file_task The dictionary describing the file to process.
+        @param request_input The request input of the whole file.
+        @param budget_tokens The maximum number of tokens of a chunk, None to never split.
+        @return The request inputs, in order.
+        """
+        if budget_tokens is None:
+            return [request_input]
+        chunks: List[str] = self._get_source_chunker(file_task).split(request_input['file_content'], file_task['file_name'], budget_tokens)
+        if len(chunks) == 1:
+            return [request_input]
+        return [dict(request_input, file_content=chunk, \
+                     error_information=f"{request_input['error_information']} (part {chunk_index + 1}/{len(chunks)})") \
+                for chunk_index, chunk in enumerate(chunks)]
+
+    def _reduce_content_budget_tokens(self, file_task: Dict, request_input: Dict, budget_tokens: int, err: ContextWindowExceededError) -> int:
+        """
+        @brief Halves the chunk budget after the LLM rejected a request as too big.
+
+        @param file_task The dictionary describing the file to process.
+        @param request_input The request input of the whole file.
+        @param budget_tokens The budget the rejected chunks were created with.
+        @param err The error raised when the request was rejected.
+        @return The new budget, None if the file shall be skipped.
+        @exception ContextWindowExceededError If files are never split.
+        """
+        if budget_tokens is None:
+            raise err
+        budget_tokens = min(budget_tokens, self._get_source_chunker(file_task).estimate_tokens(request_input['file_content'])) // 2
+        if budget_tokens < self.minimum_chunk_tokens:
+            self.logger.error(f"Skipping {file_task['from_file']}: it does not fit in the context window of the model even once split.")
+            self._record_failure(file_task['to_file'], 'too_big')
+            return None
+        self.logger.warning(f"{file_task['from_file']} is too big for the model, splitting it into chunks of at most {budget_tokens} tokens.")
+        return budget_tokens
+
+    def _create_streamed_code_writer(self, file_task: Dict, chunk_count: int = 1) -> StreamedCodeWriter:
+        """
+        @brief Creates the consumer writing the streamed completion of a file, if streaming is enabled.
+        @details A file sent in several chunks is not streamed: each retry of a chunk would truncate the output of the previous ones.
+
+        @param file_task The dictionary describing the file to process.
+        @param chunk_count The number of chunks the file is sent as.
+        @return The streamed code writer, None if the completion is not streamed.
+        """
+        file_task['streamed'] = self.stream and chunk_count == 1
+        if not file_task['streamed']:
+            return None
+        return StreamedCodeWriter(self._create_code_extractor(file_task['code_request']), self.output_sink, file_task['to_file'], \
+                                  self._get_commit_callback(file_task))
+
+    @staticmethod
+    def _abort_streamed_code_writer(streamed_code_writer: StreamedCodeWriter) -> None:
+        """
+        @brief Discards the output streamed by a request which failed, if any.
+
+        @param streamed_code_writer The streamed code writer used, None if the completion was not streamed.
+        """
+        if streamed_code_writer is not None:
+            streamed_code_writer.abort()
+
+    def _get_commit_callback(self, file_task: Dict) -> Callable[[], None]:
+        """
+        @brief Provides what to do once the target file is committed: recording it in the run metrics and the incremental manifest.
+
+        @param file_task The dictionary describing the file to process.
+        @return The callback.
+        """
+        return partial(self._on_output_committed, file_task['to_file'], file_task.get('manifest_inputs'))
+
+    def _on_output_committed(self, to_file: str, manifest_inputs: Dict, outcome: str = 'written') -> None:
+        """
+        @brief Records a committed target file, possibly from the background thread of the output sink.
+        @details The output of a file whose request was sent is then duplicated to the identical files waiting for it.
+
+        @param to_file The target file.
+        @param manifest_inputs The inputs the file was generated from, recorded in the incremental manifest if any.
+        @param outcome The outcome recorded in the run metrics, written or deduplicated.
+        """
+        self._record_outcome(to_file, outcome, os.path.getsize(to_file))
+        if self.incremental_manifest is not None:
+            self.incremental_manifest.record(to_file, manifest_inputs)
+        if self.content_deduplicator is not None:
+            self.content_deduplicator.release(to_file)
+
+    def _record_outcome(self, to_file: str, outcome: str, output_bytes: int = None) -> None:
+        """
+        @brief Records how the processing of a target file ended, in the run metrics and in the work queue if any.
+
+        @param to_file The target file.
+        @param outcome The outcome, see RunMetrics.
+        @param output_bytes The size of the target file once written.
+        """
+        self.run_metrics.record_file_outcome(to_file, outcome, output_bytes)
+        if self.work_queue_worker is not None:
+            self.work_queue_worker.record_outcome(to_file, outcome)
+
+    def _record_failure(self, to_file: str, outcome: str) -> None:
+        """
+        @brief Records a target file which could not be generated, and the identical files waiting for it.
+
+        @param to_file The target file.
+        @param outcome The outcome recorded in the run metrics, failed or too_big.
+        """
+        self._record_outcome(to_file, outcome)
+        if self.content_deduplicator is not None:
+            self.content_deduplicator.fail(to_file)
+
+    def _duplicate_output(self, leader_to_file: str, file_task: Dict) -> None:
+        """
+        @brief Writes the output of an identical file into the target file of a file whose request was not sent.
+
+        @param leader_to_file The target file generated from the identical request.
+        @param file_task The dictionary describing the file whose request was not sent.
+        """
+        if self.run_planner is not None:
+            return
+        try:
+            self.output_sink.duplicate(leader_to_file, file_task['to_file'], \
+                                       partial(self._on_output_committed, file_task['to_file'], file_task.get('manifest_inputs'), 'deduplicated'))
+        except OSError as err:
+            self.logger.error(f"{file_task['to_file']} could not be duplicated from {leader_to_file}: {err}")
+            self._record_outcome(file_task['to_file'], 'failed')
+
+    def _fail_duplicated_output(self, file_task: Dict, leader_to_file: str) -> None:
+        """
+        @brief Records a file whose request was not sent while the identical request failed.
+
+        @param file_task The dictionary describing the file whose request was not sent.
+        @param leader_to_file The target file which could not be generated.
+        """
+        self.logger.error(f"Skipping {file_task['from_file']}: {leader_to_file}, generated from an identical request, could not be generated.")
+        self._record_outcome(file_task['to_file'], 'failed')
+
+    def _store_responses(self, file_task: Dict, responses: List, streamed_code_writer: StreamedCodeWriter) -> Dict:
+        """
+        @brief Stores the responses of all the chunks of a file in the file task.
+
+        @param file_task The dictionary describing the file to process.
+        @param responses The responses, in chunk order.
+        @param streamed_code_writer The streamed code writer used, None if the completion was not streamed.
+        @return The updated file task.
+        """
+        for response in responses:
+            self.run_metrics.record_response(file_task['to_file'], response)
+        if streamed_code_writer is not None:
+            streamed_code_writer.finish()
+        file_task['responses'] = responses
+        return file_task
+
+    def _reformat_responses(self, file_task: Dict) -> Dict:
+        """
+        @brief Pipeline stage: extracts the expected content from the LLM responses.
+
+        @param file_task The dictionary describing the file to process.
+        @return The updated file task.
+        """
+        responses: List = file_task.pop('responses')
+        # Streamed responses were already reformatted and written while they were received
+        file_task['output'] = [] if file_task.get('streamed', False) else \
+            [self.reformat_llm_response(response['response'], file_task['code_request']) for response in responses]
+        return file_task
+
+    def _write_output(self, file_task: Dict) -> None:
+        """
+        @brief Pipeline sink: writes the reformatted responses to the target file.
+
+        @param file_task The dictionary describing the file to process.
+        """
+        # Streamed responses were committed once completely received
+        if not file_task.get('streamed', False):
+            with self.output_sink.open_writer(file_task['to_file'], self._get_commit_callback(file_task)) as output_writer:
+                for content in file_task['output']:
+                    output_writer.write(content)
+
+    def _get_processing_stages(self) -> List[PipelineStage]:
+        """
+        @brief Describes the stages every file goes through, in order.
+
+        @return The list of pipeline stages.
+        """
+        send_request = self._send_request_asynchronously \
+            if inspect.iscoroutinefunction(self.llm_access.prepare_and_send_llm_request) else self._send_request
+        return [
+            # A single reader: the tasks of one file share the content read by the first of them
+            PipelineStage('read', self._read_source_file),
+            PipelineStage('prompt', self._build_request),
+            PipelineStage('send', send_request, self.jobs),
+            PipelineStage('reformat', self._reformat_responses)
+        ]
+
+    def _discover_source_files(self) -> Iterator[Dict]:
+        """
+        @brief Walks the source directory and yields the files to be processed.
+
+        @return An iterator over the file tasks, in os.walk order, the tasks of one file following each other in code request order.
+        """
+        for root, current_directory, file_name in self.source_discovery.discover():
+            yield from self._create_file_tasks(root, current_directory, file_name)
+
+    def get_expected_target_files(self) -> Dict[str, Tuple[str, int]]:
+        """
+        @brief Lists the target files the source files lead to, to tell the files whose processing never ended.
+        @details The source directory is walked again, the files are not read.
+
+        @return The source file and the code request id of each target file.
+        """
+        return {file_task['to_file']: (file_task['from_file'], file_task['code_request'].request_id) for file_task in self._discover_source_files()}
+
+    def _claim_source_files(self) -> Iterator[Dict]:
+        """
+        @brief Claims the source files from the work queue and yields the files to be processed.
+
+        @return An iterator over the file tasks, in queue order, until every file of the queue is processed.
+        """
+        while True:
+            items: List[Dict] = self.work_queue_worker.claim_items()
+            if len(items) == 0:
+                return
+            for item in items:
+                current_directory, file_name = os.path.split(item['source_file'])
+                root: str = os.path.join(self.source_directory, current_directory) if len(current_directory) > 0 else self.source_directory
+                file_tasks: List[Dict] = self._create_file_tasks(root, current_directory, file_name) if os.path.isfile(os.path.join(root, file_name)) else []
+                self.work_queue_worker.track(item['item_id'], [file_task['to_file'] for file_task in file_tasks])
+                yield from file_tasks
+
+    def _get_source_file_tasks(self) -> Iterator[Dict]:
+        """
+        @brief Provides the files to be processed by the pipeline.
+
+        @return The file tasks claimed from the work queue, in queue order, or discovered, in the order of the scheduling policy.
+        """
+        if self.work_queue_worker is not None:
+            return self._claim_source_files()
+        return self.scheduling_policy.order(self._discover_source_files())
+
+    def _enqueue_source_files(self) -> None:
+        """
+        @brief Enqueues the source files in the work queue, in the order of the scheduling policy, for the workers to process.
+        """
+        source_files: List[str] = []
+        for file_task in self.scheduling_policy.order(self._discover_source_files()):
+            source_file: str = os.path.relpath(file_task['from_file'], self.source_directory)
+            if len(source_files) == 0 or source_files[-1] != source_file:
+                source_files.append(source_file)
+        queued: int = self.work_queue.enqueue(source_files)
+        self.logger.info(f"{queued} of {len(source_files)} source files were queued, the others are already queued or processed")
+
+    def _discover_typed_source_files(self, code_requests: List[CodeRequest]) -> Iterator[Tuple[str, str, FileTypeInterface]]:
+        """
+        @brief Walks the source directory and yields the files accepted by some code requests, with the file type reading them.
+        @details The whole tree is walked even if only some files are selected: the headers and the symbols of a file
+                 are learnt from the others.
+
+        @param code_requests The code requests, the first one accepting a file giving its file type.
+        @return An iterator over the paths of the files, their paths relative to the source directory and their file types.
+        """
+        for root, current_directory, file_name in self.source_discovery.discover(whole_tree=True):
+            file_extension: str = os.path.splitext(file_name)[1]
+            code_request: CodeRequest = next((code_request for code_request in code_requests \
+                                              if code_request.file_type.get_source_file_extensions_matcher().match(file_extension)), None)
+            if code_request is not None:
+                yield os.path.join(root, file_name), os.path.join(current_directory, file_name), code_request.file_type
+
+    def _learn_boilerplate_headers(self) -> None:
+        """
+        @brief Reads the start of every source file to detect the headers they share, for the code requests removing the boilerplate.
+        """
+        if self.prompt_minifier is None:
+            return
+        code_requests: List[CodeRequest] = [code_request for code_request in self.code_requests \
+                                            if 'boilerplate' in self.prompt_minifier.get_transformations(code_request.request_id)]
+        if len(code_requests) == 0:
+            return
+        self.prompt_minifier.learn_headers((source_file, file_type) for source_file, _, file_type in self._discover_typed_source_files(code_requests))
+
+    def _update_symbol_index(self) -> None:
+        """
+        @brief Parses the source files modified since the symbol index was saved, for the code requests attaching the symbols a file uses.
+        @details Every file accepted by a code request is indexed, whichever code request attaches the context: a file
+                 uses the symbols of files another code request processes.
+        """
+        if self.symbol_index is None:
+            return
+        self.symbol_index.update(self._discover_typed_source_files(self.code_requests))
+        self.symbol_index.save()
+
     def process_source_files(self):
         """
         @brief Process the source files and generate output based on LLM requests.
+        @details With more than one job, files flow through a staged pipeline (read, build prompt, send, reformat, write)
+                 where up to jobs requests are in flight at once. Files are fed in the order of the scheduling policy,
+                 and written in that order unless the policy reorders them, in which case each file is written as
+                 soon as it is processed.
+                 With a batch backend, all the requests are submitted at once and the files are written once
+                 the batches are processed.
+                 With a run planner, the requests are only built and estimated.
+                 With a work queue, the source files are only enqueued; with a work queue worker, they are claimed
+                 from the queue instead of discovered.
+                 With deduplication, a request identical to a previous one is not sent: the output of the previous
+                 one is duplicated once committed.
+                 With boilerplate removal, the start of every source file is read beforehand to detect the shared headers.
+                 With a symbol index, the source files modified since the previous run are parsed beforehand.
+                 With a UML project, the class skeletons of the whole tree are sent package by package instead of the files.
+        """
+        pipeline: StagedPipeline = StagedPipeline(self._get_processing_stages(), self._write_output, self.logger, \
+                                                  queue_size=2 * self.jobs, preserve_order=self.scheduling_policy.preserves_order)
+        try:
+            if self.work_queue is None and self.uml_project is None:
+                self._learn_boilerplate_headers()
+                self._update_symbol_index()
+            if self.work_queue is not None:
+                self._enqueue_source_files()
+            elif self.uml_project is not None:
+                self._process_source_files_as_uml_project()
+            elif self.run_planner is not None:
+                self._plan_source_files()
+            elif self.batch_backend is not None:
+                self._process_source_files_in_batch()
+            elif self.jobs > 1:
+                self.logger.info(f"Processing files with {self.jobs} concurrent jobs")
+                pipeline.run(self._get_source_file_tasks())
+            else:
+                pipeline.run_sequentially(self._get_source_file_tasks())
+        finally:
+            try:
+                # Wait for the files still being committed, they are recorded in the manifest once committed
+                self.output_sink.close()
+            finally:
+                if self.content_deduplicator is not None and self.run_planner is None:
+                    self.content_deduplicator.finish()
+                if self.work_queue_worker is not None:
+                    self.work_queue_worker.stop()
+                # Keep track of the files generated so far even if the run is interrupted
+                if self.incremental_manifest is not None:
+                    self.incremental_manifest.save()
+
+    def _get_uml_project_source_files(self) -> Iterator[Tuple[str, str, FileTypeInterface]]:
+        """
+        @brief Walks the source directory and yields the files whose class skeletons are extracted.
+
+        @return An iterator over the paths of the files, their paths relative to the source directory and the file type of the selected code request.
+        """
+        code_request: CodeRequest = self.code_requests[0]
+        for root, current_directory, file_name in self.source_discovery.discover():
+            full_file_name: str = os.path.join(current_directory, file_name)
+            if self.files_to_exclude is not None and full_file_name in self.files_to_exclude:
+                self.logger.info(f'Skipping file {full_file_name} as per request')
+                continue
+            if code_request.file_type.get_source_file_extensions_matcher().match(os.path.splitext(file_name)[1]):
+                yield os.path.join(root, file_name), full_file_name, code_request.file_type
+
+    def _create_uml_package_tasks(self, skeletons: Dict) -> Dict[str, List[Dict]]:
+        """
+        @brief Batches the class skeletons of every package and builds the LLM request input of each batch.
+
+        @param skeletons The class skeletons of each package.
+        @return The tasks of the batches of each package, in part order.
+        """
+        code_request: CodeRequest = self.code_requests[0]
+        request_text: str = self.uml_project.get_request_text(self.llm_access.build_request_input( \
+            CodeCheckerRequestHandler(self.llm_utils, code_request.request_id, ''), '')['request_llm'])
+        source_chunker: SourceChunker = self._get_source_chunker({'model_name': self.llm_access.model_name})
+        budget_tokens: int = source_chunker.get_content_budget_tokens(request_text) if source_chunker is not None else None
+        package_tasks: Dict[str, List[Dict]] = {}
+        for batch in self.uml_project.create_batches(skeletons, budget_tokens):
+            package_name: str = self.uml_project.get_package_name(batch['package'])
+            package_diagram_file: str = self.uml_project.get_package_diagram_file(self.target_directory, batch['package'])
+            file_task: Dict = {
+                'file_name': package_name,
+                'from_file': os.path.join(self.source_directory, batch['package']),
+                'to_file': package_diagram_file if batch['parts'] == 1 else f"{package_diagram_file} (part {batch['part']} of {batch['parts']})",
+                'code_request': code_request,
+                'package': batch['package'],
+                'part': batch['part']
+            }
+            file_task['model_name'] = self.model_router.select_model(batch['skeletons'], code_request, batch['package'] or '.') \
+                if self.model_router is not None else self.llm_access.model_name
+            code_checker: IRequestHandler = CodeCheckerRequestHandler(self.llm_utils, code_request.request_id, \
+                                                                      f" (package {package_name}, part {batch['part']} of {batch['parts']})")
+            file_task['request_input'] = self._get_llm_access(file_task).build_request_input(code_checker, batch['skeletons'])
+            file_task['request_input']['request_llm'] = request_text
+            package_tasks.setdefault(batch['package'], []).append(file_task)
+        return package_tasks
+
+    @staticmethod
+    def _describe_uml_package_inputs(file_tasks: List[Dict]) -> Dict:
         """
-        # Renamed method to have a more meaningful name
-        directories_to_exclude = [".git"]
-        for root, dirs_in_root, files_in_root in os.walk(self.source_directory):
-            self.logger.debug(f"root: {root}, dirs_in_root: {dirs_in_root}, files_in_root: {files_in_root}")
-            current_directory = re.sub(f'^{self.source_directory}[\\{os.sep}]*', '', root) 
-            if sum([ \
-                1 if current_directory == directory_to_exclude or current_directory.startswith(directory_to_exclude + os.sep) \
-                    else 0 \
-                        for directory_to_exclude in directories_to_exclude]) > 0:
-                self.logger.debug(f'Skipping directory {current_directory}')
+        @brief Describes the inputs a package diagram is generated from, for the incremental manifest.
+
+        @param file_tasks The tasks of the batches of the package.
+        @return The description of the skeletons, request, models and sampling parameters of the batches.
+        """
+        request_input: Dict = file_tasks[0]['request_input']
+        return IncrementalManifest.describe_inputs(''.join(file_task['request_input']['file_content'] for file_task in file_tasks), \
+                                                   file_tasks[0]['code_request'].request_id, request_input['request_llm'], \
+                                                   ','.join(file_task['model_name'] for file_task in file_tasks), \
+                                                   request_input['temperature'], request_input['top_p'])
+
+    @staticmethod
+    def _collect_uml_diagram(diagrams: Dict[str, Dict[int, str]], file_task: Dict) -> None:
+        """
+        @brief Pipeline sink: keeps the diagram generated from a batch until every batch of its package is received.
+
+        @param diagrams The diagrams received, by package and part.
+        @param file_task The task of the batch.
+        """
+        diagrams.setdefault(file_task['package'], {})[file_task['part']] = '\n'.join(file_task['output'])
+
+    def _on_uml_package_committed(self, package_diagram_file: str, file_tasks: List[Dict], manifest_inputs: Dict) -> None:
+        """
+        @brief Records a committed package diagram, possibly from the background thread of the output sink.
+
+        @param package_diagram_file The package diagram.
+        @param file_tasks The tasks of the batches of the package, recorded as written.
+        @param manifest_inputs The inputs the diagram was generated from, recorded in the incremental manifest if any.
+        """
+        for file_task in file_tasks:
+            self._record_outcome(file_task['to_file'], 'written', \
+                                 os.path.getsize(package_diagram_file) if file_task['to_file'] == package_diagram_file else None)
+        if self.incremental_manifest is not None:
+            self.incremental_manifest.record(package_diagram_file, manifest_inputs)
+
+    def _process_source_files_as_uml_project(self) -> None:
+        """
+        @brief Generates the UML class diagrams of the packages and of the project from the class skeletons of the source files.
+        @details The skeletons are extracted locally and sent package by package, in batches fitting the context window.
+                 The diagrams of the batches of a package are merged into its package diagram once all received, and the
+                 package diagrams into the project diagram. A package whose skeletons did not change since the previous
+                 run is not sent again in incremental mode, its previous diagram being merged into the project diagram.
+        """
+        skeletons: Dict = self.uml_project.extract_skeletons(self._get_uml_project_source_files())
+        package_tasks: Dict[str, List[Dict]] = self._create_uml_package_tasks(skeletons)
+        package_diagrams: Dict[str, str] = {}
+        manifest_inputs: Dict[str, Dict] = {}
+        file_tasks: List[Dict] = []
+        for package, tasks in package_tasks.items():
+            package_diagram_file: str = self.uml_project.get_package_diagram_file(self.target_directory, package)
+            if self.incremental_manifest is not None:
+                manifest_inputs[package] = self._describe_uml_package_inputs(tasks)
+                if self.incremental_manifest.is_up_to_date(package_diagram_file, manifest_inputs[package]):
+                    self.logger.info(f"Skipping package {self.uml_project.get_package_name(package)}: {package_diagram_file} is up to date.")
+                    with open(package_diagram_file, 'r', encoding='utf-8') as file:
+                        package_diagrams[package] = file.read()
+                    self._record_outcome(package_diagram_file, 'up_to_date')
+                    continue
+            for file_task in tasks:
+                self.logger.info(f"Processing package {file_task['file_name']} into {file_task['to_file']}.")
+                self.run_metrics.record_file_queued(file_task['to_file'], file_task['from_file'], file_task['code_request'].request_id, \
+                                                    file_task['model_name'])
+                file_tasks.append(file_task)
+
+        diagrams: Dict[str, Dict[int, str]] = {}
+        send_request = self._send_request_asynchronously \
+            if inspect.iscoroutinefunction(self.llm_access.prepare_and_send_llm_request) else self._send_request
+        pipeline: StagedPipeline = StagedPipeline([PipelineStage('send', send_request, self.jobs), PipelineStage('reformat', self._reformat_responses)], \
+                                                  partial(self._collect_uml_diagram, diagrams), self.logger, queue_size=2 * self.jobs)
+        self.logger.info(f"Sending {len(file_tasks)} skeleton batches of {len(package_tasks) - len(package_diagrams)} packages")
+        if self.jobs > 1:
+            pipeline.run(file_tasks)
+        else:
+            pipeline.run_sequentially(file_tasks)
+
+        for package, part_diagrams in sorted(diagrams.items()):
+            tasks: List[Dict] = package_tasks[package]
+            if len(part_diagrams) < len(tasks):
+                self.logger.warning(f"Package {self.uml_project.get_package_name(package)}: {len(tasks) - len(part_diagrams)} of {len(tasks)} batches are missing from its diagram.")
+            package_diagram_file: str = self.uml_project.get_package_diagram_file(self.target_directory, package)
+            package_diagrams[package] = self.uml_project.merge_package_diagrams(package, [part_diagrams[part] for part in sorted(part_diagrams)])
+            with self.output_sink.open_writer(package_diagram_file, partial(self._on_uml_package_committed, package_diagram_file, tasks, \
+                                                                            manifest_inputs.get(package))) as output_writer:
+                output_writer.write(package_diagrams[package])
+
+        if len(package_diagrams) > 0:
+            project_diagram_file: str = os.path.join(self.target_directory, self.uml_project.project_diagram_name)
+            with self.output_sink.open_writer(project_diagram_file) as output_writer:
+                output_writer.write(self.uml_project.merge_project_diagram(package_diagrams, skeletons))
+            self.logger.info(f"Project diagram of {len(package_diagrams)} packages written to {project_diagram_file}")
+
+    def _plan_source_files(self) -> None:
+        """
+        @brief Builds the requests of the source files as the run would, and hands them to the run planner instead of sending them.
+        @details Only the files of the sample are read. Files the incremental mode would skip are recorded as up to date,
+                 and files identical to a previous one as duplicates.
+        """
+        for file_task in self._discover_source_files():
+            if not self.run_planner.is_sampled(file_task['from_file']):
+                continue
+            from_file: str = os.path.relpath(file_task['from_file'], self.source_directory)
+            to_file: str = file_task['to_file']
+            code_request: CodeRequest = file_task['code_request']
+            file_task = self._read_source_file(file_task)
+            if file_task is None:
+                self.run_planner.record_unreadable(from_file, to_file, code_request.request_id)
+                continue
+            file_task = self._build_request(file_task)
+            if file_task is None:
+                leader_to_file: str = self.content_deduplicator.get_leader(to_file) if self.content_deduplicator is not None else None
+                if leader_to_file is not None:
+                    self.run_planner.record_duplicate(from_file, to_file, code_request.request_id, leader_to_file)
+                else:
+                    self.run_planner.record_up_to_date(from_file, to_file, code_request.request_id)
+                continue
+            request_input: Dict = file_task.pop('request_input')
+            source_chunker: SourceChunker = self._get_source_chunker(file_task)
+            chunk_request_inputs: List[Dict] = self._split_request_input(file_task, request_input, self._get_content_budget_tokens(file_task, request_input))
+            self.run_planner.record_file(from_file, to_file, code_request.request_id, \
+                                         [chunk_request_input['file_content'] for chunk_request_input in chunk_request_inputs], \
+                                         [self._get_llm_access(file_task).create_messages(chunk_request_input, chunk_request_input['file_content'], \
+                                                                                          code_request.language_name)[0] \
+                                          for chunk_request_input in chunk_request_inputs], file_task['model_name'], \
+                                         source_chunker.context_window_tokens if source_chunker is not None else None)
+
+    def _write_batch_files(self, batch_lines: List[Dict]) -> List[Tuple[str, List[str]]]:
+        """
+        @brief Writes the batch requests into as many JSONL files as the batch limits require.
+        @details A batch is processed by a single model: the requests are grouped by model, one batch file per model at least.
+
+        @param batch_lines The requests as built by IBatchBackend.build_request_line.
+        @return The path of every batch file with the custom_ids of the requests it holds.
+        """
+        batch_directory: str = os.path.join(self.target_directory, self.batch_directory_name)
+        os.makedirs(batch_directory, exist_ok=True)
+        batch_file_prefix: str = os.path.join(batch_directory, time.strftime("batch_%Y%m%d_%H%M%S"))
+        batch_files: List[Tuple[str, List[str]]] = []
+        file = None
+        try:
+            for batch_line in sorted(batch_lines, key=lambda batch_line: batch_line['body']['model']):
+                line: str = json.dumps(batch_line, ensure_ascii=False) + '\n'
+                if file is None or request_count >= self.max_batch_requests or model_name != batch_line['body']['model'] or \
+                    byte_count + len(line.encode('utf-8')) > self.max_batch_bytes:
+                    if file is not None:
+                        file.close()
+                    batch_files.append((f"{batch_file_prefix}_{len(batch_files)}.jsonl", []))
+                    file = open(batch_files[-1][0], 'w', encoding="utf-8")
+                    request_count, byte_count, model_name = 0, 0, batch_line['body']['model']
+                file.write(line)
+                batch_files[-1][1].append(batch_line['custom_id'])
+                request_count += 1
+                byte_count += len(line.encode('utf-8'))
+        finally:
+            if file is not None:
+                file.close()
+        return batch_files
+
+    @staticmethod
+    def _compute_batch_request_key(batch_line: Dict) -> str:
+        """
+        @brief Computes the key identifying a batch request across runs, whatever its custom_id.
+
+        @param batch_line The request as built by IBatchBackend.build_request_line.
+        @return The hash of the model, messages and sampling parameters of the request.
+        """
+        return IncrementalManifest.compute_hash(json.dumps(batch_line['body'], sort_keys=True))
+
+    def _load_submitted_batches(self) -> List[Dict]:
+        """
+        @brief Reads the batches submitted by a previous run whose results were not written.
+
+        @return The submitted batches, see _save_submitted_batches, empty if there are none or the file cannot be read.
+        """
+        batch_state_file: str = os.path.join(self.target_directory, self.batch_directory_name, self.batch_state_file_name)
+        if not os.path.isfile(batch_state_file):
+            return []
+        try:
+            with open(batch_state_file, 'r', encoding="utf-8") as file:
+                return json.load(file)['batches']
+        except (OSError, ValueError, KeyError) as err:
+            self.logger.warning(f"The submitted batches cannot be read from {batch_state_file}, they will not be resumed: {err}")
+            return []
+
+    def _save_submitted_batches(self, submitted_batches: List[Dict]) -> None:
+        """
+        @brief Writes the batches submitted and not written yet to the batch directory, so that an interrupted run resumes them.
+        @details The file is written to a temporary file first and renamed, and removed when there is no batch left.
+
+        @param submitted_batches The submitted batches: the batch_id, the batch_file, and the request_keys by custom_id of each batch.
+        """
+        batch_state_file: str = os.path.join(self.target_directory, self.batch_directory_name, self.batch_state_file_name)
+        if len(submitted_batches) == 0:
+            if os.path.isfile(batch_state_file):
+                os.remove(batch_state_file)
+            return
+        temporary_file: str = f'{batch_state_file}.{os.getpid()}.tmp'
+        with open(temporary_file, 'w', encoding="utf-8") as file:
+            json.dump({'batches': submitted_batches}, file, indent=1)
+        os.replace(temporary_file, batch_state_file)
+
+    def _wait_for_batches(self, submitted_batches: List[Dict]) -> Dict:
+        """
+        @brief Polls the batch endpoint until all the batches are done and gathers their results.
+
+        @param submitted_batches The submitted batches, see _save_submitted_batches.
+        @return The results of all the batches by request key.
+        """
+        results: Dict = {}
+        pending_batches: List[Dict] = list(submitted_batches)
+        while len(pending_batches) > 0:
+            time.sleep(self.batch_poll_seconds)
+            for submitted_batch in list(pending_batches):
+                status: str = self.batch_backend.get_status(submitted_batch['batch_id'])
+                if status in IBatchBackend.terminal_statuses:
+                    if status != 'completed':
+                        self.logger.warning(f"Batch {submitted_batch['batch_id']} is {status}: only the requests it processed will be written.")
+                    for custom_id, result in self.batch_backend.get_results(submitted_batch['batch_id']).items():
+                        if custom_id in submitted_batch['request_keys']:
+                            results[submitted_batch['request_keys'][custom_id]] = result
+                    pending_batches.remove(submitted_batch)
+        return results
+
+    def _process_source_files_in_batch(self) -> None:
+        """
+        @brief Process the source files with the batch endpoint.
+        @details The requests of all the files are built as in the pipeline and written to JSONL batch files, which
+                 are submitted at once. Once the batches are processed, the responses go through the same
+                 reformat and write steps as the responses received one by one.
+                 Files too big for the context window are split beforehand, but a request the endpoint rejects
+                 as too big is not retried: the file is reported and skipped.
+                 The submitted batches are saved in the batch directory until their results are written: a run
+                 interrupted while waiting is resumed by the next one, which only submits the requests they do not hold.
+        """
+        file_tasks: List[Dict] = []
+        batch_lines: List[Dict] = []
+        request_keys: Dict[str, str] = {}
+        for file_task in self._discover_source_files():
+            file_task = self._read_source_file(file_task)
+            if file_task is not None:
+                file_task = self._build_request(file_task)
+            if file_task is None:
+                continue
+            request_input: Dict = file_task.pop('request_input')
+            file_task['custom_ids'] = []
+            for chunk_request_input in self._split_request_input(file_task, request_input, self._get_content_budget_tokens(file_task, request_input)):
+                messages, request_names, temperature, top_p = self._get_llm_access(file_task).create_messages(chunk_request_input, \
+                                                                                                              chunk_request_input['file_content'], \
+                                                                                                              file_task['code_request'].language_name)
+                custom_id: str = f"file-{len(file_tasks)}-part-{len(file_task['custom_ids'])}"
+                file_task['custom_ids'].append(custom_id)
+                file_task['request_name'] = " & ".join(request_names)
+                batch_lines.append(IBatchBackend.build_request_line(custom_id, file_task['model_name'], messages, temperature, top_p))
+                request_keys[custom_id] = self._compute_batch_request_key(batch_lines[-1])
+            file_tasks.append(file_task)
+
+        # Resume the batches of an interrupted run which hold requests of this run, the others are no longer needed
+        previous_batches: List[Dict] = self._load_submitted_batches()
+        requested_keys: Set[str] = set(request_keys.values())
+        submitted_batches: List[Dict] = [previous_batch for previous_batch in previous_batches \
+                                         if not requested_keys.isdisjoint(previous_batch['request_keys'].values())]
+        if len(submitted_batches) < len(previous_batches):
+            self.logger.info(f"{len(previous_batches) - len(submitted_batches)} batches submitted by a previous run are no longer requested and are dropped")
+        submitted_keys: Set[str] = {request_key for submitted_batch in submitted_batches for request_key in submitted_batch['request_keys'].values()}
+        if len(submitted_batches) > 0:
+            self.logger.info(f"Resuming {len(submitted_batches)} batches submitted by a previous run for {len(requested_keys & submitted_keys)} requests")
+        self._save_submitted_batches(submitted_batches)
+
+        batch_lines = [batch_line for batch_line in batch_lines if request_keys[batch_line['custom_id']] not in submitted_keys]
+        if len(batch_lines) == 0 and len(submitted_batches) == 0:
+            self.logger.info("No request to submit.")
+            return
+
+        if len(batch_lines) > 0:
+            batch_files: List[Tuple[str, List[str]]] = self._write_batch_files(batch_lines)
+            self.logger.info(f"Submitting {len(batch_lines)} requests for {len(file_tasks)} files in {len(batch_files)} batches")
+            for batch_file, custom_ids in batch_files:
+                submitted_batches.append({'batch_id': self.batch_backend.submit(batch_file), 'batch_file': batch_file, \
+                                          'request_keys': {custom_id: request_keys[custom_id] for custom_id in custom_ids}})
+                self._save_submitted_batches(submitted_batches)
+        results: Dict = self._wait_for_batches(submitted_batches)
+
+        for file_task in file_tasks:
+            file_results: List[Dict] = [results.get(request_keys[custom_id], {'error': 'No result returned'}) for custom_id in file_task.pop('custom_ids')]
+            errors: List[str] = [file_result['error'] for file_result in file_results if 'error' in file_result]
+            if len(errors) > 0:
+                self.logger.error(f"Skipping {file_task['from_file']}: {errors[0]}")
+                self._record_failure(file_task['to_file'], 'failed')
                 continue
-            self.logger.info(f"Analyzing directory {root}")
-            for file_name in files_in_root:
-                self._process_file(root, current_directory, file_name)
+            file_task['responses'] = [{'request_name': file_task['request_name'], 'response': file_result['response'], 'usage': file_result['usage']} \
+                                      for file_result in file_results]
+            for response in file_task['responses']:
+                self.run_metrics.record_response(file_task['to_file'], response)
+            self._write_output(self._reformat_responses(file_task))
+        self._save_submitted_batches([])
@@ -0,0 +1,109 @@
+"""
+@file ibatch_backend.py
+@brief Abstract base class for batch endpoints.
+
+This module defines the IBatchBackend abstract base class, which provides a common interface for submitting
+a JSONL file of chat completion requests at once and retrieving their results later, as done by the
+provider Batch API. Latency is traded for cost and throughput.
+"""
+
+import json
+from abc import ABC, abstractmethod
+from typing import Dict, List
+
+
+class IBatchBackend(ABC):
+    """
+    @class IBatchBackend
+    @brief Abstract base class for batch endpoints.
+
+    Each line of a batch file is one request identified by a custom_id, the results refer to the same custom_id.
+    """
+
+    """
+    @brief Statuses after which a batch does not progress anymore. Failed, expired and cancelled batches may still have partial results.
+    """
+    terminal_statuses: List[str] = ['completed', 'failed', 'expired', 'cancelled']
+
+    @staticmethod
+    def build_request_line(custom_id: str, model_name: str, messages: List, temperature: float, top_p: float) -> Dict:
+        """
+        @brief Builds one line of a batch file.
+
+        @param custom_id The identifier of the request, unique in the batch.
+        @param model_name The name of the LLM model.
+        @param messages The messages of the chat completion.
+        @param temperature The temperature of the request.
+        @param top_p The top_p of the request.
+        @return The dictionary to be written as one JSON line.
+        """
+        return {
+            'custom_id': custom_id,
+            'method': 'POST',
+            'url': '/v1/chat/completions',
+            'body': {
+                'model': model_name,
+                'messages': messages,
+                'temperature': temperature,
+                'top_p': top_p
+            }
+        }
+
+    @staticmethod
+    def parse_result_lines(lines: List[str]) -> Dict:
+        """
+        @brief Parses the lines of a batch output or error file.
+
+        @param lines The JSON lines of the file.
+        @return Maps each custom_id to a dictionary holding either the 'response' text or the 'error' message.
+        """
+        results: Dict = {}
+        for line in lines:
+            if len(line.strip()) == 0:
+                continue
+            result: Dict = json.loads(line)
+            response: Dict = result.get('response') or {}
+            body: Dict = response.get('body') or {}
+            if result.get('error') is not None:
+                results[result['custom_id']] = {'error': str(result['error'].get('message', result['error']))}
+            elif response.get('status_code') != 200:
+                results[result['custom_id']] = {'error': str((body.get('error') or {}).get('message', body))}
+            else:
+                results[result['custom_id']] = {
+                    'response': body['choices'][0]['message']['content'].strip(),
+                    'usage': body.get('usage')
+                }
+        return results
+
+    @abstractmethod
+    def submit(self, batch_file: str) -> str:
+        """
+        @brief Submits a batch file.
+
+        @param batch_file The path of the JSONL file, one request per line as built by build_request_line.
+        @return The identifier of the batch.
+        @note This method must be implemented by any concrete subclass of IBatchBackend.
+        """
+        pass
+
+    @abstractmethod
+    def get_status(self, batch_id: str) -> str:
+        """
+        @brief Provides the status of a batch.
+
+        @param batch_id The identifier returned by submit.
+        @return The status of the batch, one of terminal_statuses once it does not progress anymore.
+        @note This method must be implemented by any concrete subclass of IBatchBackend.
+        """
+        pass
+
+    @abstractmethod
+    def get_results(self, batch_id: str) -> Dict:
+        """
+        @brief Retrieves the results of a batch whose status is terminal.
+
+        @param batch_id The identifier returned by submit.
+        @return The results as returned by parse_result_lines. Requests without result are missing.
+        @note This method must be implemented by any concrete subclass of IBatchBackend.
+        """
+        pass
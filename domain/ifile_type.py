@@ -7,7 +7,8 @@
 """
 
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Dict, List, Tuple
+from domain.uml_skeleton import ClassSkeleton
 import re
 
 class FileTypeInterface:
@@ -37,6 +38,7 @@ class FileTypeInterface:
         self._source_file_extensions: List[str] = source_file_extensions
         self._generated_file_extension: str = generated_file_extension
         self._comment_string: str = comment_string
+        self._source_file_extensions_matcher: re.Pattern = None
 
     def _get_raw_source_file_extensions(self) -> List[str]:
         """
@@ -55,6 +57,20 @@ class FileTypeInterface:
         """
 
         return [re.compile('\\.' + extension + '$') for extension in self._get_raw_source_file_extensions()]
+
+    def get_source_file_extensions_matcher(self) -> re.Pattern:
+        """
+        @brief Gets a single regular expression matching all the source file extensions.
+        @details The expression is compiled once and cached, it is meant to be matched against the extension
+                 returned by os.path.splitext, dot included.
+
+        @return The compiled regular expression.
+        """
+        if self._source_file_extensions_matcher is None:
+            alternatives: List[str] = [f'(?:{reg_exp_extension.pattern})' for reg_exp_extension in self.get_source_file_extensions_as_regex()]
+            # Without any extension nothing shall match, whereas an empty expression would match everything
+            self._source_file_extensions_matcher = re.compile('|'.join(alternatives) if len(alternatives) > 0 else '(?!)')
+        return self._source_file_extensions_matcher
     
     def get_destination_language_name(self) -> str:
         """
@@ -82,3 +98,164 @@ class FileTypeInterface:
         @return The generated file extension. If destination_file_extension is None, returns None.
         """
         return f'.{self._generated_file_extension}' if self._generated_file_extension is not None else None
+
+    def _get_comment_syntax(self, file_name: str = None) -> Tuple[List[str], List[Tuple[str, str]]]:
+        """
+        @brief Gets the comment syntax of the source files, used to minify the prompts.
+
+        @param file_name The name of the source file, for file types accepting several languages.
+        @return The line comment markers and the block comment delimiters. Both are empty by default: comments are never removed.
+        """
+        return [], []
+
+    def _get_string_delimiters(self, file_name: str = None) -> List[str]:
+        """
+        @brief Gets the string delimiters of the source files, comment markers inside strings being kept.
+
+        @param file_name The name of the source file, for file types accepting several languages.
+        @return The string delimiters.
+        """
+        return ['"', "'"]
+
+    def _is_comment_start(self, content: str, index: int) -> bool:
+        """
+        @brief Tells whether a line comment marker found at index starts a comment.
+
+        @param content The content of the source file.
+        @param index The position of the marker.
+        @return True by default.
+        """
+        return True
+
+    @staticmethod
+    def _get_shebang_end(content: str) -> int:
+        """
+        @brief Locates the end of the shebang line, kept as it tells which interpreter runs the file.
+
+        @param content The content of the source file.
+        @return The position following the shebang line, 0 if there is none.
+        """
+        if not content.startswith('#!'):
+            return 0
+        line_end: int = content.find('\n')
+        return len(content) if line_end < 0 else line_end + 1
+
+    def strip_comments(self, content: str, file_name: str = None) -> str:
+        """
+        @brief Removes the comments of a source file, outside of the strings. A line holding only a comment is removed, a shebang line is kept.
+
+        @param content The content of the source file.
+        @param file_name The name of the source file, for file types accepting several languages.
+        @return The content without comments, unchanged if the comment syntax is unknown.
+        """
+        line_markers, block_delimiters = self._get_comment_syntax(file_name)
+        if len(line_markers) == 0 and len(block_delimiters) == 0:
+            return content
+        string_delimiters: List[str] = self._get_string_delimiters(file_name)
+        result: List[str] = []
+        string_delimiter: str = None
+        index: int = self._get_shebang_end(content)
+        result.append(content[:index])
+        while index < len(content):
+            character: str = content[index]
+            if string_delimiter is not None:
+                if character == '\\':
+                    result.append(content[index:index + 2])
+                    index += 2
+                    continue
+                if character == string_delimiter or (character == '\n' and string_delimiter != '`'):
+                    string_delimiter = None
+                result.append(character)
+                index += 1
+                continue
+            if character in string_delimiters:
+                string_delimiter = character
+                result.append(character)
+                index += 1
+                continue
+            comment_end: int = None
+            if any(content.startswith(marker, index) for marker in line_markers) and self._is_comment_start(content, index):
+                comment_end = content.find('\n', index)
+                comment_end = len(content) if comment_end < 0 else comment_end
+            else:
+                for block_start, block_end in block_delimiters:
+                    if content.startswith(block_start, index):
+                        comment_end = content.find(block_end, index + len(block_start))
+                        comment_end = len(content) if comment_end < 0 else comment_end + len(block_end)
+                        break
+            if comment_end is None:
+                result.append(character)
+                index += 1
+                continue
+            # A comment alone on its line is removed with its line, otherwise it is replaced by a separator
+            while len(result) > 0 and result[-1] in ' \t':
+                result.pop()
+            line_rest_end: int = content.find('\n', comment_end)
+            line_rest_end = len(content) if line_rest_end < 0 else line_rest_end
+            at_line_end: bool = content[comment_end:line_rest_end].strip() == ''
+            if at_line_end and (len(result) == 0 or result[-1].endswith('\n')):
+                index = line_rest_end + 1
+            else:
+                if not at_line_end:
+                    result.append('\n' if '\n' in content[index:comment_end] else ' ')
+                index = comment_end
+        return ''.join(result)
+
+    def get_header_comment_span(self, content: str, file_name: str = None) -> Tuple[int, int]:
+        """
+        @brief Locates the comments heading a source file, typically a license or a generated file notice.
+
+        @param content The content of the source file.
+        @param file_name The name of the source file, for file types accepting several languages.
+        @return The start and the end of the header, after the shebang line if any, equal if there is no header.
+        """
+        line_markers, block_delimiters = self._get_comment_syntax(file_name)
+        start: int = self._get_shebang_end(content)
+        end: int = start
+        while True:
+            index: int = end
+            while index < len(content) and content[index].isspace():
+                index += 1
+            if any(content.startswith(marker, index) for marker in line_markers):
+                line_end: int = content.find('\n', index)
+                end = len(content) if line_end < 0 else line_end + 1
+                continue
+            block: Tuple[str, str] = next(((block_start, block_end) for block_start, block_end in block_delimiters \
+                                           if content.startswith(block_start, index)), None)
+            block_end: int = content.find(block[1], index + len(block[0])) if block is not None else -1
+            if block_end < 0:
+                break
+            end = block_end + len(block[1])
+        return start, end
+
+    def extract_skeleton(self, content: str, file_name: str = None) -> List[ClassSkeleton]:
+        """
+        @brief Extracts the skeletons of the classes of a source file, used to reverse engineer UML class diagrams locally.
+
+        @param content The content of the source file.
+        @param file_name The name of the source file, for file types accepting several languages.
+        @return The class skeletons, in declaration order. Empty by default: the file type has no skeleton parser.
+        """
+        return []
+
+    def extract_symbols(self, content: str, file_name: str = None) -> Dict:
+        """
+        @brief Extracts the symbols a source file defines, the identifiers it uses and its imports, recorded in the symbol index.
+        @details The definitions are the classes and the non private methods of the class skeletons. The identifiers are counted
+                 in the code, without its comments, and the imports are the import, from, #include and using lines.
+
+        @param content The content of the source file.
+        @param file_name The name of the source file, for file types accepting several languages.
+        @return The definitions, each with its name, its signature and the class owning it if a method, the number of uses of each identifier and the imports.
+        """
+        definitions: List[Dict] = []
+        for skeleton in self.extract_skeleton(content, file_name):
+            definitions.append({'name': skeleton.name.split('.')[-1], 'signature': skeleton.to_text().splitlines()[0]})
+            definitions.extend({'name': member.name, 'signature': member.to_signature(skeleton.name), 'owner': skeleton.name.split('.')[-1]} \
+                               for member in skeleton.members if member.is_method() and member.visibility != '-')
+        code: str = self.strip_comments(content, file_name)
+        references: Dict[str, int] = {}
+        for identifier in re.findall(r'[A-Za-z_]\w*', code):
+            references[identifier] = references.get(identifier, 0) + 1
+        imports: List[str] = [' '.join(line.split()) for line in re.findall(r'^[ \t]*(?:import|from|#[ \t]*include|using)\b[^\n;]*', code, re.MULTILINE)]
+        return {'definitions': definitions, 'references': references, 'imports': imports}
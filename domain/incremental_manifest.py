@@ -0,0 +1,138 @@
+"""
+@file incremental_manifest.py
+@brief This module provides the IncrementalManifest class, which records the inputs each generated file was produced from.
+@details The manifest is stored as JSON in the destination directory. A file whose recorded inputs still match
+         and whose output exists does not need to be generated again.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from logging import Logger
+from typing import Dict
+
+
+class IncrementalManifest:
+    """
+    @class IncrementalManifest
+    @brief This class keeps track of the inputs used to generate each target file.
+
+    @param target_directory The directory where the generated files and the manifest are stored.
+    @param logger A logger instance for logging messages.
+    """
+
+    """
+    @brief Name of the manifest file created in the target directory.
+    """
+    manifest_file_name: str = ".gpt2code_manifest.json"
+
+    def __init__(self, target_directory: str, logger: Logger):
+        """
+        @brief Initializes the IncrementalManifest object and loads the existing manifest if any.
+
+        @param target_directory The directory where the generated files and the manifest are stored.
+        @param logger A logger instance for logging messages.
+        """
+        self.logger: Logger = logger
+        self.target_directory: str = target_directory
+        self.manifest_file: str = os.path.join(target_directory, self.manifest_file_name)
+        self._entries: Dict = {}
+        self._recorded_entries: Dict = {}
+        self._lock: threading.Lock = threading.Lock()
+        self._modified: bool = False
+
+        if os.path.isfile(self.manifest_file):
+            try:
+                with open(self.manifest_file, 'r', encoding="utf-8") as file:
+                    self._entries = json.load(file)
+                self.logger.info(f"Manifest {self.manifest_file} was read: {len(self._entries)} entries.")
+            except (IOError, ValueError) as err:
+                self.logger.warning(f"Manifest {self.manifest_file} could not be read ({err}), all files will be generated.")
+
+    @staticmethod
+    def compute_hash(content: str) -> str:
+        """
+        @brief Computes the hash recorded for a text input.
+
+        @param content The text to hash.
+        @return The hexadecimal SHA-256 digest of the text.
+        """
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def describe_inputs(source_content: str, request_id: int, request_text, model_name: str, temperature: float, top_p: float) -> Dict:
+        """
+        @brief Describes the inputs a target file is generated from.
+
+        @param source_content The content of the source file.
+        @param request_id The id of the code request.
+        @param request_text The text of the code request, either a string or a list of strings.
+        @param model_name The name of the LLM model.
+        @param temperature The temperature of the request.
+        @param top_p The top_p of the request.
+        @return The dictionary recorded in the manifest.
+        """
+        return {
+            'source_hash': IncrementalManifest.compute_hash(source_content),
+            'request_id': request_id,
+            'request_hash': IncrementalManifest.compute_hash(json.dumps(request_text)),
+            'model_name': model_name,
+            'temperature': temperature,
+            'top_p': top_p
+        }
+
+    def _get_entry_name(self, to_file: str) -> str:
+        """
+        @brief Provides the manifest entry name of a target file: its path relative to the target directory.
+        """
+        return os.path.relpath(to_file, self.target_directory)
+
+    def is_up_to_date(self, to_file: str, inputs: Dict) -> bool:
+        """
+        @brief Tells whether a target file was already generated from the same inputs.
+
+        @param to_file The path of the target file.
+        @param inputs The inputs as returned by describe_inputs.
+        @return True if the recorded inputs match and the target file exists.
+        """
+        with self._lock:
+            recorded_inputs: Dict = self._entries.get(self._get_entry_name(to_file))
+        return recorded_inputs == inputs and os.path.isfile(to_file)
+
+    def record(self, to_file: str, inputs: Dict) -> None:
+        """
+        @brief Records the inputs a target file was generated from.
+
+        @param to_file The path of the target file.
+        @param inputs The inputs as returned by describe_inputs.
+        """
+        with self._lock:
+            self._entries[self._get_entry_name(to_file)] = inputs
+            self._recorded_entries[self._get_entry_name(to_file)] = inputs
+            self._modified = True
+
+    def save(self) -> None:
+        """
+        @brief Writes the manifest to the target directory if it was modified.
+        @details The manifest is written to a temporary file first and renamed, so that an interrupted save
+                 never leaves a truncated manifest behind. The entries recorded by this process are merged into
+                 the manifest as it is on disk, so that processes sharing the target directory keep each other's entries.
+        """
+        with self._lock:
+            if not self._modified:
+                return
+            os.makedirs(self.target_directory, exist_ok=True)
+            entries: Dict = self._entries
+            if os.path.isfile(self.manifest_file):
+                try:
+                    with open(self.manifest_file, 'r', encoding="utf-8") as file:
+                        entries = dict(json.load(file), **self._recorded_entries)
+                except (IOError, ValueError):
+                    pass
+            temporary_file: str = f'{self.manifest_file}.{os.getpid()}.tmp'
+            with open(temporary_file, 'w', encoding="utf-8") as file:
+                json.dump(entries, file, indent=1, sort_keys=True)
+            os.replace(temporary_file, self.manifest_file)
+            self._modified = False
+        self.logger.debug(f"Manifest {self.manifest_file} was saved.")
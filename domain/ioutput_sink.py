@@ -0,0 +1,111 @@
+"""
+@file ioutput_sink.py
+@brief Abstract base classes for output operations.
+
+This module defines the IOutputSink abstract base class, which hands out one IOutputWriter per generated file.
+Writers are independent from each other, so that several files can be written concurrently, and the content
+of a file only replaces the previous one once the writer is closed: a partial file is never left behind.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Callable
+
+
+class IOutputWriter(ABC):
+    """
+    @class IOutputWriter
+    @brief Abstract base class for the writer of one output file.
+
+    The writer is a context manager: the file is committed when the block exits normally and discarded
+    when it exits with an exception.
+    """
+
+    @abstractmethod
+    def write(self, content: str) -> None:
+        """
+        @brief Writes the provided content to the output file, followed by a newline character.
+
+        @param content The content to be written.
+        @note This method must be implemented by any concrete subclass of IOutputWriter.
+        """
+        pass
+
+    @abstractmethod
+    def flush(self) -> None:
+        """
+        @brief Pushes the content written so far out of memory, without committing the file.
+
+        @note This method must be implemented by any concrete subclass of IOutputWriter.
+        """
+        pass
+
+    @abstractmethod
+    def close(self) -> None:
+        """
+        @brief Commits the output file: its whole content replaces the previous file at once.
+
+        @note This method must be implemented by any concrete subclass of IOutputWriter.
+        """
+        pass
+
+    @abstractmethod
+    def abort(self) -> None:
+        """
+        @brief Discards the content written so far, the previous file if any is left untouched.
+
+        @note This method must be implemented by any concrete subclass of IOutputWriter.
+        """
+        pass
+
+    def __enter__(self) -> 'IOutputWriter':
+        return self
+
+    def __exit__(self, exception_type, exception_value, exception_traceback) -> None:
+        if exception_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class IOutputSink(ABC):
+    """
+    @class IOutputSink
+    @brief Abstract base class for output operations.
+
+    This class defines the interface for obtaining the writers of the output files.
+    """
+
+    @abstractmethod
+    def open_writer(self, output_file_name: str, on_commit: Callable[[], None] = None) -> IOutputWriter:
+        """
+        @brief Creates the writer of an output file, creating its directory if needed.
+
+        @param output_file_name The name of the output file.
+        @param on_commit If set, called once the file is committed, possibly from another thread.
+        @return The writer of the file.
+        @note This method must be implemented by any concrete subclass of IOutputSink.
+        """
+        pass
+
+    def duplicate(self, source_file_name: str, output_file_name: str, on_commit: Callable[[], None] = None) -> None:
+        """
+        @brief Writes an output file with the content of another output file already committed.
+
+        @param source_file_name The name of the committed output file.
+        @param output_file_name The name of the output file.
+        @param on_commit If set, called once the file is committed.
+        """
+        with open(source_file_name, 'r', encoding='utf-8') as source_file:
+            content: str = source_file.read()
+        with self.open_writer(output_file_name, on_commit) as output_writer:
+            output_writer.write(content)
+
+    @abstractmethod
+    def close(self) -> None:
+        """
+        @brief Waits until all the closed writers are committed.
+
+        @exception IOError If some files could not be committed.
+        @note This method must be implemented by any concrete subclass of IOutputSink.
+        """
+        pass
@@ -0,0 +1,72 @@
+"""
+@file iresponse_cache.py
+@brief Abstract base class for LLM response caches.
+
+This module defines the IResponseCache abstract base class, which provides a common interface for storing
+LLM responses keyed by the exact request sent, so that an identical request can be served locally.
+"""
+
+import hashlib
+import json
+from abc import ABC, abstractmethod
+from typing import Dict, List
+
+
+class IResponseCache(ABC):
+    """
+    @class IResponseCache
+    @brief Abstract base class for LLM response caches.
+
+    The cache is content addressed: the key is a hash of everything that influences the response.
+    """
+
+    @staticmethod
+    def compute_key(model_name: str, messages: List, temperature: float, top_p: float) -> str:
+        """
+        @brief Computes the cache key of a request.
+
+        @param model_name The name of the LLM model.
+        @param messages The exact list of messages sent to the LLM.
+        @param temperature The temperature of the request.
+        @param top_p The top_p of the request.
+        @return The hexadecimal SHA-256 digest identifying the request.
+        """
+        request_description: str = json.dumps({
+            'model_name': model_name,
+            'messages': messages,
+            'temperature': temperature,
+            'top_p': top_p
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(request_description.encode('utf-8')).hexdigest()
+
+    @abstractmethod
+    def get(self, key: str) -> str:
+        """
+        @brief Retrieves a cached response.
+
+        @param key The key computed by compute_key.
+        @return The cached response, None if the request was never cached or was evicted.
+        @note This method must be implemented by any concrete subclass of IResponseCache.
+        """
+        pass
+
+    @abstractmethod
+    def put(self, key: str, response: str) -> None:
+        """
+        @brief Stores a response.
+
+        @param key The key computed by compute_key.
+        @param response The response of the LLM.
+        @note This method must be implemented by any concrete subclass of IResponseCache.
+        """
+        pass
+
+    @abstractmethod
+    def get_statistics(self) -> Dict:
+        """
+        @brief Provides usage statistics of the cache.
+
+        @return A dictionary with at least the hits, misses, stores, evictions, entries and size_bytes keys.
+        @note This method must be implemented by any concrete subclass of IResponseCache.
+        """
+        pass
@@ -0,0 +1,62 @@
+"""
+@file itoken_estimator.py
+@brief Abstract base class for the local token estimators, and the default estimator needing no tokenizer.
+
+This module defines the ITokenEstimator abstract base class, which counts the tokens of a text without sending
+it to the LLM, so that requests can be planned and split before they are sent.
+"""
+
+from abc import ABC, abstractmethod
+from typing import List
+
+from domain.llm_utils import LLMUtils
+
+
+class ITokenEstimator(ABC):
+    """
+    @class ITokenEstimator
+    @brief Abstract base class for the local token estimators.
+    """
+
+    """
+    @brief Name of the estimator, as selected on the command line and recorded in the plans.
+    """
+    name: str = None
+
+    @abstractmethod
+    def estimate_tokens(self, text: str) -> int:
+        """
+        @brief Estimates the number of tokens of a text.
+
+        @param text The text.
+        @return The estimated number of tokens.
+        @note This method must be implemented by any concrete subclass of ITokenEstimator.
+        """
+        pass
+
+    def estimate_message_tokens(self, messages: List) -> int:
+        """
+        @brief Estimates the number of prompt tokens of a list of chat messages.
+
+        @param messages The messages, dictionaries with a content key.
+        @return The estimated number of tokens, including a small overhead per message.
+        """
+        return sum([self.estimate_tokens(str(message.get('content', ''))) + LLMUtils.tokens_per_message for message in messages])
+
+
+class CharacterTokenEstimator(ITokenEstimator):
+    """
+    @class CharacterTokenEstimator
+    @brief Estimates the tokens from the number of characters, the default used by the rate limiter and the chunker.
+    """
+
+    name: str = 'characters'
+
+    def estimate_tokens(self, text: str) -> int:
+        """
+        @brief Estimates the number of tokens of a text from its length.
+
+        @param text The text.
+        @return The estimated number of tokens.
+        """
+        return LLMUtils.estimate_tokens(text)
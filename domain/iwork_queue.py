@@ -0,0 +1,125 @@
+"""
+@file iwork_queue.py
+@brief Abstract base class for the durable queues sharing the source files of a run between several worker processes.
+
+This module defines the IWorkQueue abstract base class. A coordinator enqueues the source files once, then workers,
+possibly on other hosts mounting the same directories, claim them with time-limited leases which they renew while
+processing. The items of a worker which stops renewing its leases are claimed again by the others.
+
+Item states:
+- queued: waiting for a worker.
+- leased: claimed by a worker until its lease expires.
+- done: processed, with the outcomes of its target files.
+- failed: processing failed, or the item was leased too many times without completing. Enqueuing it again retries it.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Dict, List
+
+
+class IWorkQueue(ABC):
+    """
+    @class IWorkQueue
+    @brief Abstract base class for the work queues, usable from several threads and several processes.
+    """
+
+    @abstractmethod
+    def set_settings(self, settings: Dict) -> None:
+        """
+        @brief Records the settings of the run the queue was created for, checked by the workers.
+
+        @param settings The settings, JSON serializable values by name.
+        @note This method must be implemented by any concrete subclass of IWorkQueue.
+        """
+        pass
+
+    @abstractmethod
+    def get_settings(self) -> Dict:
+        """
+        @brief Provides the settings of the run the queue was created for.
+
+        @return The settings, empty if the queue was never initialized by a coordinator.
+        @note This method must be implemented by any concrete subclass of IWorkQueue.
+        """
+        pass
+
+    @abstractmethod
+    def enqueue(self, source_files: List[str]) -> int:
+        """
+        @brief Adds source files to the queue, in order. Files already queued, leased or done are left as they are,
+               failed files are queued again.
+
+        @param source_files The source files, relative to the source directory.
+        @return The number of files queued.
+        @note This method must be implemented by any concrete subclass of IWorkQueue.
+        """
+        pass
+
+    @abstractmethod
+    def claim(self, worker_id: str, count: int, lease_seconds: float) -> List[Dict]:
+        """
+        @brief Leases the next queued items to a worker, after queuing again the items whose lease expired.
+
+        @param worker_id The identifier of the worker.
+        @param count The maximum number of items leased.
+        @param lease_seconds The duration of the leases.
+        @return The leased items, dictionaries with item_id, source_file and attempts, empty if no item is queued.
+        @note This method must be implemented by any concrete subclass of IWorkQueue.
+        """
+        pass
+
+    @abstractmethod
+    def renew(self, worker_id: str, item_ids: List[int], lease_seconds: float) -> List[int]:
+        """
+        @brief Extends the leases a worker holds.
+
+        @param worker_id The identifier of the worker.
+        @param item_ids The items whose lease is extended.
+        @param lease_seconds The new duration of the leases, from now.
+        @return The items the worker still holds, the others were leased to another worker after their lease expired.
+        @note This method must be implemented by any concrete subclass of IWorkQueue.
+        """
+        pass
+
+    @abstractmethod
+    def complete(self, worker_id: str, item_id: int, outcome: str, failed: bool) -> None:
+        """
+        @brief Records that an item was processed.
+
+        @param worker_id The identifier of the worker.
+        @param item_id The item.
+        @param outcome The outcomes of the target files of the item.
+        @param failed True if the item shall be marked as failed.
+        @note This method must be implemented by any concrete subclass of IWorkQueue.
+        """
+        pass
+
+    @abstractmethod
+    def release(self, worker_id: str, item_ids: List[int]) -> None:
+        """
+        @brief Gives leased items back to the queue, when a worker stops before processing them. The attempt is counted.
+
+        @param worker_id The identifier of the worker.
+        @param item_ids The items given back.
+        @note This method must be implemented by any concrete subclass of IWorkQueue.
+        """
+        pass
+
+    @abstractmethod
+    def get_status(self) -> Dict:
+        """
+        @brief Provides the progress of the run.
+
+        @return The number of items by state, the outcomes of the items done, and the activity of each worker.
+        @note This method must be implemented by any concrete subclass of IWorkQueue.
+        """
+        pass
+
+    @abstractmethod
+    def close(self) -> None:
+        """
+        @brief Releases the resources of the queue, the queue itself is kept.
+
+        @note This method must be implemented by any concrete subclass of IWorkQueue.
+        """
+        pass
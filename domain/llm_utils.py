@@ -15,6 +15,16 @@ class LLMUtils:
     @brief This class handles external code requests and LLM parameters.
     """
 
+    """
+    @brief Average number of characters per token used to estimate the size of a text.
+    """
+    characters_per_token: int = 4
+
+    """
+    @brief Tokens added by the chat format around the content of each message.
+    """
+    tokens_per_message: int = 4
+
     def __init__(self, external_file_code_requests_path: str, logger: Logger):
         """
         @brief Initializes the LLMUtils object.
@@ -24,10 +34,29 @@ class LLMUtils:
         self.logger: Logger = logger
         self.force_temperature: float = None
         self.force_top_p: float = None
-        
-        external_code_requests: List = self.read_json_file(external_file_code_requests_path)
+        self.external_file_code_requests_path: str = external_file_code_requests_path
+        self._external_code_llm_requests: List = None
+
+    @property
+    def external_code_llm_requests(self) -> List:
+        """
+        @brief The built-in code requests followed by the ones of the external file.
+        @details The external file is only read the first time the requests are needed, so that runs which
+                 do not need them, such as the temperature recommendations, start without reading it.
+        @return The list of all the code requests.
+        """
+        if self._external_code_llm_requests is None:
+            self._external_code_llm_requests = self._load_code_llm_requests()
+        return self._external_code_llm_requests
+
+    def _load_code_llm_requests(self) -> List:
+        """
+        @brief Builds the list of the built-in code requests and reads the external ones.
+        @return The list of all the code requests.
+        """
+        external_code_requests: List = self.read_json_file(self.external_file_code_requests_path)
        
-        self.external_code_llm_requests = [
+        code_llm_requests: List = [
             {   'request_name': 'Create Unittests', 
                 'request': f"For each function please create unittests and ensure 100% code coverage related to the code you have. Do not create any unittests for any dependency",
                 "temperature": 0.2, 
@@ -40,7 +69,8 @@ class LLMUtils:
                 'request': f"For all source code, please ensure a proper documentation of each function. Keep the initial code exacly as is, only document the whole code in detail following Doxygen best practices.",
                 "temperature": 0.3, 
                 "top_p": 0.2,
-                "generate_full_output": False
+                "generate_full_output": False,
+                "rewrites_source": True
             },
             {   'request_name': 'Review comments',
                 'request': 'Review the Doxygen documentation against the code semantics and respond as follows:' +
@@ -51,19 +81,22 @@ class LLMUtils:
                 "top_p": 0.2,
                 "forced_destination_file_type": "md",
                 "generate_full_output": True,
-                "force_comment_caracter": ""
+                "force_comment_caracter": "",
+                "review": True
             },
             {   'request_name': 'Language best practices',
                 'request': f"Refactor each method following language best practices. Ensure that mathods have a proper name. Any change shall be associated with a comment explaining what was done within the code itself. Ensure method and variables have all a meaningfull name.",
                 "temperature": 0.2, 
                 "top_p": 0.1,
-                "generate_full_output": False
+                "generate_full_output": False,
+                "rewrites_source": True
             },
             {   'request_name': 'OOP Best practices',
                 'request': f"Refactor all the code following OOP best practices. Please add comments as TODO for all parts where changes need to be done but you are lacking information from dependencies.",
                 "temperature": 0.2, 
                 "top_p": 0.1,
-                "generate_full_output": False
+                "generate_full_output": False,
+                "rewrites_source": True
             },
             {   'request_name': 'UML Class diagrams reverse engineering',
                 'request': f"We need to have the whole file reversed engineer as UML class diagram following plantuml syntax.",
@@ -74,7 +107,8 @@ class LLMUtils:
 
         ]
 
-        self.external_code_llm_requests.extend(external_code_requests)
+        code_llm_requests.extend(external_code_requests)
+        return code_llm_requests
 
     def set_default_temperature(self, new_temperature: float) -> None:
         """
@@ -216,7 +250,47 @@ class LLMUtils:
         if forced_source_file_types is not None:
             return forced_source_file_types.split(',')
         return None
-    
+
+    def get_minify_transformations(self, selected_code_request: int):
+        """
+        @brief Provide the minification transformations specified in JSON, see PromptMinifier for their names.
+        @param selected_code_request The id of the request.
+        @return The list or the comma separated names of the transformations: it will be None unless specifically required from the request.
+        """
+        return self._get_parameter_value_from_request('minify', selected_code_request)
+
+    def get_symbol_context(self, selected_code_request: int) -> bool:
+        """
+        @brief Provide whether the signatures of the symbols a file uses are attached to its requests, see SymbolIndex.
+        @param selected_code_request The id of the request.
+        @return True if the symbol_context key is set: it will be None unless specifically required from the request.
+        """
+        return self._get_parameter_value_from_request('symbol_context', selected_code_request)
+
+    def is_review_request(self, selected_code_request: int) -> bool:
+        """
+        @brief Provide whether the output of the request is a review starting with its verdict, see RunReport.
+        @param selected_code_request The id of the request.
+        @return True if the review key is set, as for the built-in Review comments request.
+        """
+        return bool(self._get_parameter_value_from_request('review', selected_code_request))
+
+    def is_source_rewrite_request(self, selected_code_request: int) -> bool:
+        """
+        @brief Provide whether the output of the request is the source file rewritten, which keeps what the request was sent.
+        @param selected_code_request The id of the request.
+        @return True if the rewrites_source key is set, as for the built-in requests refactoring or commenting the code.
+        """
+        return bool(self._get_parameter_value_from_request('rewrites_source', selected_code_request))
+
+    def get_model_routing_rules(self, selected_code_request: int) -> List:
+        """
+        @brief Provide the model routing rules specified in JSON, see ModelRoutingRule for their keys.
+        @param selected_code_request The id of the request.
+        @return The list of rule descriptions: it will be None unless specifically required from the request.
+        """
+        return self._get_parameter_value_from_request('model_routing', selected_code_request)
+
     def get_dict_requestid_request_name(self, selecteted_request: int):
         """
         @brief Returns all code requests and their indices or a subset of requests based on the filter_request_indices parameter.
@@ -292,6 +366,24 @@ class LLMUtils:
                 parameter_list.append(int(parameter))
         return parameter_list
     
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """
+        @brief Estimates the number of tokens of a text, without any tokenizer.
+        @param text The text.
+        @return The estimated number of tokens.
+        """
+        return (len(text) + LLMUtils.characters_per_token - 1) // LLMUtils.characters_per_token
+
+    @staticmethod
+    def estimate_message_tokens(messages: List) -> int:
+        """
+        @brief Estimates the number of prompt tokens of a list of chat messages.
+        @param messages The messages, dictionaries with a content key.
+        @return The estimated number of tokens, including a small overhead per message.
+        """
+        return sum([LLMUtils.estimate_tokens(str(message.get('content', ''))) + LLMUtils.tokens_per_message for message in messages])
+
     @staticmethod
     def get_llm_instructions_for_language(language_name: str) -> str:
         """
@@ -0,0 +1,152 @@
+"""
+@file markdown_code_extractor.py
+@brief This module provides the MarkdownCodeExtractor class, an incremental version of the markdown code block state machine.
+@details The LLM answers in markdown. Only the lines inside the code block of the destination language are kept,
+         unless full output is requested, in which case the other lines are kept as comments.
+         The text can be fed in arbitrary pieces, as received from a streamed completion.
+"""
+
+from typing import Callable, List
+
+from domain.allm_access import IResponseStreamConsumer
+from domain.ioutput_sink import IOutputSink, IOutputWriter
+
+
+class MarkdownCodeExtractor:
+    """
+    @class MarkdownCodeExtractor
+    @brief Extracts the code from a markdown LLM response fed piece by piece.
+
+    @param destination_language_name The language name following the opening code fence.
+    @param comment_characters The characters prefixed to the lines outside of the code block when full output is requested.
+    @param force_full_output A flag to keep the lines outside of the code block as comments.
+    """
+
+    def __init__(self, destination_language_name: str, comment_characters: str, force_full_output: bool):
+        """
+        @brief Initializes the MarkdownCodeExtractor object.
+
+        @param destination_language_name The language name following the opening code fence.
+        @param comment_characters The characters prefixed to the lines outside of the code block when full output is requested.
+        @param force_full_output A flag to keep the lines outside of the code block as comments.
+        """
+        self.code_block_start: str = f'```{destination_language_name}'
+        self.comment_characters: str = comment_characters
+        self.force_full_output: bool = force_full_output
+        self.restart()
+
+    def restart(self) -> None:
+        """
+        @brief Forgets everything fed so far, for instance before a request is sent again.
+        """
+        self._in_code_block: bool = False
+        self._pending_text: str = ''
+
+    def _reformat_line(self, line: str, reformatted_lines: List[str]) -> None:
+        """
+        @brief Runs one complete line through the state machine.
+
+        @param line The line, without its end of line character.
+        @param reformatted_lines The list the kept line, if any, is appended to.
+        """
+        if line == '```':
+            self._in_code_block = False
+        if not self._in_code_block:
+            if self.force_full_output:
+                # This line adds a comment character to the start of each line when
+                # * force_full_output is True
+                # * the MD file does not describe a code block
+                reformatted_lines.append(self.comment_characters + ' ' + line)
+        else:
+            reformatted_lines.append(line)
+
+        if line == self.code_block_start:
+            self._in_code_block = True
+
+    def feed(self, text: str) -> List[str]:
+        """
+        @brief Feeds the next piece of the response.
+
+        @param text The next piece of the response.
+        @return The lines to keep among the lines completed by this piece.
+        """
+        reformatted_lines: List[str] = []
+        lines: List[str] = (self._pending_text + text).split('\n')
+        self._pending_text = lines.pop()
+        for line in lines:
+            self._reformat_line(line, reformatted_lines)
+        return reformatted_lines
+
+    def finish(self) -> List[str]:
+        """
+        @brief Processes the last line of the response, which has no end of line character.
+
+        @return The lines to keep, at most one.
+        """
+        reformatted_lines: List[str] = []
+        self._reformat_line(self._pending_text, reformatted_lines)
+        self._pending_text = ''
+        return reformatted_lines
+
+
+class StreamedCodeWriter(IResponseStreamConsumer):
+    """
+    @class StreamedCodeWriter
+    @brief Writes the code extracted from a streamed LLM response to the output file as soon as each line is complete.
+    @details The output file is committed by finish only: an interrupted response never replaces the previous file.
+
+    @param code_extractor The extractor used to keep the code lines.
+    @param output_sink The sink providing the writer of the output file.
+    @param output_file_name The name of the output file.
+    @param on_commit If set, called once the output file is committed.
+    """
+
+    def __init__(self, code_extractor: MarkdownCodeExtractor, output_sink: IOutputSink, output_file_name: str, \
+                 on_commit: Callable[[], None] = None):
+        """
+        @brief Initializes the StreamedCodeWriter object.
+
+        @param code_extractor The extractor used to keep the code lines.
+        @param output_sink The sink providing the writer of the output file.
+        @param output_file_name The name of the output file.
+        @param on_commit If set, called once the output file is committed.
+        """
+        self.code_extractor: MarkdownCodeExtractor = code_extractor
+        self.output_sink: IOutputSink = output_sink
+        self.output_file_name: str = output_file_name
+        self.on_commit: Callable[[], None] = on_commit
+        self.output_writer: IOutputWriter = None
+
+    def restart(self) -> None:
+        """
+        @brief Discards what was written by a previous attempt to send the request.
+        """
+        self.abort()
+        self.code_extractor.restart()
+        self.output_writer = self.output_sink.open_writer(self.output_file_name, self.on_commit)
+
+    def feed(self, text: str) -> None:
+        """
+        @brief Writes the code lines completed by the next piece of the response.
+
+        @param text The next piece of the response.
+        """
+        for line in self.code_extractor.feed(text):
+            self.output_writer.write(line)
+        self.output_writer.flush()
+
+    def finish(self) -> None:
+        """
+        @brief Writes the last line of the response once it is complete and commits the output file.
+        """
+        for line in self.code_extractor.finish():
+            self.output_writer.write(line)
+        self.output_writer.close()
+
+    def abort(self) -> None:
+        """
+        @brief Discards what was written so far, the previous output file if any is left untouched.
+        """
+        if self.output_writer is not None:
+            self.output_writer.abort()
+            self.output_writer = None
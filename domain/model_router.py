@@ -0,0 +1,223 @@
+"""
+@file model_router.py
+@brief This module provides the ModelRouter class, which chooses the LLM model of each file from routing rules.
+@details Most files are small: sending them to a cheap low latency model and only the large or complex ones to the
+         big model lowers the cost and the median latency of a run. Rules are evaluated in order and the first one
+         matching a file gives its model, the default model of the run being used when none matches. The rules of
+         a code request, declared in its JSON description, are evaluated before the rules of the command line.
+"""
+
+import fnmatch
+import json
+from logging import Logger
+from typing import Dict, List
+
+from domain.allm_access import AbstractLLMAccess
+from domain.code_request import CodeRequest
+from domain.itoken_estimator import ITokenEstimator
+from domain.source_chunker import SourceChunker
+
+
+class ModelRoutingRule:
+    """
+    @class ModelRoutingRule
+    @brief A rule sending the files matching all its conditions to a model. A condition which is not set always matches.
+
+    @param model_name The model of the matching files.
+    @param min_tokens The minimum estimated tokens of the file content.
+    @param max_tokens The maximum estimated tokens of the file content.
+    @param language_names The source languages of the code request, case insensitive.
+    @param code_request_ids The ids of the code requests.
+    @param path_patterns Shell patterns matched against the path of the file relative to the source directory.
+    """
+
+    """
+    @brief Keys of a rule in its JSON description.
+    """
+    description_keys: List[str] = ['model', 'min_tokens', 'max_tokens', 'languages', 'code_requests', 'paths']
+
+    def __init__(self, model_name: str, min_tokens: int = None, max_tokens: int = None, language_names: List[str] = None, \
+                 code_request_ids: List[int] = None, path_patterns: List[str] = None):
+        """
+        @brief Initializes the ModelRoutingRule object.
+
+        @param model_name The model of the matching files.
+        @param min_tokens The minimum estimated tokens of the file content.
+        @param max_tokens The maximum estimated tokens of the file content.
+        @param language_names The source languages of the code request, case insensitive.
+        @param code_request_ids The ids of the code requests.
+        @param path_patterns Shell patterns matched against the path of the file relative to the source directory.
+        """
+        self.model_name: str = model_name
+        self.min_tokens: int = min_tokens
+        self.max_tokens: int = max_tokens
+        self.language_names: List[str] = [language_name.lower() for language_name in language_names] if language_names is not None else None
+        self.code_request_ids: List[int] = code_request_ids
+        self.path_patterns: List[str] = path_patterns
+
+    @classmethod
+    def from_description(cls, description: Dict) -> 'ModelRoutingRule':
+        """
+        @brief Creates a rule from its JSON description.
+
+        @param description The rule, with a model and optionally min_tokens, max_tokens, languages, code_requests and paths.
+        @return The rule.
+        @exception ValueError If the description is not a valid rule.
+        """
+        if not isinstance(description, dict) or not isinstance(description.get('model'), str):
+            raise ValueError(f"A model routing rule needs a model: {description}")
+        unknown_keys: List[str] = [key for key in description if key not in cls.description_keys]
+        if len(unknown_keys) > 0:
+            raise ValueError(f"Unknown keys {', '.join(unknown_keys)} in the model routing rule {description}: "
+                             f"expected {', '.join(cls.description_keys)}")
+        for key in ['languages', 'code_requests', 'paths']:
+            if key in description and not isinstance(description[key], list):
+                raise ValueError(f"{key} must be a list in the model routing rule {description}")
+        try:
+            return cls(description['model'], \
+                       int(description['min_tokens']) if description.get('min_tokens') is not None else None, \
+                       int(description['max_tokens']) if description.get('max_tokens') is not None else None, \
+                       [str(language_name) for language_name in description['languages']] if 'languages' in description else None, \
+                       [int(code_request_id) for code_request_id in description['code_requests']] if 'code_requests' in description else None, \
+                       [str(path_pattern) for path_pattern in description['paths']] if 'paths' in description else None)
+        except (TypeError, ValueError) as err:
+            raise ValueError(f"Invalid model routing rule {description}: {err}")
+
+    def matches(self, tokens: int, language_name: str, request_id: int, relative_path: str) -> bool:
+        """
+        @brief Tells whether a file matches all the conditions of the rule.
+
+        @param tokens The estimated tokens of the file content.
+        @param language_name The source language of the code request.
+        @param request_id The id of the code request.
+        @param relative_path The path of the file relative to the source directory, with / separators.
+        @return True if the file is sent to the model of the rule.
+        """
+        if self.min_tokens is not None and tokens < self.min_tokens:
+            return False
+        if self.max_tokens is not None and tokens > self.max_tokens:
+            return False
+        if self.language_names is not None and (language_name or '').lower() not in self.language_names:
+            return False
+        if self.code_request_ids is not None and request_id not in self.code_request_ids:
+            return False
+        if self.path_patterns is not None and not any(fnmatch.fnmatch(relative_path, path_pattern) for path_pattern in self.path_patterns):
+            return False
+        return True
+
+
+class ModelRouter:
+    """
+    @class ModelRouter
+    @brief This class selects the model of each file, and provides the LLM access and the chunker of each model.
+
+    @param default_model_name The model of the files no rule matches.
+    @param logger A logger instance for logging messages.
+    @param token_estimator The estimator counting the tokens of the file contents.
+    @param rules The rules of every code request, evaluated in order.
+    @param code_request_rules The rules of each code request by id, evaluated before the others.
+    """
+
+    def __init__(self, default_model_name: str, logger: Logger, token_estimator: ITokenEstimator, rules: List[ModelRoutingRule] = None, \
+                 code_request_rules: Dict[int, List[ModelRoutingRule]] = None):
+        """
+        @brief Initializes the ModelRouter object.
+
+        @param default_model_name The model of the files no rule matches.
+        @param logger A logger instance for logging messages.
+        @param token_estimator The estimator counting the tokens of the file contents.
+        @param rules The rules of every code request, evaluated in order.
+        @param code_request_rules The rules of each code request by id, evaluated before the others.
+        """
+        self.default_model_name: str = default_model_name
+        self.logger: Logger = logger
+        self.token_estimator: ITokenEstimator = token_estimator
+        self.rules: List[ModelRoutingRule] = rules if rules is not None else []
+        self.code_request_rules: Dict[int, List[ModelRoutingRule]] = code_request_rules if code_request_rules is not None else {}
+        self._llm_accesses: Dict[str, AbstractLLMAccess] = {}
+        self._source_chunkers: Dict[str, SourceChunker] = {}
+
+    @staticmethod
+    def parse_rules(descriptions: List) -> List[ModelRoutingRule]:
+        """
+        @brief Creates rules from their JSON descriptions.
+
+        @param descriptions The list of rule descriptions.
+        @return The rules, in order.
+        @exception ValueError If the descriptions are not a list of valid rules.
+        """
+        if not isinstance(descriptions, list):
+            raise ValueError(f"Model routing rules must be a list: {descriptions}")
+        return [ModelRoutingRule.from_description(description) for description in descriptions]
+
+    @classmethod
+    def load_rules(cls, rules: str) -> List[ModelRoutingRule]:
+        """
+        @brief Reads rules from a JSON file, or from their JSON text.
+
+        @param rules The name of the JSON file, or the JSON list of the rules itself.
+        @return The rules, in order.
+        @exception ValueError If the rules are not a list of valid rules.
+        @exception OSError If the file cannot be read.
+        """
+        if rules.lstrip().startswith('['):
+            return cls.parse_rules(json.loads(rules))
+        with open(rules, 'r', encoding='utf-8') as file:
+            return cls.parse_rules(json.load(file))
+
+    def get_model_names(self) -> List[str]:
+        """
+        @brief Provides the models files can be sent to.
+
+        @return The default model followed by the models of the rules, once each.
+        """
+        model_names: List[str] = [self.default_model_name]
+        for rules in list(self.code_request_rules.values()) + [self.rules]:
+            model_names.extend(rule.model_name for rule in rules)
+        return list(dict.fromkeys(model_names))
+
+    def register(self, model_name: str, llm_access: AbstractLLMAccess, source_chunker: SourceChunker) -> None:
+        """
+        @brief Records the LLM access and the chunker of a model.
+
+        @param model_name The model.
+        @param llm_access The LLM access sending the requests to the model.
+        @param source_chunker The chunker splitting the files too big for the context window of the model, None to never split.
+        """
+        self._llm_accesses[model_name] = llm_access
+        self._source_chunkers[model_name] = source_chunker
+
+    def get_llm_access(self, model_name: str) -> AbstractLLMAccess:
+        """
+        @brief Provides the LLM access of a model.
+
+        @param model_name The model, registered beforehand.
+        @return The LLM access.
+        """
+        return self._llm_accesses[model_name]
+
+    def get_source_chunker(self, model_name: str) -> SourceChunker:
+        """
+        @brief Provides the chunker of a model.
+
+        @param model_name The model, registered beforehand.
+        @return The chunker, None if files are never split.
+        """
+        return self._source_chunkers[model_name]
+
+    def select_model(self, file_content: str, code_request: CodeRequest, relative_path: str) -> str:
+        """
+        @brief Selects the model of a file: the model of the first rule it matches, the default model otherwise.
+
+        @param file_content The content of the file.
+        @param code_request The code request the file is sent for.
+        @param relative_path The path of the file relative to the source directory.
+        @return The model.
+        """
+        tokens: int = self.token_estimator.estimate_tokens(file_content)
+        relative_path = relative_path.replace('\\', '/')
+        for rule in self.code_request_rules.get(code_request.request_id, []) + self.rules:
+            if rule.matches(tokens, code_request.language_name, code_request.request_id, relative_path):
+                self.logger.debug(f"Routing {relative_path} ({tokens} tokens) to {rule.model_name}")
+                return rule.model_name
+        return self.default_model_name
@@ -0,0 +1,198 @@
+"""
+@file prompt_minifier.py
+@brief This module provides the PromptMinifier class, which shrinks the file contents sent to the LLM.
+@details Each code request opts in to the transformations it tolerates:
+         - whitespace: removes the trailing whitespace and collapses the runs of blank lines, indentation being kept.
+         - boilerplate: removes the comments heading a file when they are a license notice or when the same header
+           heads other files of the tree.
+         - comments: removes every comment, with the comment syntax of the file type.
+         Fewer prompt tokens lower the latency and the cost, and let more files through a tokens per minute quota.
+"""
+
+import os
+import re
+from logging import Logger
+from typing import Dict, Iterable, List, Set, Tuple
+
+from domain.ifile_type import FileTypeInterface
+from domain.itoken_estimator import ITokenEstimator
+
+
+class PromptMinifier:
+    """
+    @class PromptMinifier
+    @brief This class applies the transformations selected by a code request to the content of a source file.
+
+    @param logger A logger instance for logging messages.
+    @param token_estimator The estimator counting the tokens saved.
+    @param request_transformations The transformations selected by each code request, by id.
+    """
+
+    """
+    @brief Transformations a code request may select, in the order they are applied.
+    """
+    transformations: List[str] = ['boilerplate', 'comments', 'whitespace']
+
+    """
+    @brief Transformations removing text which the output of a code request rewriting the source file would lose.
+    """
+    lossy_transformations: List[str] = ['boilerplate', 'comments']
+
+    """
+    @brief Headers matching this expression are boilerplate even if no other file shares them.
+    """
+    license_pattern: re.Pattern = re.compile(r'copyright|licen[cs]ed?\b|spdx-license-identifier|all rights reserved', re.IGNORECASE)
+
+    """
+    @brief Number of files a header must head to be detected as boilerplate.
+    """
+    min_header_files: int = 2
+
+    """
+    @brief Number of bytes read from the start of each file to detect the boilerplate headers.
+    """
+    header_read_bytes: int = 16384
+
+    def __init__(self, logger: Logger, token_estimator: ITokenEstimator, request_transformations: Dict[int, List[str]]):
+        """
+        @brief Initializes the PromptMinifier object.
+
+        @param logger A logger instance for logging messages.
+        @param token_estimator The estimator counting the tokens saved.
+        @param request_transformations The transformations selected by each code request, by id.
+        """
+        self.logger: Logger = logger
+        self.token_estimator: ITokenEstimator = token_estimator
+        self.request_transformations: Dict[int, List[str]] = request_transformations
+        self._boilerplate_headers: Set[str] = set()
+
+    @classmethod
+    def parse_transformations(cls, transformations) -> List[str]:
+        """
+        @brief Reads the transformations selected by a code request or on the command line.
+
+        @param transformations A list of transformation names, or their names separated by commas, 'all' selecting every one and 'none' none.
+        @return The transformations, in the order they are applied.
+        @exception ValueError If a transformation is unknown.
+        """
+        if isinstance(transformations, str):
+            transformations = [transformation.strip() for transformation in transformations.split(',') if len(transformation.strip()) > 0]
+        if not isinstance(transformations, list):
+            raise ValueError(f"Minification transformations must be a list: {transformations}")
+        if 'none' in transformations:
+            return []
+        if 'all' in transformations:
+            return list(cls.transformations)
+        unknown_transformations: List[str] = [str(transformation) for transformation in transformations if transformation not in cls.transformations]
+        if len(unknown_transformations) > 0:
+            raise ValueError(f"Unknown minification transformations {', '.join(unknown_transformations)}: expected {', '.join(cls.transformations)}, all or none")
+        return [transformation for transformation in cls.transformations if transformation in transformations]
+
+    def get_transformations(self, request_id: int) -> List[str]:
+        """
+        @brief Provides the transformations selected by a code request.
+
+        @param request_id The id of the code request.
+        @return The transformations, empty if its file contents are sent unchanged.
+        """
+        return self.request_transformations.get(request_id, [])
+
+    @staticmethod
+    def _normalize_header(header: str) -> str:
+        """
+        @brief Normalizes a header so that the copies differing only by their years or their spacing are counted together.
+
+        @param header The header comments.
+        @return The normalized header.
+        """
+        return '\n'.join(re.sub(r'\d+', '0', ' '.join(line.split())) for line in header.splitlines() if len(line.strip()) > 0)
+
+    def learn_headers(self, source_files: Iterable[Tuple[str, FileTypeInterface]]) -> None:
+        """
+        @brief Reads the start of the source files and records the headers shared by several of them as boilerplate.
+
+        @param source_files The paths of the source files and the file types they are read with.
+        """
+        header_counts: Dict[str, int] = {}
+        file_count: int = 0
+        for source_file, file_type in source_files:
+            try:
+                with open(source_file, 'r', encoding='utf-8', errors='replace') as file:
+                    content: str = file.read(self.header_read_bytes)
+            except OSError:
+                continue
+            file_count += 1
+            start, end = file_type.get_header_comment_span(content, os.path.basename(source_file))
+            header: str = self._normalize_header(content[start:end])
+            if len(header) > 0:
+                header_counts[header] = header_counts.get(header, 0) + 1
+        self._boilerplate_headers = {header for header, count in header_counts.items() if count >= self.min_header_files}
+        self.logger.info(f"{len(self._boilerplate_headers)} boilerplate headers detected in {file_count} source files")
+
+    def is_boilerplate(self, header: str) -> bool:
+        """
+        @brief Tells whether the comments heading a file are boilerplate.
+
+        @param header The header comments.
+        @return True if the header is a license notice or heads several files of the tree.
+        """
+        return self._normalize_header(header) in self._boilerplate_headers or self.license_pattern.search(header) is not None
+
+    def strip_boilerplate(self, content: str, file_name: str, file_type: FileTypeInterface) -> str:
+        """
+        @brief Removes the comments heading a file if they are boilerplate.
+
+        @param content The content of the source file.
+        @param file_name The name of the source file.
+        @param file_type The file type the source file is read with.
+        @return The content without its boilerplate header.
+        """
+        start, end = file_type.get_header_comment_span(content, file_name)
+        if start == end or not self.is_boilerplate(content[start:end]):
+            return content
+        return content[:start] + content[end:].lstrip('\r\n')
+
+    @staticmethod
+    def collapse_whitespace(content: str) -> str:
+        """
+        @brief Removes the trailing whitespace and the leading blank lines, and collapses the runs of blank lines into one.
+
+        @param content The content of the source file.
+        @return The content, its indentation unchanged.
+        """
+        lines: List[str] = [line.rstrip() for line in content.splitlines()]
+        collapsed_lines: List[str] = []
+        for line in lines:
+            if len(line) == 0 and (len(collapsed_lines) == 0 or len(collapsed_lines[-1]) == 0):
+                continue
+            collapsed_lines.append(line)
+        while len(collapsed_lines) > 0 and len(collapsed_lines[-1]) == 0:
+            collapsed_lines.pop()
+        return '\n'.join(collapsed_lines) + '\n' if len(collapsed_lines) > 0 else ''
+
+    def minify(self, content: str, file_name: str, file_type: FileTypeInterface, transformations: List[str]) -> str:
+        """
+        @brief Applies the selected transformations to the content of a source file.
+
+        @param content The content of the source file.
+        @param file_name The name of the source file.
+        @param file_type The file type the source file is read with.
+        @param transformations The transformations selected by the code request.
+        @return The minified content.
+        """
+        if 'boilerplate' in transformations:
+            content = self.strip_boilerplate(content, file_name, file_type)
+        if 'comments' in transformations:
+            content = file_type.strip_comments(content, file_name)
+        if 'whitespace' in transformations:
+            content = self.collapse_whitespace(content)
+        return content
+
+    def estimate_tokens(self, content: str) -> int:
+        """
+        @brief Estimates the tokens of a content, before or after minification.
+
+        @param content The content.
+        @return The estimated number of tokens.
+        """
+        return self.token_estimator.estimate_tokens(content)
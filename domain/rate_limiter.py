@@ -0,0 +1,221 @@
+"""
+@file rate_limiter.py
+@brief This module provides the RateLimiter class, a client side limiter enforcing requests and tokens per minute quotas.
+@details Each quota is a token bucket refilled continuously. Requests are charged their estimated prompt tokens
+         before being sent and reconciled with the usage reported by the endpoint afterwards. The rate limit
+         headers returned by the endpoint and the Retry-After delay of rejected requests are taken into account,
+         so that all the requests sent to one endpoint run right at its quota without tripping it.
+"""
+
+import asyncio
+import re
+import threading
+import time
+from logging import Logger
+from typing import Dict
+
+
+class TokenBucket:
+    """
+    @class TokenBucket
+    @brief A bucket holding up to capacity units, refilled at capacity units per minute.
+    @note This class is not thread safe, RateLimiter serializes the accesses.
+
+    @param capacity The number of units allowed per minute.
+    """
+
+    def __init__(self, capacity: float):
+        """
+        @brief Initializes a full TokenBucket.
+
+        @param capacity The number of units allowed per minute.
+        """
+        self.capacity: float = capacity
+        self.available: float = capacity
+        self._last_refill: float = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        """
+        @brief Adds the units accumulated since the last refill.
+        """
+        self.available = min(self.capacity, self.available + (now - self._last_refill) * self.capacity / 60.0)
+        self._last_refill = now
+
+    def get_wait_seconds(self, amount: float) -> float:
+        """
+        @brief Provides the time to wait before amount units are available.
+        @details An amount bigger than the capacity only waits for a full bucket, otherwise it could never be sent.
+        """
+        missing: float = min(amount, self.capacity) - self.available
+        return 0.0 if missing <= 0 else missing * 60.0 / self.capacity
+
+    def consume(self, amount: float) -> None:
+        """
+        @brief Removes units from the bucket, which may become negative after a reconciliation.
+        """
+        self.available -= amount
+
+    def limit_available(self, remaining: float) -> None:
+        """
+        @brief Lowers the available units to what the endpoint reports as remaining.
+        """
+        self.available = min(self.available, remaining)
+
+
+class RateLimiter:
+    """
+    @class RateLimiter
+    @brief Enforces requests per minute and tokens per minute quotas shared by all the requests sent to one endpoint.
+
+    @param logger A logger instance for logging messages.
+    @param requests_per_minute The requests per minute quota, None for no limit.
+    @param tokens_per_minute The tokens per minute quota, None for no limit.
+    """
+
+    """
+    @brief Limiters shared per endpoint, see get_shared.
+    """
+    _shared_limiters: Dict = {}
+    _shared_limiters_lock: threading.Lock = threading.Lock()
+
+    def __init__(self, logger: Logger, requests_per_minute: int = None, tokens_per_minute: int = None):
+        """
+        @brief Initializes the RateLimiter object.
+
+        @param logger A logger instance for logging messages.
+        @param requests_per_minute The requests per minute quota, None for no limit.
+        @param tokens_per_minute The tokens per minute quota, None for no limit.
+        """
+        self.logger: Logger = logger
+        self.request_bucket: TokenBucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket: TokenBucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._paused_until: float = 0.0
+        self._lock: threading.Lock = threading.Lock()
+
+    @classmethod
+    def get_shared(cls, endpoint: str, logger: Logger, requests_per_minute: int = None, tokens_per_minute: int = None) -> 'RateLimiter':
+        """
+        @brief Provides the limiter of an endpoint, creating it on first use.
+
+        @param endpoint The identifier of the endpoint, typically its base URL.
+        @param logger A logger instance for logging messages.
+        @param requests_per_minute The requests per minute quota of the endpoint, None for no limit.
+        @param tokens_per_minute The tokens per minute quota of the endpoint, None for no limit.
+        @return The limiter shared by all the requests sent to the endpoint.
+        """
+        with cls._shared_limiters_lock:
+            if endpoint not in cls._shared_limiters:
+                cls._shared_limiters[endpoint] = RateLimiter(logger, requests_per_minute, tokens_per_minute)
+            return cls._shared_limiters[endpoint]
+
+    def _reserve(self, estimated_tokens: int) -> float:
+        """
+        @brief Charges one request and its estimated tokens if the quotas allow it.
+
+        @return 0 if the request was charged, otherwise the time to wait before trying again.
+        """
+        with self._lock:
+            now: float = time.monotonic()
+            wait_seconds: float = max(0.0, self._paused_until - now)
+            for bucket, amount in [(self.request_bucket, 1), (self.token_bucket, estimated_tokens)]:
+                if bucket is not None:
+                    bucket.refill(now)
+                    wait_seconds = max(wait_seconds, bucket.get_wait_seconds(amount))
+            if wait_seconds > 0:
+                return wait_seconds
+            if self.request_bucket is not None:
+                self.request_bucket.consume(1)
+            if self.token_bucket is not None:
+                self.token_bucket.consume(estimated_tokens)
+            return 0.0
+
+    def acquire(self, estimated_tokens: int) -> None:
+        """
+        @brief Blocks until a request of estimated_tokens tokens can be sent, then charges it.
+
+        @param estimated_tokens The estimated number of tokens of the request.
+        """
+        wait_seconds: float = self._reserve(estimated_tokens)
+        while wait_seconds > 0:
+            self.logger.debug(f"Rate limit reached, waiting {wait_seconds:.2f} seconds.")
+            time.sleep(wait_seconds)
+            wait_seconds = self._reserve(estimated_tokens)
+
+    async def acquire_asynchronously(self, estimated_tokens: int) -> None:
+        """
+        @brief Waits on the event loop until a request of estimated_tokens tokens can be sent, then charges it.
+
+        @param estimated_tokens The estimated number of tokens of the request.
+        """
+        wait_seconds: float = self._reserve(estimated_tokens)
+        while wait_seconds > 0:
+            self.logger.debug(f"Rate limit reached, waiting {wait_seconds:.2f} seconds.")
+            await asyncio.sleep(wait_seconds)
+            wait_seconds = self._reserve(estimated_tokens)
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """
+        @brief Corrects the tokens charged for a request with the usage reported by the endpoint.
+
+        @param estimated_tokens The tokens charged when the request was acquired.
+        @param actual_tokens The tokens reported by the endpoint, None if unknown.
+        """
+        if self.token_bucket is None or actual_tokens is None:
+            return
+        with self._lock:
+            self.token_bucket.consume(actual_tokens - estimated_tokens)
+
+    def update_from_headers(self, headers) -> None:
+        """
+        @brief Lowers the available quotas to the remaining ones reported by the endpoint rate limit headers.
+
+        @param headers The response headers, a mapping with case insensitive keys.
+        """
+        with self._lock:
+            for bucket, header_name in [(self.request_bucket, 'x-ratelimit-remaining-requests'), \
+                                        (self.token_bucket, 'x-ratelimit-remaining-tokens')]:
+                remaining = headers.get(header_name) if headers is not None else None
+                if bucket is not None and remaining is not None:
+                    try:
+                        bucket.limit_available(float(remaining))
+                    except ValueError:
+                        pass
+
+    def pause(self, seconds: float) -> None:
+        """
+        @brief Holds every request to the endpoint for a while, typically after it answered with Retry-After.
+
+        @param seconds The time to hold the requests.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def get_pause_seconds(self) -> float:
+        """
+        @brief Provides the time the requests to the endpoint are still held for.
+
+        @return The remaining time of the pause, 0 if the requests are not held.
+        """
+        with self._lock:
+            return max(0.0, self._paused_until - time.monotonic())
+
+    @staticmethod
+    def parse_duration(duration: str) -> float:
+        """
+        @brief Parses the durations found in rate limit headers: plain seconds ("1.5") or compound ones ("6m0s", "20ms").
+
+        @param duration The duration text.
+        @return The duration in seconds, None if it cannot be parsed.
+        """
+        if duration is None:
+            return None
+        duration = duration.strip()
+        try:
+            return float(duration)
+        except ValueError:
+            pass
+        units: Dict = {'h': 3600.0, 'm': 60.0, 's': 1.0, 'ms': 0.001}
+        parts = re.findall(r'([0-9.]+)(ms|h|m|s)', duration)
+        if len(parts) == 0 or ''.join(value + unit for value, unit in parts) != duration:
+            return None
+        return sum(float(value) * units[unit] for value, unit in parts)
@@ -0,0 +1,433 @@
+"""
+@file run_metrics.py
+@brief This module provides the RunMetrics class, which accounts for the time, tokens and bytes spent on each file of a run.
+@details Records are kept per target file and per request sent to the LLM. At the end of the run they are summarized
+         with latency percentiles and throughput, written as JSON and optionally as a Prometheus textfile.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from logging import Logger
+from typing import Dict, List
+
+
+class RunMetrics:
+    """
+    @class RunMetrics
+    @brief This class records the metrics of every file and request of a run, from any thread.
+
+    File outcomes:
+    - written: the target file was committed.
+    - up_to_date: the target file was generated from the same inputs by a previous run.
+    - too_big: the file does not fit in the context window of the model even once split.
+    - failed: the request or the output failed.
+    - deduplicated: the target file was duplicated from the output of an identical request, which was sent once.
+
+    @param logger A logger instance for logging messages.
+    @param jobs The number of files processed concurrently, against which the makespan of the run is measured.
+    """
+
+    """
+    @brief Percentiles reported for latencies and queue waits.
+    """
+    percentiles: List[float] = [0.5, 0.95, 0.99]
+
+    """
+    @brief Number of files listed in the summary as the biggest token consumers.
+    """
+    top_files_count: int = 10
+
+    def __init__(self, logger: Logger, jobs: int = 1):
+        """
+        @brief Initializes the RunMetrics object, the run duration is measured from here.
+
+        @param logger A logger instance for logging messages.
+        @param jobs The number of files processed concurrently, against which the makespan of the run is measured.
+        """
+        self.logger: Logger = logger
+        self.jobs: int = max(1, jobs if jobs is not None else 1)
+        self.started_at: float = time.time()
+        self._start: float = time.perf_counter()
+        self._duration_seconds: float = None
+        self._files: Dict[str, Dict] = {}
+        self._requests: List[Dict] = []
+        self._lock: threading.Lock = threading.Lock()
+
+    def _get_file_record(self, to_file: str) -> Dict:
+        """
+        @brief Provides the record of a target file, created if needed. The lock must be held.
+
+        @param to_file The target file.
+        @return The record of the file.
+        """
+        file_record: Dict = self._files.get(to_file)
+        if file_record is None:
+            file_record = {
+                'to_file': to_file, 'from_file': None, 'request_id': None, 'model_name': None, 'outcome': None,
+                'queue_wait_seconds': None, 'processing_seconds': None, 'latency_seconds': 0.0, 'rate_limit_wait_seconds': 0.0,
+                'requests': 0, 'cached_requests': 0, 'retries': 0,
+                'prompt_tokens': 0, 'completion_tokens': 0, 'cached_tokens': 0, 'output_bytes': None,
+                'content_tokens': None, 'minified_content_tokens': None
+            }
+            self._files[to_file] = file_record
+        return file_record
+
+    def record_file_source(self, to_file: str, from_file: str, request_id: int) -> None:
+        """
+        @brief Records the source file and the code request of a target file whose request is never queued: up to date, duplicated or unreadable.
+
+        @param to_file The target file.
+        @param from_file The source file.
+        @param request_id The id of the code request.
+        """
+        with self._lock:
+            file_record: Dict = self._get_file_record(to_file)
+            file_record['from_file'] = from_file
+            file_record['request_id'] = request_id
+
+    def record_file_queued(self, to_file: str, from_file: str, request_id: int, model_name: str = None) -> None:
+        """
+        @brief Records that the request of a file is built and waits for a sender.
+
+        @param to_file The target file.
+        @param from_file The source file.
+        @param request_id The id of the code request.
+        @param model_name The model the file is sent to.
+        """
+        with self._lock:
+            file_record: Dict = self._get_file_record(to_file)
+            file_record['from_file'] = from_file
+            file_record['request_id'] = request_id
+            file_record['model_name'] = model_name
+            file_record['_queued_at'] = time.perf_counter()
+
+    def record_file_minified(self, to_file: str, content_tokens: int, minified_content_tokens: int) -> None:
+        """
+        @brief Records the estimated tokens of the content of a file before and after its minification.
+
+        @param to_file The target file.
+        @param content_tokens The tokens of the content read.
+        @param minified_content_tokens The tokens of the content sent.
+        """
+        with self._lock:
+            file_record: Dict = self._get_file_record(to_file)
+            file_record['content_tokens'] = content_tokens
+            file_record['minified_content_tokens'] = minified_content_tokens
+
+    def record_file_sent(self, to_file: str) -> None:
+        """
+        @brief Records that a sender picked the request of a file up, ending its queue wait.
+
+        @param to_file The target file.
+        """
+        with self._lock:
+            file_record: Dict = self._get_file_record(to_file)
+            queued_at: float = file_record.pop('_queued_at', None)
+            file_record['_sent_at'] = time.perf_counter()
+            if queued_at is not None:
+                file_record['queue_wait_seconds'] = file_record['_sent_at'] - queued_at
+
+    def record_response(self, to_file: str, response: Dict) -> None:
+        """
+        @brief Records one response received for a file.
+
+        @param to_file The target file.
+        @param response The response as returned by the LLM access, with its optional 'usage', 'latency_seconds',
+                        'rate_limit_wait_seconds', 'retries' and 'cached' entries.
+        """
+        usage: Dict = response.get('usage') or {}
+        request_record: Dict = {
+            'to_file': to_file,
+            'request_name': response.get('request_name'),
+            'cached': response.get('cached', False),
+            'latency_seconds': response.get('latency_seconds'),
+            'rate_limit_wait_seconds': response.get('rate_limit_wait_seconds', 0.0),
+            'retries': response.get('retries', 0),
+            'prompt_tokens': usage.get('prompt_tokens'),
+            'completion_tokens': usage.get('completion_tokens'),
+            'cached_tokens': usage.get('cached_tokens')
+        }
+        with self._lock:
+            self._requests.append(request_record)
+            file_record: Dict = self._get_file_record(to_file)
+            if '_sent_at' in file_record:
+                file_record['_received_at'] = time.perf_counter()
+                file_record['processing_seconds'] = file_record['_received_at'] - file_record['_sent_at']
+            file_record['requests'] += 1
+            file_record['cached_requests'] += 1 if request_record['cached'] else 0
+            file_record['retries'] += request_record['retries']
+            file_record['latency_seconds'] += request_record['latency_seconds'] or 0.0
+            file_record['rate_limit_wait_seconds'] += request_record['rate_limit_wait_seconds']
+            for token_type in ['prompt_tokens', 'completion_tokens', 'cached_tokens']:
+                file_record[token_type] += request_record[token_type] or 0
+
+    def record_file_outcome(self, to_file: str, outcome: str, output_bytes: int = None) -> None:
+        """
+        @brief Records how the processing of a file ended.
+
+        @param to_file The target file.
+        @param outcome The outcome, see the class description.
+        @param output_bytes The size of the target file once written.
+        """
+        with self._lock:
+            file_record: Dict = self._get_file_record(to_file)
+            file_record['outcome'] = outcome
+            if output_bytes is not None:
+                file_record['output_bytes'] = output_bytes
+
+    def finish(self) -> None:
+        """
+        @brief Ends the run: its duration is measured until now.
+        """
+        self._duration_seconds = time.perf_counter() - self._start
+
+    @staticmethod
+    def get_percentile(sorted_values: List[float], fraction: float) -> float:
+        """
+        @brief Computes a percentile with the nearest rank method.
+
+        @param sorted_values The values, sorted.
+        @param fraction The percentile, between 0 and 1.
+        @return The percentile, None if there is no value.
+        """
+        if len(sorted_values) == 0:
+            return None
+        return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+    def _describe_distribution(self, values: List[float]) -> Dict:
+        """
+        @brief Summarizes a list of durations.
+
+        @param values The durations in seconds.
+        @return The count, mean, maximum and percentiles of the durations.
+        """
+        sorted_values: List[float] = sorted(values)
+        distribution: Dict = {
+            'count': len(sorted_values),
+            'mean': sum(sorted_values) / len(sorted_values) if len(sorted_values) > 0 else None,
+            'max': sorted_values[-1] if len(sorted_values) > 0 else None
+        }
+        for fraction in self.percentiles:
+            distribution[f'p{round(fraction * 100)}'] = self.get_percentile(sorted_values, fraction)
+        return distribution
+
+    def _summarize_schedule(self, file_records: List[Dict]) -> Dict:
+        """
+        @brief Compares the time spent processing the files with the best time the jobs could have achieved.
+        @details A file is processed from the time a sender picks it up until its last response. No schedule can end before
+                 the longest file, nor before the total processing time shared by all the jobs: the efficiency is that
+                 lower bound divided by the measured makespan, from the first file sent to the last response received.
+
+        @param file_records The records of the files, with their private timestamps. The lock must be held.
+        @return The makespan, its lower bound and the efficiency, None if no file was processed.
+        """
+        processed_records: List[Dict] = [file_record for file_record in file_records if '_received_at' in file_record]
+        if len(processed_records) == 0:
+            return None
+        processing_seconds: List[float] = [file_record['processing_seconds'] for file_record in processed_records]
+        makespan_seconds: float = max(file_record['_received_at'] for file_record in processed_records) - \
+            min(file_record['_sent_at'] for file_record in processed_records)
+        lower_bound_seconds: float = max(sum(processing_seconds) / self.jobs, max(processing_seconds))
+        return {
+            'jobs': self.jobs,
+            'processed_files': len(processed_records),
+            'processing_seconds': sum(processing_seconds),
+            'longest_file_seconds': max(processing_seconds),
+            'makespan_seconds': makespan_seconds,
+            'lower_bound_seconds': lower_bound_seconds,
+            'efficiency': min(1.0, lower_bound_seconds / makespan_seconds) if makespan_seconds > 0 else None
+        }
+
+    def _summarize_models(self, files: List[Dict], requests: List[Dict]) -> Dict:
+        """
+        @brief Summarizes the files and requests sent to each model.
+
+        @param files The records of the files.
+        @param requests The records of the requests.
+        @return The files, requests, tokens and latency distribution of each model, by model name.
+        """
+        model_names: Dict[str, str] = {file_record['to_file']: file_record['model_name'] for file_record in files \
+                                       if file_record['model_name'] is not None}
+        models: Dict[str, Dict] = {}
+        for model_name in sorted(set(model_names.values())):
+            model_requests: List[Dict] = [request for request in requests if model_names.get(request['to_file']) == model_name]
+            models[model_name] = {
+                'files': sum(1 for file_model_name in model_names.values() if file_model_name == model_name),
+                'requests': len(model_requests),
+                'cached_requests': sum(1 for request in model_requests if request['cached']),
+                'prompt_tokens': sum(request['prompt_tokens'] or 0 for request in model_requests),
+                'completion_tokens': sum(request['completion_tokens'] or 0 for request in model_requests),
+                'request_latency_seconds': self._describe_distribution([request['latency_seconds'] for request in model_requests \
+                                                                        if not request['cached'] and request['latency_seconds'] is not None])
+            }
+        return models
+
+    def summarize(self) -> Dict:
+        """
+        @brief Summarizes the run.
+
+        @return The summary, with the totals, the latency and queue wait distributions, the throughput, the makespan,
+                the figures of each model, the biggest token consumers and the record of every file.
+        """
+        duration_seconds: float = self._duration_seconds if self._duration_seconds is not None else time.perf_counter() - self._start
+        with self._lock:
+            files: List[Dict] = [{key: value for key, value in file_record.items() if not key.startswith('_')} \
+                                 for file_record in self._files.values()]
+            requests: List[Dict] = list(self._requests)
+            schedule: Dict = self._summarize_schedule(list(self._files.values()))
+
+        sent_requests: List[Dict] = [request for request in requests if not request['cached'] and request['latency_seconds'] is not None]
+        outcomes: Dict[str, int] = {}
+        for file_record in files:
+            outcome: str = file_record['outcome'] or 'unfinished'
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        minified_files: List[Dict] = [file_record for file_record in files if file_record['minified_content_tokens'] is not None]
+        totals: Dict = {
+            'files': len(files),
+            'requests': len(requests),
+            'cached_requests': sum(1 for request in requests if request['cached']),
+            'retries': sum(request['retries'] for request in requests),
+            'prompt_tokens': sum(request['prompt_tokens'] or 0 for request in requests),
+            'completion_tokens': sum(request['completion_tokens'] or 0 for request in requests),
+            'cached_tokens': sum(request['cached_tokens'] or 0 for request in requests),
+            'requests_without_usage': sum(1 for request in requests if request['prompt_tokens'] is None),
+            'output_bytes': sum(file_record['output_bytes'] or 0 for file_record in files),
+            'rate_limit_wait_seconds': sum(request['rate_limit_wait_seconds'] for request in requests),
+            'minified_files': len(minified_files),
+            'minification_saved_tokens': sum(file_record['content_tokens'] - file_record['minified_content_tokens'] for file_record in minified_files)
+        }
+        generation_rates: List[float] = sorted(request['completion_tokens'] / request['latency_seconds'] for request in sent_requests \
+                                               if request['completion_tokens'] and request['latency_seconds'] > 0)
+        return {
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(self.started_at)),
+            'duration_seconds': duration_seconds,
+            'outcomes': outcomes,
+            'totals': totals,
+            'throughput': {
+                'files_per_second': outcomes.get('written', 0) / duration_seconds if duration_seconds > 0 else None,
+                'completion_tokens_per_second': totals['completion_tokens'] / duration_seconds if duration_seconds > 0 else None,
+                'median_request_completion_tokens_per_second': self.get_percentile(generation_rates, 0.5)
+            },
+            'request_latency_seconds': self._describe_distribution([request['latency_seconds'] for request in sent_requests]),
+            'queue_wait_seconds': self._describe_distribution([file_record['queue_wait_seconds'] for file_record in files \
+                                                               if file_record['queue_wait_seconds'] is not None]),
+            'schedule': schedule,
+            'models': self._summarize_models(files, requests),
+            'top_files_by_tokens': [
+                {'to_file': file_record['to_file'], 'total_tokens': file_record['prompt_tokens'] + file_record['completion_tokens']} \
+                for file_record in sorted(files, key=lambda file_record: file_record['prompt_tokens'] + file_record['completion_tokens'], \
+                                          reverse=True)[:self.top_files_count] \
+                if file_record['prompt_tokens'] + file_record['completion_tokens'] > 0
+            ],
+            'files': files
+        }
+
+    def log_summary(self, summary: Dict = None) -> None:
+        """
+        @brief Logs the main figures of the run.
+
+        @param summary The summary as returned by summarize, computed if not set.
+        """
+        summary = summary if summary is not None else self.summarize()
+        totals: Dict = summary['totals']
+        latency: Dict = summary['request_latency_seconds']
+        outcomes: str = ', '.join(f'{count} {outcome}' for outcome, count in sorted(summary['outcomes'].items()))
+        self.logger.info(f"Run metrics: {totals['files']} files ({outcomes or 'none'}) in {summary['duration_seconds']:.1f} s, "
+                         f"{totals['requests']} requests ({totals['cached_requests']} cached, {totals['retries']} retries), "
+                         f"{totals['prompt_tokens']} prompt and {totals['completion_tokens']} completion tokens")
+        if totals['minified_files'] > 0:
+            content_tokens: int = sum(file_record['content_tokens'] for file_record in summary['files'] if file_record['content_tokens'] is not None)
+            self.logger.info(f"Prompt minification: {totals['minification_saved_tokens']} content tokens saved on {totals['minified_files']} files "
+                             f"({totals['minification_saved_tokens'] * 100 / max(1, content_tokens):.1f}% of their {content_tokens} tokens, estimated)")
+        if latency['count'] > 0:
+            self.logger.info(f"Request latency: p50 {latency['p50']:.2f} s, p95 {latency['p95']:.2f} s, p99 {latency['p99']:.2f} s")
+        if len(summary['models']) > 1:
+            for model_name, model in summary['models'].items():
+                model_latency: Dict = model['request_latency_seconds']
+                latency_text: str = f", p50 {model_latency['p50']:.2f} s, p95 {model_latency['p95']:.2f} s" if model_latency['count'] > 0 else ''
+                self.logger.info(f"Model {model_name}: {model['files']} files, {model['requests']} requests ({model['cached_requests']} cached), "
+                                 f"{model['prompt_tokens']} prompt and {model['completion_tokens']} completion tokens{latency_text}")
+        schedule: Dict = summary['schedule']
+        if schedule is not None and schedule['jobs'] > 1 and schedule['efficiency'] is not None:
+            self.logger.info(f"Schedule: {schedule['processed_files']} files processed in {schedule['makespan_seconds']:.1f} s by {schedule['jobs']} jobs, "
+                             f"lower bound {schedule['lower_bound_seconds']:.1f} s (longest file {schedule['longest_file_seconds']:.1f} s), "
+                             f"efficiency {schedule['efficiency'] * 100:.0f}%")
+
+    @staticmethod
+    def _write_atomically(file_name: str, content: str) -> None:
+        """
+        @brief Writes a file through a temporary file renamed over it, so that readers never see a partial file.
+
+        @param file_name The name of the file.
+        @param content The content of the file.
+        """
+        directory: str = os.path.dirname(file_name)
+        if len(directory) > 0:
+            os.makedirs(directory, exist_ok=True)
+        temporary_file_name: str = f'{file_name}.{os.getpid()}.tmp'
+        with open(temporary_file_name, 'w', encoding='utf-8') as file:
+            file.write(content)
+        os.replace(temporary_file_name, file_name)
+
+    def write_summary(self, file_name: str, summary: Dict = None) -> None:
+        """
+        @brief Writes the summary of the run as JSON.
+
+        @param file_name The name of the JSON file.
+        @param summary The summary as returned by summarize, computed if not set.
+        """
+        summary = summary if summary is not None else self.summarize()
+        self._write_atomically(file_name, json.dumps(summary, indent=2))
+        self.logger.info(f"Run metrics written to {file_name}")
+
+    def write_prometheus_textfile(self, file_name: str, summary: Dict = None) -> None:
+        """
+        @brief Writes the totals of the run in the Prometheus text format, for the textfile collector of the node exporter.
+
+        @param file_name The name of the file, ending with .prom to be picked up by the collector.
+        @param summary The summary as returned by summarize, computed if not set.
+        """
+        summary = summary if summary is not None else self.summarize()
+        totals: Dict = summary['totals']
+        lines: List[str] = []
+
+        def add_metric(name: str, metric_type: str, description: str, samples: List[tuple]) -> None:
+            lines.append(f'# HELP gpt2code_{name} {description}')
+            lines.append(f'# TYPE gpt2code_{name} {metric_type}')
+            for labels, value in samples:
+                if value is None:
+                    continue
+                label_text: str = ','.join(f'{label}="{label_value}"' for label, label_value in labels.items())
+                lines.append(f'gpt2code_{name}{{{label_text}}} {value}' if len(label_text) > 0 else f'gpt2code_{name} {value}')
+
+        add_metric('run_duration_seconds', 'gauge', 'Duration of the last run.', [({}, summary['duration_seconds'])])
+        add_metric('run_started_timestamp_seconds', 'gauge', 'Start time of the last run.', [({}, self.started_at)])
+        add_metric('files', 'gauge', 'Files of the last run by outcome.', \
+                   [({'outcome': outcome}, count) for outcome, count in sorted(summary['outcomes'].items())])
+        add_metric('requests', 'gauge', 'Requests of the last run.', [({'cached': 'false'}, totals['requests'] - totals['cached_requests']), \
+                                                                      ({'cached': 'true'}, totals['cached_requests'])])
+        add_metric('request_retries', 'gauge', 'Retried requests of the last run.', [({}, totals['retries'])])
+        add_metric('tokens', 'gauge', 'Tokens of the last run by type.', [({'type': 'prompt'}, totals['prompt_tokens']), \
+                                                                          ({'type': 'completion'}, totals['completion_tokens']), \
+                                                                          ({'type': 'cached'}, totals['cached_tokens'])])
+        add_metric('model_tokens', 'gauge', 'Tokens of the last run by model and type.', \
+                   [({'model': model_name, 'type': token_type}, model[f'{token_type}_tokens']) \
+                    for model_name, model in summary['models'].items() for token_type in ['prompt', 'completion']])
+        add_metric('minification_saved_tokens', 'gauge', 'Estimated content tokens removed by the prompt minification of the last run.', \
+                   [({}, totals['minification_saved_tokens'])])
+        add_metric('output_bytes', 'gauge', 'Bytes written by the last run.', [({}, totals['output_bytes'])])
+        add_metric('rate_limit_wait_seconds', 'gauge', 'Time requests of the last run were held by the client side rate limiter.', \
+                   [({}, totals['rate_limit_wait_seconds'])])
+        for name, description in [('request_latency_seconds', 'Latency of the requests of the last run.'), \
+                                  ('queue_wait_seconds', 'Time the files of the last run waited for a sender.')]:
+            distribution: Dict = summary[name]
+            add_metric(name, 'summary', description, \
+                       [({'quantile': str(fraction)}, distribution[f'p{round(fraction * 100)}']) for fraction in self.percentiles])
+            lines.append(f"gpt2code_{name}_count {distribution['count']}")
+            if distribution['mean'] is not None:
+                lines.append(f"gpt2code_{name}_sum {distribution['mean'] * distribution['count']}")
+        self._write_atomically(file_name, '\n'.join(lines) + '\n')
+        self.logger.info(f"Prometheus metrics written to {file_name}")
@@ -0,0 +1,439 @@
+"""
+@file run_planner.py
+@brief This module provides the RunPlanner class, which estimates a run without sending any request, and the RunPlan class, which restricts a later run to the planned files.
+@details The planner is fed with the exact messages the run would send, built by the same pipeline, so that the files
+         matched, the chunks and the prompts are those of the real run. It projects the output tokens, the cost and
+         the wall time at the given concurrency and rate limits, and flags the files which do not fit in the context
+         window of the model. Very large trees can be planned on a sample of their files, the totals being extrapolated.
+"""
+
+import json
+import math
+import os
+import time
+from logging import Logger
+from typing import Dict, List, Set, Tuple
+
+from domain.itoken_estimator import ITokenEstimator
+
+
+class RunPlanner:
+    """
+    @class RunPlanner
+    @brief This class gathers the estimates of every file of a run and projects its tokens, cost and wall time.
+
+    @param logger A logger instance for logging messages.
+    @param token_estimator The estimator counting the prompt tokens.
+    @param model_name The name of the LLM model.
+    @param context_window_tokens The context window of the model, in tokens.
+    @param sample_fraction The share of the source files planned, the totals being extrapolated to the whole tree.
+    @param jobs The number of requests in flight at once.
+    @param requests_per_minute The requests per minute quota of the endpoint, None for no limit.
+    @param tokens_per_minute The tokens per minute quota of the endpoint, None for no limit.
+    @param token_prices The prices of one million input and output tokens of every model, looked up from the model names if not set.
+    @param output_ratio The number of output tokens projected per token of file content.
+    """
+
+    """
+    @brief Version of the plan format.
+    """
+    plan_version: int = 1
+
+    """
+    @brief Prices in USD of one million input and output tokens of well known models. Model names are matched by prefix, longest first.
+    """
+    model_token_prices: Dict = {
+        'gpt-4o-mini': (0.15, 0.60),
+        'gpt-4o': (2.50, 10.00),
+        'gpt-4.1-nano': (0.10, 0.40),
+        'gpt-4.1-mini': (0.40, 1.60),
+        'gpt-4.1': (2.00, 8.00),
+        'gpt-4-turbo': (10.00, 30.00),
+        'gpt-4': (30.00, 60.00),
+        'gpt-3.5-turbo': (0.50, 1.50),
+        'o1-mini': (1.10, 4.40),
+        'o1': (15.00, 60.00),
+        'o3-mini': (1.10, 4.40)
+    }
+
+    """
+    @brief Output tokens projected per token of file content: most code requests return the whole file transformed.
+    """
+    default_output_ratio: float = 1.0
+
+    """
+    @brief Time to the first token assumed for each request, in seconds.
+    """
+    assumed_latency_seconds: float = 1.0
+
+    """
+    @brief Generation rate assumed for each request, in tokens per second.
+    """
+    assumed_output_tokens_per_second: float = 50.0
+
+    """
+    @brief Number of files listed in the log for each kind of issue.
+    """
+    logged_files_count: int = 10
+
+    def __init__(self, logger: Logger, token_estimator: ITokenEstimator, model_name: str, context_window_tokens: int, \
+                 sample_fraction: float = 1.0, jobs: int = 1, requests_per_minute: int = None, tokens_per_minute: int = None, \
+                 token_prices: Tuple[float, float] = None, output_ratio: float = None):
+        """
+        @brief Initializes the RunPlanner object.
+
+        @param logger A logger instance for logging messages.
+        @param token_estimator The estimator counting the prompt tokens.
+        @param model_name The name of the LLM model.
+        @param context_window_tokens The context window of the model, in tokens.
+        @param sample_fraction The share of the source files planned, the totals being extrapolated to the whole tree.
+        @param jobs The number of requests in flight at once.
+        @param requests_per_minute The requests per minute quota of the endpoint, None for no limit.
+        @param tokens_per_minute The tokens per minute quota of the endpoint, None for no limit.
+        @param token_prices The prices of one million input and output tokens of every model, looked up from the model names if not set.
+        @param output_ratio The number of output tokens projected per token of file content.
+        """
+        self.logger: Logger = logger
+        self.token_estimator: ITokenEstimator = token_estimator
+        self.model_name: str = model_name
+        self.context_window_tokens: int = context_window_tokens
+        self.sample_fraction: float = sample_fraction if sample_fraction is not None else 1.0
+        self.jobs: int = max(1, jobs if jobs is not None else 1)
+        self.requests_per_minute: int = requests_per_minute
+        self.tokens_per_minute: int = tokens_per_minute
+        self.token_prices: Tuple[float, float] = token_prices if token_prices is not None else self.get_model_token_prices(model_name)
+        self._forced_token_prices: Tuple[float, float] = token_prices
+        self.output_ratio: float = output_ratio if output_ratio is not None else self.default_output_ratio
+        self.files: List[Dict] = []
+        self._discovered_file_tasks: int = 0
+        self._sampled_file_tasks: int = 0
+        self._discovered_source_files: int = 0
+        self._last_source_file: str = None
+        self._last_source_file_sampled: bool = False
+
+    @classmethod
+    def get_model_token_prices(cls, model_name: str) -> Tuple[float, float]:
+        """
+        @brief Looks up the prices of a model.
+
+        @param model_name The name of the LLM model.
+        @return The prices of one million input and output tokens in USD, None if the model is unknown.
+        """
+        normalized_model_name: str = (model_name or '').lower().split('/')[-1]
+        for known_model_name in sorted(cls.model_token_prices, key=len, reverse=True):
+            if normalized_model_name.startswith(known_model_name):
+                return cls.model_token_prices[known_model_name]
+        return None
+
+    def is_sampled(self, from_file: str) -> bool:
+        """
+        @brief Tells whether a discovered file task is part of the sample, and counts it.
+        @details Source files are sampled systematically in discovery order, the first one always being part of the
+                 sample, so that the sample spreads over the whole tree and two plans of the same tree agree.
+                 The tasks of one source file follow each other and share its decision.
+
+        @param from_file The source file of the task.
+        @return True if the task shall be planned.
+        """
+        if from_file != self._last_source_file:
+            self._last_source_file = from_file
+            self._last_source_file_sampled = math.ceil((self._discovered_source_files + 1) * self.sample_fraction) > \
+                math.ceil(self._discovered_source_files * self.sample_fraction)
+            self._discovered_source_files += 1
+        self._discovered_file_tasks += 1
+        if self._last_source_file_sampled:
+            self._sampled_file_tasks += 1
+        return self._last_source_file_sampled
+
+    def record_up_to_date(self, from_file: str, to_file: str, request_id: int) -> None:
+        """
+        @brief Records a file the incremental mode would skip.
+
+        @param from_file The source file, relative to the source directory.
+        @param to_file The target file.
+        @param request_id The id of the code request.
+        """
+        self.files.append({'from_file': from_file, 'to_file': to_file, 'request_id': request_id, 'status': 'up_to_date', \
+                           'content_tokens': 0, 'prompt_tokens': 0, 'requests': 0, 'projected_output_tokens': 0, 'largest_request_tokens': 0})
+
+    def record_duplicate(self, from_file: str, to_file: str, request_id: int, leader_to_file: str) -> None:
+        """
+        @brief Records a file identical to a previous one, whose output would be duplicated instead of requested.
+
+        @param from_file The source file, relative to the source directory.
+        @param to_file The target file.
+        @param request_id The id of the code request.
+        @param leader_to_file The target file of the identical request.
+        """
+        self.files.append({'from_file': from_file, 'to_file': to_file, 'request_id': request_id, 'status': 'duplicate', 'duplicate_of': leader_to_file, \
+                           'content_tokens': 0, 'prompt_tokens': 0, 'requests': 0, 'projected_output_tokens': 0, 'largest_request_tokens': 0})
+
+    def record_unreadable(self, from_file: str, to_file: str, request_id: int) -> None:
+        """
+        @brief Records a file which cannot be read, or is not UTF-8, and would fail.
+
+        @param from_file The source file, relative to the source directory.
+        @param to_file The target file.
+        @param request_id The id of the code request.
+        """
+        self.files.append({'from_file': from_file, 'to_file': to_file, 'request_id': request_id, 'status': 'unreadable', \
+                           'content_tokens': 0, 'prompt_tokens': 0, 'requests': 0, 'projected_output_tokens': 0, 'largest_request_tokens': 0})
+
+    def record_file(self, from_file: str, to_file: str, request_id: int, chunk_contents: List[str], chunk_messages: List[List], \
+                    model_name: str = None, context_window_tokens: int = None) -> None:
+        """
+        @brief Records the requests a file would be sent as.
+
+        @param from_file The source file, relative to the source directory.
+        @param to_file The target file.
+        @param request_id The id of the code request.
+        @param chunk_contents The file content of each request, several when the file is split.
+        @param chunk_messages The messages of each request.
+        @param model_name The model the file would be sent to, the model of the run if not set.
+        @param context_window_tokens The context window of that model, the one of the run if not set.
+        """
+        content_tokens: List[int] = [self.token_estimator.estimate_tokens(chunk_content) for chunk_content in chunk_contents]
+        prompt_tokens: List[int] = [self.token_estimator.estimate_message_tokens(messages) for messages in chunk_messages]
+        output_tokens: List[int] = [int(math.ceil(tokens * self.output_ratio)) for tokens in content_tokens]
+        request_tokens: List[int] = [prompt + output for prompt, output in zip(prompt_tokens, output_tokens)]
+        status: str = 'planned'
+        if max(request_tokens) > (context_window_tokens if context_window_tokens is not None else self.context_window_tokens):
+            status = 'over_limit'
+        elif len(chunk_contents) > 1:
+            status = 'split'
+        self.files.append({
+            'from_file': from_file,
+            'to_file': to_file,
+            'request_id': request_id,
+            'model_name': model_name if model_name is not None else self.model_name,
+            'status': status,
+            'content_tokens': sum(content_tokens),
+            'prompt_tokens': sum(prompt_tokens),
+            'requests': len(chunk_contents),
+            'projected_output_tokens': sum(output_tokens),
+            'largest_request_tokens': max(request_tokens)
+        })
+
+    def project_wall_time(self, request_count: int, output_tokens: int, total_tokens: int) -> Tuple[float, str]:
+        """
+        @brief Projects the wall time of the requests at the concurrency and rate limits of the run.
+        @details Each limit alone gives a lower bound of the wall time: the requests kept in flight by the jobs,
+                 the requests per minute and the tokens per minute. The largest one is the projection.
+
+        @param request_count The number of requests.
+        @param output_tokens The number of output tokens of all the requests.
+        @param total_tokens The number of prompt and output tokens of all the requests.
+        @return The projected wall time in seconds and the limit it is bound by.
+        """
+        bounds: Dict[str, float] = {
+            'concurrency': (request_count * self.assumed_latency_seconds + output_tokens / self.assumed_output_tokens_per_second) / self.jobs
+        }
+        if self.requests_per_minute is not None:
+            bounds['requests_per_minute'] = request_count / self.requests_per_minute * 60
+        if self.tokens_per_minute is not None:
+            bounds['tokens_per_minute'] = total_tokens / self.tokens_per_minute * 60
+        bottleneck: str = max(bounds, key=bounds.get)
+        return bounds[bottleneck], bottleneck
+
+    def project_cost(self, files_to_send: List[Dict], scale: float) -> Dict:
+        """
+        @brief Projects the cost of the requests, each file being priced at the prices of its model.
+
+        @param files_to_send The files of the sample whose requests would be sent.
+        @param scale The ratio of the discovered files to the sampled ones.
+        @return The projected cost in USD, with the cost of each model when several are used, None if the price of a model is unknown.
+        """
+        model_tokens: Dict[str, List[int]] = {self.model_name: [0, 0]} if len(files_to_send) == 0 else {}
+        for file in files_to_send:
+            tokens: List[int] = model_tokens.setdefault(file.get('model_name') or self.model_name, [0, 0])
+            tokens[0] += file['prompt_tokens']
+            tokens[1] += file['projected_output_tokens']
+        model_costs: Dict[str, Dict] = {}
+        for model_name, (prompt_tokens, output_tokens) in model_tokens.items():
+            token_prices: Tuple[float, float] = self._forced_token_prices if self._forced_token_prices is not None \
+                else self.get_model_token_prices(model_name)
+            if token_prices is None:
+                return None
+            model_costs[model_name] = {'input': int(round(prompt_tokens * scale)) * token_prices[0] / 1000000, \
+                                       'output': int(round(output_tokens * scale)) * token_prices[1] / 1000000}
+        input_cost: float = sum(model_cost['input'] for model_cost in model_costs.values())
+        output_cost: float = sum(model_cost['output'] for model_cost in model_costs.values())
+        cost: Dict = {'currency': 'USD', 'price_per_million_input_tokens': self.token_prices[0] if self.token_prices is not None else None, \
+                      'price_per_million_output_tokens': self.token_prices[1] if self.token_prices is not None else None, \
+                      'input': round(input_cost, 4), 'output': round(output_cost, 4), 'total': round(input_cost + output_cost, 4)}
+        if len(model_costs) > 1:
+            cost['models'] = {model_name: round(model_cost['input'] + model_cost['output'], 4) for model_name, model_cost in model_costs.items()}
+        return cost
+
+    def create_plan(self, source_directory: str, target_directory: str, code_request_ids: List[int]) -> Dict:
+        """
+        @brief Builds the plan of the run from the recorded files.
+
+        @param source_directory The source directory of the run.
+        @param target_directory The target directory of the run.
+        @param code_request_ids The ids of the code requests of the run.
+        @return The plan: the settings, the totals of the sample, the totals projected to the whole tree and the files.
+        """
+        files_to_send: List[Dict] = [file for file in self.files if file['status'] not in ['up_to_date', 'duplicate', 'unreadable']]
+        sampled: Dict = {
+            'file_tasks': len(self.files),
+            'up_to_date_files': sum(1 for file in self.files if file['status'] == 'up_to_date'),
+            'duplicate_files': sum(1 for file in self.files if file['status'] == 'duplicate'),
+            'unreadable_files': sum(1 for file in self.files if file['status'] == 'unreadable'),
+            'split_files': sum(1 for file in files_to_send if file['status'] == 'split'),
+            'over_limit_files': sum(1 for file in files_to_send if file['status'] == 'over_limit'),
+            'requests': sum(file['requests'] for file in files_to_send),
+            'prompt_tokens': sum(file['prompt_tokens'] for file in files_to_send),
+            'projected_output_tokens': sum(file['projected_output_tokens'] for file in files_to_send)
+        }
+        scale: float = self._discovered_file_tasks / self._sampled_file_tasks if self._sampled_file_tasks > 0 else 0.0
+        projected: Dict = {key: int(round(value * scale)) for key, value in sampled.items()}
+        wall_time_seconds, bottleneck = self.project_wall_time(projected['requests'], projected['projected_output_tokens'], \
+                                                               projected['prompt_tokens'] + projected['projected_output_tokens'])
+        cost: Dict = self.project_cost(files_to_send, scale)
+        return {
+            'version': self.plan_version,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'source_directory': os.path.abspath(source_directory),
+            'target_directory': os.path.abspath(target_directory),
+            'model_name': self.model_name,
+            'code_request_ids': list(code_request_ids),
+            'token_estimator': self.token_estimator.name,
+            'context_window_tokens': self.context_window_tokens,
+            'output_ratio': self.output_ratio,
+            'sample': {
+                'fraction': self.sample_fraction,
+                'discovered_file_tasks': self._discovered_file_tasks,
+                'sampled_file_tasks': self._sampled_file_tasks
+            },
+            'sampled': sampled,
+            'projected': projected,
+            'projection': {
+                'jobs': self.jobs,
+                'requests_per_minute': self.requests_per_minute,
+                'tokens_per_minute': self.tokens_per_minute,
+                'assumed_latency_seconds': self.assumed_latency_seconds,
+                'assumed_output_tokens_per_second': self.assumed_output_tokens_per_second,
+                'wall_time_seconds': round(wall_time_seconds, 1),
+                'bottleneck': bottleneck,
+                'cost': cost
+            },
+            'files': self.files
+        }
+
+    def log_plan(self, plan: Dict) -> None:
+        """
+        @brief Logs the main figures of a plan and the files which need attention.
+
+        @param plan The plan as returned by create_plan.
+        """
+        projected: Dict = plan['projected']
+        projection: Dict = plan['projection']
+        if plan['sample']['fraction'] < 1.0:
+            self.logger.info(f"Planned {plan['sample']['sampled_file_tasks']} of {plan['sample']['discovered_file_tasks']} files, "
+                             f"totals are extrapolated to the whole tree")
+        self.logger.info(f"Plan: {projected['file_tasks']} files ({projected['up_to_date_files']} up to date, {projected['duplicate_files']} duplicates, "
+                         f"{projected['unreadable_files']} unreadable, {projected['split_files']} split, "
+                         f"{projected['over_limit_files']} over the context window of {plan['context_window_tokens']} tokens), "
+                         f"{projected['requests']} requests, {projected['prompt_tokens']} prompt tokens and "
+                         f"{projected['projected_output_tokens']} projected output tokens ({plan['token_estimator']} estimator)")
+        cost: Dict = projection['cost']
+        models_text: str = ' (' + ', '.join(f"{model_name} {model_cost:.2f}" for model_name, model_cost in cost['models'].items()) + ')' \
+            if cost is not None and 'models' in cost else ''
+        self.logger.info(f"Projected cost: {cost['total']:.2f} {cost['currency']}{models_text}" if cost is not None else \
+                         f"Projected cost: unknown prices for the models of the run, see --token_prices")
+        self.logger.info(f"Projected wall time: {projection['wall_time_seconds'] / 60:.1f} minutes with {projection['jobs']} jobs, "
+                         f"bound by {projection['bottleneck'].replace('_', ' ')}")
+        for file in [file for file in plan['files'] if file['status'] == 'unreadable'][:self.logged_files_count]:
+            self.logger.warning(f"{file['from_file']} cannot be read and will fail")
+        for status, description in [('over_limit', 'does not fit in the context window even once split'), ('split', 'will be split')]:
+            files: List[Dict] = sorted([file for file in plan['files'] if file['status'] == status], \
+                                       key=lambda file: file['largest_request_tokens'], reverse=True)
+            for file in files[:self.logged_files_count]:
+                self.logger.warning(f"{file['from_file']} {description}: {file['content_tokens']} content tokens, "
+                                    f"largest request {file['largest_request_tokens']} tokens")
+            if len(files) > self.logged_files_count:
+                self.logger.warning(f"... and {len(files) - self.logged_files_count} more files which {description}")
+
+    @staticmethod
+    def write_plan(file_name: str, plan: Dict) -> None:
+        """
+        @brief Writes a plan to a JSON file.
+
+        @param file_name The file to write.
+        @param plan The plan as returned by create_plan.
+        """
+        directory: str = os.path.dirname(os.path.abspath(file_name))
+        os.makedirs(directory, exist_ok=True)
+        with open(file_name, 'w', encoding='utf-8') as file:
+            json.dump(plan, file, indent=2)
+
+
+class RunPlan:
+    """
+    @class RunPlan
+    @brief A plan written by RunPlanner, restricting a run to the files it planned.
+
+    @param plan The plan as returned by RunPlanner.create_plan.
+    """
+
+    def __init__(self, plan: Dict):
+        """
+        @brief Initializes the RunPlan object.
+
+        @param plan The plan as returned by RunPlanner.create_plan.
+        """
+        self.plan: Dict = plan
+        self._planned_files: Set[Tuple[str, int]] = {(file['from_file'], file['request_id']) for file in plan['files'] \
+                                                     if file['status'] != 'up_to_date'}
+
+    @classmethod
+    def load(cls, file_name: str) -> 'RunPlan':
+        """
+        @brief Reads a plan from a JSON file.
+
+        @param file_name The file written by RunPlanner.write_plan.
+        @return The plan.
+        @exception ValueError If the file is not a plan of a supported version.
+        """
+        with open(file_name, 'r', encoding='utf-8') as file:
+            plan: Dict = json.load(file)
+        if not isinstance(plan, dict) or plan.get('version') != RunPlanner.plan_version or not isinstance(plan.get('files'), list):
+            raise ValueError(f"{file_name} is not a plan of version {RunPlanner.plan_version}")
+        return cls(plan)
+
+    def get_file_count(self) -> int:
+        """
+        @brief Provides the number of file tasks the plan sends.
+
+        @return The number of planned files.
+        """
+        return len(self._planned_files)
+
+    def includes(self, from_file: str, request_id: int) -> bool:
+        """
+        @brief Tells whether a file is part of the plan.
+
+        @param from_file The source file, relative to the source directory.
+        @param request_id The id of the code request.
+        @return True if the plan sends the file for this code request.
+        """
+        return (from_file, request_id) in self._planned_files
+
+    def get_mismatches(self, source_directory: str, model_name: str, code_request_ids: List[int]) -> List[str]:
+        """
+        @brief Compares the settings of the run executing the plan with the settings it was planned with.
+
+        @param source_directory The source directory of the run.
+        @param model_name The name of the LLM model of the run.
+        @param code_request_ids The ids of the code requests of the run.
+        @return The description of each setting which differs, empty if the run matches the plan.
+        """
+        mismatches: List[str] = []
+        if os.path.abspath(source_directory) != self.plan['source_directory']:
+            mismatches.append(f"source directory {os.path.abspath(source_directory)} instead of {self.plan['source_directory']}")
+        if model_name != self.plan['model_name']:
+            mismatches.append(f"model {model_name} instead of {self.plan['model_name']}")
+        if list(code_request_ids) != self.plan['code_request_ids']:
+            mismatches.append(f"code requests {list(code_request_ids)} instead of {self.plan['code_request_ids']}")
+        return mismatches
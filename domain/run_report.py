@@ -0,0 +1,232 @@
+"""
+@file run_report.py
+@brief This module provides the RunReport class, which aggregates the outcome and the review verdict of every file of a run.
+@details In a CI pipeline the reviews are otherwise scattered over one generated file per source file. The report
+         gathers them in one JSON file, with a Markdown summary table next to it, and tells whether the run failed:
+         a request which failed, or a review whose verdict is at or above the failing level.
+"""
+
+import json
+import os
+import re
+import time
+from logging import Logger
+from typing import Dict, List, Set, Tuple
+
+
+class RunReport:
+    """
+    @class RunReport
+    @brief This class builds the report of a run from its metrics and from the reviews written to the target files.
+
+    Review verdicts, from the first word of the review:
+    - ok: the review starts with OK.
+    - acceptable: the review starts with Acceptable, minor issues only.
+    - issues: any other review, detailing serious issues.
+
+    @param logger A logger instance for logging messages.
+    @param source_directory The directory containing the source files.
+    @param destination_directory The directory where the output files are generated.
+    @param request_names The names of the code requests of the run, by id.
+    @param review_request_ids The ids of the code requests whose output is a review with a verdict.
+    @param fail_on The lowest verdict failing the run, acceptable or issues.
+    """
+
+    """
+    @brief Review verdicts, from the best to the worst.
+    """
+    verdicts: List[str] = ['ok', 'acceptable', 'issues']
+
+    """
+    @brief File outcomes failing the run, see RunMetrics.
+    """
+    failing_outcomes: List[str] = ['failed', 'too_big', 'unfinished']
+
+    """
+    @brief File outcomes whose target file holds a review.
+    """
+    reviewed_outcomes: List[str] = ['written', 'up_to_date', 'deduplicated']
+
+    """
+    @brief Number of characters of a review kept in the report.
+    """
+    max_review_characters: int = 2000
+
+    def __init__(self, logger: Logger, source_directory: str, destination_directory: str, request_names: Dict[int, str], \
+                 review_request_ids: Set[int], fail_on: str = 'issues'):
+        """
+        @brief Initializes the RunReport object.
+
+        @param logger A logger instance for logging messages.
+        @param source_directory The directory containing the source files.
+        @param destination_directory The directory where the output files are generated.
+        @param request_names The names of the code requests of the run, by id.
+        @param review_request_ids The ids of the code requests whose output is a review with a verdict.
+        @param fail_on The lowest verdict failing the run, acceptable or issues.
+        """
+        self.logger: Logger = logger
+        self.source_directory: str = source_directory
+        self.destination_directory: str = destination_directory
+        self.request_names: Dict[int, str] = request_names
+        self.review_request_ids: Set[int] = review_request_ids
+        self.fail_on: str = fail_on
+
+    @staticmethod
+    def get_verdict(review: str) -> str:
+        """
+        @brief Reads the verdict of a review from its first word, emphasis and quotes ignored.
+
+        @param review The review, as generated.
+        @return The verdict: ok, acceptable or issues.
+        """
+        first_word: re.Match = re.match(r'[\s*_"\'`#>-]*(\w+)', review)
+        if first_word is not None and first_word.group(1).lower() in ('ok', 'acceptable'):
+            return first_word.group(1).lower()
+        return 'issues'
+
+    def _read_review(self, to_file: str) -> str:
+        """
+        @brief Reads the review written to a target file.
+
+        @param to_file The target file.
+        @return The review, None if the file cannot be read.
+        """
+        try:
+            with open(to_file, 'r', encoding='utf-8', errors='replace') as file:
+                return file.read()
+        except OSError as err:
+            self.logger.warning(f"The review {to_file} cannot be read: {err}")
+            return None
+
+    def is_failing(self, file_entry: Dict) -> bool:
+        """
+        @brief Tells whether a file of the report fails the run.
+
+        @param file_entry The entry of the file in the report.
+        @return True if its request failed or its verdict is at or above the failing level.
+        """
+        if file_entry['outcome'] in self.failing_outcomes:
+            return True
+        verdict: str = file_entry.get('verdict')
+        return verdict is not None and self.verdicts.index(verdict) >= self.verdicts.index(self.fail_on)
+
+    def _create_file_entry(self, to_file: str, from_file: str, request_id: int, outcome: str) -> Dict:
+        """
+        @brief Describes a file in the report, with the verdict of its review if any.
+
+        @param to_file The target file.
+        @param from_file The source file, None if unknown.
+        @param request_id The id of the code request.
+        @param outcome The outcome of the file, see RunMetrics, unfinished if it never got one.
+        @return The entry of the file.
+        """
+        file_entry: Dict = {
+            'source_file': os.path.relpath(from_file, self.source_directory).replace(os.sep, '/') if from_file is not None else None,
+            'target_file': os.path.relpath(to_file, self.destination_directory).replace(os.sep, '/'),
+            'request_id': request_id,
+            'request_name': self.request_names.get(request_id),
+            'outcome': outcome,
+            'verdict': None
+        }
+        if request_id in self.review_request_ids and outcome in self.reviewed_outcomes:
+            review: str = self._read_review(to_file)
+            if review is not None:
+                file_entry['verdict'] = self.get_verdict(review)
+                if file_entry['verdict'] != 'ok':
+                    file_entry['review'] = review.strip()[:self.max_review_characters]
+        file_entry['failing'] = self.is_failing(file_entry)
+        return file_entry
+
+    def create_report(self, run_summary: Dict, selection: str = None, expected_target_files: Dict[str, Tuple[str, int]] = None, \
+                      processing_error: Exception = None) -> Dict:
+        """
+        @brief Builds the report of a run.
+        @details A run which was aborted, or left an expected target file without outcome, does not pass whatever the verdicts.
+
+        @param run_summary The summary of the run, as returned by RunMetrics.summarize.
+        @param selection How the processed files were selected, None if the whole tree was processed.
+        @param expected_target_files If set, the source file and the code request id of every target file the run should have processed.
+        @param processing_error The error which aborted the processing, None if it ended.
+        @return The report: the settings of the run, the totals by outcome and by verdict, whether it passed, and the entry of every file.
+        """
+        file_records: List[Dict] = list(run_summary['files'])
+        recorded_files: Set[str] = {file_record['to_file'] for file_record in file_records}
+        for to_file, (from_file, request_id) in (expected_target_files or {}).items():
+            if to_file not in recorded_files:
+                file_records.append({'to_file': to_file, 'from_file': from_file, 'request_id': request_id, 'outcome': None})
+        files: List[Dict] = [self._create_file_entry(file_record['to_file'], file_record['from_file'], file_record['request_id'], \
+                                                     file_record['outcome'] or 'unfinished') \
+                             for file_record in sorted(file_records, key=lambda file_record: (file_record['from_file'] or '', file_record['to_file']))]
+
+        outcomes: Dict[str, int] = {}
+        verdicts: Dict[str, int] = {}
+        for file_entry in files:
+            outcomes[file_entry['outcome']] = outcomes.get(file_entry['outcome'], 0) + 1
+            if file_entry['verdict'] is not None:
+                verdicts[file_entry['verdict']] = verdicts.get(file_entry['verdict'], 0) + 1
+        failing_files: int = sum(1 for file_entry in files if file_entry['failing'])
+        return {
+            'started_at': run_summary['started_at'],
+            'finished_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'source_directory': os.path.abspath(self.source_directory),
+            'selection': selection,
+            'fail_on': self.fail_on,
+            'passed': failing_files == 0 and processing_error is None,
+            'error': str(processing_error) if processing_error is not None else None,
+            'totals': {'files': len(files), 'failing_files': failing_files, 'outcomes': outcomes, 'verdicts': verdicts},
+            'files': files
+        }
+
+    @staticmethod
+    def format_summary_table(report: Dict) -> str:
+        """
+        @brief Formats the report as a Markdown summary, the failing files first.
+
+        @param report The report, as returned by create_report.
+        @return The status line of the run followed by the table of the files.
+        """
+        totals: Dict = report['totals']
+        counts: str = ', '.join(f'{count} {name}' for name, count in sorted(dict(totals['outcomes'], **totals['verdicts']).items()))
+        lines: List[str] = [f"**{'Passed' if report['passed'] else 'Failed'}**: {totals['files']} files ({counts or 'none'}), "
+                            f"{totals['failing_files']} failing" + (f", selected by {report['selection']}" if report['selection'] is not None else '') + \
+                            (f", aborted: {report['error']}" if report['error'] is not None else ''),
+                            '', '| Source file | Request | Outcome | Verdict |', '| --- | --- | --- | --- |']
+        for file_entry in sorted(report['files'], key=lambda file_entry: not file_entry['failing']):
+            lines.append(f"| {file_entry['source_file'] or file_entry['target_file']} | {file_entry['request_name'] or file_entry['request_id']} "
+                         f"| {file_entry['outcome']} | {(file_entry['verdict'] or '-') + (' (failing)' if file_entry['failing'] else '')} |")
+        return '\n'.join(lines) + '\n'
+
+    def write_report(self, file_name: str, report: Dict) -> None:
+        """
+        @brief Writes the report as JSON, and its summary table as Markdown in a file with the same name and the md extension.
+
+        @param file_name The name of the JSON file.
+        @param report The report, as returned by create_report.
+        """
+        directory: str = os.path.dirname(file_name)
+        if len(directory) > 0:
+            os.makedirs(directory, exist_ok=True)
+        with open(file_name, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        summary_file_name: str = os.path.splitext(file_name)[0] + '.md'
+        if summary_file_name == file_name:
+            summary_file_name += '.md'
+        with open(summary_file_name, 'w', encoding='utf-8') as file:
+            file.write(self.format_summary_table(report))
+        self.logger.info(f"Run report written to {file_name} and {summary_file_name}")
+
+    def log_report(self, report: Dict) -> None:
+        """
+        @brief Logs the outcome of the run and the failing files.
+
+        @param report The report, as returned by create_report.
+        """
+        totals: Dict = report['totals']
+        verdicts: str = ', '.join(f"{totals['verdicts'].get(verdict, 0)} {verdict}" for verdict in self.verdicts)
+        self.logger.info(f"Run report: {totals['files']} files, verdicts {verdicts}, {totals['failing_files']} failing")
+        if report['error'] is not None:
+            self.logger.error(f"The run was aborted: {report['error']}")
+        for file_entry in report['files']:
+            if file_entry['failing']:
+                self.logger.error(f"{file_entry['source_file'] or file_entry['target_file']}: "
+                                  f"{file_entry['verdict'] if file_entry['outcome'] not in self.failing_outcomes else file_entry['outcome']}")
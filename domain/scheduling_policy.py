@@ -0,0 +1,188 @@
+"""
+@file scheduling_policy.py
+@brief This module provides the scheduling policies ordering the files fed to the processing pipeline.
+@details With several jobs, the order in which files are picked up decides when the run ends: a big file picked up
+         last keeps one job busy while the others are idle. Sending the biggest files first (longest processing time
+         first) brings the run close to its theoretical makespan. The work of a file is estimated from its size on
+         disk, or from its tokens when a token estimator is given.
+"""
+
+import os
+from logging import Logger
+from typing import Dict, Iterable, List
+
+from domain.itoken_estimator import ITokenEstimator
+
+
+class SchedulingPolicy:
+    """
+    @class SchedulingPolicy
+    @brief The default policy: files are processed in discovery order, and written in that order.
+    @details Subclasses reorder the file tasks. The tasks of one source file keep following each other so that
+             the file is still read once for all the code requests.
+
+    @param logger A logger instance for logging messages.
+    @param token_estimator If set, the work of a file is estimated in tokens, otherwise from its size in bytes.
+    """
+
+    """
+    @brief Name of the policy, as selected on the command line.
+    """
+    name: str = 'discovery'
+
+    """
+    @brief Whether the output files are written in the order the policy feeds the files. Reordering policies write
+           each file as soon as it is processed, so that a big file does not hold the output of the others.
+    """
+    preserves_order: bool = True
+
+    def __init__(self, logger: Logger, token_estimator: ITokenEstimator = None):
+        """
+        @brief Initializes the SchedulingPolicy object.
+
+        @param logger A logger instance for logging messages.
+        @param token_estimator If set, the work of a file is estimated in tokens, otherwise from its size in bytes.
+        """
+        self.logger: Logger = logger
+        self.token_estimator: ITokenEstimator = token_estimator
+        self._work_by_source_file: Dict[str, int] = {}
+
+    @classmethod
+    def get_policies(cls) -> Dict[str, type]:
+        """
+        @brief Provides the available policies.
+
+        @return The policy classes by name.
+        """
+        return {policy.name: policy for policy in [SchedulingPolicy, LongestFirstSchedulingPolicy, ShortestFirstSchedulingPolicy, \
+                                                   DirectoryGroupedSchedulingPolicy]}
+
+    @classmethod
+    def create(cls, name: str, logger: Logger, token_estimator: ITokenEstimator = None) -> 'SchedulingPolicy':
+        """
+        @brief Creates a policy by name.
+
+        @param name The name of the policy, the discovery order if not set.
+        @param logger A logger instance for logging messages.
+        @param token_estimator If set, the work of a file is estimated in tokens, otherwise from its size in bytes.
+        @return The policy.
+        @exception ValueError If the name is unknown.
+        """
+        policies: Dict[str, type] = cls.get_policies()
+        if name is None:
+            name = SchedulingPolicy.name
+        if name not in policies:
+            raise ValueError(f"Unknown scheduling policy {name}: expected one of {', '.join(policies)}")
+        return policies[name](logger, token_estimator)
+
+    def estimate_work(self, file_task: Dict) -> int:
+        """
+        @brief Estimates the work of a file task, shared by the tasks of the same source file.
+
+        @param file_task The dictionary describing the file to process.
+        @return The size of the source file in bytes or in tokens, 0 if it cannot be read.
+        """
+        from_file: str = file_task['from_file']
+        work: int = self._work_by_source_file.get(from_file)
+        if work is None:
+            try:
+                if self.token_estimator is None:
+                    work = os.path.getsize(from_file)
+                else:
+                    with open(from_file, 'r', encoding="utf-8") as file:
+                        work = self.token_estimator.estimate_tokens(file.read())
+            except (OSError, UnicodeDecodeError):
+                work = 0
+            self._work_by_source_file[from_file] = work
+        return work
+
+    def order(self, file_tasks: Iterable[Dict]) -> Iterable[Dict]:
+        """
+        @brief Orders the file tasks.
+
+        @param file_tasks The file tasks in discovery order.
+        @return The file tasks in processing order.
+        """
+        return file_tasks
+
+    def _sort_by_work(self, file_tasks: Iterable[Dict], largest_first: bool) -> List[Dict]:
+        """
+        @brief Sorts the file tasks by estimated work, ties keeping the discovery order.
+
+        @param file_tasks The file tasks in discovery order.
+        @param largest_first True to sort the biggest files first.
+        @return The sorted file tasks.
+        """
+        sorted_file_tasks: List[Dict] = sorted(file_tasks, key=self.estimate_work, reverse=largest_first)
+        self.logger.info(f"Scheduling {len(sorted_file_tasks)} files {self.name.replace('_', ' ')} "
+                         f"by {'tokens' if self.token_estimator is not None else 'size'}")
+        return sorted_file_tasks
+
+
+class LongestFirstSchedulingPolicy(SchedulingPolicy):
+    """
+    @class LongestFirstSchedulingPolicy
+    @brief The biggest files are processed first, so that the last files picked up are small ones and the jobs finish together.
+    """
+
+    name: str = 'longest_first'
+    preserves_order: bool = False
+
+    def order(self, file_tasks: Iterable[Dict]) -> Iterable[Dict]:
+        """
+        @brief Orders the file tasks by decreasing estimated work.
+
+        @param file_tasks The file tasks in discovery order.
+        @return The file tasks in processing order.
+        """
+        return self._sort_by_work(file_tasks, True)
+
+
+class ShortestFirstSchedulingPolicy(SchedulingPolicy):
+    """
+    @class ShortestFirstSchedulingPolicy
+    @brief The smallest files are processed first, for fast feedback on the first outputs.
+    """
+
+    name: str = 'shortest_first'
+    preserves_order: bool = False
+
+    def order(self, file_tasks: Iterable[Dict]) -> Iterable[Dict]:
+        """
+        @brief Orders the file tasks by increasing estimated work.
+
+        @param file_tasks The file tasks in discovery order.
+        @return The file tasks in processing order.
+        """
+        return self._sort_by_work(file_tasks, False)
+
+
+class DirectoryGroupedSchedulingPolicy(SchedulingPolicy):
+    """
+    @class DirectoryGroupedSchedulingPolicy
+    @brief The files of a directory are processed together, so that each directory of the output is completed in one go.
+    @details Directories are processed by decreasing total work and the files of a directory by decreasing work,
+             which keeps the end of the run made of small files.
+    """
+
+    name: str = 'directory_grouped'
+    preserves_order: bool = False
+
+    def order(self, file_tasks: Iterable[Dict]) -> Iterable[Dict]:
+        """
+        @brief Groups the file tasks by directory, biggest directories and files first.
+
+        @param file_tasks The file tasks in discovery order.
+        @return The file tasks in processing order.
+        """
+        directories: Dict[str, List[Dict]] = {}
+        for file_task in file_tasks:
+            directories.setdefault(os.path.dirname(file_task['from_file']), []).append(file_task)
+        directory_work: Dict[str, int] = {directory: sum(self.estimate_work(file_task) for file_task in directory_file_tasks) \
+                                          for directory, directory_file_tasks in directories.items()}
+        self.logger.info(f"Scheduling {sum(len(directory_file_tasks) for directory_file_tasks in directories.values())} files "
+                         f"grouped in {len(directories)} directories by {'tokens' if self.token_estimator is not None else 'size'}")
+        ordered_file_tasks: List[Dict] = []
+        for directory in sorted(directories, key=directory_work.get, reverse=True):
+            ordered_file_tasks.extend(sorted(directories[directory], key=self.estimate_work, reverse=True))
+        return ordered_file_tasks
@@ -0,0 +1,252 @@
+"""
+@file source_chunker.py
+@brief This module provides the SourceChunker class, which splits source files too big for the context window of the model.
+@details Files are split at syntactic boundaries: top level definitions first, then the members of the definitions
+         that are still too big. Python files are split with the ast module, Java, C, C++ and Typescript files
+         by following the nesting of the braces. Any other file, or any block still too big, is split by lines.
+"""
+
+import ast
+import os
+import re
+from logging import Logger
+from typing import Dict, List
+
+from domain.itoken_estimator import ITokenEstimator, CharacterTokenEstimator
+
+
+class SourceChunker:
+    """
+    @class SourceChunker
+    @brief This class estimates the number of tokens of a file and splits it into chunks fitting in the context window.
+
+    @param logger A logger instance for logging messages.
+    @param model_name The name of the LLM model, used to look up its context window.
+    @param context_window_tokens Overrides the context window of the model if set.
+    @param token_estimator The estimator counting the tokens of the contents, the character based one if not set.
+    """
+
+    """
+    @brief Context window, in tokens, of well known models. Model names are matched by prefix, longest first.
+    """
+    model_context_window_tokens: Dict = {
+        'gpt-4o': 128000,
+        'gpt-4-turbo': 128000,
+        'gpt-4': 8192,
+        'gpt-3.5-turbo': 16385,
+        'o1': 128000,
+        'o3': 200000,
+        'llama3.1': 128000,
+        'llama3.2': 128000,
+        'llama3.3': 128000,
+        'llama3': 8192,
+        'mixtral': 32768,
+        'mistral': 32768,
+        'claude': 200000,
+        'gemini': 1000000
+    }
+
+    """
+    @brief Context window used for models not listed in model_context_window_tokens.
+    """
+    default_context_window_tokens: int = 8192
+
+    """
+    @brief Tokens reserved for the system, instruction and request messages sent along the file content.
+    """
+    prompt_overhead_tokens: int = 512
+
+    """
+    @brief Share of the remaining context window given to the file content, the rest is left for the response.
+    """
+    content_share: float = 0.5
+
+    """
+    @brief Extensions of the files split by following the nesting of the braces.
+    """
+    brace_language_extensions: List[str] = ['.java', '.c', '.cc', '.cpp', '.cxx', '.c++', '.h', '.hh', '.hpp', '.hxx', '.h++', '.ts', '.js']
+
+    def __init__(self, logger: Logger, model_name: str, context_window_tokens: int = None, token_estimator: ITokenEstimator = None):
+        """
+        @brief Initializes the SourceChunker object.
+
+        @param logger A logger instance for logging messages.
+        @param model_name The name of the LLM model, used to look up its context window.
+        @param context_window_tokens Overrides the context window of the model if set.
+        @param token_estimator The estimator counting the tokens of the contents, the character based one if not set.
+        """
+        self.logger: Logger = logger
+        self.token_estimator: ITokenEstimator = token_estimator if token_estimator is not None else CharacterTokenEstimator()
+        self.context_window_tokens: int = context_window_tokens if context_window_tokens is not None \
+            else self.get_model_context_window_tokens(model_name)
+
+    @classmethod
+    def get_model_context_window_tokens(cls, model_name: str) -> int:
+        """
+        @brief Looks up the context window of a model.
+
+        @param model_name The name of the LLM model.
+        @return The context window of the model in tokens, the default one if the model is unknown.
+        """
+        normalized_model_name: str = (model_name or '').lower().split('/')[-1]
+        for known_model_name in sorted(cls.model_context_window_tokens, key=len, reverse=True):
+            if normalized_model_name.startswith(known_model_name):
+                return cls.model_context_window_tokens[known_model_name]
+        return cls.default_context_window_tokens
+
+    def estimate_tokens(self, text: str) -> int:
+        """
+        @brief Estimates the number of tokens of a text.
+
+        @param text The text.
+        @return The estimated number of tokens.
+        """
+        return self.token_estimator.estimate_tokens(text)
+
+    def get_content_budget_tokens(self, request_text: str = '') -> int:
+        """
+        @brief Provides the number of tokens a file content may have to be sent in one request.
+
+        @param request_text The text of the request sent along the file content.
+        @return The budget in tokens for the file content.
+        """
+        remaining_tokens: int = self.context_window_tokens - self.prompt_overhead_tokens - self.estimate_tokens(request_text)
+        return max(1, int(remaining_tokens * self.content_share))
+
+    def split(self, content: str, file_name: str, budget_tokens: int) -> List[str]:
+        """
+        @brief Splits a file content into chunks of at most budget_tokens tokens, at syntactic boundaries when possible.
+
+        @param content The content of the file.
+        @param file_name The name of the file, its extension selects the way the content is split.
+        @param budget_tokens The maximum number of tokens of a chunk.
+        @return The chunks, in order. Joining them gives back the content.
+        """
+        if self.estimate_tokens(content) <= budget_tokens:
+            return [content]
+
+        lines: List[str] = content.splitlines(keepends=True)
+        _, file_extension = os.path.splitext(file_name)
+        cut_levels: Dict = {}
+        if file_extension.lower() == '.py':
+            cut_levels = self._get_python_cut_levels(content)
+        elif file_extension.lower() in self.brace_language_extensions:
+            cut_levels = self._get_brace_cut_levels(lines)
+
+        chunks: List[str] = []
+        self._split_lines(lines, 0, len(lines), 0, cut_levels, budget_tokens, chunks)
+        self.logger.info(f"{file_name} was split into {len(chunks)} chunks of at most {budget_tokens} tokens.")
+        return chunks
+
+    def _split_lines(self, lines: List[str], start: int, end: int, level: int, cut_levels: Dict, budget_tokens: int, chunks: List[str]) -> None:
+        """
+        @brief Splits lines[start:end] at the cuts of the given nesting level, recursing into the blocks still too big.
+
+        @param lines All the lines of the file.
+        @param start The index of the first line to split.
+        @param end The index following the last line to split.
+        @param level The nesting level of the cuts used.
+        @param cut_levels Maps the index of a line a chunk may start at to the nesting level of this cut.
+        @param budget_tokens The maximum number of tokens of a chunk.
+        @param chunks The list the chunks are appended to.
+        """
+        cuts: List[int] = [line_index for line_index in range(start + 1, end) if cut_levels.get(line_index, level + 1) <= level]
+        deeper_cut_exists: bool = any(start < line_index < end and cut_level > level for line_index, cut_level in cut_levels.items())
+        if len(cuts) == 0 and not deeper_cut_exists:
+            self._split_by_lines(lines[start:end], budget_tokens, chunks)
+            return
+
+        pending_text: str = ''
+        for segment_start, segment_end in zip([start] + cuts, cuts + [end]):
+            segment_text: str = ''.join(lines[segment_start:segment_end])
+            if self.estimate_tokens(pending_text + segment_text) <= budget_tokens:
+                pending_text += segment_text
+                continue
+            if len(pending_text) > 0:
+                chunks.append(pending_text)
+                pending_text = ''
+            if self.estimate_tokens(segment_text) <= budget_tokens:
+                pending_text = segment_text
+            else:
+                self._split_lines(lines, segment_start, segment_end, level + 1, cut_levels, budget_tokens, chunks)
+        if len(pending_text) > 0:
+            chunks.append(pending_text)
+
+    def _split_by_lines(self, lines: List[str], budget_tokens: int, chunks: List[str]) -> None:
+        """
+        @brief Last resort: packs whole lines into chunks, a line too big on its own becoming a chunk by itself.
+        """
+        pending_text: str = ''
+        for line in lines:
+            if len(pending_text) > 0 and self.estimate_tokens(pending_text + line) > budget_tokens:
+                chunks.append(pending_text)
+                pending_text = ''
+            pending_text += line
+        if len(pending_text) > 0:
+            chunks.append(pending_text)
+
+    def _get_python_cut_levels(self, content: str) -> Dict:
+        """
+        @brief Finds where a Python file may be cut: before each statement, at the nesting level of the statement.
+
+        @param content The content of the file.
+        @return Maps the index of a line a chunk may start at to the nesting level of this cut, empty if the file cannot be parsed.
+        """
+        try:
+            module: ast.Module = ast.parse(content)
+        except (SyntaxError, ValueError) as err:
+            self.logger.debug(f"File cannot be parsed ({err}), it will be split by lines.")
+            return {}
+
+        cut_levels: Dict = {}
+
+        def add_cuts(statements: List[ast.stmt], level: int) -> None:
+            for statement in statements:
+                # Decorators belong to the definition they decorate
+                first_line: int = min([statement.lineno] + [decorator.lineno for decorator in getattr(statement, 'decorator_list', [])])
+                cut_levels[first_line - 1] = min(level, cut_levels.get(first_line - 1, level))
+                if isinstance(statement, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+                    add_cuts(statement.body, level + 1)
+
+        add_cuts(module.body, 0)
+        return cut_levels
+
+    def _get_brace_cut_levels(self, lines: List[str]) -> Dict:
+        """
+        @brief Finds where a file of a language using braces may be cut: after a line closing a block or a statement.
+        @details Braces inside strings and comments are ignored.
+
+        @param lines The lines of the file.
+        @return Maps the index of a line a chunk may start at to the brace nesting level at this line.
+        """
+        cut_levels: Dict = {}
+        depth: int = 0
+        in_block_comment: bool = False
+        for line_index, line in enumerate(lines):
+            code: str = ''
+            position: int = 0
+            while position < len(line):
+                if in_block_comment:
+                    comment_end: int = line.find('*/', position)
+                    if comment_end < 0:
+                        position = len(line)
+                    else:
+                        in_block_comment = False
+                        position = comment_end + 2
+                    continue
+                if line.startswith('//', position):
+                    break
+                if line.startswith('/*', position):
+                    in_block_comment = True
+                    position += 2
+                    continue
+                if line[position] in '"\'`':
+                    string_match = re.compile(r'%s(?:\\.|[^\\%s])*%s' % ((line[position],) * 3)).match(line, position)
+                    position = string_match.end() if string_match else len(line)
+                    continue
+                code += line[position]
+                depth += {'{': 1, '}': -1}.get(line[position], 0)
+                position += 1
+            if not in_block_comment and code.strip().endswith(('}', ';')) and depth >= 0:
+                cut_levels[line_index + 1] = depth
+        return cut_levels
@@ -0,0 +1,287 @@
+"""
+@file source_discovery.py
+@brief This module provides the SourceDiscovery class, which lists the files of the source directory to be processed.
+@details The tree is walked with os.scandir: excluded directories and the paths matched by the ignore files
+         (.gitignore, .gpt2codeignore) are pruned before descending into them, and files are yielded one by one
+         as soon as their directory is listed. When only some files are selected, for instance the files changed
+         since a git revision, only the directories leading to them are listed.
+"""
+
+import os
+import re
+from logging import Logger
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+
+
+class IgnoreRules:
+    """
+    @class IgnoreRules
+    @brief The rules of one ignore file, following the gitignore syntax.
+
+    Supported: comments, negation with '!', directory only patterns ending with '/', patterns anchored to the
+    directory of the ignore file when they contain a '/', and the wildcards '*', '?', '[...]' and '**'.
+
+    @param base_directory The directory containing the ignore file, relative to the source directory, with '/' separators.
+    @param lines The lines of the ignore file.
+    """
+
+    def __init__(self, base_directory: str, lines: List[str]):
+        """
+        @brief Initializes the IgnoreRules object and compiles the patterns.
+
+        @param base_directory The directory containing the ignore file, relative to the source directory, with '/' separators.
+        @param lines The lines of the ignore file.
+        """
+        self.base_prefix: str = base_directory + '/' if len(base_directory) > 0 else ''
+        # Each rule is (regular expression, negated, directory only)
+        self.rules: List[Tuple[re.Pattern, bool, bool]] = []
+        for line in lines:
+            rule = self._parse_line(line)
+            if rule is not None:
+                self.rules.append(rule)
+
+    @staticmethod
+    def _parse_line(line: str) -> Optional[Tuple[re.Pattern, bool, bool]]:
+        """
+        @brief Compiles one line of an ignore file.
+
+        @param line The line.
+        @return The rule as (regular expression, negated, directory only), None for blank lines and comments.
+        """
+        pattern: str = line.rstrip('\n').rstrip('\r')
+        # Trailing spaces are ignored unless escaped
+        if not pattern.endswith('\\ '):
+            pattern = pattern.rstrip(' ')
+        if len(pattern) == 0 or pattern.startswith('#'):
+            return None
+        negated: bool = pattern.startswith('!')
+        if negated:
+            pattern = pattern[1:]
+        elif pattern.startswith('\\!') or pattern.startswith('\\#'):
+            pattern = pattern[1:]
+        directory_only: bool = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        if len(pattern) == 0:
+            return None
+        # A pattern containing a slash is relative to the ignore file, otherwise it matches at any depth
+        anchored: bool = '/' in pattern
+        pattern = pattern.lstrip('/')
+        reg_exp: str = IgnoreRules._translate(pattern)
+        if not anchored:
+            reg_exp = '(?:.*/)?' + reg_exp
+        return re.compile(reg_exp + '$', re.DOTALL), negated, directory_only
+
+    @staticmethod
+    def _translate(pattern: str) -> str:
+        """
+        @brief Translates a gitignore pattern into a regular expression.
+
+        @param pattern The pattern, without its leading '!' and trailing '/'.
+        @return The regular expression matching the paths relative to the directory of the ignore file.
+        """
+        reg_exp: str = ''
+        index: int = 0
+        while index < len(pattern):
+            character: str = pattern[index]
+            if pattern.startswith('**/', index):
+                reg_exp += '(?:.*/)?'
+                index += 3
+            elif pattern.startswith('/**', index) and index + 3 == len(pattern):
+                reg_exp += '/.*'
+                index += 3
+            elif pattern.startswith('**', index):
+                reg_exp += '.*'
+                index += 2
+            elif character == '*':
+                reg_exp += '[^/]*'
+                index += 1
+            elif character == '?':
+                reg_exp += '[^/]'
+                index += 1
+            elif character == '[':
+                closing: int = pattern.find(']', index + 2 if pattern.startswith('[!', index) or pattern.startswith('[^', index) else index + 1)
+                if closing < 0:
+                    reg_exp += '\\['
+                    index += 1
+                else:
+                    content: str = pattern[index + 1:closing]
+                    if content.startswith('!'):
+                        content = '^' + content[1:]
+                    reg_exp += '[' + content.replace('\\', '\\\\') + ']'
+                    index = closing + 1
+            elif character == '\\' and index + 1 < len(pattern):
+                reg_exp += re.escape(pattern[index + 1])
+                index += 2
+            else:
+                reg_exp += re.escape(character)
+                index += 1
+        return reg_exp
+
+    def match(self, relative_path: str, is_directory: bool) -> Optional[bool]:
+        """
+        @brief Checks a path against the rules, the last matching rule wins.
+
+        @param relative_path The path relative to the source directory, with '/' separators.
+        @param is_directory A flag telling whether the path is a directory.
+        @return True if the path is ignored, False if it is explicitly included again, None if no rule matches.
+        """
+        if not relative_path.startswith(self.base_prefix):
+            return None
+        path: str = relative_path[len(self.base_prefix):]
+        for reg_exp, negated, directory_only in reversed(self.rules):
+            if directory_only and not is_directory:
+                continue
+            if reg_exp.match(path):
+                return not negated
+        return None
+
+
+class SourceDiscovery:
+    """
+    @class SourceDiscovery
+    @brief This class walks the source directory and yields the files which may be processed.
+
+    @param source_directory The directory containing the source files.
+    @param logger A logger instance for logging messages.
+    @param excluded_directory_names The names of the directories never descended into, at any depth. Defaults to default_excluded_directory_names.
+    @param use_ignore_files A flag to honour the ignore files found in the tree.
+    @param selected_files If set, the only files yielded, relative to the source directory with '/' separators.
+    """
+
+    """
+    @brief Names of the directories skipped by default: version control, dependencies, caches and build outputs.
+    """
+    default_excluded_directory_names: List[str] = [
+        '.git', '.hg', '.svn', 'node_modules', '__pycache__', '.venv', 'venv', '.tox', '.mypy_cache', '.pytest_cache',
+        'build', 'dist', 'target'
+    ]
+
+    """
+    @brief Names of the ignore files honoured in every directory, patterns of the later ones win.
+    """
+    ignore_file_names: List[str] = ['.gitignore', '.gpt2codeignore']
+
+    def __init__(self, source_directory: str, logger: Logger, excluded_directory_names: List[str] = None, use_ignore_files: bool = True, \
+                 selected_files: Set[str] = None):
+        """
+        @brief Initializes the SourceDiscovery object.
+
+        @param source_directory The directory containing the source files.
+        @param logger A logger instance for logging messages.
+        @param excluded_directory_names The names of the directories never descended into, at any depth. Defaults to default_excluded_directory_names.
+        @param use_ignore_files A flag to honour the ignore files found in the tree.
+        @param selected_files If set, the only files yielded, relative to the source directory with '/' separators.
+        """
+        self.source_directory: str = source_directory
+        self.logger: Logger = logger
+        self.excluded_directory_names: frozenset = frozenset(
+            self.default_excluded_directory_names if excluded_directory_names is None else excluded_directory_names)
+        self.use_ignore_files: bool = use_ignore_files
+        self.selected_files: Optional[frozenset] = frozenset(selected_files) if selected_files is not None else None
+        # The directories leading to a selected file, the only ones listed
+        self._selected_directories: Set[str] = set()
+        for selected_file in self.selected_files or []:
+            directory: str = os.path.dirname(selected_file)
+            while len(directory) > 0 and directory not in self._selected_directories:
+                self._selected_directories.add(directory)
+                directory = os.path.dirname(directory)
+
+    @staticmethod
+    def get_relative_paths(source_directory: str, paths: Iterable[str]) -> Set[str]:
+        """
+        @brief Converts paths into the paths relative to the source directory expected as selected files.
+
+        @param source_directory The directory containing the source files.
+        @param paths The paths, absolute or relative to the current directory.
+        @return The paths relative to the source directory with '/' separators, the paths outside of it being dropped.
+        """
+        relative_paths: Set[str] = set()
+        source_directory = os.path.abspath(source_directory)
+        for path in paths:
+            relative_path: str = os.path.relpath(os.path.abspath(path), source_directory)
+            if relative_path != '..' and not relative_path.startswith('..' + os.sep):
+                relative_paths.add(relative_path.replace(os.sep, '/'))
+        return relative_paths
+
+    def _read_ignore_rules(self, directory: str, relative_directory: str, entry_names: frozenset) -> List[IgnoreRules]:
+        """
+        @brief Loads the ignore files of a directory.
+
+        @param directory The directory.
+        @param relative_directory The directory relative to the source directory.
+        @param entry_names The names of the entries of the directory.
+        @return The rules of the ignore files found, in ignore_file_names order.
+        """
+        ignore_rules: List[IgnoreRules] = []
+        for ignore_file_name in self.ignore_file_names:
+            if ignore_file_name not in entry_names:
+                continue
+            try:
+                with open(os.path.join(directory, ignore_file_name), 'r', encoding='utf-8', errors='replace') as ignore_file:
+                    ignore_rules.append(IgnoreRules(relative_directory.replace(os.sep, '/'), ignore_file.readlines()))
+            except OSError as err:
+                self.logger.warning(f'Ignore file {os.path.join(directory, ignore_file_name)} could not be read: {err}')
+        return ignore_rules
+
+    @staticmethod
+    def _is_ignored(ignore_rules: List[IgnoreRules], relative_path: str, is_directory: bool) -> bool:
+        """
+        @brief Checks a path against the rules of the ignore files, the deepest matching rule wins.
+
+        @param ignore_rules The rules applying to the directory of the path, from the shallowest to the deepest.
+        @param relative_path The path relative to the source directory.
+        @param is_directory A flag telling whether the path is a directory.
+        @return True if the path is ignored.
+        """
+        path: str = relative_path.replace(os.sep, '/')
+        for rules in reversed(ignore_rules):
+            ignored: Optional[bool] = rules.match(path, is_directory)
+            if ignored is not None:
+                return ignored
+        return False
+
+    def discover(self, whole_tree: bool = False) -> Iterator[Tuple[str, str, str]]:
+        """
+        @brief Walks the source directory, in os.walk order: the files of a directory, then its subdirectories.
+        @details Directories are listed one at a time when they are visited, symbolic links to directories
+                 are not followed.
+
+        @param whole_tree A flag to yield every file, even if only some files are selected, for the passes reading the whole tree.
+        @return An iterator over (directory, directory relative to the source directory, file name).
+        """
+        selected: bool = self.selected_files is not None and not whole_tree
+        # Each pending directory comes with the ignore rules of its parents
+        pending_directories: List[Tuple[str, List[IgnoreRules]]] = [('', [])]
+        while len(pending_directories) > 0:
+            relative_directory, ignore_rules = pending_directories.pop()
+            directory: str = os.path.join(self.source_directory, relative_directory) if len(relative_directory) > 0 else self.source_directory
+            try:
+                with os.scandir(directory) as entries_iterator:
+                    entries: List[os.DirEntry] = list(entries_iterator)
+            except OSError as err:
+                self.logger.warning(f'Directory {directory} could not be listed: {err}')
+                continue
+            if self.use_ignore_files:
+                ignore_rules = ignore_rules + self._read_ignore_rules(directory, relative_directory, frozenset(entry.name for entry in entries))
+            self.logger.info(f"Analyzing directory {directory}")
+
+            subdirectories: List[str] = []
+            for entry in entries:
+                relative_path: str = os.path.join(relative_directory, entry.name)
+                try:
+                    is_directory: bool = entry.is_dir()
+                except OSError:
+                    is_directory = False
+                if selected and (relative_path.replace(os.sep, '/') not in (self._selected_directories if is_directory else self.selected_files)):
+                    continue
+                if is_directory:
+                    if entry.name in self.excluded_directory_names or self._is_ignored(ignore_rules, relative_path, True):
+                        self.logger.debug(f'Skipping directory {relative_path}')
+                    elif not entry.is_symlink():
+                        subdirectories.append(relative_path)
+                elif len(ignore_rules) > 0 and self._is_ignored(ignore_rules, relative_path, False):
+                    self.logger.debug(f'Skipping ignored file {relative_path}')
+                else:
+                    yield directory, relative_directory, entry.name
+
+            pending_directories.extend((subdirectory, ignore_rules) for subdirectory in reversed(subdirectories))
@@ -0,0 +1,316 @@
+"""
+@file staged_pipeline.py
+@brief This module provides a staged producer/consumer pipeline used to process source files concurrently.
+@details Stages are joined by bounded queues so that a slow stage applies backpressure to the stages feeding it.
+         Items leave the pipeline in the order they were produced: the items in flight are bounded, so that a slow
+         item cannot let the others pile up waiting for it. A stage whose handler is a coroutine function
+         runs on its own event loop, with up to workers handlers awaited concurrently.
+"""
+
+import asyncio
+import inspect
+import queue
+import threading
+from logging import Logger
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+class PipelineStage:
+    """
+    @class PipelineStage
+    @brief Describes one stage of a StagedPipeline.
+
+    @param name The name of the stage, used for thread names and logging.
+    @param handler Function transforming an item. Returning None drops the item from the pipeline.
+    @param workers The number of handlers running concurrently: threads, or pending coroutines for a coroutine handler.
+    """
+
+    def __init__(self, name: str, handler: Callable[[Dict], Optional[Dict]], workers: int = 1):
+        """
+        @brief Initializes the PipelineStage object.
+
+        @param name The name of the stage, used for thread names and logging.
+        @param handler Function transforming an item. Returning None drops the item from the pipeline.
+        @param workers The number of handlers running concurrently: threads, or pending coroutines for a coroutine handler.
+        """
+        self.name: str = name
+        self.handler: Callable[[Dict], Optional[Dict]] = handler
+        self.workers: int = max(1, workers)
+
+    def is_asynchronous(self) -> bool:
+        """
+        @brief Tells whether the handler is a coroutine function.
+        """
+        return inspect.iscoroutinefunction(self.handler)
+
+
+class StagedPipeline:
+    """
+    @class StagedPipeline
+    @brief Runs items through a list of stages joined by bounded queues and hands the results to a sink.
+
+    @param stages The ordered list of stages.
+    @param sink Function called from the calling thread for each item leaving the last stage.
+    @param logger A logger instance for logging messages.
+    @param queue_size The maximum number of items waiting between two stages.
+    @param preserve_order If True the sink receives the items in the order the source produced them.
+    """
+
+    # Sentinel pushed through the queues once the source is exhausted
+    _END_OF_STREAM = object()
+
+    # Polling period used to notice a failure in another stage while blocked on a queue
+    _POLL_INTERVAL_SECONDS: float = 0.1
+
+    def __init__(self, stages: List[PipelineStage], sink: Callable[[Dict], None], logger: Logger, \
+                 queue_size: int = 8, preserve_order: bool = True):
+        """
+        @brief Initializes the StagedPipeline object.
+
+        @param stages The ordered list of stages.
+        @param sink Function called from the calling thread for each item leaving the last stage.
+        @param logger A logger instance for logging messages.
+        @param queue_size The maximum number of items waiting between two stages.
+        @param preserve_order If True the sink receives the items in the order the source produced them.
+        """
+        self.stages: List[PipelineStage] = stages
+        self.sink: Callable[[Dict], None] = sink
+        self.logger: Logger = logger
+        self.queue_size: int = max(1, queue_size)
+        self.preserve_order: bool = preserve_order
+        self._stop_event: threading.Event = threading.Event()
+        self._first_error: BaseException = None
+        self._error_lock: threading.Lock = threading.Lock()
+        # Permits of the items between the source and the sink, when the order is restored
+        self._reorder_slots: threading.Semaphore = None
+
+    def run_sequentially(self, source: Iterable[Dict]) -> None:
+        """
+        @brief Runs every item through all the stages and the sink one after the other, without any thread.
+
+        @param source The items to process.
+        """
+        event_loop: asyncio.AbstractEventLoop = None
+        try:
+            for item in source:
+                for stage in self.stages:
+                    if stage.is_asynchronous():
+                        # One event loop for the whole run, so that connections opened by the handler can be reused
+                        if event_loop is None:
+                            event_loop = asyncio.new_event_loop()
+                        item = event_loop.run_until_complete(stage.handler(item))
+                    else:
+                        item = stage.handler(item)
+                    if item is None:
+                        break
+                if item is not None:
+                    self.sink(item)
+        finally:
+            if event_loop is not None:
+                event_loop.close()
+
+    def run(self, source: Iterable[Dict]) -> None:
+        """
+        @brief Runs the pipeline until the source is exhausted and all items reached the sink.
+        @details The first exception raised by any stage stops the pipeline and is raised again here.
+
+        @param source The items to process.
+        """
+        queues: List[queue.Queue] = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        # Items behind a slow one wait for it in the reorder buffer, out of the bounded queues: without this bound the
+        # source would be drained into the buffer
+        if self.preserve_order:
+            self._reorder_slots = threading.Semaphore(self.queue_size + sum(stage.workers for stage in self.stages))
+        threads: List[threading.Thread] = [
+            threading.Thread(target=self._produce, args=(source, queues[0]), name='pipeline-source', daemon=True)
+        ]
+        for stage_index, stage in enumerate(self.stages):
+            if stage.is_asynchronous():
+                threads.append(threading.Thread(target=self._work_asynchronously, \
+                                                args=(stage, queues[stage_index], queues[stage_index + 1]), \
+                                                name=f'pipeline-{stage.name}', daemon=True))
+                continue
+            remaining_workers: List[int] = [stage.workers]
+            remaining_workers_lock: threading.Lock = threading.Lock()
+            for worker_index in range(stage.workers):
+                threads.append(threading.Thread(target=self._work, \
+                                                args=(stage, queues[stage_index], queues[stage_index + 1], \
+                                                      remaining_workers, remaining_workers_lock), \
+                                                name=f'pipeline-{stage.name}-{worker_index}', daemon=True))
+        for thread in threads:
+            thread.start()
+
+        try:
+            self._consume(queues[-1])
+        except BaseException as err:
+            self._record_error(err)
+
+        self._stop_event.set()
+        for thread in threads:
+            thread.join()
+
+        if self._first_error is not None:
+            raise self._first_error
+
+    def _record_error(self, err: BaseException) -> None:
+        """
+        @brief Keeps the first error raised in the pipeline and asks every stage to stop.
+
+        @param err The error raised.
+        """
+        with self._error_lock:
+            if self._first_error is None:
+                self._first_error = err
+        self._stop_event.set()
+
+    def _put(self, target_queue: queue.Queue, entry) -> bool:
+        """
+        @brief Puts an entry in a queue, blocking while it is full unless the pipeline is stopped.
+
+        @return False if the pipeline was stopped before the entry could be queued.
+        """
+        while not self._stop_event.is_set():
+            try:
+                target_queue.put(entry, timeout=self._POLL_INTERVAL_SECONDS)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, source_queue: queue.Queue):
+        """
+        @brief Gets an entry from a queue, blocking while it is empty unless the pipeline is stopped.
+
+        @return The entry, or the end of stream sentinel if the pipeline was stopped.
+        """
+        while not self._stop_event.is_set():
+            try:
+                return source_queue.get(timeout=self._POLL_INTERVAL_SECONDS)
+            except queue.Empty:
+                pass
+        return self._END_OF_STREAM
+
+    def _acquire_reorder_slot(self) -> bool:
+        """
+        @brief Waits until the number of items in flight allows one more, when the order is restored.
+
+        @return False if the pipeline was stopped while waiting.
+        """
+        if self._reorder_slots is None:
+            return True
+        while not self._stop_event.is_set():
+            if self._reorder_slots.acquire(timeout=self._POLL_INTERVAL_SECONDS):
+                return True
+        return False
+
+    def _produce(self, source: Iterable[Dict], output_queue: queue.Queue) -> None:
+        """
+        @brief Numbers the items of the source and pushes them into the first queue.
+        @details When the order is restored, an item is only pulled from the source once an earlier one left the pipeline.
+        """
+        try:
+            for sequence_number, item in enumerate(source):
+                if not self._acquire_reorder_slot() or not self._put(output_queue, (sequence_number, item)):
+                    return
+            self._put(output_queue, self._END_OF_STREAM)
+        except BaseException as err:
+            self._record_error(err)
+
+    def _work(self, stage: PipelineStage, input_queue: queue.Queue, output_queue: queue.Queue, \
+              remaining_workers: List[int], remaining_workers_lock: threading.Lock) -> None:
+        """
+        @brief Worker loop of one stage thread.
+        @details Dropped items are still forwarded as empty entries so that the ordered sink does not wait for them.
+        """
+        try:
+            while True:
+                entry = self._get(input_queue)
+                if entry is self._END_OF_STREAM:
+                    # Let the sibling workers see the end of stream as well, the last one forwards it
+                    if self._stop_event.is_set():
+                        return
+                    self._put(input_queue, self._END_OF_STREAM)
+                    with remaining_workers_lock:
+                        remaining_workers[0] -= 1
+                        last_worker: bool = remaining_workers[0] == 0
+                    if last_worker:
+                        self._put(output_queue, self._END_OF_STREAM)
+                    return
+                sequence_number, item = entry
+                if item is not None:
+                    item = stage.handler(item)
+                if not self._put(output_queue, (sequence_number, item)):
+                    return
+        except BaseException as err:
+            self.logger.debug(f'Stage {stage.name} failed: {err}')
+            self._record_error(err)
+
+    def _work_asynchronously(self, stage: PipelineStage, input_queue: queue.Queue, output_queue: queue.Queue) -> None:
+        """
+        @brief Thread running the event loop of a stage whose handler is a coroutine function.
+        """
+        try:
+            asyncio.run(self._run_asynchronous_stage(stage, input_queue, output_queue))
+        except BaseException as err:
+            self.logger.debug(f'Stage {stage.name} failed: {err}')
+            self._record_error(err)
+
+    async def _run_asynchronous_stage(self, stage: PipelineStage, input_queue: queue.Queue, output_queue: queue.Queue) -> None:
+        """
+        @brief Pulls items from the input queue and awaits up to stage.workers handlers at once.
+        @details The blocking queue operations run in the default executor so that the event loop keeps serving
+                 the pending handlers.
+        """
+        event_loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        available_slots: asyncio.Semaphore = asyncio.Semaphore(stage.workers)
+        pending_handlers: set = set()
+
+        async def handle(sequence_number: int, item: Dict) -> None:
+            try:
+                if item is not None:
+                    item = await stage.handler(item)
+                await event_loop.run_in_executor(None, self._put, output_queue, (sequence_number, item))
+            except BaseException as err:
+                self.logger.debug(f'Stage {stage.name} failed: {err}')
+                self._record_error(err)
+            finally:
+                available_slots.release()
+
+        while True:
+            await available_slots.acquire()
+            entry = await event_loop.run_in_executor(None, self._get, input_queue)
+            if entry is self._END_OF_STREAM:
+                break
+            pending_handler: asyncio.Task = asyncio.create_task(handle(*entry))
+            pending_handlers.add(pending_handler)
+            pending_handler.add_done_callback(pending_handlers.discard)
+
+        if self._stop_event.is_set():
+            for pending_handler in pending_handlers:
+                pending_handler.cancel()
+        if len(pending_handlers) > 0:
+            await asyncio.gather(*pending_handlers, return_exceptions=True)
+        await event_loop.run_in_executor(None, self._put, output_queue, self._END_OF_STREAM)
+
+    def _consume(self, input_queue: queue.Queue) -> None:
+        """
+        @brief Hands the items leaving the last stage to the sink, restoring the source order if requested.
+        """
+        pending_items: Dict = {}
+        next_sequence_number: int = 0
+        while True:
+            entry = self._get(input_queue)
+            if entry is self._END_OF_STREAM:
+                return
+            sequence_number, item = entry
+            if not self.preserve_order:
+                if item is not None:
+                    self.sink(item)
+                continue
+            pending_items[sequence_number] = item
+            while next_sequence_number in pending_items:
+                item = pending_items.pop(next_sequence_number)
+                next_sequence_number += 1
+                if item is not None:
+                    self.sink(item)
+                self._reorder_slots.release()
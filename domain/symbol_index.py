@@ -0,0 +1,238 @@
+"""
+@file symbol_index.py
+@brief This module provides the SymbolIndex class, which indexes the definitions, identifiers and imports of the source tree.
+@details The LLM sees one file at a time: a file calling code defined elsewhere is sent without the signatures it calls,
+         and a rename breaks the callers it never sees. The index records what every file defines and uses, so that
+         each request carries the signatures of the symbols its file uses and nothing more, and so that the files
+         referencing a symbol can be found, for instance to propagate a rename in a follow-up pass.
+         The index is stored as JSON in the destination directory and only the files modified since the previous run
+         are parsed again.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from logging import Logger
+from typing import Dict, Iterable, List, Set, Tuple
+
+from domain.ifile_type import FileTypeInterface
+from domain.itoken_estimator import ITokenEstimator
+
+
+class SymbolIndex:
+    """
+    @class SymbolIndex
+    @brief This class keeps the symbols of every source file and provides the context of the code requests attaching it.
+
+    @param target_directory The directory where the index is stored.
+    @param logger A logger instance for logging messages.
+    @param token_estimator The estimator limiting the size of the context.
+    @param request_ids The ids of the code requests whose requests carry the signatures of the symbols their file uses.
+    @param max_context_tokens The maximum tokens of the context attached to one request.
+    """
+
+    """
+    @brief Name of the index file created in the target directory, and version of its format.
+    """
+    index_file_name: str = ".gpt2code_symbols.json"
+    index_version: int = 1
+
+    """
+    @brief Default maximum tokens of the context attached to one request.
+    """
+    default_max_context_tokens: int = 1024
+
+    """
+    @brief Names defined in more files than this, and imported by none of them, are too ambiguous to be attached.
+    """
+    max_ambiguous_definitions: int = 3
+
+    """
+    @brief Text introducing the context in the request.
+    """
+    context_header: str = "For reference only, the signatures of the symbols this file uses which are defined in other files " + \
+        "of the project, grouped by file. They must not be returned, and any symbol renamed in this file keeps being used " + \
+        "under its previous name by these files."
+
+    def __init__(self, target_directory: str, logger: Logger, token_estimator: ITokenEstimator, request_ids: Set[int], \
+                 max_context_tokens: int = None):
+        """
+        @brief Initializes the SymbolIndex object and loads the existing index if any.
+
+        @param target_directory The directory where the index is stored.
+        @param logger A logger instance for logging messages.
+        @param token_estimator The estimator limiting the size of the context.
+        @param request_ids The ids of the code requests whose requests carry the signatures of the symbols their file uses.
+        @param max_context_tokens The maximum tokens of the context attached to one request.
+        """
+        self.logger: Logger = logger
+        self.token_estimator: ITokenEstimator = token_estimator
+        self.request_ids: Set[int] = request_ids
+        self.max_context_tokens: int = max_context_tokens if max_context_tokens is not None else self.default_max_context_tokens
+        self.target_directory: str = target_directory
+        self.index_file: str = os.path.join(target_directory, self.index_file_name)
+        self._entries: Dict[str, Dict] = {}
+        self._definitions: Dict[str, Dict[str, List[Dict]]] = {}
+        self._lock: threading.Lock = threading.Lock()
+        self._modified: bool = False
+
+        if os.path.isfile(self.index_file):
+            try:
+                with open(self.index_file, 'r', encoding="utf-8") as file:
+                    index: Dict = json.load(file)
+                if index.get('version') == self.index_version:
+                    self._entries = index.get('files', {})
+                    self.logger.info(f"Symbol index {self.index_file} was read: {len(self._entries)} files.")
+            except (IOError, ValueError) as err:
+                self.logger.warning(f"Symbol index {self.index_file} could not be read ({err}), all files will be parsed.")
+
+    def is_enabled(self, request_id: int) -> bool:
+        """
+        @brief Tells whether the requests of a code request carry the signatures of the symbols their file uses.
+
+        @param request_id The id of the code request.
+        @return True if the context is attached.
+        """
+        return request_id in self.request_ids
+
+    def update(self, source_files: Iterable[Tuple[str, str, FileTypeInterface]]) -> None:
+        """
+        @brief Parses the source files added or modified since the index was saved, and forgets the files removed.
+        @details A file whose modification time and size did not change is not read. A file whose content did not
+                 change despite a new modification time is read but not parsed again.
+
+        @param source_files The paths of the source files, their paths relative to the source directory and the file types they are parsed with.
+        """
+        indexed_files: Set[str] = set()
+        parsed_count: int = 0
+        for source_file, relative_path, file_type in source_files:
+            relative_path = relative_path.replace('\\', '/')
+            try:
+                file_stat: os.stat_result = os.stat(source_file)
+                indexed_files.add(relative_path)
+                entry: Dict = self._entries.get(relative_path)
+                if entry is not None and entry['mtime_ns'] == file_stat.st_mtime_ns and entry['size'] == file_stat.st_size:
+                    continue
+                with open(source_file, 'r', encoding='utf-8', errors='replace') as file:
+                    content: str = file.read()
+            except OSError as err:
+                self.logger.warning(f"Skipping {source_file} in the symbol index: {err}")
+                continue
+            source_hash: str = hashlib.sha256(content.encode('utf-8')).hexdigest()
+            if entry is None or entry['source_hash'] != source_hash:
+                entry = dict(file_type.extract_symbols(content, os.path.basename(source_file)), source_hash=source_hash)
+                parsed_count += 1
+            self._entries[relative_path] = dict(entry, mtime_ns=file_stat.st_mtime_ns, size=file_stat.st_size)
+            self._modified = True
+        removed_files: List[str] = [relative_path for relative_path in self._entries if relative_path not in indexed_files]
+        for relative_path in removed_files:
+            del self._entries[relative_path]
+            self._modified = True
+
+        self._definitions = {}
+        for relative_path, entry in self._entries.items():
+            for definition in entry['definitions']:
+                self._definitions.setdefault(definition['name'], {}).setdefault(relative_path, []).append(definition)
+        self.logger.info(f"Symbol index: {len(self._entries)} files, {parsed_count} parsed, {len(removed_files)} removed, "
+                         f"{sum(len(entry['definitions']) for entry in self._entries.values())} definitions")
+
+    def save(self) -> None:
+        """
+        @brief Writes the index to the target directory if it was modified, through a temporary file renamed once complete.
+        """
+        with self._lock:
+            if not self._modified:
+                return
+            os.makedirs(self.target_directory, exist_ok=True)
+            temporary_file: str = f'{self.index_file}.{os.getpid()}.tmp'
+            with open(temporary_file, 'w', encoding="utf-8") as file:
+                json.dump({'version': self.index_version, 'files': self._entries}, file, sort_keys=True)
+            os.replace(temporary_file, self.index_file)
+            self._modified = False
+        self.logger.debug(f"Symbol index {self.index_file} was saved.")
+
+    def find_definitions(self, name: str) -> Dict[str, List[str]]:
+        """
+        @brief Locates the definitions of a symbol.
+
+        @param name The name of the symbol.
+        @return The signatures of its definitions, by file relative to the source directory.
+        """
+        return {relative_path: [definition['signature'] for definition in definitions] \
+                for relative_path, definitions in self._definitions.get(name, {}).items()}
+
+    def find_references(self, name: str) -> Dict[str, int]:
+        """
+        @brief Locates the files using a symbol, the files to update when it is renamed.
+
+        @param name The name of the symbol.
+        @return The number of uses of the name, by file relative to the source directory.
+        """
+        return {relative_path: entry['references'][name] for relative_path, entry in self._entries.items() if name in entry['references']}
+
+    @staticmethod
+    def _is_imported(relative_path: str, imports: str) -> bool:
+        """
+        @brief Tells whether a file is imported, from the name of its module.
+
+        @param relative_path The file defining a symbol.
+        @param imports The import lines of the file using the symbol.
+        @return True if the module name of the defining file appears in the imports.
+        """
+        module_name: str = os.path.splitext(os.path.basename(relative_path))[0]
+        return re.search(rf'\b{re.escape(module_name)}\b', imports) is not None
+
+    def _select_definitions(self, relative_path: str) -> List[Tuple[str, str]]:
+        """
+        @brief Selects the definitions of the other files which a file uses, the most used first.
+        @details A method is only selected if its class is used by the file or its module imported, so that a call
+                 to a homonymous method of another class does not attach it.
+
+        @param relative_path The file relative to the source directory.
+        @return The defining files and the signatures, without duplicates.
+        """
+        entry: Dict = self._entries.get(relative_path)
+        if entry is None:
+            return []
+        defined_names: Set[str] = {definition['name'] for definition in entry['definitions']}
+        imports: str = ' '.join(entry['imports'])
+        selected_definitions: List[Tuple[str, str]] = []
+        for name, _ in sorted(entry['references'].items(), key=lambda reference: (-reference[1], reference[0])):
+            if name in defined_names:
+                continue
+            defining_files: List[str] = [defining_file for defining_file in self._definitions.get(name, {}) if defining_file != relative_path]
+            if len(defining_files) > 1:
+                imported_files: List[str] = [defining_file for defining_file in defining_files if self._is_imported(defining_file, imports)]
+                if len(imported_files) > 0:
+                    defining_files = imported_files
+                elif len(defining_files) > self.max_ambiguous_definitions:
+                    continue
+            for defining_file in defining_files:
+                for definition in self._definitions[name][defining_file]:
+                    owner_name: str = definition.get('owner')
+                    if owner_name is None or owner_name in entry['references'] or self._is_imported(defining_file, imports):
+                        selected_definitions.append((defining_file, definition['signature']))
+        return list(dict.fromkeys(selected_definitions))
+
+    def get_context(self, relative_path: str) -> str:
+        """
+        @brief Provides the signatures of the symbols a file uses which other files define, within the context budget.
+
+        @param relative_path The file relative to the source directory.
+        @return The context attached to the request of the file, empty if the file uses no symbol of the other files.
+        """
+        signatures_by_file: Dict[str, List[str]] = {}
+        budget_tokens: int = self.max_context_tokens - self.token_estimator.estimate_tokens(self.context_header)
+        for defining_file, signature in self._select_definitions(relative_path.replace('\\', '/')):
+            signature_tokens: int = self.token_estimator.estimate_tokens(signature) + \
+                (0 if defining_file in signatures_by_file else self.token_estimator.estimate_tokens(defining_file) + 2)
+            if signature_tokens > budget_tokens:
+                break
+            budget_tokens -= signature_tokens
+            signatures_by_file.setdefault(defining_file, []).append(signature)
+        if len(signatures_by_file) == 0:
+            return ''
+        return '\n'.join([self.context_header] + [f"# {defining_file}\n" + '\n'.join(signatures) \
+                                                 for defining_file, signatures in signatures_by_file.items()])
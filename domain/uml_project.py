@@ -0,0 +1,258 @@
+"""
+@file uml_project.py
+@brief This module provides the UMLProjectBuilder class, which reverse engineers the UML class diagrams of a whole tree
+       from the skeletons of its classes.
+@details Sending the files one at a time yields one disconnected diagram per file, whose relations the LLM has to guess.
+         The skeletons of the classes are extracted locally for the whole tree instead, and sent package by package in
+         batches as big as the context window allows: far fewer and far smaller requests. The diagrams of the batches
+         are merged into one diagram per package, and the package diagrams into the project diagram, the relations
+         between packages being derived from the skeletons.
+"""
+
+import os
+import re
+from logging import Logger
+from typing import Dict, Iterable, List, Set, Tuple
+
+from domain.ifile_type import FileTypeInterface
+from domain.itoken_estimator import ITokenEstimator
+from domain.uml_skeleton import ClassSkeleton
+
+
+class UMLProjectBuilder:
+    """
+    @class UMLProjectBuilder
+    @brief This class extracts the class skeletons of a tree, batches them by package and merges the diagrams generated from the batches.
+
+    @param logger A logger instance for logging messages.
+    @param token_estimator The estimator sizing the batches.
+    @param project_name The name of the project diagram, the name of the source directory by default.
+    @param max_batch_tokens The maximum tokens of the skeletons sent in one request.
+    """
+
+    """
+    @brief Name of the diagram generated in the target directory of each package, and of the diagram of the whole tree.
+    """
+    package_diagram_name: str = 'package.puml'
+    project_diagram_name: str = 'project.puml'
+
+    """
+    @brief Default maximum tokens of the skeletons sent in one request, smaller batches keeping the diagrams readable.
+    """
+    default_max_batch_tokens: int = 6000
+
+    """
+    @brief Statements setting up a whole diagram, kept out of the package blocks.
+    """
+    setting_pattern: re.Pattern = re.compile(r'\s*(skinparam\s|hide\s|show\s|!|title\s|left to right direction|top to bottom direction)')
+
+    """
+    @brief Instructions appended to the request of the selected code request.
+    """
+    skeleton_instructions: str = "The content is not source code but the skeletons of the classes of one package, extracted " + \
+        "from its source files, each introduced by a line starting with # and giving its path. Each class is listed with its kind, " + \
+        "the classes it extends and the interfaces it implements, then one line per field and per method, + marking public, " + \
+        "# protected, - private and ~ package members. Reverse engineer them as one PlantUML class diagram with every class and " + \
+        "its members, and the relations the skeletons show: inheritance and realization from the extended classes and interfaces, " + \
+        "composition or association from the field types, dependency from the parameter and return types. Do not declare the " + \
+        "classes of other packages, only name them in the relations, and do not invent classes nor members."
+
+    def __init__(self, logger: Logger, token_estimator: ITokenEstimator, project_name: str, max_batch_tokens: int = None):
+        """
+        @brief Initializes the UMLProjectBuilder object.
+
+        @param logger A logger instance for logging messages.
+        @param token_estimator The estimator sizing the batches.
+        @param project_name The name of the project diagram, the name of the source directory by default.
+        @param max_batch_tokens The maximum tokens of the skeletons sent in one request.
+        """
+        self.logger: Logger = logger
+        self.token_estimator: ITokenEstimator = token_estimator
+        self.project_name: str = project_name
+        self.max_batch_tokens: int = max_batch_tokens if max_batch_tokens is not None else self.default_max_batch_tokens
+
+    def extract_skeletons(self, source_files: Iterable[Tuple[str, str, FileTypeInterface]]) -> Dict[str, List[ClassSkeleton]]:
+        """
+        @brief Reads the source files and extracts the skeletons of their classes.
+
+        @param source_files The paths of the source files, their paths relative to the source directory and the file types they are read with.
+        @return The skeletons of each package, a package being a directory relative to the source directory, '' for the source directory.
+        """
+        skeletons: Dict[str, List[ClassSkeleton]] = {}
+        file_count: int = 0
+        for source_file, relative_path, file_type in source_files:
+            try:
+                with open(source_file, 'r', encoding='utf-8', errors='replace') as file:
+                    content: str = file.read()
+            except OSError as err:
+                self.logger.warning(f"Skipping {source_file}: {err}")
+                continue
+            file_count += 1
+            relative_path = relative_path.replace('\\', '/')
+            file_skeletons: List[ClassSkeleton] = file_type.extract_skeleton(content, os.path.basename(source_file))
+            for skeleton in file_skeletons:
+                skeleton.source_file = relative_path
+            if len(file_skeletons) > 0:
+                skeletons.setdefault(os.path.dirname(relative_path), []).extend(file_skeletons)
+        self.logger.info(f"{sum(len(package_skeletons) for package_skeletons in skeletons.values())} class skeletons extracted " + \
+                         f"from {file_count} source files in {len(skeletons)} packages")
+        return skeletons
+
+    def get_package_name(self, package: str) -> str:
+        """
+        @brief Provides the name of a package in the diagrams.
+
+        @param package The directory of the package relative to the source directory.
+        @return The directory with dots as separators, the project name for the source directory.
+        """
+        return package.replace('/', '.') if len(package) > 0 else self.project_name
+
+    def get_package_diagram_file(self, target_directory: str, package: str) -> str:
+        """
+        @brief Provides the path of the diagram of a package.
+
+        @param target_directory The directory the diagrams are written to.
+        @param package The directory of the package relative to the source directory.
+        @return The path of the diagram, in the directory of the package within the target directory.
+        """
+        return os.path.join(target_directory, *package.split('/'), self.package_diagram_name)
+
+    def get_request_text(self, request_text: str) -> str:
+        """
+        @brief Provides the request sent with the skeletons.
+
+        @param request_text The request of the selected code request.
+        @return The request followed by the description of the skeletons.
+        """
+        return f"{request_text} {self.skeleton_instructions}"
+
+    def create_batches(self, skeletons: Dict[str, List[ClassSkeleton]], budget_tokens: int = None) -> List[Dict]:
+        """
+        @brief Groups the skeletons of each package in batches, the skeletons of one source file never being split.
+
+        @param skeletons The skeletons of each package.
+        @param budget_tokens The tokens the content of one request may have, None if it is only limited by the maximum batch tokens.
+        @return The batches in package order, each with its package, its part number, the number of parts of the package and its skeleton text.
+        """
+        budget_tokens = self.max_batch_tokens if budget_tokens is None else min(budget_tokens, self.max_batch_tokens)
+        batches: List[Dict] = []
+        for package in sorted(skeletons):
+            file_texts: Dict[str, List[str]] = {}
+            for skeleton in skeletons[package]:
+                file_texts.setdefault(skeleton.source_file, [f"# {skeleton.source_file}"]).append(skeleton.to_text())
+            package_texts: List[str] = []
+            package_tokens: int = 0
+            package_batches: List[str] = []
+            for texts in file_texts.values():
+                file_text: str = '\n'.join(texts)
+                file_tokens: int = self.token_estimator.estimate_tokens(file_text)
+                if len(package_texts) > 0 and package_tokens + file_tokens > budget_tokens:
+                    package_batches.append('\n'.join(package_texts) + '\n')
+                    package_texts, package_tokens = [], 0
+                package_texts.append(file_text)
+                package_tokens += file_tokens
+            package_batches.append('\n'.join(package_texts) + '\n')
+            batches.extend({'package': package, 'part': part + 1, 'parts': len(package_batches), 'skeletons': package_batch} \
+                           for part, package_batch in enumerate(package_batches))
+        return batches
+
+    @staticmethod
+    def get_diagram_lines(diagram: str) -> List[str]:
+        """
+        @brief Provides the statements of a diagram, without its start and end tags.
+
+        @param diagram The PlantUML diagram.
+        @return The lines between @startuml and @enduml, the whole diagram if they are missing.
+        """
+        lines: List[str] = diagram.splitlines()
+        start: int = next((index + 1 for index, line in enumerate(lines) if line.strip().startswith('@startuml')), 0)
+        end: int = next((index for index in range(len(lines) - 1, start - 1, -1) if lines[index].strip().startswith('@enduml')), len(lines))
+        return [line.rstrip() for line in lines[start:end]]
+
+    @staticmethod
+    def merge_diagram_lines(diagrams: List[List[str]]) -> List[str]:
+        """
+        @brief Merges the statements of several diagrams, the top level statements declared twice being kept once.
+
+        @param diagrams The statements of each diagram.
+        @return The merged statements, blank lines removed.
+        """
+        merged_lines: List[str] = []
+        top_level_statements: Set[str] = set()
+        for lines in diagrams:
+            depth: int = 0
+            for line in lines:
+                statement: str = line.strip()
+                if len(statement) == 0:
+                    continue
+                if depth == 0 and '{' not in statement:
+                    if statement in top_level_statements:
+                        continue
+                    top_level_statements.add(statement)
+                merged_lines.append(line)
+                depth = max(0, depth + statement.count('{') - statement.count('}'))
+        return merged_lines
+
+    def merge_package_diagrams(self, package: str, diagrams: List[str]) -> str:
+        """
+        @brief Merges the diagrams generated from the batches of a package into the package diagram.
+
+        @param package The directory of the package relative to the source directory.
+        @param diagrams The diagrams of the batches, in part order.
+        @return The package diagram, its classes enclosed in the package and its settings before it.
+        """
+        lines: List[str] = self.merge_diagram_lines([self.get_diagram_lines(diagram) for diagram in diagrams])
+        settings: List[str] = [line for line in lines if self.setting_pattern.match(line) is not None and '{' not in line]
+        package_name: str = self.get_package_name(package)
+        return '\n'.join([f'@startuml {package_name}'] + settings + [f'package "{package_name}" {{'] + \
+                         ['  ' + line for line in lines if line not in settings] + ['}', '@enduml']) + '\n'
+
+    @staticmethod
+    def index_classes(skeletons: Dict[str, List[ClassSkeleton]]) -> Dict[str, str]:
+        """
+        @brief Locates the classes by their simple names.
+
+        @param skeletons The skeletons of each package.
+        @return The package of each class name declared in one package only, the others being ambiguous.
+        """
+        packages_by_name: Dict[str, Set[str]] = {}
+        for package, package_skeletons in skeletons.items():
+            for skeleton in package_skeletons:
+                packages_by_name.setdefault(skeleton.name.split('.')[-1], set()).add(package)
+        return {name: next(iter(packages)) for name, packages in packages_by_name.items() if len(packages) == 1}
+
+    def get_cross_package_relations(self, skeletons: Dict[str, List[ClassSkeleton]]) -> List[str]:
+        """
+        @brief Derives the relations between classes of different packages from the skeletons, which no batch sees both ends of.
+
+        @param skeletons The skeletons of each package.
+        @return The PlantUML relations: inheritance, realization and association from the field types.
+        """
+        class_packages: Dict[str, str] = self.index_classes(skeletons)
+        relations: List[str] = []
+        for package in sorted(skeletons):
+            for skeleton in skeletons[package]:
+                name: str = skeleton.name.split('.')[-1]
+                for arrow, related_names in (('<|--', [re.sub(r'[<\[].*$', '', base).split('.')[-1] for base in skeleton.bases]), \
+                                             ('<|..', [re.sub(r'[<\[].*$', '', interface).split('.')[-1] for interface in skeleton.interfaces])):
+                    for related_name in related_names:
+                        if class_packages.get(related_name, package) != package:
+                            relations.append(f"{related_name} {arrow} {name}")
+                for related_name in sorted(skeleton.get_field_type_names()):
+                    if class_packages.get(related_name, package) != package:
+                        relations.append(f"{name} --> {related_name}")
+        return list(dict.fromkeys(relations))
+
+    def merge_project_diagram(self, package_diagrams: Dict[str, str], skeletons: Dict[str, List[ClassSkeleton]]) -> str:
+        """
+        @brief Merges the package diagrams into the project diagram, and adds the relations between packages.
+
+        @param package_diagrams The diagram of each package.
+        @param skeletons The skeletons of each package.
+        @return The project diagram.
+        """
+        lines: List[str] = self.merge_diagram_lines([self.get_diagram_lines(package_diagrams[package]) for package in sorted(package_diagrams)])
+        relations: List[str] = [relation for relation in self.get_cross_package_relations(skeletons) if relation not in lines]
+        if len(relations) > 0:
+            lines.extend(["' Relations between packages, derived from the class skeletons"] + relations)
+        return '\n'.join([f'@startuml {self.project_name}'] + lines + ['@enduml']) + '\n'
@@ -0,0 +1,415 @@
+"""
+@file uml_skeleton.py
+@brief This module provides the ClassSkeleton class, which describes a class without its code, and the BraceSkeletonParser
+       class, which extracts the skeletons of the languages delimiting their blocks with braces.
+@details Skeletons are extracted locally for the whole tree so that UML class diagrams are reverse engineered from
+         them instead of from the whole source: only the class names, bases, fields and method signatures are sent.
+         The brace parser is lightweight: macros and templates are not expanded, some members may be missed.
+"""
+
+import re
+from typing import List, Set, Tuple
+
+
+class MemberSkeleton:
+    """
+    @class MemberSkeleton
+    @brief A field or a method of a class, without its code.
+
+    @param visibility The UML visibility: + public, # protected, - private, ~ package.
+    @param name The name of the member.
+    @param type_name The type of the field or the return type of the method, empty if unknown.
+    @param parameters The parameters of the method as declared, None for a field.
+    @param modifiers The UML modifiers, such as {static} or {abstract}.
+    """
+
+    def __init__(self, visibility: str, name: str, type_name: str = '', parameters: str = None, modifiers: str = ''):
+        """
+        @brief Initializes the MemberSkeleton object.
+
+        @param visibility The UML visibility: + public, # protected, - private, ~ package.
+        @param name The name of the member.
+        @param type_name The type of the field or the return type of the method, empty if unknown.
+        @param parameters The parameters of the method as declared, None for a field.
+        @param modifiers The UML modifiers, such as {static} or {abstract}.
+        """
+        self.visibility: str = visibility
+        self.name: str = name
+        self.type_name: str = type_name
+        self.parameters: str = parameters
+        self.modifiers: str = modifiers
+
+    def is_method(self) -> bool:
+        """
+        @brief Tells whether the member is a method.
+
+        @return True for a method, False for a field.
+        """
+        return self.parameters is not None
+
+    def to_signature(self, owner_name: str = None) -> str:
+        """
+        @brief Renders the declaration of the member on one line, without its visibility.
+
+        @param owner_name The name of the class prefixing the member name, None for no prefix.
+        @return For instance 'count: int' or '{static} Parser.parse(text: str): Dict'.
+        """
+        text: str = f"{self.modifiers + ' ' if len(self.modifiers) > 0 else ''}{owner_name + '.' if owner_name is not None else ''}{self.name}"
+        if self.is_method():
+            text += f"({' '.join(self.parameters.split())})"
+        if len(self.type_name) > 0:
+            text += f": {' '.join(self.type_name.split())}"
+        return text
+
+    def to_text(self) -> str:
+        """
+        @brief Renders the member on one line, in the UML notation.
+
+        @return For instance '- count: int' or '+ {static} parse(text: str): Dict'.
+        """
+        return f"{self.visibility} {self.to_signature()}"
+
+
+class ClassSkeleton:
+    """
+    @class ClassSkeleton
+    @brief A class, interface, struct or enum of a source file, reduced to its bases and the declarations of its members.
+
+    @param name The name of the class, prefixed with the names of the classes it is nested in.
+    @param kind The kind of the class: class, abstract class, interface, struct or enum.
+    @param bases The classes it extends.
+    @param interfaces The interfaces it implements.
+    @param members The fields and methods, in declaration order.
+    @param source_file The path of the source file relative to the source directory.
+    """
+
+    def __init__(self, name: str, kind: str = 'class', bases: List[str] = None, interfaces: List[str] = None, \
+                 members: List[MemberSkeleton] = None, source_file: str = None):
+        """
+        @brief Initializes the ClassSkeleton object.
+
+        @param name The name of the class, prefixed with the names of the classes it is nested in.
+        @param kind The kind of the class: class, abstract class, interface, struct or enum.
+        @param bases The classes it extends.
+        @param interfaces The interfaces it implements.
+        @param members The fields and methods, in declaration order.
+        @param source_file The path of the source file relative to the source directory.
+        """
+        self.name: str = name
+        self.kind: str = kind
+        self.bases: List[str] = bases if bases is not None else []
+        self.interfaces: List[str] = interfaces if interfaces is not None else []
+        self.members: List[MemberSkeleton] = members if members is not None else []
+        self.source_file: str = source_file
+
+    @staticmethod
+    def get_type_names(type_name: str) -> Set[str]:
+        """
+        @brief Provides the names a type refers to, so that List[Node] or std::vector<Node*> refer to Node.
+
+        @param type_name The type, as declared.
+        @return The last component of every qualified name of the type.
+        """
+        return {name.split('.')[-1] for name in re.findall(r'[A-Za-z_][\w.]*', type_name.replace('::', '.'))}
+
+    def get_field_type_names(self) -> Set[str]:
+        """
+        @brief Provides the names the types of the fields refer to, the candidates of the associations of the class.
+
+        @return The names.
+        """
+        type_names: Set[str] = set()
+        for member in self.members:
+            if not member.is_method():
+                type_names |= self.get_type_names(member.type_name)
+        return type_names
+
+    def to_text(self) -> str:
+        """
+        @brief Renders the skeleton in a compact text, one line for the class and one per member.
+
+        @return The skeleton.
+        """
+        lines: List[str] = [self.kind + ' ' + self.name + \
+                            (' extends ' + ', '.join(self.bases) if len(self.bases) > 0 else '') + \
+                            (' implements ' + ', '.join(self.interfaces) if len(self.interfaces) > 0 else '')]
+        lines.extend('  ' + member.to_text() for member in self.members)
+        return '\n'.join(lines)
+
+
+class BraceSkeletonParser:
+    """
+    @class BraceSkeletonParser
+    @brief This class extracts the class skeletons of a Java, Typescript or C++ source, its comments being removed beforehand.
+
+    @param language_name The dialect parsed: java, typescript or c++.
+    """
+
+    """
+    @brief Declarations of the classes: the kind, the name and what precedes the opening brace of the body.
+    """
+    class_pattern: re.Pattern = re.compile(r'\b(class|interface|struct|enum(?:\s+class|\s+struct)?)\s+([A-Za-z_]\w*)([^{};()]*)\{')
+
+    """
+    @brief Keywords which never name a member, and modifiers removed from the declarations.
+    """
+    statement_keywords: Set[str] = {'if', 'for', 'while', 'switch', 'catch', 'return', 'new', 'sizeof', 'throw', 'using', 'typedef', \
+                                    'friend', 'template', 'operator', 'namespace', 'static_assert'}
+    modifiers: Set[str] = {'public', 'private', 'protected', 'static', 'final', 'abstract', 'virtual', 'inline', 'explicit', \
+                           'override', 'async', 'readonly', 'export', 'default', 'declare', 'synchronized', 'native', 'transient', \
+                           'volatile', 'constexpr', 'mutable', 'extern', 'noexcept', 'const'}
+
+    def __init__(self, language_name: str):
+        """
+        @brief Initializes the BraceSkeletonParser object.
+
+        @param language_name The dialect parsed: java, typescript or c++.
+        """
+        self.language_name: str = language_name.lower()
+
+    def _blank_strings(self, content: str) -> str:
+        """
+        @brief Empties the string and character literals, so that the braces and semicolons they hold are ignored.
+
+        @param content The source, without comments.
+        @return The source with empty literals, and without its preprocessor lines.
+        """
+        delimiters: str = '"\'`' if self.language_name == 'typescript' else '"\''
+        content = re.sub(f'([{delimiters}])(?:\\\\.|(?!\\1).)*?\\1', r'\1\1', content, flags=re.DOTALL if self.language_name == 'typescript' else 0)
+        if self.language_name == 'c++':
+            content = re.sub(r'^[ \t]*#.*?(?<!\\)$', '', content, flags=re.MULTILINE)
+        return content
+
+    @staticmethod
+    def _remove_generics(text: str) -> str:
+        """
+        @brief Removes the type parameters and arguments of a declaration.
+
+        @param text The declaration.
+        @return The declaration without anything between angle brackets.
+        """
+        previous_text: str = None
+        while previous_text != text:
+            previous_text, text = text, re.sub(r'<[^<>]*>', '', text)
+        return text
+
+    @staticmethod
+    def _find_block_end(content: str, start: int) -> int:
+        """
+        @brief Finds the brace closing a block.
+
+        @param content The source.
+        @param start The position of the opening brace.
+        @return The position of the closing brace, the end of the source if it is missing.
+        """
+        depth: int = 0
+        for index in range(start, len(content)):
+            if content[index] == '{':
+                depth += 1
+            elif content[index] == '}':
+                depth -= 1
+                if depth == 0:
+                    return index
+        return len(content)
+
+    @staticmethod
+    def _split_declarations(body: str) -> List[Tuple[str, bool]]:
+        """
+        @brief Splits a class body into the declarations of its members, the blocks they open being skipped.
+
+        @param body The class body, between its braces.
+        @return The declarations, each with True if it opens a block (a method body, a nested class, an initializer).
+        """
+        declarations: List[Tuple[str, bool]] = []
+        start: int = 0
+        depth: int = 0
+        parentheses: int = 0
+        for index, character in enumerate(body):
+            if character == '(':
+                parentheses += 1
+            elif character == ')':
+                parentheses = max(0, parentheses - 1)
+            elif character == '{' and parentheses == 0:
+                if depth == 0:
+                    declarations.append((body[start:index], True))
+                depth += 1
+            elif character == '}' and parentheses == 0:
+                depth = max(0, depth - 1)
+                if depth == 0:
+                    start = index + 1
+            elif character == ';' and depth == 0 and parentheses == 0:
+                declarations.append((body[start:index], False))
+                start = index + 1
+        if len(body[start:].strip()) > 0:
+            declarations.append((body[start:], False))
+        return declarations
+
+    def _parse_bases(self, header: str) -> Tuple[List[str], List[str]]:
+        """
+        @brief Reads the classes extended and the interfaces implemented from what follows the class name.
+
+        @param header The declaration between the class name and its body.
+        @return The bases and the interfaces.
+        """
+        header = self._remove_generics(header)
+        if self.language_name == 'c++':
+            match: re.Match = re.search(r'(?<!:):(?!:)(.*)$', header, re.DOTALL)
+            if match is None:
+                return [], []
+            bases: List[str] = [' '.join(word for word in base.split() if word not in ('public', 'private', 'protected', 'virtual')) \
+                                for base in match.group(1).split(',')]
+            return [base for base in bases if len(base) > 0], []
+        extends_match: re.Match = re.search(r'\bextends\s+(.*?)(?=\bimplements\b|$)', header, re.DOTALL)
+        implements_match: re.Match = re.search(r'\bimplements\s+(.*)$', header, re.DOTALL)
+        return [base.strip() for base in extends_match.group(1).split(',') if len(base.strip()) > 0] if extends_match is not None else [], \
+            [interface.strip() for interface in implements_match.group(1).split(',') if len(interface.strip()) > 0] if implements_match is not None else []
+
+    def _get_visibility(self, words: List[str], default_visibility: str) -> str:
+        """
+        @brief Reads the visibility of a member from the modifiers of its declaration.
+
+        @param words The words of the declaration.
+        @param default_visibility The visibility of the members declared without modifier.
+        @return The UML visibility.
+        """
+        if 'private' in words:
+            return '-'
+        if 'protected' in words:
+            return '#'
+        if 'public' in words:
+            return '+'
+        return default_visibility
+
+    def _parse_method(self, declaration: str, visibility: str, class_name: str) -> MemberSkeleton:
+        """
+        @brief Reads a method from its declaration.
+
+        @param declaration The declaration, up to its body or its semicolon.
+        @param visibility The visibility of the method.
+        @param class_name The simple name of the class, its constructors having no return type.
+        @return The method, None if the declaration is not a method.
+        """
+        match: re.Match = re.match(r'(.*?)(~?[A-Za-z_$][\w$]*)\s*\??\s*\((.*?)\)(.*)$', declaration, re.DOTALL)
+        if match is None or match.group(2) in self.statement_keywords:
+            return None
+        prefix_words: List[str] = match.group(1).split()
+        modifiers: str = ' '.join(f'{{{word}}}' for word in ('static', 'abstract') if word in prefix_words)
+        if self.language_name == 'c++' and re.search(r'=\s*0\s*$', match.group(4)) is not None:
+            modifiers = '{abstract}'
+        type_name: str = ' '.join(word for word in prefix_words if word not in self.modifiers)
+        if self.language_name == 'typescript':
+            return_type_match: re.Match = re.match(r'\s*:\s*(.+)$', match.group(4), re.DOTALL)
+            type_name = return_type_match.group(1).strip() if return_type_match is not None else ''
+        if match.group(2) in (class_name, '~' + class_name, 'constructor'):
+            type_name = ''
+        return MemberSkeleton(visibility, match.group(2), type_name, match.group(3), modifiers)
+
+    def _parse_fields(self, declaration: str, visibility: str) -> List[MemberSkeleton]:
+        """
+        @brief Reads the fields declared by a declaration.
+
+        @param declaration The declaration, without its initializer.
+        @param visibility The visibility of the fields.
+        @return The fields, empty if the declaration declares none.
+        """
+        words: List[str] = declaration.split()
+        modifiers: str = '{static}' if 'static' in words else ''
+        declaration = ' '.join(word for word in words if word not in self.modifiers)
+        if len(declaration) == 0:
+            return []
+        if self.language_name == 'typescript':
+            match: re.Match = re.match(r'([#A-Za-z_$][\w$]*)\s*[?!]?\s*(?::\s*(.+))?$', declaration, re.DOTALL)
+            if match is None:
+                return []
+            return [MemberSkeleton('-' if match.group(1).startswith('#') else visibility, match.group(1), match.group(2) or '', None, modifiers)]
+        declarators: List[str] = self._remove_generics(declaration).split(',')
+        match = re.match(r'(.*?)([A-Za-z_]\w*)\s*(\[[^\]]*\])*\s*$', declarators[0], re.DOTALL)
+        if match is None or len(match.group(1).strip()) == 0:
+            return []
+        type_name: str = declaration[:declaration.rfind(match.group(2))].strip() if len(declarators) == 1 else match.group(1).strip()
+        names: List[str] = [match.group(2)] + [re.sub(r'[^\w]', '', declarator) for declarator in declarators[1:]]
+        return [MemberSkeleton(visibility, name, type_name, None, modifiers) for name in names if len(name) > 0]
+
+    def _parse_enum_constants(self, body: str) -> List[MemberSkeleton]:
+        """
+        @brief Reads the constants of an enum.
+
+        @param body The enum body, between its braces.
+        @return The constants, as public fields without type.
+        """
+        constants: str = self._split_declarations(body)[0][0] if len(body.strip()) > 0 else ''
+        names: List[str] = [re.match(r'\s*([A-Za-z_]\w*)', constant) for constant in constants.split(',')]
+        return [MemberSkeleton('+', name.group(1)) for name in names if name is not None]
+
+    def _parse_members(self, body: str, class_name: str, kind: str) -> List[MemberSkeleton]:
+        """
+        @brief Reads the members declared in a class body, the nested classes being parsed on their own.
+
+        @param body The class body, between its braces.
+        @param class_name The simple name of the class.
+        @param kind The kind of the class.
+        @return The fields and the methods, in declaration order.
+        """
+        if kind.startswith('enum') and self.language_name != 'java':
+            return self._parse_enum_constants(body)
+        members: List[MemberSkeleton] = []
+        if kind.startswith('enum'):
+            members = self._parse_enum_constants(body)
+            declarations: List[Tuple[str, bool]] = self._split_declarations(body)[1:]
+        else:
+            declarations = self._split_declarations(body)
+        if self.language_name == 'c++':
+            default_visibility: str = '+' if kind == 'struct' else '-'
+        elif self.language_name == 'java':
+            default_visibility = '+' if kind == 'interface' else '~'
+        else:
+            default_visibility = '+'
+        for declaration, opens_block in declarations:
+            if self.language_name == 'c++':
+                label: re.Match = re.match(r'\s*(public|private|protected)\s*:(?!:)', declaration)
+                while label is not None:
+                    default_visibility = self._get_visibility([label.group(1)], default_visibility)
+                    declaration = declaration[label.end():]
+                    label = re.match(r'\s*(public|private|protected)\s*:(?!:)', declaration)
+            declaration = re.sub(r'@[\w.]+(\s*\([^()]*\))?', ' ', declaration).strip()
+            if len(declaration) == 0 or declaration.split()[0] in self.statement_keywords or \
+                    self.class_pattern.search(declaration + '{') is not None:
+                continue
+            visibility: str = self._get_visibility(declaration.split(), default_visibility)
+            assignment: int = re.search(r'(?<![=!<>])=(?!=)|$', declaration).start()
+            parenthesis: int = declaration.find('(')
+            if 0 <= parenthesis < assignment:
+                method: MemberSkeleton = self._parse_method(declaration, visibility, class_name)
+                if method is not None:
+                    if kind == 'interface' and len(method.modifiers) == 0 and self.language_name == 'java' and 'default' not in declaration.split():
+                        method.modifiers = '{abstract}'
+                    members.append(method)
+            elif not opens_block or assignment < len(declaration):
+                members.extend(self._parse_fields(declaration[:assignment], visibility))
+        return members
+
+    def parse(self, content: str) -> List[ClassSkeleton]:
+        """
+        @brief Extracts the skeletons of the classes of a source.
+
+        @param content The source, without comments.
+        @return The skeletons, in declaration order, the nested classes being named after the classes they are nested in.
+        """
+        content = self._blank_strings(content)
+        skeletons: List[ClassSkeleton] = []
+        enclosing_classes: List[Tuple[str, int]] = []
+        for match in self.class_pattern.finditer(content):
+            body_start: int = match.end() - 1
+            body_end: int = self._find_block_end(content, body_start)
+            while len(enclosing_classes) > 0 and enclosing_classes[-1][1] < body_start:
+                enclosing_classes.pop()
+            kind: str = ' '.join(match.group(1).split())
+            bases, interfaces = self._parse_bases(match.group(3))
+            if kind == 'class' and re.search(r'\babstract\s+$', content[max(0, match.start() - 64):match.start()]) is not None:
+                kind = 'abstract class'
+            name: str = '.'.join([enclosing_class[0] for enclosing_class in enclosing_classes] + [match.group(2)])
+            skeletons.append(ClassSkeleton(name, kind.split()[0] if kind.startswith('enum') else kind, bases, interfaces, \
+                                           self._parse_members(content[body_start + 1:body_end], match.group(2), kind)))
+            enclosing_classes.append((match.group(2), body_end))
+        return skeletons
+
@@ -0,0 +1,235 @@
+"""
+@file work_queue_worker.py
+@brief This module provides the WorkQueueWorker class, which claims source files from a work queue and keeps their leases alive.
+@details The worker leases a few files at a time, and a background thread renews the leases of the files being
+         processed. A file is completed in the queue once each of its target files has an outcome. When the worker
+         stops, the files it still holds are given back to the queue.
+"""
+
+import os
+import socket
+import threading
+from logging import Logger
+from typing import Dict, List
+
+from domain.iwork_queue import IWorkQueue
+
+
+class WorkQueueWorker:
+    """
+    @class WorkQueueWorker
+    @brief This class claims the source files of a run from a work queue on behalf of one process, from any thread.
+
+    @param work_queue The queue shared with the coordinator and the other workers.
+    @param logger A logger instance for logging messages.
+    @param worker_id The identifier of the worker, the host name and process id if not set.
+    @param lease_seconds The duration of the leases, renewed every third of it.
+    @param claim_count The number of files leased at once, a worker holding at most twice as many.
+    """
+
+    """
+    @brief Outcomes of target files which fail the source file in the queue, so that enqueuing it again retries it.
+    """
+    failed_outcomes: List[str] = ['failed']
+
+    """
+    @brief Maximum time to wait before polling again a queue whose remaining files are all leased by other workers.
+    """
+    max_poll_seconds: float = 5.0
+
+    def __init__(self, work_queue: IWorkQueue, logger: Logger, worker_id: str = None, lease_seconds: float = 300.0, claim_count: int = 1):
+        """
+        @brief Initializes the WorkQueueWorker object.
+
+        @param work_queue The queue shared with the coordinator and the other workers.
+        @param logger A logger instance for logging messages.
+        @param worker_id The identifier of the worker, the host name and process id if not set.
+        @param lease_seconds The duration of the leases, renewed every third of it.
+        @param claim_count The number of files leased at once, a worker holding at most twice as many.
+        """
+        self.work_queue: IWorkQueue = work_queue
+        self.logger: Logger = logger
+        self.worker_id: str = worker_id if worker_id is not None else f'{socket.gethostname()}:{os.getpid()}'
+        self.lease_seconds: float = lease_seconds
+        self.claim_count: int = max(1, claim_count)
+        self.completed: int = 0
+        self._items: Dict[int, Dict] = {}
+        self._item_ids_by_target_file: Dict[str, int] = {}
+        self.max_held: int = 2 * self.claim_count
+        self._lock: threading.Lock = threading.Lock()
+        self._held_changed: threading.Condition = threading.Condition(self._lock)
+        self._stopped: threading.Event = threading.Event()
+        self._renewal_thread: threading.Thread = None
+
+    @staticmethod
+    def describe_run(source_directory: str, target_directory: str, model_name: str, code_request_ids: List[int]) -> Dict:
+        """
+        @brief Describes the run a work queue is created for, recorded in its settings by the coordinator.
+
+        @param source_directory The source directory of the run.
+        @param target_directory The target directory of the run.
+        @param model_name The name of the LLM model.
+        @param code_request_ids The ids of the code requests.
+        @return The settings.
+        """
+        return {
+            'source_directory': os.path.abspath(source_directory),
+            'target_directory': os.path.abspath(target_directory),
+            'model_name': model_name,
+            'code_request_ids': list(code_request_ids)
+        }
+
+    @staticmethod
+    def get_mismatches(settings: Dict, model_name: str, code_request_ids: List[int]) -> List[str]:
+        """
+        @brief Compares a run with the run a work queue was created for. The directories may be mounted elsewhere on each host.
+
+        @param settings The settings of the work queue, as described by describe_run.
+        @param model_name The name of the LLM model of the run.
+        @param code_request_ids The ids of the code requests of the run.
+        @return The descriptions of the differences, empty if the run may process the queue.
+        """
+        mismatches: List[str] = []
+        if settings.get('model_name') != model_name:
+            mismatches.append(f"model {settings.get('model_name')} instead of {model_name}")
+        if settings.get('code_request_ids') != list(code_request_ids):
+            mismatches.append(f"code requests {settings.get('code_request_ids')} instead of {list(code_request_ids)}")
+        return mismatches
+
+    @staticmethod
+    def describe_status(status: Dict) -> str:
+        """
+        @brief Summarizes the progress of a work queue in one line.
+
+        @param status The status as returned by IWorkQueue.get_status.
+        @return The summary.
+        """
+        states: Dict[str, int] = status['states']
+        description: str = f"{status['items']} files: {states['done']} done, {states['failed']} failed, {states['leased']} leased " \
+                           f"({status['expired_leases']} expired), {states['queued']} queued, {len(status['workers'])} workers"
+        if status['remaining_seconds'] is not None and states['queued'] + states['leased'] > 0:
+            description += f", {status['files_per_second']:.2f} files/s, about {status['remaining_seconds'] / 60:.1f} minutes remaining"
+        return description
+
+    def claim_items(self) -> List[Dict]:
+        """
+        @brief Leases the next source files, waiting while the remaining ones are leased by other workers which may stop.
+        @details The pipeline reads ahead of the files being processed: the files held are limited, so that the
+                 worker does not lease files the other workers could process meanwhile.
+
+        @return The leased items, with their item_id and source_file, empty once every file of the queue is done or failed.
+        """
+        while not self._stopped.is_set():
+            with self._lock:
+                while len(self._items) >= self.max_held and not self._stopped.is_set():
+                    self._held_changed.wait(self.max_poll_seconds)
+                count: int = min(self.claim_count, self.max_held - len(self._items))
+            if count <= 0:
+                break
+            items: List[Dict] = self.work_queue.claim(self.worker_id, count, self.lease_seconds)
+            if len(items) > 0:
+                with self._lock:
+                    for item in items:
+                        self._items[item['item_id']] = dict(item, target_files=None, outcomes={})
+                self._start_renewal_thread()
+                return items
+            states: Dict[str, int] = self.work_queue.get_status()['states']
+            with self._lock:
+                leased_by_others: int = states['leased'] - len(self._items)
+            if states['queued'] == 0 and leased_by_others <= 0:
+                return []
+            # Files leased by other workers come back to the queue if their worker stops renewing them
+            self._stopped.wait(min(self.max_poll_seconds, self.lease_seconds / 4))
+        return []
+
+    def track(self, item_id: int, target_files: List[str]) -> None:
+        """
+        @brief Records the target files generated from a leased source file, completed once they all have an outcome.
+
+        @param item_id The leased item.
+        @param target_files The target files, empty if the source file does not match any code request.
+        """
+        with self._lock:
+            item: Dict = self._items[item_id]
+            item['target_files'] = list(target_files)
+            for target_file in target_files:
+                self._item_ids_by_target_file[target_file] = item_id
+        self._complete_if_finished(item_id)
+
+    def record_outcome(self, target_file: str, outcome: str) -> None:
+        """
+        @brief Records the outcome of a target file, possibly from the background thread of the output sink.
+
+        @param target_file The target file.
+        @param outcome The outcome as recorded in the run metrics.
+        """
+        with self._lock:
+            item_id: int = self._item_ids_by_target_file.pop(target_file, None)
+            if item_id is None:
+                return
+            self._items[item_id]['outcomes'][target_file] = outcome
+        self._complete_if_finished(item_id)
+
+    def _complete_if_finished(self, item_id: int) -> None:
+        """
+        @brief Completes a leased item in the queue once every target file has an outcome.
+
+        @param item_id The leased item.
+        """
+        with self._lock:
+            item: Dict = self._items.get(item_id)
+            if item is None or item['target_files'] is None or len(item['outcomes']) < len(item['target_files']):
+                return
+            del self._items[item_id]
+            self._held_changed.notify_all()
+        outcomes: List[str] = sorted(set(item['outcomes'].values()))
+        self.work_queue.complete(self.worker_id, item_id, ','.join(outcomes) if len(outcomes) > 0 else 'skipped', \
+                                 any(outcome in self.failed_outcomes for outcome in outcomes))
+        self.completed += 1
+
+    def _start_renewal_thread(self) -> None:
+        """
+        @brief Starts the thread renewing the leases, once.
+        """
+        if self._renewal_thread is None:
+            self._renewal_thread = threading.Thread(target=self._renew_leases, name='lease-renewal', daemon=True)
+            self._renewal_thread.start()
+
+    def _renew_leases(self) -> None:
+        """
+        @brief Background thread: renews the leases of the items held every third of the lease duration until stopped.
+        """
+        while not self._stopped.wait(self.lease_seconds / 3):
+            with self._lock:
+                item_ids: List[int] = list(self._items)
+            if len(item_ids) == 0:
+                continue
+            try:
+                held_item_ids: List[int] = self.work_queue.renew(self.worker_id, item_ids, self.lease_seconds)
+            except Exception as err:
+                self.logger.warning(f"The leases of {self.worker_id} could not be renewed: {err}")
+                continue
+            for item_id in set(item_ids) - set(held_item_ids):
+                with self._lock:
+                    item: Dict = self._items.get(item_id)
+                if item is not None:
+                    self.logger.warning(f"The lease on {item['source_file']} was lost: another worker may process it too.")
+
+    def stop(self) -> None:
+        """
+        @brief Stops renewing the leases and gives the files still held back to the queue.
+        """
+        self._stopped.set()
+        with self._lock:
+            self._held_changed.notify_all()
+        if self._renewal_thread is not None:
+            self._renewal_thread.join()
+            self._renewal_thread = None
+        with self._lock:
+            item_ids: List[int] = list(self._items)
+            self._items.clear()
+            self._item_ids_by_target_file.clear()
+        if len(item_ids) > 0:
+            self.logger.warning(f"{len(item_ids)} files leased by {self.worker_id} were not processed, they are given back to the queue.")
+            self.work_queue.release(self.worker_id, item_ids)
+        self.logger.info(f"Worker {self.worker_id} completed {self.completed} files.")
@@ -0,0 +1,238 @@
+"""
+Module for submitting batches of requests.
+
+This module provides the class OpenAIBatchBackend, which submits batch files to the OpenAI Batch API,
+and LocalFileBatchBackend, a stand-in for the batch endpoint working on a local directory, used for testing
+and for simulated runs.
+"""
+
+import json
+import os
+import shutil
+import uuid
+from logging import Logger
+from pprint import pformat
+from typing import Dict, List
+
+from domain.ibatch_backend import IBatchBackend
+
+
+class OpenAIBatchBackend(IBatchBackend):
+    """
+    Class submitting batch files to the OpenAI Batch API.
+
+    Attributes:
+        client (OpenAI): The OpenAI client object.
+        completion_window (str): The time frame within which the batches shall be processed.
+    """
+
+    """
+    Retries of the SDK on the connection errors, rate limits and server errors of the batch calls.
+    """
+    max_retries: int = 2
+
+    def __init__(self, logger: Logger, client, completion_window: str = '24h'):
+        """
+        Initializes the OpenAIBatchBackend instance.
+
+        Args:
+            logger (Logger): The logger instance used for logging.
+            client (OpenAI): The OpenAI client object.
+            completion_window (str): The time frame within which the batches shall be processed.
+        """
+        self.logger: Logger = logger
+        # The client of the requests does not retry, the uploads and polls of the batches keep the retries of the SDK
+        self.client = client.with_options(max_retries=self.max_retries)
+        self.completion_window: str = completion_window
+
+    def submit(self, batch_file: str) -> str:
+        """
+        Uploads a batch file and creates the batch processing it.
+
+        Args:
+            batch_file (str): The path of the JSONL file.
+
+        Returns:
+            str: The identifier of the batch.
+        """
+        with open(batch_file, 'rb') as file:
+            input_file = self.client.files.create(file=file, purpose='batch')
+        batch = self.client.batches.create(input_file_id=input_file.id, endpoint='/v1/chat/completions', \
+                                           completion_window=self.completion_window)
+        self.logger.info(f"Batch {batch.id} was submitted from {batch_file}")
+        return batch.id
+
+    def get_status(self, batch_id: str) -> str:
+        """
+        Retrieves the status of a batch.
+
+        Args:
+            batch_id (str): The identifier of the batch.
+
+        Returns:
+            str: The status of the batch.
+        """
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.request_counts is not None:
+            self.logger.info(f"Batch {batch_id} is {batch.status}: {batch.request_counts.completed} completed, " + \
+                             f"{batch.request_counts.failed} failed out of {batch.request_counts.total} requests")
+        else:
+            self.logger.info(f"Batch {batch_id} is {batch.status}")
+        return batch.status
+
+    def get_results(self, batch_id: str) -> Dict:
+        """
+        Downloads the output and error files of a batch.
+
+        Args:
+            batch_id (str): The identifier of the batch.
+
+        Returns:
+            Dict: The results by custom_id.
+        """
+        batch = self.client.batches.retrieve(batch_id)
+        results: Dict = {}
+        for file_id in [batch.error_file_id, batch.output_file_id]:
+            if file_id is not None:
+                results.update(self.parse_result_lines(self.client.files.content(file_id).text.splitlines()))
+        return results
+
+
+class LocalFileBatchBackend(IBatchBackend):
+    """
+    Class standing in for the batch endpoint with a local directory.
+
+    Each submitted batch gets a directory holding a copy of its input file. The batch is processed when it
+    has been polled polls_before_completion times: each request gets the response LLMAccessSimulator would
+    return, unless an output.jsonl file was already placed in the batch directory, in which case it is used as is.
+
+    Attributes:
+        batch_directory (str): The directory where the batches are stored.
+        polls_before_completion (int): The number of times a batch is reported in progress before being processed.
+    """
+
+    input_file_name: str = "input.jsonl"
+    """
+    The name of the copy of the submitted batch file.
+    """
+
+    output_file_name: str = "output.jsonl"
+    """
+    The name of the file holding the results of the batch.
+    """
+
+    status_file_name: str = "status.json"
+    """
+    The name of the file holding the status of the batch.
+    """
+
+    def __init__(self, batch_directory: str, logger: Logger, polls_before_completion: int = 1):
+        """
+        Initializes the LocalFileBatchBackend instance.
+
+        Args:
+            batch_directory (str): The directory where the batches are stored.
+            logger (Logger): The logger instance used for logging.
+            polls_before_completion (int): The number of times a batch is reported in progress before being processed.
+        """
+        self.batch_directory: str = batch_directory
+        self.logger: Logger = logger
+        self.polls_before_completion: int = polls_before_completion
+
+    def _read_status(self, batch_id: str) -> Dict:
+        """
+        Reads the status file of a batch.
+        """
+        with open(os.path.join(self.batch_directory, batch_id, self.status_file_name), 'r', encoding="utf-8") as file:
+            return json.load(file)
+
+    def _write_status(self, batch_id: str, status: Dict) -> None:
+        """
+        Writes the status file of a batch.
+        """
+        with open(os.path.join(self.batch_directory, batch_id, self.status_file_name), 'w', encoding="utf-8") as file:
+            json.dump(status, file)
+
+    def submit(self, batch_file: str) -> str:
+        """
+        Copies a batch file into a new batch directory.
+
+        Args:
+            batch_file (str): The path of the JSONL file.
+
+        Returns:
+            str: The identifier of the batch.
+        """
+        batch_id: str = f"batch_{uuid.uuid4().hex}"
+        os.makedirs(os.path.join(self.batch_directory, batch_id))
+        shutil.copyfile(batch_file, os.path.join(self.batch_directory, batch_id, self.input_file_name))
+        self._write_status(batch_id, {'status': 'validating', 'polls': 0})
+        self.logger.info(f"Batch {batch_id} was submitted from {batch_file} to {self.batch_directory}")
+        return batch_id
+
+    def get_status(self, batch_id: str) -> str:
+        """
+        Provides the status of a batch, processing it once it has been polled enough.
+
+        Args:
+            batch_id (str): The identifier of the batch.
+
+        Returns:
+            str: The status of the batch.
+        """
+        status: Dict = self._read_status(batch_id)
+        if status['status'] not in self.terminal_statuses:
+            status['polls'] += 1
+            if status['polls'] > self.polls_before_completion:
+                self._process(batch_id)
+                status['status'] = 'completed'
+            else:
+                status['status'] = 'in_progress'
+            self._write_status(batch_id, status)
+        self.logger.info(f"Batch {batch_id} is {status['status']}")
+        return status['status']
+
+    def _process(self, batch_id: str) -> None:
+        """
+        Writes the output file of a batch, unless one was already provided.
+        """
+        output_file: str = os.path.join(self.batch_directory, batch_id, self.output_file_name)
+        if os.path.isfile(output_file):
+            return
+        output_lines: List[str] = []
+        with open(os.path.join(self.batch_directory, batch_id, self.input_file_name), 'r', encoding="utf-8") as file:
+            for line in file:
+                if len(line.strip()) == 0:
+                    continue
+                request: Dict = json.loads(line)
+                response_message: str = f"# No calls performed\nOriginal request:\n{pformat(request['body']['messages'])}"
+                output_lines.append(json.dumps({
+                    'id': f"batch_req_{uuid.uuid4().hex}",
+                    'custom_id': request['custom_id'],
+                    'response': {
+                        'status_code': 200,
+                        'body': {
+                            'model': request['body']['model'],
+                            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': response_message}, 'finish_reason': 'stop'}]
+                        }
+                    },
+                    'error': None
+                }))
+        with open(output_file, 'w', encoding="utf-8") as file:
+            file.write('\n'.join(output_lines) + '\n')
+
+    def get_results(self, batch_id: str) -> Dict:
+        """
+        Reads the output file of a batch.
+
+        Args:
+            batch_id (str): The identifier of the batch.
+
+        Returns:
+            Dict: The results by custom_id.
+        """
+        output_file: str = os.path.join(self.batch_directory, batch_id, self.output_file_name)
+        if not os.path.isfile(output_file):
+            return {}
+        with open(output_file, 'r', encoding="utf-8") as file:
+            return self.parse_result_lines(file.readlines())
@@ -6,8 +6,13 @@ Each class provides methods for getting source file extensions and comment chara
 """
 
 from domain.ifile_type import FileTypeInterface
-from typing import List
+from domain.uml_skeleton import BraceSkeletonParser, ClassSkeleton, MemberSkeleton
+from typing import Dict, List, Tuple
+import ast
+import io
+import os
 import re
+import tokenize
 
 class PythonFileType(FileTypeInterface):
     """
@@ -32,6 +37,166 @@ class PythonFileType(FileTypeInterface):
         """
         return "#"
 
+    def _get_comment_syntax(self, file_name: str = None) -> Tuple[List[str], List[Tuple[str, str]]]:
+        """
+        Gets the comment syntax of Python files.
+
+        @return The line comment marker, Python having no block comment.
+        """
+        return ['#'], []
+
+    def strip_comments(self, content: str, file_name: str = None) -> str:
+        """
+        Removes the comments of a Python file with the Python tokenizer, so that strings and docstrings are never altered.
+
+        A line holding only a comment is removed, a shebang line is kept. A file the tokenizer rejects is scanned as any other file.
+
+        @return The content without comments.
+        """
+        try:
+            comments: List[tokenize.TokenInfo] = [token for token in tokenize.generate_tokens(io.StringIO(content).readline) \
+                                                  if token.type == tokenize.COMMENT]
+        except (tokenize.TokenError, SyntaxError):
+            return super().strip_comments(content, file_name)
+        lines: List[str] = content.splitlines(keepends=True)
+        for comment in comments:
+            row, column = comment.start
+            if row == 1 and column == 0 and comment.string.startswith('#!'):
+                continue
+            line: str = lines[row - 1]
+            code: str = line[:column].rstrip()
+            lines[row - 1] = code + line[len(line.rstrip('\r\n')):] if len(code) > 0 else ''
+        return ''.join(lines)
+
+    @staticmethod
+    def _get_member_visibility(name: str) -> str:
+        """
+        Gets the UML visibility of a Python member from its name.
+
+        @return - for a name mangled member, # for a member prefixed with an underscore, + otherwise.
+        """
+        if name.startswith('__') and not name.endswith('__'):
+            return '-'
+        return '#' if name.startswith('_') and not name.startswith('__') else '+'
+
+    @staticmethod
+    def _get_annotation(annotation: ast.expr) -> str:
+        """
+        Gets the type of an annotation, the quotes of a forward reference being removed.
+
+        @return The type, empty if there is no annotation.
+        """
+        if annotation is None:
+            return ''
+        if isinstance(annotation, ast.Constant) and isinstance(annotation.value, str):
+            return annotation.value
+        return ast.unparse(annotation)
+
+    def _get_method_skeleton(self, function: ast.FunctionDef, bound: bool = True) -> MemberSkeleton:
+        """
+        Gets the skeleton of a method, without its self or cls parameter, or of a module level function if not bound.
+
+        @return The method.
+        """
+        decorators: List[str] = [ast.unparse(decorator).split('.')[-1] for decorator in function.decorator_list]
+        parameters: List[ast.arg] = function.args.posonlyargs + function.args.args
+        if bound and len(parameters) > 0 and 'staticmethod' not in decorators:
+            parameters = parameters[1:]
+        parameters = parameters + ([function.args.vararg] if function.args.vararg is not None else []) + function.args.kwonlyargs + \
+            ([function.args.kwarg] if function.args.kwarg is not None else [])
+        modifiers: str = '{static}' if 'staticmethod' in decorators or 'classmethod' in decorators else \
+            '{abstract}' if 'abstractmethod' in decorators else ''
+        return MemberSkeleton(self._get_member_visibility(function.name), function.name, \
+                              self._get_annotation(function.returns), \
+                              ', '.join(parameter.arg + (': ' + self._get_annotation(parameter.annotation) if parameter.annotation is not None else '') \
+                                        for parameter in parameters), modifiers)
+
+    def _get_instance_fields(self, function: ast.FunctionDef, fields: Dict[str, MemberSkeleton]) -> None:
+        """
+        Gets the fields assigned to self in a method, typed from their annotation, the parameter they are assigned or the class they are created from.
+        """
+        parameter_types: Dict[str, str] = {parameter.arg: self._get_annotation(parameter.annotation) for parameter in function.args.args \
+                                           if parameter.annotation is not None}
+        for node in ast.walk(function):
+            if isinstance(node, ast.AnnAssign):
+                targets, type_name = [node.target], self._get_annotation(node.annotation)
+            elif isinstance(node, ast.Assign):
+                targets, type_name = node.targets, ''
+                if isinstance(node.value, ast.Name):
+                    type_name = parameter_types.get(node.value.id, '')
+                elif isinstance(node.value, ast.Call) and isinstance(node.value.func, (ast.Name, ast.Attribute)) and \
+                        ast.unparse(node.value.func).split('.')[-1][:1].isupper():
+                    type_name = ast.unparse(node.value.func)
+            else:
+                continue
+            for target in targets:
+                if isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name) and target.value.id == 'self' and \
+                        (target.attr not in fields or len(fields[target.attr].type_name) == 0):
+                    fields[target.attr] = MemberSkeleton(self._get_member_visibility(target.attr), target.attr, type_name)
+
+    def extract_skeleton(self, content: str, file_name: str = None) -> List[ClassSkeleton]:
+        """
+        Extracts the skeletons of the classes of a Python file with the Python parser.
+
+        Fields are read from the class attributes and from the attributes assigned to self in the methods. A file the parser rejects has no skeleton.
+
+        @return The class skeletons, in declaration order.
+        """
+        try:
+            tree: ast.Module = ast.parse(content)
+        except (SyntaxError, ValueError):
+            return []
+        skeletons: List[ClassSkeleton] = []
+
+        def add_classes(statements: List[ast.stmt], prefix: str) -> None:
+            for statement in statements:
+                if not isinstance(statement, ast.ClassDef):
+                    continue
+                fields: Dict[str, MemberSkeleton] = {}
+                methods: List[MemberSkeleton] = []
+                for member in statement.body:
+                    if isinstance(member, ast.AnnAssign) and isinstance(member.target, ast.Name):
+                        fields[member.target.id] = MemberSkeleton(self._get_member_visibility(member.target.id), member.target.id, \
+                                                                  self._get_annotation(member.annotation), None, '{static}')
+                    elif isinstance(member, ast.Assign):
+                        for target in member.targets:
+                            if isinstance(target, ast.Name):
+                                fields[target.id] = MemberSkeleton(self._get_member_visibility(target.id), target.id, '', None, '{static}')
+                    elif isinstance(member, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                        methods.append(self._get_method_skeleton(member))
+                for member in statement.body:
+                    if isinstance(member, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                        self._get_instance_fields(member, fields)
+                bases: List[str] = [ast.unparse(base) for base in statement.bases]
+                kind: str = 'class'
+                if any(base.split('.')[-1] in ('Enum', 'IntEnum', 'StrEnum', 'Flag', 'IntFlag') for base in bases):
+                    kind = 'enum'
+                elif any(base.split('.')[-1] == 'ABC' for base in bases) or any(method.modifiers == '{abstract}' for method in methods):
+                    kind = 'abstract class'
+                skeletons.append(ClassSkeleton(prefix + statement.name, kind, \
+                                               [base for base in bases if base.split('.')[-1] not in ('ABC', 'object')], [], \
+                                               list(fields.values()) + methods))
+                add_classes(statement.body, prefix + statement.name + '.')
+
+        add_classes(tree.body, '')
+        return skeletons
+
+    def extract_symbols(self, content: str, file_name: str = None) -> Dict:
+        """
+        Extracts the symbols of a Python file, its module level functions being defined along with its classes.
+
+        @return The definitions, the number of uses of each identifier and the imports.
+        """
+        symbols: Dict = super().extract_symbols(content, file_name)
+        try:
+            tree: ast.Module = ast.parse(content)
+        except (SyntaxError, ValueError):
+            return symbols
+        for statement in tree.body:
+            if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef)) and not statement.name.startswith('__'):
+                symbols['definitions'].append({'name': statement.name, 'signature': 'def ' + self._get_method_skeleton(statement, False).to_signature()})
+        return symbols
+
 class CppFileType(FileTypeInterface):
     """
     Class representing C++ file type.
@@ -56,6 +221,22 @@ class CppFileType(FileTypeInterface):
         # Renamed method to get_cpp_comment_characters for clarity
         return "//"
 
+    def _get_comment_syntax(self, file_name: str = None) -> Tuple[List[str], List[Tuple[str, str]]]:
+        """
+        Gets the comment syntax of C++ files.
+
+        @return The line comment marker and the block comment delimiters.
+        """
+        return ['//'], [('/*', '*/')]
+
+    def extract_skeleton(self, content: str, file_name: str = None) -> List[ClassSkeleton]:
+        """
+        Extracts the skeletons of the classes of a C++ file with the lightweight brace parser, once its comments are removed.
+
+        @return The class skeletons, in declaration order.
+        """
+        return BraceSkeletonParser('c++').parse(self.strip_comments(content, file_name))
+
 class JavaFileType(FileTypeInterface):
     """
     Class representing Java file type.
@@ -81,6 +262,22 @@ class JavaFileType(FileTypeInterface):
 
         return "//"
 
+    def _get_comment_syntax(self, file_name: str = None) -> Tuple[List[str], List[Tuple[str, str]]]:
+        """
+        Gets the comment syntax of Java files.
+
+        @return The line comment marker and the block comment delimiters, Javadoc included.
+        """
+        return ['//'], [('/*', '*/')]
+
+    def extract_skeleton(self, content: str, file_name: str = None) -> List[ClassSkeleton]:
+        """
+        Extracts the skeletons of the classes of a Java file with the lightweight brace parser, once its comments are removed.
+
+        @return The class skeletons, in declaration order.
+        """
+        return BraceSkeletonParser('java').parse(self.strip_comments(content, file_name))
+
 class ShellFileType(FileTypeInterface):
     """
     Class representing Shell file type.
@@ -106,6 +303,22 @@ class ShellFileType(FileTypeInterface):
 
         return "#"
 
+    def _get_comment_syntax(self, file_name: str = None) -> Tuple[List[str], List[Tuple[str, str]]]:
+        """
+        Gets the comment syntax of Shell files.
+
+        @return The line comment marker, shells having no block comment.
+        """
+        return ['#'], []
+
+    def _is_comment_start(self, content: str, index: int) -> bool:
+        """
+        Tells whether a # starts a comment: only at the start of a word, unlike in $# or ${#name}.
+
+        @return True if the # starts a comment.
+        """
+        return index == 0 or content[index - 1] in ' \t\n;|&()'
+
 class TypescriptFileType(FileTypeInterface):
     """
     Class representing Typescript file type.
@@ -131,6 +344,30 @@ class TypescriptFileType(FileTypeInterface):
 
         return "//"
 
+    def _get_comment_syntax(self, file_name: str = None) -> Tuple[List[str], List[Tuple[str, str]]]:
+        """
+        Gets the comment syntax of Typescript files.
+
+        @return The line comment marker and the block comment delimiters.
+        """
+        return ['//'], [('/*', '*/')]
+
+    def _get_string_delimiters(self, file_name: str = None) -> List[str]:
+        """
+        Gets the string delimiters of Typescript files, template literals included.
+
+        @return The string delimiters.
+        """
+        return ['"', "'", '`']
+
+    def extract_skeleton(self, content: str, file_name: str = None) -> List[ClassSkeleton]:
+        """
+        Extracts the skeletons of the classes of a Typescript file with the lightweight brace parser, once its comments are removed.
+
+        @return The class skeletons, in declaration order.
+        """
+        return BraceSkeletonParser('typescript').parse(self.strip_comments(content, file_name))
+
 class PlantUMLFileType(FileTypeInterface):
     """
     Class representing PlantUML file type.
@@ -138,24 +375,78 @@ class PlantUMLFileType(FileTypeInterface):
     This class provides methods for getting source file extensions, comment characters, and generated file extension for PlantUML files.
     """
 
-    def _get_raw_source_file_extensions(self) -> List:
+    def _get_supported_file_types(self) -> List[FileTypeInterface]:
         """
-        Gets the source file extensions for PlantUML files.
+        Gets the file types of the source files reverse engineered as PlantUML.
 
-        This method returns a list of regular expressions matching file extensions for various programming languages.
-
-        @return A list of regular expressions matching file extensions.
+        @return A list of file types.
         """
-
-        supported_file_types = [
+        return [
             JavaFileType('java', 'java'),
             CppFileType('c++', '[ch][p+x]{2}'),
             PythonFileType('python', 'py'),
             TypescriptFileType('typescript', 'ts')
         ]
 
+    def _get_source_file_type(self, file_name: str) -> FileTypeInterface:
+        """
+        Gets the file type of a source file from its extension.
+
+        @return The file type, None if the file name is not set or not supported.
+        """
+        if file_name is None:
+            return None
+        file_extension: str = os.path.splitext(file_name)[1]
+        return next((file_type for file_type in self._get_supported_file_types() \
+                     if file_type.get_source_file_extensions_matcher().match(file_extension)), None)
+
+    def _get_comment_syntax(self, file_name: str = None) -> Tuple[List[str], List[Tuple[str, str]]]:
+        """
+        Gets the comment syntax of a source file, from the file type matching its extension.
+
+        @return The line comment markers and the block comment delimiters, empty if the file type is unknown.
+        """
+        source_file_type: FileTypeInterface = self._get_source_file_type(file_name)
+        return source_file_type._get_comment_syntax(file_name) if source_file_type is not None else ([], [])
+
+    def _get_string_delimiters(self, file_name: str = None) -> List[str]:
+        """
+        Gets the string delimiters of a source file, from the file type matching its extension.
+
+        @return The string delimiters.
+        """
+        source_file_type: FileTypeInterface = self._get_source_file_type(file_name)
+        return source_file_type._get_string_delimiters(file_name) if source_file_type is not None else super()._get_string_delimiters(file_name)
+
+    def strip_comments(self, content: str, file_name: str = None) -> str:
+        """
+        Removes the comments of a source file with the file type matching its extension.
+
+        @return The content without comments, unchanged if the file type is unknown.
+        """
+        source_file_type: FileTypeInterface = self._get_source_file_type(file_name)
+        return source_file_type.strip_comments(content, file_name) if source_file_type is not None else content
+
+    def extract_skeleton(self, content: str, file_name: str = None) -> List[ClassSkeleton]:
+        """
+        Extracts the skeletons of the classes of a source file with the file type matching its extension.
+
+        @return The class skeletons, empty if the file type is unknown.
+        """
+        source_file_type: FileTypeInterface = self._get_source_file_type(file_name)
+        return source_file_type.extract_skeleton(content, file_name) if source_file_type is not None else []
+
+    def _get_raw_source_file_extensions(self) -> List:
+        """
+        Gets the source file extensions for PlantUML files.
+
+        This method returns a list of regular expressions matching file extensions for various programming languages.
+
+        @return A list of regular expressions matching file extensions.
+        """
+
         file_extensions = []
-        for file_type in supported_file_types:
+        for file_type in self._get_supported_file_types():
             file_extensions.extend(file_type.get_source_file_extensions_as_regex())
         return file_extensions
 
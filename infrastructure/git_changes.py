@@ -0,0 +1,85 @@
+"""
+Module for listing the source files changed since a git revision.
+
+This module provides the class GitChangeDetector, which asks git for the files of the source directory which were
+added, modified or renamed since a revision, so that a run on a pull request only processes the files it touches.
+"""
+
+import os
+import subprocess
+from logging import Logger
+from typing import List, Set
+
+
+class GitChangeDetector:
+    """
+    Class listing the files changed in the git working tree containing the source directory.
+
+    Attributes:
+        source_directory (str): The directory containing the source files, within a git working tree.
+        include_untracked (bool): Whether the files not tracked by git yet, and not ignored, count as changed.
+    """
+
+    """
+    Maximum duration of one git command, in seconds.
+    """
+    timeout_seconds: float = 60.0
+
+    def __init__(self, source_directory: str, logger: Logger, include_untracked: bool = True):
+        """
+        Initializes the GitChangeDetector instance.
+
+        Args:
+            source_directory (str): The directory containing the source files, within a git working tree.
+            logger (Logger): The logger instance used for logging.
+            include_untracked (bool): Whether the files not tracked by git yet, and not ignored, count as changed.
+        """
+        self.source_directory: str = source_directory
+        self.logger: Logger = logger
+        self.include_untracked: bool = include_untracked
+
+    def _run_git(self, arguments: List[str]) -> List[str]:
+        """
+        Runs a git command in the source directory.
+
+        Args:
+            arguments (List[str]): The arguments of the command, printing NUL separated paths.
+
+        Returns:
+            List[str]: The paths printed by the command.
+
+        Raises:
+            RuntimeError: If git cannot be run or the command fails, for instance on an unknown revision.
+        """
+        try:
+            result: subprocess.CompletedProcess = subprocess.run(['git', '-C', self.source_directory] + arguments, capture_output=True, \
+                                                                 timeout=self.timeout_seconds, check=False)
+        except (OSError, subprocess.TimeoutExpired) as err:
+            raise RuntimeError(f"git could not be run: {err}") from err
+        if result.returncode != 0:
+            raise RuntimeError(f"git {' '.join(arguments)} failed: {result.stderr.decode('utf-8', errors='replace').strip()}")
+        return [path for path in result.stdout.decode('utf-8', errors='surrogateescape').split('\0') if len(path) > 0]
+
+    def get_changed_files(self, revision: str) -> Set[str]:
+        """
+        Lists the files of the source directory which differ from a revision, deleted files excepted.
+
+        The working tree is compared to the revision: uncommitted changes count. A range such as origin/main...HEAD
+        compares the commits of a branch with the point it forked from instead.
+
+        Args:
+            revision (str): The revision, or the range of revisions, to compare with.
+
+        Returns:
+            Set[str]: The paths of the changed files relative to the source directory, with '/' separators.
+
+        Raises:
+            RuntimeError: If git cannot be run or the source directory is not in a git working tree.
+        """
+        changed_files: Set[str] = set(self._run_git(['diff', '--name-only', '--relative', '--diff-filter=d', '-z', revision, '--']))
+        if self.include_untracked and '..' not in revision:
+            changed_files.update(self._run_git(['ls-files', '--others', '--exclude-standard', '-z']))
+        # Renamed files are listed under their new name, files removed since are skipped
+        changed_files = {changed_file for changed_file in changed_files if os.path.isfile(os.path.join(self.source_directory, changed_file))}
+        self.logger.info(f"{len(changed_files)} files of {self.source_directory} changed since {revision}")
+        return changed_files
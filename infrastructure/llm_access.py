@@ -5,14 +5,18 @@ This module provides a class OpenAIAccess that handles the interaction with the
 It includes methods for creating and sending requests to the API, as well as handling errors and exceptions.
 """
 
-from openai import OpenAI
 from pprint import pformat
 from typing import List, Dict
+from email.utils import parsedate_to_datetime
+import random
+import threading
 import time
 import re
 import os
 from domain.llm_utils import LLMUtils
-from domain.allm_access import AbstractLLMAccess, ContextWindowExceededError
+from domain.allm_access import AbstractLLMAccess, ContextWindowExceededError, IResponseStreamConsumer
+from domain.rate_limiter import RateLimiter
+from domain.endpoint_pool import Endpoint
 from pprint import pprint
 
 class LLMAccess(AbstractLLMAccess):
@@ -24,7 +28,7 @@ class LLMAccess(AbstractLLMAccess):
 
     Attributes:
         api_key (str): The API key for the OpenAI API.
-        client (OpenAI): The OpenAI client object.
+        _client (OpenAI): The OpenAI client object, created on first use by get_client.
     """
 
     # Extracted API key from environment variable for better readability
@@ -33,16 +37,63 @@ class LLMAccess(AbstractLLMAccess):
     The API key for the OpenAI API.
     """
 
-    # Created OpenAI client object with API key and base URL
-    client = OpenAI(
-        base_url=os.getenv("OPENAI_BASE_URL"),
-        # base_url="https://api.openai.com/v1"
-        api_key=api_key
-    ) if api_key is not None and len(api_key) > 0 else None
+    base_url = os.getenv("OPENAI_BASE_URL")
     """
-    The OpenAI client object.
+    The base URL of the OpenAI compatible endpoint, None for the default OpenAI endpoint.
     """
 
+    _client = None
+    """
+    The OpenAI client object shared by all the instances, created by get_client.
+    """
+
+    _client_lock = threading.Lock()
+    """
+    Lock preventing concurrent jobs from creating the client twice.
+    """
+
+    _endpoint_clients: Dict = {}
+    """
+    The OpenAI client objects of the endpoints of a pool by endpoint name, created by get_client.
+    """
+
+    @classmethod
+    def get_client(cls, endpoint: Endpoint = None):
+        """
+        Provides the OpenAI client object, created on first use.
+
+        The openai package is only imported here: runs which never send a request, such as simulated runs
+        or the help, do not pay for it at startup.
+
+        Args:
+            endpoint (Endpoint): The endpoint of a pool the client sends to, None for the default endpoint.
+
+        Returns:
+            OpenAI: The client object, None if no API key is set.
+        """
+        if endpoint is not None:
+            with LLMAccess._client_lock:
+                if endpoint.name not in LLMAccess._endpoint_clients:
+                    from openai import OpenAI
+
+                    # A failing endpoint is reported to the pool at once, to fail over and eject it, instead of being retried by the SDK
+                    LLMAccess._endpoint_clients[endpoint.name] = OpenAI(base_url=endpoint.base_url, api_key=endpoint.api_key or cls.api_key, \
+                                                                        max_retries=0)
+                return LLMAccess._endpoint_clients[endpoint.name]
+        if LLMAccess._client is None and cls.api_key is not None and len(cls.api_key) > 0:
+            with LLMAccess._client_lock:
+                if LLMAccess._client is None:
+                    from openai import OpenAI
+
+                    LLMAccess._client = OpenAI(
+                        base_url=cls.base_url,
+                        # base_url="https://api.openai.com/v1"
+                        api_key=cls.api_key,
+                        # Only send_request_with_error_handling retries, honouring Retry-After, the rate limiter and the endpoint failover
+                        max_retries=0
+                    )
+        return LLMAccess._client
+
     def convert_request_llm_to_string(self, request_input: Dict) -> str:
         """
         Converts the request LLM to a string.
@@ -103,12 +154,15 @@ class LLMAccess(AbstractLLMAccess):
         # Prepare request and add content of slide
         llm_requests, request_name = self.create_initial_message(file_content, request_input["request_name"], language_name)
         request_names.append(request_name)
+        # The signatures of the symbols the file uses come before the file content, so that they read as a reference
+        if len(request_input.get('symbol_context', '')) > 0:
+            llm_requests.insert(len(llm_requests) - 1, {"role": "user", "content": request_input['symbol_context']})
         llm_requests.append({"role": "user", "content": self.convert_request_llm_to_string(request_input)})
         temperature: float = request_input.get('temperature', 0.2)  # Used get method to provide default value
         top_p: float = request_input.get('top_p', 0.1)  # Used get method to provide default value
         return llm_requests, request_names, temperature, top_p
 
-    def send_plain_request(self, messages: List, request_name: str, temperature: float, top_p: float) -> Dict:
+    def send_plain_request(self, messages: List, request_name: str, temperature: float, top_p: float, stream_consumer: IResponseStreamConsumer = None, endpoint: Endpoint = None) -> Dict:
         """
         Sends a plain request to the OpenAI API.
 
@@ -117,6 +171,8 @@ class LLMAccess(AbstractLLMAccess):
             request_name (str): The name of the request.
             temperature (float): The temperature for the request.
             top_p (float): The top_p for the request.
+            stream_consumer (IResponseStreamConsumer): If set, the completion is streamed and each piece is fed to this consumer.
+            endpoint (Endpoint): The endpoint of the pool the request is sent to, None to use the default endpoint.
 
         Returns:
             Dict: A dictionary containing the response from the API.
@@ -125,21 +181,69 @@ class LLMAccess(AbstractLLMAccess):
         return_message: str = None
 
         self.logger.info(f'Requesting {request_name}')
-        review = self.client.chat.completions.create(
+        if stream_consumer is not None:
+            return self.send_streamed_request(messages, request_name, temperature, top_p, stream_consumer, endpoint)
+
+        raw_response = self.get_client(endpoint).chat.completions.with_raw_response.create(
             model=self.model_name,
             messages=messages,
             temperature=temperature,
             top_p=top_p
         )
+        self.update_rate_limit(raw_response.headers, endpoint)
+        review = raw_response.parse()
 
         return_message = re.sub(r'\'\s+.*refusal=.*,.*role=.*\)', '', re.sub(r'ChatCompletionMessage\(content=', '', str(review.choices[0].message.content.strip())))
 
         return {
             'request_name': request_name,
             'response': return_message,
+            'usage': self.get_usage(review.usage)
         }
 
-    def send_request_with_error_handling(self, messages: List, error_information: str, request_name: str, temperature: float, top_p: float) -> Dict:
+    def send_streamed_request(self, messages: List, request_name: str, temperature: float, top_p: float, stream_consumer: IResponseStreamConsumer, endpoint: Endpoint = None) -> Dict:
+        """
+        Sends a request to the OpenAI API and feeds the completion to a consumer while it is generated.
+
+        Args:
+            messages (List): The list of messages to send.
+            request_name (str): The name of the request.
+            temperature (float): The temperature for the request.
+            top_p (float): The top_p for the request.
+            stream_consumer (IResponseStreamConsumer): The consumer receiving each piece of the completion.
+            endpoint (Endpoint): The endpoint of the pool the request is sent to, None to use the default endpoint.
+
+        Returns:
+            Dict: A dictionary containing the whole response from the API.
+        """
+        response_pieces: List = []
+        raw_response = self.get_client(endpoint).chat.completions.with_raw_response.create(
+            model=self.model_name,
+            messages=messages,
+            temperature=temperature,
+            top_p=top_p,
+            stream=True,
+            # The usage comes in a last chunk without choices, for the run metrics and the token limiter
+            stream_options={"include_usage": True}
+        )
+        self.update_rate_limit(raw_response.headers, endpoint)
+        usage = None
+        for chunk in raw_response.parse():
+            if getattr(chunk, 'usage', None) is not None:
+                usage = chunk.usage
+            if len(chunk.choices) == 0 or chunk.choices[0].delta.content is None:
+                continue
+            stream_consumer.feed(chunk.choices[0].delta.content)
+            response_pieces.append(chunk.choices[0].delta.content)
+
+        return {
+            'request_name': request_name,
+            'response': ''.join(response_pieces),
+            'usage': self.get_usage(usage)
+        }
+
+    def send_request_with_error_handling(self, messages: List, error_information: str, request_name: str, temperature: float, top_p: float, \
+                                         stream_consumer: IResponseStreamConsumer = None) -> Dict:
         """
         Sends a request to the OpenAI API with error handling.
 
@@ -149,37 +253,257 @@ class LLMAccess(AbstractLLMAccess):
             request_name (str): The name of the request.
             temperature (float): The temperature for the request.
             top_p (float): The top_p for the request.
+            stream_consumer (IResponseStreamConsumer): If set, the response is streamed to this consumer, restarted before each attempt.
+
+        With an endpoint pool, each attempt is sent to the endpoint selected by the pool, and a failed attempt
+        is retried right away on another endpoint when one is available.
 
         Returns:
-            Dict: A dictionary containing the response from the API.
+            Dict: A dictionary containing the response from the API, with the latency of the attempt which succeeded,
+                  the number of retries, the time spent waiting for the rate limiter and the endpoint, if any.
         """
         # Renamed method to better describe its purpose
         openai_response: bool = False
         sleep_time: int = 10
-        response: Dict = {}
-
+        response: Dict = self.get_cached_response(messages, request_name, temperature, top_p, stream_consumer)
+        if response is not None:
+            return response
+
+        estimated_tokens: int = LLMUtils.estimate_message_tokens(messages)
+        retries: int = 0
+        rate_limit_wait_seconds: float = 0.0
+        failed_endpoints: List[Endpoint] = []
         while not openai_response:
+            endpoint: Endpoint = self.endpoint_pool.acquire(failed_endpoints) if self.endpoint_pool is not None else None
+            rate_limiter: RateLimiter = self.get_rate_limiter(endpoint)
+            latency_seconds: float = None
+            endpoint_failed: bool = False
             try:
-                response = self.send_plain_request(messages, request_name, temperature, top_p)
+                if rate_limiter is not None:
+                    rate_limit_wait_start: float = time.perf_counter()
+                    rate_limiter.acquire(estimated_tokens)
+                    rate_limit_wait_seconds += time.perf_counter() - rate_limit_wait_start
+                if stream_consumer is not None:
+                    stream_consumer.restart()
+                request_start: float = time.perf_counter()
+                response = self.send_plain_request(messages, request_name, temperature, top_p, stream_consumer, endpoint)
+                latency_seconds = time.perf_counter() - request_start
+                response.update(latency_seconds=latency_seconds, retries=retries, rate_limit_wait_seconds=rate_limit_wait_seconds)
+                if endpoint is not None:
+                    response.update(endpoint=endpoint.name)
                 openai_response = True
             except Exception as err:                    
                 self.logger.warning(f"{error_information}: {request_name}: Caught exception {err=}, {type(err)=}\nMessage: {pformat(messages)}")
-                if "ContextWindowExceededError" in str(err):
+                if ContextWindowExceededError.is_reported_by(err):
                     self.logger.error(f"{request_name}: It seems your request is too big.")
                     raise ContextWindowExceededError(f"{request_name}: It seems the size of your request is too big.")
-                self.logger.warning(f"{request_name}: Backoff retry: Sleeping {sleep_time} seconds.")
-                time.sleep(sleep_time)
-                if sleep_time < 30:
-                    sleep_time = sleep_time * 2
+                retry_delay: float = self.get_retry_delay_seconds(err, sleep_time, endpoint)
+                endpoint_failed = self.is_endpoint_failure(err)
+                if endpoint is not None and endpoint not in failed_endpoints:
+                    failed_endpoints.append(endpoint)
+            finally:
+                if endpoint is not None:
+                    self.endpoint_pool.release(endpoint, latency_seconds, endpoint_failed)
+            if openai_response:
+                break
+            retries += 1
+            if self.endpoint_pool is not None and self.endpoint_pool.has_alternative(failed_endpoints):
+                self.logger.warning(f"{request_name}: Failing over from endpoint {endpoint.name}.")
+                continue
+            self.logger.warning(f"{request_name}: Backoff retry: Sleeping {retry_delay:.1f} seconds.")
+            time.sleep(retry_delay)
+            # Every endpoint failed the request: all of them are tried again after the backoff
+            failed_endpoints.clear()
+            if sleep_time < 30:
+                sleep_time = sleep_time * 2
+        self.reconcile_rate_limit(estimated_tokens, response, endpoint)
+        self.store_cached_response(messages, response, temperature, top_p)
         return response
 
-    def prepare_and_send_llm_request(self, request_input: Dict, language_name: str) -> List:
+    def get_usage(self, usage) -> Dict:
+        """
+        Converts the usage reported by the API into a dictionary.
+
+        Args:
+            usage (CompletionUsage): The usage of the completion, may be None.
+
+        Returns:
+            Dict: The prompt, completion, total and cached tokens, None if the usage is not reported.
+        """
+        if usage is None:
+            return None
+        prompt_tokens_details = getattr(usage, 'prompt_tokens_details', None)
+        return {
+            'prompt_tokens': usage.prompt_tokens,
+            'completion_tokens': usage.completion_tokens,
+            'total_tokens': usage.total_tokens,
+            'cached_tokens': getattr(prompt_tokens_details, 'cached_tokens', None) or 0
+        }
+
+    def get_rate_limiter(self, endpoint: Endpoint = None) -> RateLimiter:
+        """
+        Provides the rate limiter of the endpoint a request is sent to.
+
+        Args:
+            endpoint (Endpoint): The endpoint of the pool, None for the default endpoint.
+
+        Returns:
+            RateLimiter: The limiter of the endpoint, None if there is no client side limit.
+        """
+        return endpoint.rate_limiter if endpoint is not None else self.rate_limiter
+
+    def update_rate_limit(self, headers, endpoint: Endpoint = None) -> None:
+        """
+        Lowers the quotas of the rate limiter to the remaining ones reported by the API, if any.
+
+        Args:
+            headers (Headers): The headers of the response.
+            endpoint (Endpoint): The endpoint of the pool which answered, None for the default endpoint.
+        """
+        rate_limiter: RateLimiter = self.get_rate_limiter(endpoint)
+        if rate_limiter is not None:
+            rate_limiter.update_from_headers(headers)
+
+    def reconcile_rate_limit(self, estimated_tokens: int, response: Dict, endpoint: Endpoint = None) -> None:
+        """
+        Corrects the tokens charged to the rate limiter with the usage reported by the API.
+
+        Args:
+            estimated_tokens (int): The tokens charged before sending the request.
+            response (Dict): The response as returned by send_plain_request.
+            endpoint (Endpoint): The endpoint of the pool which answered, None for the default endpoint.
+        """
+        rate_limiter: RateLimiter = self.get_rate_limiter(endpoint)
+        if rate_limiter is not None:
+            usage: Dict = response.get('usage')
+            rate_limiter.reconcile(estimated_tokens, usage['total_tokens'] if usage is not None else None)
+
+    @staticmethod
+    def is_endpoint_failure(err: Exception) -> bool:
+        """
+        Tells whether an error counts against the health of the endpoint which raised it.
+
+        Connection errors, timeouts and server errors do. Rate limits only hold the endpoint for the delay it
+        asks for, and other client errors would be raised by any endpoint.
+
+        Args:
+            err (Exception): The error raised while sending the request.
+
+        Returns:
+            bool: True if the endpoint failed.
+        """
+        status_code: int = getattr(err, 'status_code', None)
+        return status_code is None or status_code >= 500 or status_code == 408
+
+    def get_retry_after_seconds(self, err: Exception) -> float:
+        """
+        Extracts the delay the API asks to wait before retrying from the headers of an error response.
+
+        Args:
+            err (Exception): The error raised while sending the request.
+
+        Returns:
+            float: The delay in seconds, None if the API did not provide any.
+        """
+        headers = getattr(getattr(err, 'response', None), 'headers', None)
+        if headers is None:
+            return None
+        if headers.get('retry-after-ms') is not None:
+            retry_after_milliseconds: float = RateLimiter.parse_duration(headers.get('retry-after-ms'))
+            if retry_after_milliseconds is not None:
+                return retry_after_milliseconds / 1000.0
+        retry_after: str = headers.get('retry-after')
+        if retry_after is not None:
+            retry_after_seconds: float = RateLimiter.parse_duration(retry_after)
+            if retry_after_seconds is not None:
+                return retry_after_seconds
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+        if getattr(err, 'status_code', None) == 429:
+            reset_delays: List = [RateLimiter.parse_duration(headers.get(header_name)) \
+                                  for header_name in ['x-ratelimit-reset-requests', 'x-ratelimit-reset-tokens']]
+            reset_delays = [reset_delay for reset_delay in reset_delays if reset_delay is not None]
+            if len(reset_delays) > 0:
+                return max(reset_delays)
+        return None
+
+    def get_retry_delay_seconds(self, err: Exception, backoff_seconds: float, endpoint: Endpoint = None) -> float:
+        """
+        Computes how long to wait before retrying a failed request.
+
+        The delay requested by the API is honoured when provided, and every request to the endpoint is held
+        for that time. Otherwise the exponential backoff is used. A random jitter is added in both cases
+        so that the requests held together do not all retry at the same time.
+
+        Args:
+            err (Exception): The error raised while sending the request.
+            backoff_seconds (float): The current exponential backoff delay.
+            endpoint (Endpoint): The endpoint of the pool which raised the error, None for the default endpoint.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        retry_after: float = self.get_retry_after_seconds(err)
+        if retry_after is None:
+            return backoff_seconds + random.uniform(0, backoff_seconds / 2)
+        rate_limiter: RateLimiter = self.get_rate_limiter(endpoint)
+        if rate_limiter is not None:
+            rate_limiter.pause(retry_after)
+        return retry_after + random.uniform(0, max(1.0, retry_after / 10))
+
+    def get_cached_response(self, messages: List, request_name: str, temperature: float, top_p: float, \
+                            stream_consumer: IResponseStreamConsumer = None) -> Dict:
+        """
+        Looks the request up in the response cache.
+
+        Args:
+            messages (List): The list of messages to send.
+            request_name (str): The name of the request.
+            temperature (float): The temperature for the request.
+            top_p (float): The top_p for the request.
+            stream_consumer (IResponseStreamConsumer): If set, a cached response is fed to this consumer in one piece.
+
+        Returns:
+            Dict: The cached response in the format of send_plain_request, None if there is no cache or no cached response.
+        """
+        if self.response_cache is None:
+            return None
+        cached_response: str = self.response_cache.get(self.response_cache.compute_key(self.model_name, messages, temperature, top_p))
+        if cached_response is None:
+            return None
+        self.logger.info(f'Serving {request_name} from cache')
+        if stream_consumer is not None:
+            stream_consumer.restart()
+            stream_consumer.feed(cached_response)
+        return {
+            'request_name': request_name,
+            'response': cached_response,
+            'cached': True
+        }
+
+    def store_cached_response(self, messages: List, response: Dict, temperature: float, top_p: float) -> None:
+        """
+        Stores a response received from the API in the response cache, if any.
+
+        Args:
+            messages (List): The list of messages sent.
+            response (Dict): The response as returned by send_plain_request.
+            temperature (float): The temperature for the request.
+            top_p (float): The top_p for the request.
+        """
+        if self.response_cache is not None:
+            self.response_cache.put(self.response_cache.compute_key(self.model_name, messages, temperature, top_p), response['response'])
+
+    def prepare_and_send_llm_request(self, request_input: Dict, language_name: str, stream_consumer: IResponseStreamConsumer = None) -> List:
         """
         Prepares and sends a request to the OpenAI API.
 
         Args:
             request_input (Dict): The input dictionary containing the request information.
             language_name (str): The name of the language.
+            stream_consumer (IResponseStreamConsumer): If set, the response is streamed to this consumer while it is generated.
 
         Returns:
             List: A list containing the response from the API.
@@ -193,5 +517,5 @@ class LLMAccess(AbstractLLMAccess):
         return_value.append(self.send_request_with_error_handling(llm_requests, \
                                                 error_information, \
                                                 " & ".join(request_names),
-                                                temperature, top_p))
+                                                temperature, top_p, stream_consumer))
         return return_value
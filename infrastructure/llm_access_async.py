@@ -0,0 +1,321 @@
+"""
+Module for accessing the OpenAI API with asyncio.
+
+This module provides the class AsyncLLMAccess, the asyncio counterpart of LLMAccess. All the requests
+of one instance are multiplexed on the running event loop and share one HTTP connection pool, so hundreds
+of long running completions can be kept open without one OS thread per request.
+It also provides AsyncLLMAccessSimulator, the asyncio counterpart of LLMAccessSimulator.
+"""
+
+import asyncio
+import time
+import re
+from pprint import pformat
+from typing import List, Dict
+
+from domain.allm_access import ContextWindowExceededError, IResponseStreamConsumer
+from domain.endpoint_pool import Endpoint
+from domain.llm_utils import LLMUtils
+from domain.rate_limiter import RateLimiter
+from infrastructure.llm_access import LLMAccess
+
+
+class AsyncLLMAccess(LLMAccess):
+    """
+    Class for accessing the OpenAI API with asyncio.
+
+    Messages are built exactly as in LLMAccess, only the methods performing I/O are coroutines.
+    The AsyncOpenAI client and its HTTP connection pool are created on first use, inside the event loop
+    running the requests.
+
+    Attributes:
+        max_connections (int): The maximum number of HTTP connections opened to the endpoint.
+        max_keepalive_connections (int): The maximum number of idle connections kept in the pool.
+    """
+
+    def __init__(self, logger, model_name: str, max_connections: int = 100, max_keepalive_connections: int = None):
+        """
+        Initializes the AsyncLLMAccess instance.
+
+        Args:
+            logger (Logger): The logger instance used for logging.
+            model_name (str): The name of the LLM model being used.
+            max_connections (int): The maximum number of HTTP connections opened to the endpoint.
+            max_keepalive_connections (int): The maximum number of idle connections kept in the pool, defaults to max_connections.
+        """
+        super().__init__(logger, model_name)
+        self.max_connections: int = max_connections
+        self.max_keepalive_connections: int = max_keepalive_connections if max_keepalive_connections is not None else max_connections
+        self._async_client = None
+        self._endpoint_async_clients: Dict = {}
+
+    @property
+    def async_client(self):
+        """
+        The AsyncOpenAI client object, sharing one connection pool for all the requests of this instance.
+        """
+        if self._async_client is None and self.api_key is not None and len(self.api_key) > 0:
+            self._async_client = self.create_async_client(self.base_url, self.api_key)
+        return self._async_client
+
+    def get_async_client(self, endpoint: Endpoint = None):
+        """
+        Provides the AsyncOpenAI client object of an endpoint, created on first use.
+
+        Args:
+            endpoint (Endpoint): The endpoint of a pool, None for the default endpoint.
+
+        Returns:
+            AsyncOpenAI: The client object, each endpoint of a pool having its own connection pool.
+        """
+        if endpoint is None:
+            return self.async_client
+        if endpoint.name not in self._endpoint_async_clients:
+            self._endpoint_async_clients[endpoint.name] = self.create_async_client(endpoint.base_url, endpoint.api_key or self.api_key)
+        return self._endpoint_async_clients[endpoint.name]
+
+    def create_async_client(self, base_url: str, api_key: str):
+        """
+        Creates an AsyncOpenAI client object with its own HTTP connection pool.
+
+        Args:
+            base_url (str): The base URL of the endpoint, None for the default OpenAI endpoint.
+            api_key (str): The API key of the endpoint.
+
+        Returns:
+            AsyncOpenAI: The client object.
+        """
+        import httpx
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+        return AsyncOpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            # Only send_request_with_error_handling retries, honouring Retry-After, the rate limiter and the endpoint failover
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(limits=httpx.Limits(max_connections=self.max_connections, \
+                                                                    max_keepalive_connections=self.max_keepalive_connections))
+        )
+
+    async def check(self, file_content: str, language_name: str) -> List:
+        """
+        Checks the file content using the LLM.
+
+        Args:
+            file_content (str): The content of the file to be checked.
+            language_name (str): The name of the language being used.
+
+        Returns:
+            List: The response from the LLM.
+        """
+        if self.request_handler is None:
+            raise Exception("Internal error: Checker was not properly defined!")
+        return await self.prepare_and_send_llm_request([self.build_request_input(self.request_handler, file_content)], language_name)
+
+    async def send_plain_request(self, messages: List, request_name: str, temperature: float, top_p: float, stream_consumer: IResponseStreamConsumer = None, endpoint: Endpoint = None) -> Dict:
+        """
+        Sends a plain request to the OpenAI API.
+
+        Args:
+            messages (List): The list of messages to send.
+            request_name (str): The name of the request.
+            temperature (float): The temperature for the request.
+            top_p (float): The top_p for the request.
+            stream_consumer (IResponseStreamConsumer): If set, the completion is streamed and each piece is fed to this consumer.
+            endpoint (Endpoint): The endpoint of the pool the request is sent to, None to use the default endpoint.
+
+        Returns:
+            Dict: A dictionary containing the response from the API.
+        """
+        self.logger.info(f'Requesting {request_name}')
+        if stream_consumer is not None:
+            return await self.send_streamed_request(messages, request_name, temperature, top_p, stream_consumer, endpoint)
+
+        raw_response = await self.get_async_client(endpoint).chat.completions.with_raw_response.create(
+            model=self.model_name,
+            messages=messages,
+            temperature=temperature,
+            top_p=top_p
+        )
+        self.update_rate_limit(raw_response.headers, endpoint)
+        review = raw_response.parse()
+
+        return_message: str = re.sub(r'\'\s+.*refusal=.*,.*role=.*\)', '', re.sub(r'ChatCompletionMessage\(content=', '', str(review.choices[0].message.content.strip())))
+
+        return {
+            'request_name': request_name,
+            'response': return_message,
+            'usage': self.get_usage(review.usage)
+        }
+
+    async def send_streamed_request(self, messages: List, request_name: str, temperature: float, top_p: float, stream_consumer: IResponseStreamConsumer, endpoint: Endpoint = None) -> Dict:
+        """
+        Sends a request to the OpenAI API and feeds the completion to a consumer while it is generated.
+
+        Args:
+            messages (List): The list of messages to send.
+            request_name (str): The name of the request.
+            temperature (float): The temperature for the request.
+            top_p (float): The top_p for the request.
+            stream_consumer (IResponseStreamConsumer): The consumer receiving each piece of the completion.
+            endpoint (Endpoint): The endpoint of the pool the request is sent to, None to use the default endpoint.
+
+        Returns:
+            Dict: A dictionary containing the whole response from the API.
+        """
+        response_pieces: List = []
+        raw_response = await self.get_async_client(endpoint).chat.completions.with_raw_response.create(
+            model=self.model_name,
+            messages=messages,
+            temperature=temperature,
+            top_p=top_p,
+            stream=True,
+            # The usage comes in a last chunk without choices, for the run metrics and the token limiter
+            stream_options={"include_usage": True}
+        )
+        self.update_rate_limit(raw_response.headers, endpoint)
+        usage = None
+        async for chunk in raw_response.parse():
+            if getattr(chunk, 'usage', None) is not None:
+                usage = chunk.usage
+            if len(chunk.choices) == 0 or chunk.choices[0].delta.content is None:
+                continue
+            stream_consumer.feed(chunk.choices[0].delta.content)
+            response_pieces.append(chunk.choices[0].delta.content)
+
+        return {
+            'request_name': request_name,
+            'response': ''.join(response_pieces),
+            'usage': self.get_usage(usage)
+        }
+
+    async def send_request_with_error_handling(self, messages: List, error_information: str, request_name: str, temperature: float, top_p: float, \
+                                               stream_consumer: IResponseStreamConsumer = None) -> Dict:
+        """
+        Sends a request to the OpenAI API with error handling.
+
+        The backoff sleeps on the event loop, so other requests keep progressing meanwhile. With an endpoint pool,
+        a failed attempt is retried right away on another endpoint when one is available.
+
+        Args:
+            messages (List): The list of messages to send.
+            error_information (str): The error information.
+            request_name (str): The name of the request.
+            temperature (float): The temperature for the request.
+            top_p (float): The top_p for the request.
+            stream_consumer (IResponseStreamConsumer): If set, the response is streamed to this consumer, restarted before each attempt.
+
+        Returns:
+            Dict: A dictionary containing the response from the API, with the latency of the attempt which succeeded,
+                  the number of retries, the time spent waiting for the rate limiter and the endpoint, if any.
+        """
+        sleep_time: int = 10
+        response: Dict = self.get_cached_response(messages, request_name, temperature, top_p, stream_consumer)
+        if response is not None:
+            return response
+
+        estimated_tokens: int = LLMUtils.estimate_message_tokens(messages)
+        retries: int = 0
+        rate_limit_wait_seconds: float = 0.0
+        failed_endpoints: List[Endpoint] = []
+        while response is None:
+            endpoint: Endpoint = await self.endpoint_pool.acquire_asynchronously(failed_endpoints) if self.endpoint_pool is not None else None
+            rate_limiter: RateLimiter = self.get_rate_limiter(endpoint)
+            latency_seconds: float = None
+            endpoint_failed: bool = False
+            try:
+                if rate_limiter is not None:
+                    rate_limit_wait_start: float = time.perf_counter()
+                    await rate_limiter.acquire_asynchronously(estimated_tokens)
+                    rate_limit_wait_seconds += time.perf_counter() - rate_limit_wait_start
+                if stream_consumer is not None:
+                    stream_consumer.restart()
+                request_start: float = time.perf_counter()
+                response = await self.send_plain_request(messages, request_name, temperature, top_p, stream_consumer, endpoint)
+                latency_seconds = time.perf_counter() - request_start
+                response.update(latency_seconds=latency_seconds, retries=retries, rate_limit_wait_seconds=rate_limit_wait_seconds)
+                if endpoint is not None:
+                    response.update(endpoint=endpoint.name)
+            except Exception as err:
+                self.logger.warning(f"{error_information}: {request_name}: Caught exception {err=}, {type(err)=}\nMessage: {pformat(messages)}")
+                if ContextWindowExceededError.is_reported_by(err):
+                    self.logger.error(f"{request_name}: It seems your request is too big.")
+                    raise ContextWindowExceededError(f"{request_name}: It seems the size of your request is too big.")
+                retry_delay: float = self.get_retry_delay_seconds(err, sleep_time, endpoint)
+                endpoint_failed = self.is_endpoint_failure(err)
+                if endpoint is not None and endpoint not in failed_endpoints:
+                    failed_endpoints.append(endpoint)
+            finally:
+                if endpoint is not None:
+                    self.endpoint_pool.release(endpoint, latency_seconds, endpoint_failed)
+            if response is not None:
+                break
+            retries += 1
+            if self.endpoint_pool is not None and self.endpoint_pool.has_alternative(failed_endpoints):
+                self.logger.warning(f"{request_name}: Failing over from endpoint {endpoint.name}.")
+                continue
+            self.logger.warning(f"{request_name}: Backoff retry: Sleeping {retry_delay:.1f} seconds.")
+            await asyncio.sleep(retry_delay)
+            # Every endpoint failed the request: all of them are tried again after the backoff
+            failed_endpoints.clear()
+            if sleep_time < 30:
+                sleep_time = sleep_time * 2
+        self.reconcile_rate_limit(estimated_tokens, response, endpoint)
+        self.store_cached_response(messages, response, temperature, top_p)
+        return response
+
+    async def prepare_and_send_llm_request(self, request_input: Dict, language_name: str, stream_consumer: IResponseStreamConsumer = None) -> List:
+        """
+        Prepares and sends a request to the OpenAI API.
+
+        Args:
+            request_input (Dict): The input dictionary containing the request information.
+            language_name (str): The name of the language.
+            stream_consumer (IResponseStreamConsumer): If set, the response is streamed to this consumer while it is generated.
+
+        Returns:
+            List: A list containing the response from the API.
+        """
+        file_content: str = request_input[0]['file_content']
+        error_information: str = request_input[0]['error_information']
+
+        llm_requests, request_names, temperature, top_p = self.create_messages(request_input[0], file_content, language_name)
+        return [await self.send_request_with_error_handling(llm_requests, \
+                                                            error_information, \
+                                                            " & ".join(request_names),
+                                                            temperature, top_p, stream_consumer)]
+
+
+class AsyncLLMAccessSimulator(AsyncLLMAccess):
+    """
+    Class for simulating asyncio LLM access calls.
+
+    This class returns the same response as LLMAccessSimulator without sending any request.
+    """
+
+    async def send_plain_request(self, messages: List, request_name: str, temperature: float, top_p: float, stream_consumer: IResponseStreamConsumer = None, endpoint: Endpoint = None) -> Dict:
+        """
+        Simulates sending a request.
+
+        Args:
+            messages (List): A list of messages to be sent.
+            request_name (str): The name of the request.
+            temperature (float): The temperature for the request.
+            top_p (float): The top_p for the request.
+            stream_consumer (IResponseStreamConsumer): If set, the response message is fed to it line by line.
+            endpoint (Endpoint): The endpoint of the pool the request is sent to, None to use the default endpoint.
+
+        Returns:
+            Dict: A dictionary containing the request name and a response message.
+        """
+        response_message: str = f"# No calls performed\nOriginal request:\n{pformat(messages)}"
+        # Give the other coroutines a chance to run as a real request would
+        await asyncio.sleep(0)
+        if stream_consumer is not None:
+            for line in response_message.splitlines(keepends=True):
+                stream_consumer.feed(line)
+
+        return {
+            'request_name': request_name,
+            'response': response_message
+        }
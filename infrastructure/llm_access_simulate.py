@@ -8,6 +8,8 @@ It simulates the sending of requests by returning a predefined response instead
 from pprint import pformat
 from typing import List
 
+from domain.allm_access import IResponseStreamConsumer
+from domain.endpoint_pool import Endpoint
 from infrastructure.llm_access import LLMAccess
 
 class LLMAccessSimulator(LLMAccess):
@@ -18,7 +20,7 @@ class LLMAccessSimulator(LLMAccess):
     It returns a dictionary containing the request name and a response message.
     """
 
-    def send_plain_request(self, messages: List, request_name: str, temperature: float, top_p: float) -> dict:
+    def send_plain_request(self, messages: List, request_name: str, temperature: float, top_p: float, stream_consumer: IResponseStreamConsumer = None, endpoint: Endpoint = None) -> dict:
         """
         Simulates sending a request.
 
@@ -29,6 +31,8 @@ class LLMAccessSimulator(LLMAccess):
         Args:
             input_messages (List): A list of messages to be sent.
             request_type (str): The type of the request.
+            stream_consumer (IResponseStreamConsumer): If set, the response message is fed to it line by line.
+            endpoint (Endpoint): The endpoint of the pool the request is routed to, unused by the simulation.
 
         Returns:
             dict: A dictionary containing the request type and a response message.
@@ -36,6 +40,9 @@ class LLMAccessSimulator(LLMAccess):
 
         # The response message is a formatted string that includes the original request
         response_message = f"# No calls performed\nOriginal request:\n{pformat(messages)}"
+        if stream_consumer is not None:
+            for line in response_message.splitlines(keepends=True):
+                stream_consumer.feed(line)
 
         return {
             'request_name': request_name,  # Changed key name to request_type
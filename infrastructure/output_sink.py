@@ -0,0 +1,276 @@
+"""
+@file output_sink.py
+@brief This module contains the AtomicFileOutputSink class, which writes each output file atomically.
+@details The content of a file is buffered in memory, then in a temporary file created next to the output file
+         once the buffer grows too big. When the writer is closed, the temporary file is optionally synced to disk
+         and renamed over the output file, so that the output file is always either the previous one or the
+         complete new one. Commits can be performed by a background thread so that workers do not wait for
+         slow file systems.
+"""
+
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from logging import Logger
+from typing import Callable, List
+
+from domain.ioutput_sink import IOutputSink, IOutputWriter
+
+
+class AtomicFileWriter(IOutputWriter):
+    """
+    @class AtomicFileWriter
+    @brief This class implements the IOutputWriter interface for one output file, committed by a rename.
+
+    @param sink The sink which created the writer and commits it.
+    @param output_file_name The name of the output file.
+    @param on_commit If set, called once the file is committed.
+    """
+
+    def __init__(self, sink: 'AtomicFileOutputSink', output_file_name: str, on_commit: Callable[[], None] = None):
+        """
+        @brief Constructor for the AtomicFileWriter class.
+
+        @param sink The sink which created the writer and commits it.
+        @param output_file_name The name of the output file.
+        @param on_commit If set, called once the file is committed.
+        """
+        if not output_file_name:
+            raise ValueError("File name cannot be empty")
+        self.sink: AtomicFileOutputSink = sink
+        self.output_file_name: str = output_file_name
+        self.on_commit: Callable[[], None] = on_commit
+        self._buffer: List[str] = []
+        self._buffer_size: int = 0
+        self._temporary_file = None
+        self._temporary_file_name: str = None
+        self._closed: bool = False
+
+    def _open_temporary_file(self) -> None:
+        """
+        @brief Creates the temporary file in the directory of the output file, so that it can be renamed over it.
+        """
+        directory, base_name = os.path.split(self.output_file_name)
+        file_descriptor, self._temporary_file_name = tempfile.mkstemp(prefix=f'.{base_name}.', suffix='.tmp', dir=directory or '.')
+        # mkstemp creates private files, output files get the usual permissions
+        os.chmod(self._temporary_file_name, 0o666 & ~self.sink.umask)
+        self._temporary_file = os.fdopen(file_descriptor, 'w', encoding="utf-8")
+
+    def _spill(self) -> None:
+        """
+        @brief Moves the buffered content to the temporary file.
+        """
+        if self._temporary_file is None:
+            self._open_temporary_file()
+        self._temporary_file.write(''.join(self._buffer))
+        self._buffer = []
+        self._buffer_size = 0
+
+    def write(self, content: str) -> None:
+        """
+        @brief Appends content to the output file, followed by a newline character.
+
+        @param content The content to be written.
+        """
+        if self._closed:
+            raise ValueError(f"Output file {self.output_file_name} is already closed")
+        self._buffer.append(content + '\n')
+        self._buffer_size += len(content) + 1
+        if self._buffer_size > self.sink.memory_buffer_size:
+            self._spill()
+
+    def flush(self) -> None:
+        """
+        @brief Moves the buffered content to the temporary file.
+        """
+        if len(self._buffer) > 0:
+            self._spill()
+            self._temporary_file.flush()
+
+    def close(self) -> None:
+        """
+        @brief Hands the writer over to the sink for commit.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self.sink.commit(self)
+
+    def abort(self) -> None:
+        """
+        @brief Discards the content written so far and removes the temporary file.
+        """
+        self._closed = True
+        self._buffer = []
+        if self._temporary_file is not None:
+            self._temporary_file.close()
+            self._temporary_file = None
+            try:
+                os.remove(self._temporary_file_name)
+            except FileNotFoundError:
+                pass
+
+    def commit(self, fsync: bool) -> None:
+        """
+        @brief Writes the remaining content and renames the temporary file over the output file.
+
+        @param fsync A flag to sync the file and its directory to disk before and after the rename.
+        """
+        try:
+            self._spill()
+            self._temporary_file.flush()
+            if fsync:
+                os.fsync(self._temporary_file.fileno())
+            self._temporary_file.close()
+            os.replace(self._temporary_file_name, self.output_file_name)
+            self._temporary_file = None
+        except BaseException:
+            self.abort()
+            raise
+        if fsync and hasattr(os, 'O_DIRECTORY'):
+            directory_descriptor: int = os.open(os.path.dirname(self.output_file_name) or '.', os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(directory_descriptor)
+            finally:
+                os.close(directory_descriptor)
+        if self.on_commit is not None:
+            self.on_commit()
+
+
+class AtomicFileOutputSink(IOutputSink):
+    """
+    @class AtomicFileOutputSink
+    @brief This class implements the IOutputSink interface and hands out writers committing their file atomically.
+
+    @param logger A logger instance for logging messages.
+    @param fsync A flag to sync each file to disk before it replaces the previous one.
+    @param background A flag to commit the files in a background thread.
+    @param memory_buffer_size The number of characters buffered in memory before they are moved to the temporary file.
+    @param link_duplicates A flag to duplicate output files as hard links instead of copies, where the file system allows it.
+    """
+
+    def __init__(self, logger: Logger, fsync: bool = False, background: bool = False, memory_buffer_size: int = 1024 * 1024, \
+                 link_duplicates: bool = False):
+        """
+        @brief Constructor for the AtomicFileOutputSink class.
+
+        @param logger A logger instance for logging messages.
+        @param fsync A flag to sync each file to disk before it replaces the previous one.
+        @param background A flag to commit the files in a background thread.
+        @param memory_buffer_size The number of characters buffered in memory before they are moved to the temporary file.
+        @param link_duplicates A flag to duplicate output files as hard links instead of copies, where the file system allows it.
+        """
+        self.logger: Logger = logger
+        self.fsync: bool = fsync
+        self.memory_buffer_size: int = memory_buffer_size
+        self.link_duplicates: bool = link_duplicates
+        # The umask can only be read by setting it, which is done once here rather than from the worker threads
+        self.umask: int = os.umask(0o022)
+        os.umask(self.umask)
+        self._failed_files: List[str] = []
+        self._failed_files_lock: threading.Lock = threading.Lock()
+        self._commit_queue: queue.Queue = None
+        self._commit_thread: threading.Thread = None
+        if background:
+            self._commit_queue = queue.Queue()
+            self._commit_thread = threading.Thread(target=self._commit_in_background, name='output-sink', daemon=True)
+            self._commit_thread.start()
+
+    def open_writer(self, output_file_name: str, on_commit: Callable[[], None] = None) -> IOutputWriter:
+        """
+        @brief Creates the writer of an output file, creating its directory if needed.
+
+        @param output_file_name The name of the output file.
+        @param on_commit If set, called once the file is committed, from the background thread if any.
+        @return The writer of the file.
+        """
+        directory: str = os.path.dirname(output_file_name)
+        if len(directory) > 0:
+            os.makedirs(directory, exist_ok=True)
+        return AtomicFileWriter(self, output_file_name, on_commit)
+
+    def duplicate(self, source_file_name: str, output_file_name: str, on_commit: Callable[[], None] = None) -> None:
+        """
+        @brief Writes an output file with the content of another output file already committed, right away.
+        @details The duplicate is a hard link or a copy created next to the output file and renamed over it, so that
+                 the output file is always either the previous one or the complete duplicate. A hard link falls back
+                 to a copy across file systems. The output files are replaced by later runs, never written in place,
+                 so that linked files do not change each other.
+
+        @param source_file_name The name of the committed output file.
+        @param output_file_name The name of the output file.
+        @param on_commit If set, called once the file is committed.
+        """
+        directory, base_name = os.path.split(output_file_name)
+        if len(directory) > 0:
+            os.makedirs(directory, exist_ok=True)
+        file_descriptor, temporary_file_name = tempfile.mkstemp(prefix=f'.{base_name}.', suffix='.tmp', dir=directory or '.')
+        os.close(file_descriptor)
+        try:
+            linked: bool = False
+            if self.link_duplicates:
+                os.remove(temporary_file_name)
+                try:
+                    os.link(source_file_name, temporary_file_name)
+                    linked = True
+                except OSError:
+                    pass
+            if not linked:
+                shutil.copyfile(source_file_name, temporary_file_name)
+                os.chmod(temporary_file_name, 0o666 & ~self.umask)
+                if self.fsync:
+                    with open(temporary_file_name, 'rb') as temporary_file:
+                        os.fsync(temporary_file.fileno())
+            os.replace(temporary_file_name, output_file_name)
+        except BaseException:
+            try:
+                os.remove(temporary_file_name)
+            except FileNotFoundError:
+                pass
+            raise
+        if on_commit is not None:
+            on_commit()
+
+    def commit(self, writer: AtomicFileWriter) -> None:
+        """
+        @brief Commits a closed writer, right away or in the background thread.
+
+        @param writer The closed writer.
+        """
+        if self._commit_queue is not None:
+            self._commit_queue.put(writer)
+        else:
+            writer.commit(self.fsync)
+
+    def _commit_in_background(self) -> None:
+        """
+        @brief Background thread: commits the writers in the order they were closed until None is received.
+        @details Failures are reported by close, the thread keeps committing the other files.
+        """
+        while True:
+            writer: AtomicFileWriter = self._commit_queue.get()
+            if writer is None:
+                return
+            try:
+                writer.commit(self.fsync)
+            except Exception as err:
+                self.logger.error(f"Output file {writer.output_file_name} could not be written: {err}")
+                with self._failed_files_lock:
+                    self._failed_files.append(writer.output_file_name)
+
+    def close(self) -> None:
+        """
+        @brief Waits until all the closed writers are committed and stops the background thread.
+
+        @exception IOError If some files could not be committed.
+        """
+        if self._commit_thread is not None:
+            self._commit_queue.put(None)
+            self._commit_thread.join()
+            self._commit_thread = None
+        with self._failed_files_lock:
+            failed_files: List[str] = list(self._failed_files)
+        if len(failed_files) > 0:
+            raise IOError(f"{len(failed_files)} output files could not be written: {', '.join(failed_files)}")
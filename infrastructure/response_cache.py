@@ -0,0 +1,136 @@
+"""
+Module for persisting LLM responses on disk.
+
+This module provides the class SQLiteResponseCache, an IResponseCache backed by a SQLite database.
+Entries are evicted in least recently used order once the stored responses exceed a maximum size,
+and responses can optionally be compressed.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from logging import Logger
+from typing import Dict
+
+from domain.iresponse_cache import IResponseCache
+
+
+class SQLiteResponseCache(IResponseCache):
+    """
+    Class caching LLM responses in a SQLite database.
+
+    Several threads and several processes can share the same cache directory.
+
+    Attributes:
+        database_file (str): The path of the SQLite database.
+        max_size_bytes (int): The maximum size of the stored responses before eviction starts.
+        compress (bool): Whether new responses are stored compressed with zlib.
+    """
+
+    database_file_name: str = "responses.sqlite"
+    """
+    The name of the SQLite database created in the cache directory.
+    """
+
+    def __init__(self, cache_directory: str, logger: Logger, max_size_bytes: int = 1024 * 1024 * 1024, compress: bool = False):
+        """
+        Initializes the SQLiteResponseCache instance and creates the database if needed.
+
+        Args:
+            cache_directory (str): The directory where the database is stored.
+            logger (Logger): The logger instance used for logging.
+            max_size_bytes (int): The maximum size of the stored responses before eviction starts.
+            compress (bool): Whether new responses are stored compressed with zlib.
+        """
+        os.makedirs(cache_directory, exist_ok=True)
+        self.logger: Logger = logger
+        self.database_file: str = os.path.join(cache_directory, self.database_file_name)
+        self.max_size_bytes: int = max_size_bytes
+        self.compress: bool = compress
+        self._statistics: Dict = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self._lock: threading.Lock = threading.Lock()
+        self._connection: sqlite3.Connection = sqlite3.connect(self.database_file, timeout=30, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS responses ("
+                                     "key TEXT PRIMARY KEY, value BLOB NOT NULL, compressed INTEGER NOT NULL, "
+                                     "size INTEGER NOT NULL, last_access REAL NOT NULL)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)")
+            # The total size is kept up to date by every store and eviction, so that no store sums the whole table.
+            # It is only computed once, when the database is created or predates it.
+            self._connection.execute("CREATE TABLE IF NOT EXISTS cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL)")
+            self._connection.execute("INSERT OR IGNORE INTO cache_size (id, total) SELECT 0, COALESCE(SUM(size), 0) FROM responses")
+
+    def get(self, key: str) -> str:
+        """
+        Retrieves a cached response and marks it as recently used.
+
+        Args:
+            key (str): The key computed by compute_key.
+
+        Returns:
+            str: The cached response, None if not found.
+        """
+        with self._lock, self._connection:
+            row = self._connection.execute("SELECT value, compressed FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._statistics['misses'] += 1
+                return None
+            self._connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._statistics['hits'] += 1
+        value, compressed = row
+        return (zlib.decompress(value) if compressed else value).decode('utf-8')
+
+    def put(self, key: str, response: str) -> None:
+        """
+        Stores a response, then evicts the least recently used entries if the cache grew too big.
+
+        Args:
+            key (str): The key computed by compute_key.
+            response (str): The response of the LLM.
+        """
+        value: bytes = response.encode('utf-8')
+        if self.compress:
+            value = zlib.compress(value)
+        with self._lock, self._connection:
+            # Take the write lock before reading the size of the replaced entry, so that two processes storing
+            # the same key do not both count it
+            self._connection.execute("BEGIN IMMEDIATE")
+            replaced_row = self._connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._connection.execute("INSERT OR REPLACE INTO responses (key, value, compressed, size, last_access) VALUES (?, ?, ?, ?, ?)", \
+                                     (key, value, 1 if self.compress else 0, len(value), time.time()))
+            self._connection.execute("UPDATE cache_size SET total = total + ? WHERE id = 0", \
+                                     (len(value) - (replaced_row[0] if replaced_row is not None else 0),))
+            self._statistics['stores'] += 1
+            self._evict()
+
+    def _evict(self) -> None:
+        """
+        Deletes the least recently used entries until the stored responses fit in max_size_bytes.
+        Must be called with the lock held, inside a transaction. The entries are only scanned once the limit is exceeded.
+        """
+        total_size: int = self._connection.execute("SELECT total FROM cache_size WHERE id = 0").fetchone()[0]
+        if total_size <= self.max_size_bytes:
+            return
+        evicted_keys = []
+        for key, size in self._connection.execute("SELECT key, size FROM responses ORDER BY last_access"):
+            if total_size <= self.max_size_bytes:
+                break
+            evicted_keys.append((key,))
+            total_size -= size
+        self._connection.executemany("DELETE FROM responses WHERE key = ?", evicted_keys)
+        self._connection.execute("UPDATE cache_size SET total = ? WHERE id = 0", (total_size,))
+        self._statistics['evictions'] += len(evicted_keys)
+        self.logger.debug(f"Evicted {len(evicted_keys)} responses from cache {self.database_file}")
+
+    def get_statistics(self) -> Dict:
+        """
+        Provides usage statistics of the cache for the current run, and its current content.
+
+        Returns:
+            Dict: The hits, misses, stores, evictions, entries and size_bytes of the cache.
+        """
+        with self._lock:
+            entries, size_bytes = self._connection.execute("SELECT (SELECT COUNT(*) FROM responses), total FROM cache_size WHERE id = 0").fetchone()
+            return dict(self._statistics, entries=entries, size_bytes=size_bytes)
@@ -0,0 +1,85 @@
+"""
+Module for counting tokens with a real tokenizer.
+
+This module provides the class TiktokenTokenEstimator, an ITokenEstimator counting tokens with the tiktoken
+package, and create_token_estimator, which selects an estimator by name. tiktoken is an optional dependency:
+it is only imported when its estimator is selected.
+"""
+
+from logging import Logger
+
+from domain.itoken_estimator import ITokenEstimator, CharacterTokenEstimator
+
+
+class TiktokenTokenEstimator(ITokenEstimator):
+    """
+    Class counting tokens with the tiktoken encoding of the model.
+
+    Models tiktoken does not know, such as most open weight models, are counted with the o200k_base encoding,
+    which is close enough to plan a run.
+
+    Attributes:
+        encoding: The tiktoken encoding used.
+    """
+
+    name: str = 'tiktoken'
+
+    fallback_encoding_name: str = 'o200k_base'
+    """
+    The encoding used for the models tiktoken does not know.
+    """
+
+    def __init__(self, model_name: str):
+        """
+        Initializes the TiktokenTokenEstimator instance.
+
+        Args:
+            model_name (str): The name of the LLM model, selecting the encoding.
+
+        Raises:
+            ImportError: If the tiktoken package is not installed.
+        """
+        import tiktoken
+
+        try:
+            self.encoding = tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            self.encoding = tiktoken.get_encoding(self.fallback_encoding_name)
+
+    def estimate_tokens(self, text: str) -> int:
+        """
+        Counts the tokens of a text.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            int: The number of tokens.
+        """
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+
+def create_token_estimator(estimator_name: str, model_name: str, logger: Logger) -> ITokenEstimator:
+    """
+    Creates a token estimator by name.
+
+    Args:
+        estimator_name (str): The name of the estimator, 'characters' or 'tiktoken'.
+        model_name (str): The name of the LLM model.
+        logger (Logger): The logger instance used for logging.
+
+    Returns:
+        ITokenEstimator: The estimator, the character based one if tiktoken is requested but not installed.
+
+    Raises:
+        ValueError: If the estimator name is unknown.
+    """
+    if estimator_name is None or estimator_name == CharacterTokenEstimator.name:
+        return CharacterTokenEstimator()
+    if estimator_name == TiktokenTokenEstimator.name:
+        try:
+            return TiktokenTokenEstimator(model_name)
+        except ImportError:
+            logger.warning("The tiktoken package is not installed (pip install tiktoken): tokens are estimated from the number of characters.")
+            return CharacterTokenEstimator()
+    raise ValueError(f"Unknown token estimator {estimator_name}: expected {CharacterTokenEstimator.name} or {TiktokenTokenEstimator.name}")
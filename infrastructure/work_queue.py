@@ -0,0 +1,293 @@
+"""
+Module for sharing a run between several worker processes through a SQLite database.
+
+This module provides the class SQLiteWorkQueue, an IWorkQueue stored in one SQLite file. The file can live on
+a file system shared by several hosts: every change is a short transaction taking the database lock, and the
+rollback journal is used rather than the write-ahead log, which requires shared memory between the processes.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from logging import Logger
+from typing import Dict, List
+
+from domain.iwork_queue import IWorkQueue
+
+
+class SQLiteWorkQueue(IWorkQueue):
+    """
+    Class storing the work queue of a run in a SQLite database.
+
+    Lease expiry times come from the clocks of the workers: the lease duration must be well above the clock
+    differences between the hosts.
+
+    Attributes:
+        queue_file (str): The path of the SQLite database.
+        max_attempts (int): The number of leases of an item after which it is failed instead of queued again.
+    """
+
+    def __init__(self, queue_file: str, logger: Logger, max_attempts: int = 3):
+        """
+        Initializes the SQLiteWorkQueue instance and creates the database if needed.
+
+        Args:
+            queue_file (str): The path of the SQLite database.
+            logger (Logger): The logger instance used for logging.
+            max_attempts (int): The number of leases of an item after which it is failed instead of queued again.
+        """
+        directory: str = os.path.dirname(queue_file)
+        if len(directory) > 0:
+            os.makedirs(directory, exist_ok=True)
+        self.logger: Logger = logger
+        self.queue_file: str = queue_file
+        self.max_attempts: int = max_attempts
+        self._lock: threading.Lock = threading.Lock()
+        # Transactions are explicit: claims must read and update the items under the same database lock
+        self._connection: sqlite3.Connection = sqlite3.connect(queue_file, timeout=60, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=DELETE")
+        with self._transaction():
+            self._connection.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS items ("
+                                     "item_id INTEGER PRIMARY KEY AUTOINCREMENT, source_file TEXT NOT NULL UNIQUE, state TEXT NOT NULL, "
+                                     "worker_id TEXT, lease_expires_at REAL, attempts INTEGER NOT NULL DEFAULT 0, outcome TEXT, "
+                                     "updated_at REAL NOT NULL)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS items_state ON items(state, item_id)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS workers ("
+                                     "worker_id TEXT PRIMARY KEY, started_at REAL NOT NULL, last_seen_at REAL NOT NULL, "
+                                     "claimed INTEGER NOT NULL DEFAULT 0, completed INTEGER NOT NULL DEFAULT 0)")
+
+    def _transaction(self) -> 'SQLiteTransaction':
+        """
+        Opens a transaction holding the database lock from its start, so that concurrent claims never lease the same item.
+
+        Returns:
+            SQLiteTransaction: The transaction, committed when the block exits normally and rolled back otherwise.
+        """
+        return SQLiteTransaction(self._connection, self._lock)
+
+    def set_settings(self, settings: Dict) -> None:
+        """
+        Records the settings of the run the queue was created for.
+
+        Args:
+            settings (Dict): The settings, JSON serializable values by name.
+        """
+        with self._transaction():
+            self._connection.executemany("INSERT OR REPLACE INTO settings (name, value) VALUES (?, ?)", \
+                                         [(name, json.dumps(value)) for name, value in settings.items()])
+
+    def get_settings(self) -> Dict:
+        """
+        Provides the settings of the run the queue was created for.
+
+        Returns:
+            Dict: The settings, empty if the queue was never initialized by a coordinator.
+        """
+        with self._lock:
+            return {name: json.loads(value) for name, value in self._connection.execute("SELECT name, value FROM settings")}
+
+    def enqueue(self, source_files: List[str]) -> int:
+        """
+        Adds source files to the queue, in order. Failed files are queued again.
+
+        Args:
+            source_files (List[str]): The source files, relative to the source directory.
+
+        Returns:
+            int: The number of files queued.
+        """
+        now: float = time.time()
+        with self._transaction():
+            changes_before: int = self._connection.total_changes
+            self._connection.executemany("INSERT INTO items (source_file, state, updated_at) VALUES (?, 'queued', ?) "
+                                         "ON CONFLICT(source_file) DO UPDATE SET state = 'queued', worker_id = NULL, lease_expires_at = NULL, "
+                                         "attempts = 0, outcome = NULL, updated_at = excluded.updated_at WHERE state = 'failed'", \
+                                         [(source_file, now) for source_file in source_files])
+            return self._connection.total_changes - changes_before
+
+    def _expire_leases(self, now: float) -> None:
+        """
+        Queues again the items whose lease expired, or fails them once they were leased max_attempts times.
+        Must be called inside a transaction.
+
+        Args:
+            now (float): The current time.
+        """
+        expired: List[tuple] = self._connection.execute("SELECT item_id, source_file, worker_id, attempts FROM items "
+                                                        "WHERE state = 'leased' AND lease_expires_at < ?", (now,)).fetchall()
+        for item_id, source_file, worker_id, attempts in expired:
+            if attempts >= self.max_attempts:
+                self.logger.error(f"{source_file} was leased {attempts} times without completing, last by {worker_id}: it is failed.")
+                self._connection.execute("UPDATE items SET state = 'failed', worker_id = NULL, outcome = 'lease_expired', updated_at = ? "
+                                         "WHERE item_id = ?", (now, item_id))
+            else:
+                self.logger.warning(f"The lease of {worker_id} on {source_file} expired: it is queued again.")
+                self._connection.execute("UPDATE items SET state = 'queued', worker_id = NULL, lease_expires_at = NULL, updated_at = ? "
+                                         "WHERE item_id = ?", (now, item_id))
+
+    def claim(self, worker_id: str, count: int, lease_seconds: float) -> List[Dict]:
+        """
+        Leases the next queued items to a worker, after queuing again the items whose lease expired.
+
+        Args:
+            worker_id (str): The identifier of the worker.
+            count (int): The maximum number of items leased.
+            lease_seconds (float): The duration of the leases.
+
+        Returns:
+            List[Dict]: The leased items, with item_id, source_file and attempts, empty if no item is queued.
+        """
+        now: float = time.time()
+        with self._transaction():
+            self._expire_leases(now)
+            rows: List[tuple] = self._connection.execute("SELECT item_id, source_file, attempts FROM items WHERE state = 'queued' "
+                                                         "ORDER BY item_id LIMIT ?", (count,)).fetchall()
+            self._connection.executemany("UPDATE items SET state = 'leased', worker_id = ?, lease_expires_at = ?, attempts = attempts + 1, "
+                                         "updated_at = ? WHERE item_id = ?", [(worker_id, now + lease_seconds, now, row[0]) for row in rows])
+            self._connection.execute("INSERT INTO workers (worker_id, started_at, last_seen_at, claimed) VALUES (?, ?, ?, ?) "
+                                     "ON CONFLICT(worker_id) DO UPDATE SET last_seen_at = excluded.last_seen_at, claimed = claimed + excluded.claimed", \
+                                     (worker_id, now, now, len(rows)))
+        return [{'item_id': item_id, 'source_file': source_file, 'attempts': attempts + 1} for item_id, source_file, attempts in rows]
+
+    def renew(self, worker_id: str, item_ids: List[int], lease_seconds: float) -> List[int]:
+        """
+        Extends the leases a worker holds.
+
+        Args:
+            worker_id (str): The identifier of the worker.
+            item_ids (List[int]): The items whose lease is extended.
+            lease_seconds (float): The new duration of the leases, from now.
+
+        Returns:
+            List[int]: The items the worker still holds.
+        """
+        now: float = time.time()
+        held_item_ids: List[int] = []
+        with self._transaction():
+            for item_id in item_ids:
+                cursor: sqlite3.Cursor = self._connection.execute("UPDATE items SET lease_expires_at = ?, updated_at = ? "
+                                                                  "WHERE item_id = ? AND state = 'leased' AND worker_id = ?", \
+                                                                  (now + lease_seconds, now, item_id, worker_id))
+                if cursor.rowcount > 0:
+                    held_item_ids.append(item_id)
+            self._connection.execute("UPDATE workers SET last_seen_at = ? WHERE worker_id = ?", (now, worker_id))
+        return held_item_ids
+
+    def complete(self, worker_id: str, item_id: int, outcome: str, failed: bool) -> None:
+        """
+        Records that an item was processed, even if its lease expired meanwhile: its target files are written.
+
+        Args:
+            worker_id (str): The identifier of the worker.
+            item_id (int): The item.
+            outcome (str): The outcomes of the target files of the item.
+            failed (bool): True if the item shall be marked as failed.
+        """
+        now: float = time.time()
+        with self._transaction():
+            self._connection.execute("UPDATE items SET state = ?, worker_id = ?, lease_expires_at = NULL, outcome = ?, updated_at = ? "
+                                     "WHERE item_id = ?", ('failed' if failed else 'done', worker_id, outcome, now, item_id))
+            self._connection.execute("UPDATE workers SET last_seen_at = ?, completed = completed + 1 WHERE worker_id = ?", (now, worker_id))
+
+    def release(self, worker_id: str, item_ids: List[int]) -> None:
+        """
+        Gives leased items back to the queue. Their attempt is counted, so that an item which keeps failing
+        without an outcome ends up failed.
+
+        Args:
+            worker_id (str): The identifier of the worker.
+            item_ids (List[int]): The items given back.
+        """
+        now: float = time.time()
+        with self._transaction():
+            self._connection.executemany("UPDATE items SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, worker_id = NULL, "
+                                         "lease_expires_at = NULL, updated_at = ? WHERE item_id = ? AND state = 'leased' AND worker_id = ?", \
+                                         [(self.max_attempts, now, item_id, worker_id) for item_id in item_ids])
+
+    def get_status(self) -> Dict:
+        """
+        Provides the progress of the run.
+
+        Returns:
+            Dict: The number of items by state, the expired leases, the outcomes of the items done, the throughput
+                  since the first claim with the projected remaining time, and the activity of each worker.
+        """
+        now: float = time.time()
+        with self._lock:
+            states: Dict[str, int] = dict(self._connection.execute("SELECT state, COUNT(*) FROM items GROUP BY state").fetchall())
+            expired_leases: int = self._connection.execute("SELECT COUNT(*) FROM items WHERE state = 'leased' AND lease_expires_at < ?", \
+                                                           (now,)).fetchone()[0]
+            outcomes: Dict[str, int] = dict(self._connection.execute("SELECT outcome, COUNT(*) FROM items WHERE outcome IS NOT NULL "
+                                                                     "GROUP BY outcome").fetchall())
+            leased_by_worker: Dict[str, int] = dict(self._connection.execute("SELECT worker_id, COUNT(*) FROM items WHERE state = 'leased' "
+                                                                             "GROUP BY worker_id").fetchall())
+            workers: List[Dict] = [{
+                'worker_id': worker_id, 'claimed': claimed, 'completed': completed, 'leased': leased_by_worker.get(worker_id, 0),
+                'last_seen_seconds_ago': round(now - last_seen_at, 1)
+            } for worker_id, started_at, last_seen_at, claimed, completed in \
+                self._connection.execute("SELECT worker_id, started_at, last_seen_at, claimed, completed FROM workers ORDER BY started_at")]
+            first_claim_at: float = self._connection.execute("SELECT MIN(started_at) FROM workers").fetchone()[0]
+
+        states = {state: states.get(state, 0) for state in ['queued', 'leased', 'done', 'failed']}
+        items: int = sum(states.values())
+        finished: int = states['done'] + states['failed']
+        elapsed_seconds: float = now - first_claim_at if first_claim_at is not None else None
+        files_per_second: float = finished / elapsed_seconds if elapsed_seconds else None
+        return {
+            'queue_file': self.queue_file,
+            'items': items,
+            'states': states,
+            'expired_leases': expired_leases,
+            'progress': finished / items if items > 0 else None,
+            'outcomes': outcomes,
+            'elapsed_seconds': round(elapsed_seconds, 1) if elapsed_seconds is not None else None,
+            'files_per_second': files_per_second,
+            'remaining_seconds': round((items - finished) / files_per_second, 1) if files_per_second else None,
+            'workers': workers
+        }
+
+    def close(self) -> None:
+        """
+        Closes the connection to the database.
+        """
+        with self._lock:
+            self._connection.close()
+
+
+class SQLiteTransaction:
+    """
+    Context manager running a block in a SQLite transaction started with BEGIN IMMEDIATE, under the lock of the connection.
+
+    Attributes:
+        connection (sqlite3.Connection): The connection, in autocommit mode.
+        lock (threading.Lock): The lock serializing the use of the connection by the threads.
+    """
+
+    def __init__(self, connection: sqlite3.Connection, lock: threading.Lock):
+        """
+        Initializes the SQLiteTransaction instance.
+
+        Args:
+            connection (sqlite3.Connection): The connection, in autocommit mode.
+            lock (threading.Lock): The lock serializing the use of the connection by the threads.
+        """
+        self.connection: sqlite3.Connection = connection
+        self.lock: threading.Lock = lock
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.lock.acquire()
+        try:
+            self.connection.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self.lock.release()
+            raise
+        return self.connection
+
+    def __exit__(self, exception_type, exception_value, exception_traceback) -> None:
+        try:
+            self.connection.execute("COMMIT" if exception_type is None else "ROLLBACK")
+        finally:
+            self.lock.release()
@@ -8,17 +8,42 @@ import os
 import sys
 from pathlib import Path
 from logging import Logger
-from typing import List
+from typing import List, Dict, Set
 
 from domain.llm_utils import LLMUtils
-from domain.icontent_out import IContentOut
+from domain.ioutput_sink import IOutputSink
 from domain.allm_access import AbstractLLMAccess
+from domain.iresponse_cache import IResponseCache
+from domain.incremental_manifest import IncrementalManifest
+from domain.source_chunker import SourceChunker
+from domain.rate_limiter import RateLimiter
+from domain.endpoint_pool import EndpointPool
+from domain.model_router import ModelRouter, ModelRoutingRule
+from domain.prompt_minifier import PromptMinifier
+from domain.symbol_index import SymbolIndex
+from domain.uml_project import UMLProjectBuilder
+from domain.ibatch_backend import IBatchBackend
 from domain.gpt2code import GPT2Code
 from domain.ifile_type import FileTypeInterface
+from domain.code_request import CodeRequest
+from domain.source_discovery import SourceDiscovery
+from domain.run_metrics import RunMetrics
+from domain.run_report import RunReport
+from domain.run_planner import RunPlanner, RunPlan
+from domain.itoken_estimator import ITokenEstimator
+from domain.scheduling_policy import SchedulingPolicy
+from domain.iwork_queue import IWorkQueue
+from domain.work_queue_worker import WorkQueueWorker
 
 from infrastructure.llm_access import LLMAccess
 from infrastructure.llm_access_simulate import LLMAccessSimulator
-from infrastructure.content_out import ContentOut
+from infrastructure.llm_access_async import AsyncLLMAccess, AsyncLLMAccessSimulator
+from infrastructure.output_sink import AtomicFileOutputSink
+from infrastructure.response_cache import SQLiteResponseCache
+from infrastructure.batch_backend import OpenAIBatchBackend, LocalFileBatchBackend
+from infrastructure.token_estimators import create_token_estimator
+from infrastructure.work_queue import SQLiteWorkQueue
+from infrastructure.git_changes import GitChangeDetector
 from infrastructure.file_types import CppFileType, JavaFileType, PythonFileType, \
                                       ShellFileType, TypescriptFileType, PlantUMLFileType, \
                                       AllFileType
@@ -37,20 +62,80 @@ class ApplicationService:
     @param simulate_llm_calls_only A flag indicating whether to simulate LLM calls or not.
     @param logger The logger object used for logging purposes.
     @param llm_utils The LLMUtils object used for LLM-related functionality.
-    @param selected_code_request The selected code request.
+    @param selected_code_request The selected code request, or the list of code requests processed in one pass.
     @param model_name The name of the LLM model being used.
     @param forced_source_file_types A list of source file types to be forced.
     @param forced_destination_file_type The destination file type to be forced.
     @param forced_comment_string The comment string to be forced.
     @param forced_destination_language_name The destination language name to be forced.
     @param generate_full_output A flag indicating whether to generate full output or not.
+    @param jobs The number of files processed concurrently.
+    @param use_asyncio A flag indicating whether requests are multiplexed on an asyncio event loop.
+    @param max_connections The size of the HTTP connection pool used with asyncio.
+    @param cache_directory The directory of the LLM response cache, None to disable the cache.
+    @param cache_max_size_mb The size of the response cache above which least recently used responses are evicted.
+    @param cache_compress A flag indicating whether cached responses are compressed.
+    @param show_cache_stats A flag indicating whether cache statistics are logged at the end of the run.
+    @param incremental A flag indicating whether files generated from unchanged inputs are skipped.
+    @param stream A flag indicating whether completions are streamed and written while they are generated.
+    @param context_window_tokens Overrides the context window of the model used to split files too big, if set.
+    @param requests_per_minute The requests per minute quota of the endpoint, None for no client side limit.
+    @param tokens_per_minute The tokens per minute quota of the endpoint, None for no client side limit.
+    @param batch A flag indicating whether all the requests are submitted at once to the batch endpoint.
+    @param batch_endpoint_directory If set, batches are submitted to a local file based stand-in for the batch endpoint in this directory.
+    @param batch_poll_seconds The time to wait between two polls of the batch endpoint.
+    @param fsync_output A flag indicating whether generated files are synced to disk before replacing the previous ones.
+    @param background_output_writer A flag indicating whether generated files are committed by a background thread.
+    @param excluded_directory_names The names of the directories never descended into, None for the default ones.
+    @param use_ignore_files A flag indicating whether the .gitignore and .gpt2codeignore files of the source tree are honoured.
+    @param metrics_file If set, the JSON summary of the run metrics is written to this file.
+    @param prometheus_textfile If set, the run metrics are written to this file in the Prometheus text format.
+    @param plan_file If set, no request is sent: the run is estimated and its plan is written to this JSON file.
+    @param execute_plan_file If set, only the files planned in this JSON file are processed.
+    @param sample_fraction The share of the source files planned, the totals being extrapolated to the whole tree.
+    @param token_estimator_name The name of the estimator counting the tokens, the character based one if not set.
+    @param token_prices The prices of one million input and output tokens used to plan, looked up from the model name if not set.
+    @param plan_output_ratio The number of output tokens projected per token of file content, the planner default if not set.
+    @param schedule_name The name of the policy ordering the files sent to the LLM, the discovery order if not set.
+    @param schedule_by_tokens If True the work of a file is estimated from its tokens, otherwise from its size in bytes.
+    @param deduplication How the output of identical requests is duplicated: copy, hardlink, or off to send every request.
+    @param enqueue_file If set, the source files are only enqueued in this work queue, to be processed by workers.
+    @param worker_file If set, the source files are claimed from this work queue, shared with other workers.
+    @param worker_id The identifier of the worker in the work queue, the host name and process id if not set.
+    @param lease_seconds The duration of the leases on the files claimed from the work queue.
+    @param endpoints_file If set, the requests are spread over the endpoints described in this JSON file.
+    @param routing How the endpoint of each request is selected: least_outstanding or ewma_latency.
+    @param model_rules If set, the JSON file or the JSON text of the rules routing each file to a model, model_name being the default one.
+    @param minify If set, the minification transformations applied to every code request, otherwise the ones each code request selects.
+    @param uml_project A flag indicating whether the UML class diagrams of the packages and of the project are generated from the class skeletons.
+    @param symbol_context A flag attaching to the requests of every code request the signatures of the symbols the file uses, otherwise only for the code requests selecting it.
+    @param changed_since If set, only the source files changed since this git revision are processed.
+    @param changed_files If set, only the source files listed in this file, one per line, are processed, - reading the list from the standard input.
+    @param report_file If set, the outcome and the review verdict of every file are written to this JSON file, and the run exits with an error if some fail.
+    @param fail_on The lowest review verdict failing the run: acceptable or issues.
     """
 
     def __init__(self, source_directory: str, destination_directory: str, files_to_skip: List, language_name: str, \
                  simulate_llm_calls_only: bool, logger: Logger, llm_utils: LLMUtils, \
-                 selected_code_request: int, model_name: str, \
+                 selected_code_request: int | List[int], model_name: str, \
                  forced_source_file_types: List, generated_file_extension: str, forced_comment_string: str, 
-                 forced_destination_language_name: str, generate_full_output: bool):
+                 forced_destination_language_name: str, generate_full_output: bool, jobs: int = 1, \
+                 use_asyncio: bool = False, max_connections: int = 100, \
+                 cache_directory: str = None, cache_max_size_mb: int = 1024, cache_compress: bool = False, \
+                 show_cache_stats: bool = False, incremental: bool = False, \
+                 stream: bool = False, context_window_tokens: int = None, \
+                 requests_per_minute: int = None, tokens_per_minute: int = None, \
+                 batch: bool = False, batch_endpoint_directory: str = None, batch_poll_seconds: float = 60, \
+                 fsync_output: bool = False, background_output_writer: bool = False, \
+                 excluded_directory_names: List[str] = None, use_ignore_files: bool = True, \
+                 metrics_file: str = None, prometheus_textfile: str = None, \
+                 plan_file: str = None, execute_plan_file: str = None, sample_fraction: float = None, \
+                 token_estimator_name: str = None, token_prices: List[float] = None, plan_output_ratio: float = None, \
+                 schedule_name: str = None, schedule_by_tokens: bool = False, deduplication: str = 'copy', \
+                 enqueue_file: str = None, worker_file: str = None, worker_id: str = None, lease_seconds: float = 300.0, \
+                 endpoints_file: str = None, routing: str = 'least_outstanding', model_rules: str = None, \
+                 minify: str = None, uml_project: bool = False, symbol_context: bool = False, \
+                 changed_since: str = None, changed_files: str = None, report_file: str = None, fail_on: str = 'issues'):
         """
         @brief Initializes the ApplicationService object with the provided parameters.
 
@@ -61,13 +146,57 @@ class ApplicationService:
         @param simulate_llm_calls_only A flag indicating whether to simulate LLM calls or not.
         @param logger The logger object used for logging purposes.
         @param llm_utils The LLMUtils object used for LLM-related functionality.
-        @param selected_code_request The selected code request.
+        @param selected_code_request The selected code request, or the list of code requests processed in one pass.
         @param model_name The name of the LLM model being used.
         @param forced_source_file_types A list of source file types to be forced.
         @param forced_destination_file_type The destination file type to be forced.
         @param forced_comment_string The comment string to be forced.
         @param forced_destination_language_name The destination language name to be forced.
         @param generate_full_output A flag indicating whether to generate full output or not.
+        @param jobs The number of files processed concurrently.
+        @param use_asyncio A flag indicating whether requests are multiplexed on an asyncio event loop.
+        @param max_connections The size of the HTTP connection pool used with asyncio.
+        @param cache_directory The directory of the LLM response cache, None to disable the cache.
+        @param cache_max_size_mb The size of the response cache above which least recently used responses are evicted.
+        @param cache_compress A flag indicating whether cached responses are compressed.
+        @param show_cache_stats A flag indicating whether cache statistics are logged at the end of the run.
+        @param incremental A flag indicating whether files generated from unchanged inputs are skipped.
+        @param stream A flag indicating whether completions are streamed and written while they are generated.
+        @param context_window_tokens Overrides the context window of the model used to split files too big, if set.
+        @param requests_per_minute The requests per minute quota of the endpoint, None for no client side limit.
+        @param tokens_per_minute The tokens per minute quota of the endpoint, None for no client side limit.
+        @param batch A flag indicating whether all the requests are submitted at once to the batch endpoint.
+        @param batch_endpoint_directory If set, batches are submitted to a local file based stand-in for the batch endpoint in this directory.
+        @param batch_poll_seconds The time to wait between two polls of the batch endpoint.
+        @param fsync_output A flag indicating whether generated files are synced to disk before replacing the previous ones.
+        @param background_output_writer A flag indicating whether generated files are committed by a background thread.
+        @param excluded_directory_names The names of the directories never descended into, None for the default ones.
+        @param use_ignore_files A flag indicating whether the .gitignore and .gpt2codeignore files of the source tree are honoured.
+        @param metrics_file If set, the JSON summary of the run metrics is written to this file.
+        @param prometheus_textfile If set, the run metrics are written to this file in the Prometheus text format.
+        @param plan_file If set, no request is sent: the run is estimated and its plan is written to this JSON file.
+        @param execute_plan_file If set, only the files planned in this JSON file are processed.
+        @param sample_fraction The share of the source files planned, the totals being extrapolated to the whole tree.
+        @param token_estimator_name The name of the estimator counting the tokens, the character based one if not set.
+        @param token_prices The prices of one million input and output tokens used to plan, looked up from the model name if not set.
+        @param plan_output_ratio The number of output tokens projected per token of file content, the planner default if not set.
+        @param schedule_name The name of the policy ordering the files sent to the LLM, the discovery order if not set.
+        @param schedule_by_tokens If True the work of a file is estimated from its tokens, otherwise from its size in bytes.
+        @param deduplication How the output of identical requests is duplicated: copy, hardlink, or off to send every request.
+        @param enqueue_file If set, the source files are only enqueued in this work queue, to be processed by workers.
+        @param worker_file If set, the source files are claimed from this work queue, shared with other workers.
+        @param worker_id The identifier of the worker in the work queue, the host name and process id if not set.
+        @param lease_seconds The duration of the leases on the files claimed from the work queue.
+        @param endpoints_file If set, the requests are spread over the endpoints described in this JSON file.
+        @param routing How the endpoint of each request is selected: least_outstanding or ewma_latency.
+        @param model_rules If set, the JSON file or the JSON text of the rules routing each file to a model, model_name being the default one.
+        @param minify If set, the minification transformations applied to every code request, otherwise the ones each code request selects.
+        @param uml_project A flag indicating whether the UML class diagrams of the packages and of the project are generated from the class skeletons.
+        @param symbol_context A flag attaching to the requests of every code request the signatures of the symbols the file uses, otherwise only for the code requests selecting it.
+        @param changed_since If set, only the source files changed since this git revision are processed.
+        @param changed_files If set, only the source files listed in this file, one per line, are processed, - reading the list from the standard input.
+        @param report_file If set, the outcome and the review verdict of every file are written to this JSON file, and the run exits with an error if some fail.
+        @param fail_on The lowest review verdict failing the run: acceptable or issues.
         """
         
         # Check if the provided directory is valid
@@ -84,12 +213,304 @@ class ApplicationService:
             # Changed 'Files to be skipped are' to 'The following files will be skipped' for clarity
             information_messages.append(f"The following files will be skipped: {files_to_skip}")
 
-        output_handler: IContentOut = ContentOut()
+        output_handler: IOutputSink = AtomicFileOutputSink(logger, fsync_output, background_output_writer, \
+                                                            link_duplicates=deduplication == 'hardlink')
         # Log each information message
         for information in information_messages:
             logger.info(information)
         
-        # Initialize the file type object
+        # Several code requests may be processed in one pass, each with its own file type
+        selected_code_requests: List[int] = selected_code_request if isinstance(selected_code_request, list) else [selected_code_request]
+        code_requests: List[CodeRequest] = [self.create_code_request(code_request_id, language_name, logger, llm_utils, forced_source_file_types, \
+                                                                     generated_file_extension, forced_comment_string, \
+                                                                     forced_destination_language_name, generate_full_output) \
+                                            for code_request_id in selected_code_requests]
+
+        llm_access_handler: AbstractLLMAccess = self.create_llm_access(model_name, simulate_llm_calls_only, use_asyncio, max_connections, logger)
+
+        # Simulated responses are never cached so that they cannot be served later instead of real ones
+        response_cache: IResponseCache = None
+        if cache_directory is not None and not simulate_llm_calls_only:
+            response_cache = SQLiteResponseCache(cache_directory, logger, cache_max_size_mb * 1024 * 1024, cache_compress)
+            logger.info(f"Using response cache {response_cache.database_file}")
+            llm_access_handler.set_response_cache(response_cache)
+
+        # With a pool, each endpoint has its own limiter, the quotas given here being the default ones
+        endpoint_pool: EndpointPool = None
+        if endpoints_file is not None:
+            try:
+                endpoint_pool = EndpointPool.load(endpoints_file, logger, routing, requests_per_minute, tokens_per_minute)
+            except (OSError, ValueError) as err:
+                logger.error(f"The endpoints {endpoints_file} cannot be read: {err}")
+                sys.exit(1)
+            logger.info(f"Spreading the requests over {len(endpoint_pool.endpoints)} endpoints by {routing.replace('_', ' ')}: "
+                        f"{', '.join(endpoint.name for endpoint in endpoint_pool.endpoints)}")
+            llm_access_handler.set_endpoint_pool(endpoint_pool)
+
+        # One limiter per endpoint, shared by all the jobs sending requests to it
+        rate_limiter: RateLimiter = None
+        if endpoint_pool is None and (requests_per_minute is not None or tokens_per_minute is not None):
+            rate_limiter = RateLimiter.get_shared(LLMAccess.base_url or 'default', logger, requests_per_minute, tokens_per_minute)
+            logger.info(f"Limiting requests to {requests_per_minute or 'unlimited'} per minute and {tokens_per_minute or 'unlimited'} tokens per minute")
+            llm_access_handler.set_rate_limiter(rate_limiter)
+
+        batch_backend: IBatchBackend = None
+        if batch and plan_file is None:
+            if batch_endpoint_directory is None and simulate_llm_calls_only:
+                batch_endpoint_directory = os.path.join(destination_directory, GPT2Code.batch_directory_name, "endpoint")
+            if batch_endpoint_directory is not None:
+                batch_backend = LocalFileBatchBackend(batch_endpoint_directory, logger)
+                logger.info(f"Submitting batches to the local batch endpoint {batch_endpoint_directory}")
+            elif LLMAccess.get_client() is None:
+                logger.error("Batch mode requires the OPENAI_API_KEY environment variable, or a local batch endpoint directory.")
+                sys.exit(1)
+            else:
+                batch_backend = OpenAIBatchBackend(logger, LLMAccess.get_client())
+
+        incremental_manifest: IncrementalManifest = IncrementalManifest(destination_directory, logger) if incremental else None
+        token_estimator: ITokenEstimator = create_token_estimator(token_estimator_name, model_name, logger)
+        source_chunker: SourceChunker = SourceChunker(logger, model_name, context_window_tokens, token_estimator)
+
+        # Every model gets its own LLM access and chunker, sharing the cache, the endpoints and the quotas of the default one
+        model_router: ModelRouter = None
+        code_request_rules: Dict[int, List[ModelRoutingRule]] = {}
+        try:
+            for code_request in code_requests:
+                rule_descriptions: List = llm_utils.get_model_routing_rules(code_request.request_id)
+                if rule_descriptions is not None:
+                    code_request_rules[code_request.request_id] = ModelRouter.parse_rules(rule_descriptions)
+            rules: List[ModelRoutingRule] = ModelRouter.load_rules(model_rules) if model_rules is not None else []
+        except (OSError, ValueError) as err:
+            logger.error(f"The model routing rules cannot be read: {err}")
+            sys.exit(1)
+        if len(rules) > 0 or len(code_request_rules) > 0:
+            model_router = ModelRouter(model_name, logger, token_estimator, rules, code_request_rules)
+            model_router.register(model_name, llm_access_handler, source_chunker)
+            for routed_model_name in model_router.get_model_names()[1:]:
+                routed_llm_access: AbstractLLMAccess = self.create_llm_access(routed_model_name, simulate_llm_calls_only, use_asyncio, \
+                                                                              max_connections, logger)
+                if response_cache is not None:
+                    routed_llm_access.set_response_cache(response_cache)
+                if endpoint_pool is not None:
+                    routed_llm_access.set_endpoint_pool(endpoint_pool)
+                if rate_limiter is not None:
+                    routed_llm_access.set_rate_limiter(rate_limiter)
+                model_router.register(routed_model_name, routed_llm_access, \
+                                      SourceChunker(logger, routed_model_name, context_window_tokens, token_estimator))
+            logger.info(f"Routing files between the models {', '.join(model_router.get_model_names())} "
+                        f"with {len(rules) + sum(len(request_rules) for request_rules in code_request_rules.values())} rules, "
+                        f"{model_name} by default")
+
+        # The transformations forced on the command line apply to every code request, otherwise each one selects its own
+        request_transformations: Dict[int, List[str]] = {}
+        for code_request_id in selected_code_requests:
+            transformations = minify if minify is not None else llm_utils.get_minify_transformations(code_request_id)
+            try:
+                transformations = PromptMinifier.parse_transformations(transformations) if transformations is not None else []
+            except ValueError as err:
+                logger.error(f"Request {code_request_id}: {err}")
+                sys.exit(1)
+            # The headers and comments removed from the content sent would be missing from the rewritten source files
+            lossy_transformations: List[str] = [transformation for transformation in transformations \
+                                                if transformation in PromptMinifier.lossy_transformations]
+            if minify is not None and len(lossy_transformations) > 0 and llm_utils.is_source_rewrite_request(code_request_id):
+                logger.warning(f"Request {code_request_id} rewrites the source files: {', '.join(lossy_transformations)} not applied")
+                transformations = [transformation for transformation in transformations if transformation not in lossy_transformations]
+            if len(transformations) > 0:
+                request_transformations[code_request_id] = transformations
+                logger.info(f"Minifying the files of request {code_request_id}: {', '.join(transformations)}")
+        prompt_minifier: PromptMinifier = PromptMinifier(logger, token_estimator, request_transformations) if len(request_transformations) > 0 else None
+
+        uml_project_builder: UMLProjectBuilder = None
+        if uml_project:
+            if len(code_requests) > 1:
+                logger.error("The UML project diagrams are generated for one code request only.")
+                sys.exit(1)
+            uml_project_builder = UMLProjectBuilder(logger, token_estimator, os.path.basename(os.path.abspath(source_directory)))
+            logger.info("Generating the UML class diagrams of the packages and of the project from the class skeletons")
+
+        symbol_index: SymbolIndex = None
+        symbol_request_ids: Set[int] = {code_request_id for code_request_id in selected_code_requests \
+                                        if symbol_context or llm_utils.get_symbol_context(code_request_id)}
+        if len(symbol_request_ids) > 0 and not uml_project:
+            symbol_index = SymbolIndex(destination_directory, logger, token_estimator, symbol_request_ids)
+            logger.info(f"Attaching the signatures of the symbols each file uses to the requests {', '.join(map(str, sorted(symbol_request_ids)))}")
+        # In CI only the files a change touches are processed, the other passes still reading the whole tree
+        selected_files: Set[str] = None
+        selection: str = None
+        if changed_since is not None:
+            try:
+                selected_files = GitChangeDetector(source_directory, logger).get_changed_files(changed_since)
+            except RuntimeError as err:
+                logger.error(f"The files changed since {changed_since} cannot be listed: {err}")
+                sys.exit(1)
+            selection = f"changes since {changed_since}"
+        elif changed_files is not None:
+            try:
+                if changed_files == '-':
+                    paths: List[str] = sys.stdin.read().splitlines()
+                else:
+                    with open(changed_files, 'r', encoding='utf-8') as file:
+                        paths = file.read().splitlines()
+            except OSError as err:
+                logger.error(f"The file list {changed_files} cannot be read: {err}")
+                sys.exit(1)
+            selected_files = SourceDiscovery.get_relative_paths(source_directory, [path.strip() for path in paths if len(path.strip()) > 0])
+            selection = f"file list {changed_files}"
+            logger.info(f"{len(selected_files)} files of {source_directory} selected from {changed_files}")
+        source_discovery: SourceDiscovery = SourceDiscovery(source_directory, logger, excluded_directory_names, use_ignore_files, selected_files)
+        run_metrics: RunMetrics = RunMetrics(logger, jobs)
+        scheduling_policy: SchedulingPolicy = SchedulingPolicy.create(schedule_name, logger, token_estimator if schedule_by_tokens else None)
+
+        run_planner: RunPlanner = None
+        if plan_file is not None:
+            run_planner = RunPlanner(logger, token_estimator, model_name, source_chunker.context_window_tokens, sample_fraction, jobs, \
+                                     requests_per_minute, tokens_per_minute, tuple(token_prices) if token_prices is not None else None, \
+                                     plan_output_ratio)
+            logger.info("Planning the run, no request will be sent")
+
+        run_plan: RunPlan = None
+        if execute_plan_file is not None:
+            try:
+                run_plan = RunPlan.load(execute_plan_file)
+            except (OSError, ValueError) as err:
+                logger.error(f"The plan {execute_plan_file} cannot be read: {err}")
+                sys.exit(1)
+            mismatches: List[str] = run_plan.get_mismatches(source_directory, model_name, selected_code_requests)
+            if len(mismatches) > 0:
+                logger.error(f"The plan {execute_plan_file} was made for another run: {', '.join(mismatches)}.")
+                sys.exit(1)
+            logger.info(f"Executing the plan {execute_plan_file}: {run_plan.get_file_count()} files")
+
+        # The coordinator records the run in the queue, so that workers started with other options refuse to process it
+        work_queue: IWorkQueue = None
+        work_queue_worker: WorkQueueWorker = None
+        if enqueue_file is not None:
+            work_queue = SQLiteWorkQueue(enqueue_file, logger)
+            settings: Dict = work_queue.get_settings()
+            mismatches: List[str] = WorkQueueWorker.get_mismatches(settings, model_name, selected_code_requests) if len(settings) > 0 else []
+            if len(mismatches) > 0:
+                logger.error(f"The work queue {enqueue_file} was created for another run: {', '.join(mismatches)}.")
+                sys.exit(1)
+            work_queue.set_settings(WorkQueueWorker.describe_run(source_directory, destination_directory, model_name, selected_code_requests))
+        elif worker_file is not None:
+            work_queue = SQLiteWorkQueue(worker_file, logger)
+            settings: Dict = work_queue.get_settings()
+            if len(settings) == 0:
+                logger.error(f"The work queue {worker_file} was not initialized: enqueue the source files first with --enqueue.")
+                sys.exit(1)
+            mismatches: List[str] = WorkQueueWorker.get_mismatches(settings, model_name, selected_code_requests)
+            if len(mismatches) > 0:
+                logger.error(f"The work queue {worker_file} was created for another run: {', '.join(mismatches)}.")
+                sys.exit(1)
+            if settings.get('source_directory') != os.path.abspath(source_directory):
+                logger.warning(f"The work queue {worker_file} was created for the source directory {settings.get('source_directory')}, "
+                               f"processing {os.path.abspath(source_directory)}")
+            work_queue_worker = WorkQueueWorker(work_queue, logger, worker_id, lease_seconds, jobs)
+            logger.info(f"Processing the work queue {worker_file} as worker {work_queue_worker.worker_id}")
+
+        gpt2code: GPT2Code = self.initialize_gpt2code(source_directory, destination_directory, files_to_skip, logger, output_handler, llm_utils, code_requests[0].request_id, \
+                llm_access_handler, code_requests[0].language_name, code_requests[0].file_type, code_requests[0].force_full_output, jobs, incremental_manifest, \
+                stream, source_chunker, batch_backend, batch_poll_seconds, code_requests[1:], source_discovery, run_metrics, run_planner, run_plan, \
+                scheduling_policy, deduplication != 'off', work_queue if work_queue_worker is None else None, work_queue_worker, \
+                model_router, prompt_minifier, uml_project_builder, symbol_index)
+
+        if work_queue is not None:
+            logger.info(f"Work queue {work_queue.queue_file}: {WorkQueueWorker.describe_status(work_queue.get_status())}")
+            work_queue.close()
+            if work_queue_worker is None:
+                if gpt2code.processing_error is not None:
+                    logger.error(f"Enqueuing was aborted: {gpt2code.processing_error}")
+                    sys.exit(1)
+                return
+
+        if run_planner is not None:
+            # A plan of the files discovered before the error would understate the run
+            if gpt2code.processing_error is not None:
+                logger.error(f"Planning was aborted, no plan written: {gpt2code.processing_error}")
+                sys.exit(1)
+            plan: Dict = run_planner.create_plan(source_directory, destination_directory, selected_code_requests)
+            run_planner.log_plan(plan)
+            RunPlanner.write_plan(plan_file, plan)
+            logger.info(f"Plan written to {plan_file}")
+            return
+
+        if endpoint_pool is not None:
+            endpoint_pool.log_statistics()
+
+        run_metrics.finish()
+        run_summary: Dict = run_metrics.summarize()
+        run_metrics.log_summary(run_summary)
+        if metrics_file is not None:
+            run_metrics.write_summary(metrics_file, run_summary)
+        if prometheus_textfile is not None:
+            run_metrics.write_prometheus_textfile(prometheus_textfile, run_summary)
+
+        if show_cache_stats:
+            if response_cache is None:
+                logger.info("Response cache is disabled")
+            else:
+                statistics: Dict = response_cache.get_statistics()
+                logger.info(f"Response cache statistics: {statistics['hits']} hits, {statistics['misses']} misses, " + \
+                            f"{statistics['stores']} stores, {statistics['evictions']} evictions, " + \
+                            f"{statistics['entries']} entries, {statistics['size_bytes']} bytes")
+
+        if report_file is not None:
+            request_names: Dict[int, str] = {}
+            for code_request_id in selected_code_requests:
+                request_names.update(llm_utils.get_dict_requestid_request_name(code_request_id))
+            run_report: RunReport = RunReport(logger, source_directory, destination_directory, request_names, \
+                                              {code_request_id for code_request_id in selected_code_requests if llm_utils.is_review_request(code_request_id)}, \
+                                              fail_on)
+            # With a selection, the files the run never got to are reported as unfinished
+            report: Dict = run_report.create_report(run_summary, selection, \
+                                                    gpt2code.get_expected_target_files() if selected_files is not None else None, \
+                                                    gpt2code.processing_error)
+            run_report.log_report(report)
+            run_report.write_report(report_file, report)
+            if not report['passed']:
+                sys.exit(1)
+
+        if gpt2code.processing_error is not None:
+            logger.error(f"The run was aborted: {gpt2code.processing_error}")
+            sys.exit(1)
+
+    @staticmethod
+    def create_llm_access(model_name: str, simulate_llm_calls_only: bool, use_asyncio: bool, max_connections: int, logger: Logger) -> AbstractLLMAccess:
+        """
+        @brief Creates the LLM access sending the requests to a model.
+
+        @param model_name The name of the LLM model.
+        @param simulate_llm_calls_only A flag indicating whether to simulate LLM calls or not.
+        @param use_asyncio A flag indicating whether requests are multiplexed on an asyncio event loop.
+        @param max_connections The size of the HTTP connection pool used with asyncio.
+        @param logger The logger object used for logging purposes.
+        @return The LLM access.
+        """
+        if use_asyncio:
+            return AsyncLLMAccess(logger, model_name, max_connections) if not simulate_llm_calls_only \
+                else AsyncLLMAccessSimulator(logger, model_name, max_connections)
+        return LLMAccess(logger, model_name) if not simulate_llm_calls_only \
+            else LLMAccessSimulator(logger, model_name)
+
+    @staticmethod
+    def create_code_request(selected_code_request: int, language_name: str, logger: Logger, llm_utils: LLMUtils, \
+                            forced_source_file_types: List, generated_file_extension: str, forced_comment_string: str, \
+                            forced_destination_language_name: str, generate_full_output: bool) -> CodeRequest:
+        """
+        @brief Selects the file type handler of a code request, the options not forced being taken from the code request itself.
+
+        @param selected_code_request The id of the code request.
+        @param language_name The name of the programming language being used, None to take it from the code request.
+        @param logger The logger object used for logging purposes.
+        @param llm_utils The LLMUtils object used for LLM-related functionality.
+        @param forced_source_file_types A list of source file types to be forced.
+        @param generated_file_extension The extension added to the generated files to be forced.
+        @param forced_comment_string The comment string to be forced.
+        @param forced_destination_language_name The destination language name to be forced.
+        @param generate_full_output A flag indicating whether to generate full output or not, None to take it from the code request.
+        @return The code request with its file type handler.
+        """
         file_type_handler: FileTypeInterface = None
 
         if language_name is None:
@@ -148,14 +569,17 @@ class ApplicationService:
             file_type_handler = AllFileType(forced_destination_language_name, generated_file_extension, forced_comment_string, forced_source_file_types)
             logger.info(f"Handling generic request {selected_code_request}, language name: {language_name}, forced destination file type: {generated_file_extension}, Forced comment string: {forced_comment_string}, Forced source file type: {forced_source_file_types}")
 
-        llm_access_handler: AbstractLLMAccess = LLMAccess(logger, model_name) if not simulate_llm_calls_only \
-            else LLMAccessSimulator(logger, model_name)
-
-        self.initialize_gpt2code(source_directory, destination_directory, files_to_skip, logger, output_handler, llm_utils, selected_code_request, \
-                llm_access_handler, language_name, file_type_handler, generate_full_output)
+        return CodeRequest(selected_code_request, language_name, file_type_handler, generate_full_output)
 
-    def initialize_gpt2code(self, source_directory: str, destination_directory: str, files_to_skip: List, logger: Logger, output_handler: IContentOut, llm_utils: LLMUtils, selected_code_request: int, \
-                llm_access_handler: AbstractLLMAccess, language_name: str, file_type_handler: FileTypeInterface, generate_full_output: bool):
+    def initialize_gpt2code(self, source_directory: str, destination_directory: str, files_to_skip: List, logger: Logger, output_handler: IOutputSink, llm_utils: LLMUtils, selected_code_request: int, \
+                llm_access_handler: AbstractLLMAccess, language_name: str, file_type_handler: FileTypeInterface, generate_full_output: bool, jobs: int = 1, \
+                incremental_manifest: IncrementalManifest = None, stream: bool = False, \
+                source_chunker: SourceChunker = None, batch_backend: IBatchBackend = None, batch_poll_seconds: float = 60, \
+                other_code_requests: List[CodeRequest] = None, source_discovery: SourceDiscovery = None, \
+                run_metrics: RunMetrics = None, run_planner: RunPlanner = None, run_plan: RunPlan = None, \
+                scheduling_policy: SchedulingPolicy = None, deduplicate: bool = False, \
+                work_queue: IWorkQueue = None, work_queue_worker: WorkQueueWorker = None, model_router: ModelRouter = None, \
+                prompt_minifier: PromptMinifier = None, uml_project: UMLProjectBuilder = None, symbol_index: SymbolIndex = None) -> GPT2Code:
         """
         @brief Initializes the GPT2Code object with the provided parameters.
 
@@ -163,13 +587,36 @@ class ApplicationService:
         @param destination_directory The directory where the output files will be generated.
         @param files_to_skip A list of files to be skipped during processing.
         @param logger The logger object used for logging purposes.
-        @param output_handler The output handler object used for handling output.
+        @param output_handler The output sink providing the writers of the generated files.
         @param llm_utils The LLMUtils object used for LLM-related functionality.
-        @param selected_code_request The selected code request.
+        @param selected_code_request The selected code request, or the list of code requests processed in one pass.
         @param llm_access_handler The LLM access handler object used for accessing LLM models.
         @param language_name The name of the programming language being used.
         @param file_type_handler The file type handler object used for handling file types.
         @param generate_full_output A flag indicating whether to generate full output or not.
+        @param jobs The number of files processed concurrently.
+        @param incremental_manifest If set, files whose inputs did not change since the previous run are skipped.
+        @param stream A flag indicating whether completions are streamed and written while they are generated.
+        @param source_chunker The chunker splitting files too big for the context window of the model.
+        @param batch_backend If set, all the requests are submitted at once to this batch endpoint.
+        @param batch_poll_seconds The time to wait between two polls of the batch endpoint.
+        @param other_code_requests Code requests processed in the same pass as the selected one.
+        @param source_discovery The walker listing the source files, skipping excluded directories and ignored paths.
+        @param run_metrics The metrics of the files and requests of the run.
+        @param run_planner If set, the run is only planned by it.
+        @param run_plan If set, only the files planned in it are processed.
+        @param scheduling_policy The policy ordering the files sent to the LLM.
+        @param deduplicate A flag to send identical requests once.
+        @param work_queue If set, the source files are only enqueued in this work queue.
+        @param work_queue_worker If set, the source files are claimed from the work queue of this worker.
+        @param model_router If set, selects the model each file is sent to.
+        @param prompt_minifier If set, minifies the file contents of the code requests selecting minification transformations.
+        @param uml_project If set, the UML class diagrams of the packages and of the project are generated from the class skeletons.
+        @param symbol_index If set, attaches the signatures of the symbols a file uses to its requests, for the code requests enabling it.
+        @return The GPT2Code object, once the source files are processed.
         """
-        GPT2Code(source_directory, destination_directory, files_to_skip, logger, output_handler, llm_utils, selected_code_request, \
-                llm_access_handler, language_name, file_type_handler, generate_full_output)
+        return GPT2Code(source_directory, destination_directory, files_to_skip, logger, output_handler, llm_utils, selected_code_request, \
+                llm_access_handler, language_name, file_type_handler, generate_full_output, jobs, incremental_manifest, \
+                stream, source_chunker, batch_backend, batch_poll_seconds, other_code_requests, source_discovery, run_metrics, \
+                run_planner, run_plan, scheduling_policy, deduplicate, work_queue, work_queue_worker, model_router, \
+                prompt_minifier, uml_project, symbol_index)
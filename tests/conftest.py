@@ -0,0 +1,22 @@
+"""
+@file conftest.py
+@brief Shared fixtures of the tests: the repository root is importable and every test gets a logger.
+"""
+
+import logging
+import os
+import sys
+
+import pytest
+
+REPOSITORY_DIRECTORY: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPOSITORY_DIRECTORY not in sys.path:
+    sys.path.insert(0, REPOSITORY_DIRECTORY)
+
+
+@pytest.fixture
+def logger() -> logging.Logger:
+    """
+    @brief Provides the logger handed to the classes under test.
+    """
+    return logging.getLogger('gpt2code.tests')
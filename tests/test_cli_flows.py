@@ -0,0 +1,116 @@
+"""
+@file test_cli_flows.py
+@brief End to end tests of the --plan, --batch and --report flows, with simulated LLM calls.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import List
+
+import pytest
+
+from conftest import REPOSITORY_DIRECTORY
+
+
+def run_gpt2code(source_directory: str, target_directory: str, *arguments: str, wait: bool = True):
+    command: List[str] = [sys.executable, os.path.join(REPOSITORY_DIRECTORY, '__main__.py'), '--from_directory', source_directory,
+                          '--to_directory', target_directory, '--language_name', 'python', '--simulate_calls_only', '--no_cache'] + list(arguments)
+    environment = {name: value for name, value in os.environ.items() if not name.startswith('OPENAI_')}
+    if not wait:
+        return subprocess.Popen(command, cwd=REPOSITORY_DIRECTORY, env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return subprocess.run(command, cwd=REPOSITORY_DIRECTORY, env=environment, capture_output=True, text=True, timeout=120)
+
+
+def write_file(path: str, content: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(content)
+
+
+@pytest.fixture
+def source_directory(tmp_path) -> str:
+    """
+    @brief Provides a source tree with two identical files and a file which is not UTF-8.
+    """
+    source_directory: str = os.path.join(str(tmp_path), 'src')
+    write_file(os.path.join(source_directory, 'main.py'), b'def main():\n    return 1\n')
+    write_file(os.path.join(source_directory, 'pkg', 'a.py'), b'def f(x):\n    return x + 1\n')
+    write_file(os.path.join(source_directory, 'pkg', 'b.py'), b'def f(x):\n    return x + 1\n')
+    write_file(os.path.join(source_directory, 'pkg', 'latin1.py'), b'name = "\xe9t\xe9"\n')
+    return source_directory
+
+
+def test_plan_lists_every_file_and_sends_nothing(tmp_path, source_directory):
+    target_directory: str = os.path.join(str(tmp_path), 'out')
+    plan_file: str = os.path.join(str(tmp_path), 'plan.json')
+    result = run_gpt2code(source_directory, target_directory, '--plan', plan_file)
+    assert result.returncode == 0, result.stderr
+    with open(plan_file, 'r', encoding='utf-8') as file:
+        plan = json.load(file)
+    assert {planned_file['from_file'].replace(os.sep, '/'): planned_file['status'] for planned_file in plan['files']} == \
+        {'main.py': 'planned', 'pkg/a.py': 'planned', 'pkg/b.py': 'duplicate', 'pkg/latin1.py': 'unreadable'}
+    assert plan['sampled']['requests'] == 2 and plan['sampled']['unreadable_files'] == 1
+    assert not os.path.exists(os.path.join(target_directory, 'main.py'))
+
+
+def test_batch_writes_the_files_and_skips_unreadable_ones(tmp_path, source_directory):
+    target_directory: str = os.path.join(str(tmp_path), 'out')
+    endpoint_directory: str = os.path.join(str(tmp_path), 'endpoint')
+    result = run_gpt2code(source_directory, target_directory, '--batch', '--batch_endpoint_dir', endpoint_directory, '--batch_poll_interval', '0.05')
+    assert result.returncode == 0, result.stderr
+    for written_file in ['main.py', 'pkg/a.py', 'pkg/b.py']:
+        assert os.path.isfile(os.path.join(target_directory, written_file))
+    assert not os.path.exists(os.path.join(target_directory, 'pkg', 'latin1.py'))
+    assert len(os.listdir(endpoint_directory)) == 1
+    assert not os.path.exists(os.path.join(target_directory, '.gpt2code_batches', 'submitted_batches.json'))
+
+
+def test_interrupted_batch_run_is_resumed_without_submitting_again(tmp_path, source_directory):
+    target_directory: str = os.path.join(str(tmp_path), 'out')
+    endpoint_directory: str = os.path.join(str(tmp_path), 'endpoint')
+    batch_state_file: str = os.path.join(target_directory, '.gpt2code_batches', 'submitted_batches.json')
+    process = run_gpt2code(source_directory, target_directory, '--batch', '--batch_endpoint_dir', endpoint_directory,
+                           '--batch_poll_interval', '3600', wait=False)
+    try:
+        deadline: float = time.monotonic() + 60
+        while not os.path.isfile(batch_state_file) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert os.path.isfile(batch_state_file)
+    finally:
+        process.kill()
+        process.wait()
+    with open(batch_state_file, 'r', encoding='utf-8') as file:
+        submitted_batches = json.load(file)['batches']
+    assert len(submitted_batches) == 1 and len(submitted_batches[0]['request_keys']) == 2
+
+    result = run_gpt2code(source_directory, target_directory, '--batch', '--batch_endpoint_dir', endpoint_directory, '--batch_poll_interval', '0.05')
+    assert result.returncode == 0, result.stderr
+    assert 'Resuming 1 batches' in result.stderr
+    assert os.listdir(endpoint_directory) == [submitted_batches[0]['batch_id']]
+    assert os.path.isfile(os.path.join(target_directory, 'pkg', 'a.py'))
+    assert not os.path.exists(batch_state_file)
+
+
+def test_report_fails_on_unreadable_files(tmp_path, source_directory):
+    target_directory: str = os.path.join(str(tmp_path), 'out')
+    report_file: str = os.path.join(str(tmp_path), 'report.json')
+    result = run_gpt2code(source_directory, target_directory, '--report', report_file)
+    assert result.returncode == 1, result.stderr
+    with open(report_file, 'r', encoding='utf-8') as file:
+        report = json.load(file)
+    assert not report['passed'] and report['error'] is None
+    assert {file_entry['source_file']: file_entry['outcome'] for file_entry in report['files']} == \
+        {'main.py': 'written', 'pkg/a.py': 'written', 'pkg/b.py': 'deduplicated', 'pkg/latin1.py': 'failed'}
+    assert os.path.isfile(os.path.join(str(tmp_path), 'report.md'))
+
+
+def test_report_passes_on_a_clean_tree(tmp_path, source_directory):
+    os.remove(os.path.join(source_directory, 'pkg', 'latin1.py'))
+    report_file: str = os.path.join(str(tmp_path), 'report.json')
+    result = run_gpt2code(source_directory, os.path.join(str(tmp_path), 'out'), '--report', report_file)
+    assert result.returncode == 0, result.stderr
+    with open(report_file, 'r', encoding='utf-8') as file:
+        assert json.load(file)['passed']
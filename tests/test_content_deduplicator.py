@@ -0,0 +1,78 @@
+"""
+@file test_content_deduplicator.py
+@brief Tests of the ContentDeduplicator states: pending, available and failed requests.
+"""
+
+import pytest
+
+from domain.content_deduplicator import ContentDeduplicator
+
+
+@pytest.fixture
+def calls():
+    return {'duplicated': [], 'failed': []}
+
+
+@pytest.fixture
+def deduplicator(logger, calls):
+    return ContentDeduplicator(logger, lambda leader, file_task: calls['duplicated'].append((leader, file_task['to_file'])),
+                               lambda file_task, leader: calls['failed'].append((file_task['to_file'], leader)))
+
+
+def test_first_file_leads_and_followers_wait_for_its_commit(deduplicator, calls):
+    assert deduplicator.claim('key', {'to_file': 'a'}) is None
+    assert deduplicator.claim('key', {'to_file': 'b'}) == 'a'
+    assert deduplicator.claim('key', {'to_file': 'c'}) == 'a'
+    assert calls['duplicated'] == []
+    deduplicator.release('a')
+    assert calls['duplicated'] == [('a', 'b'), ('a', 'c')]
+    assert deduplicator.get_leader('b') == 'a'
+    assert deduplicator.get_leader('a') is None
+    assert deduplicator.duplicates == 2
+
+
+def test_follower_of_an_available_request_is_duplicated_right_away(deduplicator, calls):
+    deduplicator.claim('key', {'to_file': 'a'})
+    deduplicator.release('a')
+    assert deduplicator.claim('key', {'to_file': 'b'}) == 'a'
+    assert calls['duplicated'] == [('a', 'b')]
+
+
+def test_up_to_date_file_is_available_to_followers(deduplicator, calls):
+    deduplicator.make_available('key', 'previous')
+    assert deduplicator.claim('key', {'to_file': 'b'}) == 'previous'
+    assert calls['duplicated'] == [('previous', 'b')]
+
+
+def test_failed_leader_fails_its_followers_and_the_next_file_leads(deduplicator, calls):
+    deduplicator.claim('key', {'to_file': 'a'})
+    deduplicator.claim('key', {'to_file': 'b'})
+    deduplicator.fail('a')
+    assert calls['failed'] == [('b', 'a')]
+    assert deduplicator.claim('key', {'to_file': 'c'}) is None
+    deduplicator.release('c')
+    assert deduplicator.claim('key', {'to_file': 'd'}) == 'c'
+    assert calls['duplicated'] == [('c', 'd')]
+
+
+def test_release_and_fail_are_ignored_once_the_request_is_settled(deduplicator, calls):
+    deduplicator.claim('key', {'to_file': 'a'})
+    deduplicator.release('a')
+    deduplicator.fail('a')
+    deduplicator.release('unknown')
+    assert deduplicator.claim('key', {'to_file': 'b'}) == 'a'
+    assert calls['failed'] == []
+
+
+def test_finish_fails_the_followers_of_uncommitted_leaders(deduplicator, calls):
+    deduplicator.claim('key', {'to_file': 'a'})
+    deduplicator.claim('key', {'to_file': 'b'})
+    deduplicator.claim('other', {'to_file': 'c'})
+    deduplicator.finish()
+    assert calls['failed'] == [('b', 'a')]
+
+
+def test_distinct_inputs_have_distinct_keys():
+    inputs = {'content': 'x', 'request_id': 1}
+    assert ContentDeduplicator.compute_key(inputs) == ContentDeduplicator.compute_key({'request_id': 1, 'content': 'x'})
+    assert ContentDeduplicator.compute_key(inputs) != ContentDeduplicator.compute_key({'content': 'y', 'request_id': 1})
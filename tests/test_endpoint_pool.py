@@ -0,0 +1,139 @@
+"""
+@file test_endpoint_pool.py
+@brief Tests of the EndpointPool: routing, failover, ejection and the cap keeping endpoints in rotation.
+"""
+
+import json
+import time
+from typing import List
+
+import pytest
+
+from domain.endpoint_pool import Endpoint, EndpointPool
+from domain.rate_limiter import RateLimiter
+
+
+def create_pool(logger, names: List[str], routing: str = 'least_outstanding') -> EndpointPool:
+    return EndpointPool([Endpoint(name, f'http://{name}.invalid/v1', None, 1.0, None, RateLimiter(logger)) for name in names], logger, routing)
+
+
+def fail(pool: EndpointPool, endpoint: Endpoint, times: int) -> None:
+    for _ in range(times):
+        endpoint.outstanding += 1
+        pool.release(endpoint, failed=True)
+
+
+def test_requests_are_spread_over_the_endpoints(logger):
+    pool: EndpointPool = create_pool(logger, ['a', 'b'])
+    acquired = [pool.acquire() for _ in range(4)]
+    assert [endpoint.name for endpoint in acquired] == ['a', 'b', 'a', 'b']
+
+
+def test_failed_request_moves_to_another_endpoint(logger):
+    pool: EndpointPool = create_pool(logger, ['a', 'b'])
+    first: Endpoint = pool.acquire()
+    pool.release(first, failed=True)
+    assert pool.has_alternative([first])
+    assert pool.acquire([first]) is not first
+
+
+def test_endpoint_failing_in_a_row_is_ejected(logger):
+    pool: EndpointPool = create_pool(logger, ['dead', 'ok'])
+    dead, ok = pool.endpoints
+    fail(pool, dead, EndpointPool.max_consecutive_failures)
+    assert dead.is_ejected(time.monotonic())
+    assert all(pool.acquire() is ok for _ in range(5))
+
+
+def test_success_resets_the_consecutive_failures(logger):
+    pool: EndpointPool = create_pool(logger, ['a', 'b'])
+    a: Endpoint = pool.endpoints[0]
+    fail(pool, a, EndpointPool.max_consecutive_failures - 1)
+    a.outstanding += 1
+    pool.release(a, latency_seconds=0.1)
+    fail(pool, a, EndpointPool.max_consecutive_failures - 1)
+    assert not a.is_ejected(time.monotonic())
+
+
+def test_last_healthy_endpoint_is_never_ejected(logger):
+    pool: EndpointPool = create_pool(logger, ['dead', 'ok'])
+    dead, ok = pool.endpoints
+    fail(pool, dead, EndpointPool.max_consecutive_failures)
+    ok.outstanding += 1
+    pool.release(ok, latency_seconds=0.1)
+    # Transient errors on the endpoint left in rotation
+    fail(pool, ok, EndpointPool.max_consecutive_failures)
+    assert not ok.is_ejected(time.monotonic())
+    assert [pool.acquire().name for _ in range(5)] == ['ok'] * 5
+
+
+def test_single_endpoint_is_never_ejected(logger):
+    pool: EndpointPool = create_pool(logger, ['only'])
+    fail(pool, pool.endpoints[0], EndpointPool.max_consecutive_failures * 2)
+    assert not pool.endpoints[0].is_ejected(time.monotonic())
+
+
+def test_ejections_are_capped_to_a_share_of_the_endpoints(logger):
+    pool: EndpointPool = create_pool(logger, ['a', 'b', 'c', 'd'])
+    for endpoint in pool.endpoints:
+        fail(pool, endpoint, EndpointPool.max_consecutive_failures)
+    now: float = time.monotonic()
+    assert [endpoint.is_ejected(now) for endpoint in pool.endpoints] == [True, True, False, False]
+
+
+def test_all_ejected_prefers_the_healthiest_endpoint(logger):
+    pool: EndpointPool = create_pool(logger, ['long_dead', 'flaky', 'recent'])
+    long_dead, flaky, recent = pool.endpoints
+    ejected_until: float = time.monotonic() + 60
+    long_dead.consecutive_failures, long_dead.ejected_until = 12, ejected_until - 30
+    flaky.consecutive_failures, flaky.ejected_until, flaky.last_success = 3, ejected_until, 10.0
+    recent.consecutive_failures, recent.ejected_until, recent.last_success = 3, ejected_until, 20.0
+    assert pool.acquire() is recent
+
+
+def test_saturated_endpoints_are_skipped(logger):
+    pool: EndpointPool = create_pool(logger, ['a', 'b'])
+    pool.endpoints[0].max_concurrency = 1
+    assert pool.acquire().name == 'a'
+    assert [pool.acquire().name for _ in range(3)] == ['b', 'b', 'b']
+
+
+def test_ewma_routing_prefers_the_fastest_endpoint(logger):
+    pool: EndpointPool = create_pool(logger, ['slow', 'fast'], 'ewma_latency')
+    slow, fast = pool.endpoints
+    for endpoint, latency in [(slow, 2.0), (fast, 0.1)]:
+        endpoint.outstanding += 1
+        pool.release(endpoint, latency_seconds=latency)
+    assert pool.acquire() is fast
+
+
+def test_endpoint_held_by_retry_after_is_avoided(logger):
+    pool: EndpointPool = create_pool(logger, ['held', 'free'])
+    pool.endpoints[0].rate_limiter.pause(30)
+    assert [pool.acquire().name for _ in range(3)] == ['free'] * 3
+
+
+def test_load_reads_the_endpoints_file(tmp_path, logger, monkeypatch):
+    monkeypatch.setenv('TEST_ENDPOINT_KEY', 'secret')
+    endpoints_file = tmp_path / 'endpoints.json'
+    endpoints_file.write_text(json.dumps([{'name': 'a', 'base_url': 'http://a/v1', 'weight': 2, 'max_concurrency': 4},
+                                          {'base_url': 'http://b/v1', 'api_key_env': 'TEST_ENDPOINT_KEY', 'requests_per_minute': 60}]))
+    pool: EndpointPool = EndpointPool.load(str(endpoints_file), logger, default_tokens_per_minute=1000)
+    a, b = pool.endpoints
+    assert (a.name, a.weight, a.max_concurrency, a.api_key) == ('a', 2.0, 4, None)
+    assert (b.name, b.api_key) == ('http://b/v1', 'secret')
+    assert b.rate_limiter.request_bucket.capacity == 60 and b.rate_limiter.token_bucket.capacity == 1000
+
+
+@pytest.mark.parametrize('descriptions', [
+    {'base_url': 'http://a/v1'},
+    [{'name': 'a'}],
+    [{'base_url': 'http://a/v1', 'weight': 0}],
+    [{'base_url': 'http://a/v1', 'name': 'x'}, {'base_url': 'http://b/v1', 'name': 'x'}],
+    [{'base_url': 'http://a/v1', 'api_key_env': 'TEST_ENDPOINT_KEY_NOT_SET'}],
+])
+def test_load_rejects_invalid_files(tmp_path, logger, descriptions):
+    endpoints_file = tmp_path / 'endpoints.json'
+    endpoints_file.write_text(json.dumps(descriptions))
+    with pytest.raises(ValueError):
+        EndpointPool.load(str(endpoints_file), logger)
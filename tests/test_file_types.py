@@ -0,0 +1,104 @@
+"""
+@file test_file_types.py
+@brief Tests of the comment scanners of the file types: strip_comments and get_header_comment_span.
+"""
+
+import pytest
+
+from infrastructure.file_types import CppFileType, PlantUMLFileType, PythonFileType, ShellFileType, TypescriptFileType
+
+
+@pytest.fixture
+def cpp():
+    return CppFileType('c++', 'cpp')
+
+
+@pytest.fixture
+def python():
+    return PythonFileType('python', 'py')
+
+
+def test_cpp_comments_are_removed_with_their_lines(cpp):
+    content: str = ("// license\n"
+                    "int a = 1; // trailing\n"
+                    "/* block\n"
+                    "   comment */\n"
+                    "int b = /* inline */ 2;\n")
+    # The comment is replaced by a separator, the spaces following it are kept
+    assert cpp.strip_comments(content) == "int a = 1;\nint b =  2;\n"
+
+
+def test_cpp_comment_markers_inside_strings_are_kept(cpp):
+    content: str = 'const char *url = "http://host/*path*/"; // comment\nchar c = \'"\'; // quote\n'
+    assert cpp.strip_comments(content) == 'const char *url = "http://host/*path*/";\nchar c = \'"\';\n'
+
+
+def test_cpp_escaped_quote_does_not_end_the_string(cpp):
+    content: str = 'const char *s = "a \\" // not a comment"; // comment\n'
+    assert cpp.strip_comments(content) == 'const char *s = "a \\" // not a comment";\n'
+
+
+def test_cpp_block_comment_between_tokens_keeps_them_apart(cpp):
+    assert cpp.strip_comments('return/* value */x;\n') == 'return x;\n'
+    assert cpp.strip_comments('f(a, /* multi\nline */ b);\n') == 'f(a,\n b);\n'
+
+
+def test_cpp_unterminated_block_comment_runs_to_the_end(cpp):
+    assert cpp.strip_comments('int a;\n/* never closed\nint b;\n') == 'int a;\n'
+
+
+def test_python_comments_are_removed_but_strings_and_shebang_kept(python):
+    content: str = ('#!/usr/bin/env python\n'
+                    '# comment\n'
+                    'x = "# not a comment"  # comment\n'
+                    'y = """\n'
+                    '# inside a docstring\n'
+                    '"""\n')
+    assert python.strip_comments(content) == ('#!/usr/bin/env python\n'
+                                              'x = "# not a comment"\n'
+                                              'y = """\n'
+                                              '# inside a docstring\n'
+                                              '"""\n')
+
+
+def test_python_file_rejected_by_the_tokenizer_is_still_scanned(python):
+    assert python.strip_comments('x = (1,  # comment\n') == 'x = (1,\n'
+
+
+def test_shell_hash_inside_a_word_is_not_a_comment():
+    shell: ShellFileType = ShellFileType('shell', 'sh')
+    assert shell.strip_comments('echo $# ${#name} # count\n') == 'echo $# ${#name}\n'
+
+
+def test_typescript_template_literal_spans_lines():
+    typescript: TypescriptFileType = TypescriptFileType('typescript', 'ts')
+    content: str = 'const s = `line\n// kept\n`; // removed\n'
+    assert typescript.strip_comments(content) == 'const s = `line\n// kept\n`;\n'
+
+
+def test_file_type_without_comment_syntax_is_unchanged():
+    plantuml: PlantUMLFileType = PlantUMLFileType('plantuml', 'puml')
+    assert plantuml.strip_comments('// kept\n', 'notes.txt') == '// kept\n'
+    assert plantuml.strip_comments('// removed\nint a;\n', 'a.cpp') == 'int a;\n'
+
+
+def test_header_spans_consecutive_comments(cpp):
+    content: str = '/* Copyright\n * License\n */\n\n// Generated\nint a; // not header\n'
+    start, end = cpp.get_header_comment_span(content)
+    assert (start, content[start:end]) == (0, '/* Copyright\n * License\n */\n\n// Generated\n')
+
+
+def test_header_starts_after_the_shebang(python):
+    content: str = '#!/bin/sh\n# License\n# MIT\nimport os\n'
+    start, end = python.get_header_comment_span(content)
+    assert content[start:end] == '# License\n# MIT\n'
+
+
+def test_no_header_gives_an_empty_span(cpp, python):
+    assert cpp.get_header_comment_span('int a;\n// comment\n') == (0, 0)
+    assert python.get_header_comment_span('#!/bin/sh\nimport os\n') == (10, 10)
+    assert cpp.get_header_comment_span('') == (0, 0)
+
+
+def test_unterminated_header_block_is_not_a_header(cpp):
+    assert cpp.get_header_comment_span('// license\n/* never closed\nint a;\n') == (0, 11)
@@ -0,0 +1,91 @@
+"""
+@file test_rate_limiter.py
+@brief Tests of the token buckets of the RateLimiter: refill, waits, reconciliation, rate limit headers and pauses.
+"""
+
+import pytest
+
+from domain.rate_limiter import RateLimiter, TokenBucket
+
+
+def test_bucket_refills_continuously_up_to_its_capacity():
+    bucket: TokenBucket = TokenBucket(60)
+    start: float = bucket._last_refill
+    bucket.consume(60)
+    bucket.refill(start + 30)
+    assert bucket.available == pytest.approx(30)
+    bucket.refill(start + 600)
+    assert bucket.available == 60
+
+
+def test_bucket_wait_matches_the_missing_units():
+    bucket: TokenBucket = TokenBucket(60)
+    assert bucket.get_wait_seconds(60) == 0
+    bucket.consume(60)
+    assert bucket.get_wait_seconds(1) == pytest.approx(1.0)
+    assert bucket.get_wait_seconds(30) == pytest.approx(30.0)
+
+
+def test_amount_above_the_capacity_only_waits_for_a_full_bucket():
+    bucket: TokenBucket = TokenBucket(100)
+    assert bucket.get_wait_seconds(1000) == 0
+    bucket.consume(50)
+    assert bucket.get_wait_seconds(1000) == pytest.approx(30.0)
+
+
+def test_reserve_charges_both_quotas_or_none(logger):
+    limiter: RateLimiter = RateLimiter(logger, requests_per_minute=2, tokens_per_minute=1000)
+    assert limiter._reserve(600) == 0
+    assert limiter.request_bucket.available == pytest.approx(1, abs=0.01)
+    # The token quota is short: the request is not charged either
+    assert limiter._reserve(600) > 0
+    assert limiter.request_bucket.available == pytest.approx(1, abs=0.01)
+    assert limiter._reserve(300) == 0
+    assert limiter._reserve(1) > 0
+
+
+def test_limiter_without_quota_never_waits(logger):
+    limiter: RateLimiter = RateLimiter(logger)
+    for _ in range(1000):
+        assert limiter._reserve(100000) == 0
+
+
+def test_reconcile_charges_the_actual_usage(logger):
+    limiter: RateLimiter = RateLimiter(logger, tokens_per_minute=1000)
+    limiter._reserve(100)
+    limiter.reconcile(100, 900)
+    assert limiter.token_bucket.available == pytest.approx(100, abs=1)
+    limiter.reconcile(100, None)
+    assert limiter.token_bucket.available == pytest.approx(100, abs=1)
+
+
+def test_headers_lower_the_available_quotas(logger):
+    limiter: RateLimiter = RateLimiter(logger, requests_per_minute=100, tokens_per_minute=10000)
+    limiter.update_from_headers({'x-ratelimit-remaining-requests': '3', 'x-ratelimit-remaining-tokens': 'invalid'})
+    assert limiter.request_bucket.available == pytest.approx(3, abs=0.01)
+    assert limiter.token_bucket.available == pytest.approx(10000)
+    limiter.update_from_headers({'x-ratelimit-remaining-requests': '50'})
+    assert limiter.request_bucket.available < 4
+    limiter.update_from_headers(None)
+
+
+def test_pause_holds_every_request(logger):
+    limiter: RateLimiter = RateLimiter(logger)
+    limiter.pause(30)
+    assert 29 < limiter.get_pause_seconds() <= 30
+    assert limiter._reserve(1) > 29
+    limiter.pause(1)
+    assert limiter.get_pause_seconds() > 29
+
+
+def test_shared_limiter_is_created_once_per_endpoint(logger):
+    first: RateLimiter = RateLimiter.get_shared('http://tests.invalid/shared', logger, 10)
+    assert RateLimiter.get_shared('http://tests.invalid/shared', logger, 20) is first
+    assert RateLimiter.get_shared('http://tests.invalid/other', logger, 10) is not first
+
+
+@pytest.mark.parametrize('duration, seconds', [
+    ('1.5', 1.5), ('6m0s', 360.0), ('20ms', 0.02), ('1h2m3s', 3723.0), (' 2s ', 2.0), ('soon', None), ('5x', None), (None, None)
+])
+def test_parse_duration(duration, seconds):
+    assert RateLimiter.parse_duration(duration) == (pytest.approx(seconds) if seconds is not None else None)
@@ -0,0 +1,107 @@
+"""
+@file test_run_report.py
+@brief Tests of the RunReport: review verdicts, failing files, unfinished and aborted runs, and the summary table.
+"""
+
+import json
+import os
+
+import pytest
+
+from domain.run_report import RunReport
+
+
+@pytest.mark.parametrize('review, verdict', [
+    ('OK, nothing to report.', 'ok'),
+    ('**OK**\nClean code.', 'ok'),
+    ('  > Acceptable: minor naming issues.', 'acceptable'),
+    ('`acceptable`', 'acceptable'),
+    ('# Issues\n- SQL injection', 'issues'),
+    ('Okay overall, but the parser is broken.', 'issues'),
+    ('', 'issues'),
+])
+def test_get_verdict(review, verdict):
+    assert RunReport.get_verdict(review) == verdict
+
+
+@pytest.fixture
+def directories(tmp_path):
+    source_directory: str = os.path.join(str(tmp_path), 'src')
+    target_directory: str = os.path.join(str(tmp_path), 'out')
+    os.makedirs(source_directory)
+    os.makedirs(target_directory)
+    return source_directory, target_directory
+
+
+def write_review(target_directory: str, file_name: str, review: str) -> str:
+    to_file: str = os.path.join(target_directory, file_name)
+    with open(to_file, 'w', encoding='utf-8') as file:
+        file.write(review)
+    return to_file
+
+
+def create_run_report(logger, directories, fail_on: str = 'issues') -> RunReport:
+    return RunReport(logger, directories[0], directories[1], {7: 'Review comments', 1: 'Comments creation'}, {7}, fail_on)
+
+
+def file_record(directories, name: str, outcome: str, request_id: int = 7) -> dict:
+    return {'to_file': os.path.join(directories[1], name + '.md'), 'from_file': os.path.join(directories[0], name), 'request_id': request_id,
+            'outcome': outcome}
+
+
+def test_reviews_fail_the_run_from_the_failing_verdict(logger, directories):
+    write_review(directories[1], 'a.py.md', 'OK')
+    write_review(directories[1], 'b.py.md', 'Acceptable, minor issues')
+    run_summary = {'started_at': 'start', 'files': [file_record(directories, 'a.py', 'written'), file_record(directories, 'b.py', 'up_to_date')]}
+    report = create_run_report(logger, directories).create_report(run_summary)
+    assert report['passed'] and report['totals']['verdicts'] == {'ok': 1, 'acceptable': 1}
+    assert [file_entry['source_file'] for file_entry in report['files']] == ['a.py', 'b.py']
+    assert 'review' not in report['files'][0] and report['files'][1]['review'] == 'Acceptable, minor issues'
+    report = create_run_report(logger, directories, 'acceptable').create_report(run_summary)
+    assert not report['passed'] and report['totals']['failing_files'] == 1
+
+
+def test_failed_requests_fail_the_run_without_verdict(logger, directories):
+    run_summary = {'started_at': 'start', 'files': [file_record(directories, 'a.py', 'failed'), file_record(directories, 'b.py', 'written', 1)]}
+    report = create_run_report(logger, directories).create_report(run_summary)
+    assert not report['passed']
+    assert [(file_entry['outcome'], file_entry['verdict'], file_entry['failing']) for file_entry in report['files']] == \
+        [('failed', None, True), ('written', None, False)]
+
+
+def test_expected_files_without_outcome_are_unfinished(logger, directories):
+    write_review(directories[1], 'a.py.md', 'OK')
+    expected = {record['to_file']: (record['from_file'], record['request_id'])
+                for record in [file_record(directories, 'a.py', None), file_record(directories, 'b.py', None)]}
+    report = create_run_report(logger, directories).create_report({'started_at': 'start', 'files': [file_record(directories, 'a.py', 'written')]},
+                                                                  'changed since main', expected)
+    assert not report['passed'] and report['totals']['outcomes'] == {'written': 1, 'unfinished': 1}
+    assert report['selection'] == 'changed since main'
+
+
+def test_aborted_run_never_passes(logger, directories):
+    report = create_run_report(logger, directories).create_report({'started_at': 'start', 'files': []}, processing_error=RuntimeError('boom'))
+    assert not report['passed'] and report['error'] == 'boom'
+    assert 'aborted: boom' in RunReport.format_summary_table(report)
+
+
+def test_missing_review_has_no_verdict(logger, directories):
+    report = create_run_report(logger, directories).create_report({'started_at': 'start', 'files': [file_record(directories, 'a.py', 'written')]})
+    assert report['files'][0]['verdict'] is None and report['passed']
+
+
+def test_report_is_written_with_its_summary_table(logger, directories):
+    write_review(directories[1], 'a.py.md', 'Serious issues')
+    run_report: RunReport = create_run_report(logger, directories)
+    report = run_report.create_report({'started_at': 'start', 'files': [file_record(directories, 'a.py', 'written'),
+                                                                        file_record(directories, 'b.py', 'deduplicated', 1)]})
+    report_file: str = os.path.join(directories[1], 'reports', 'report.json')
+    run_report.write_report(report_file, report)
+    with open(report_file, 'r', encoding='utf-8') as file:
+        assert json.load(file)['passed'] is False
+    with open(os.path.join(directories[1], 'reports', 'report.md'), 'r', encoding='utf-8') as file:
+        lines = file.read().splitlines()
+    assert lines[0].startswith('**Failed**: 2 files') and '1 failing' in lines[0]
+    # Failing files first
+    assert lines[4] == '| a.py | Review comments | written | issues (failing) |'
+    assert lines[5] == '| b.py | Comments creation | deduplicated | - |'
@@ -0,0 +1,84 @@
+"""
+@file test_source_discovery.py
+@brief Tests of the translation of the gitignore patterns by IgnoreRules, and of SourceDiscovery walking a tree with ignore files.
+"""
+
+import os
+
+import pytest
+
+from domain.source_discovery import IgnoreRules, SourceDiscovery
+
+
+@pytest.mark.parametrize('pattern, path, is_directory, expected', [
+    ('*.log', 'debug.log', False, True),
+    ('*.log', 'deep/nested/debug.log', False, True),
+    ('*.log', 'debug.log.txt', False, None),
+    ('/build', 'build', True, True),
+    ('/build', 'src/build', True, None),
+    ('build/', 'src/build', True, True),
+    ('build/', 'build', False, None),
+    ('doc/*.txt', 'doc/notes.txt', False, True),
+    ('doc/*.txt', 'doc/server/notes.txt', False, None),
+    ('**/cache', 'a/b/cache', True, True),
+    ('**/cache', 'cache', True, True),
+    ('a/**/b', 'a/b', False, True),
+    ('a/**/b', 'a/x/y/b', False, True),
+    ('a/**/b', 'c/a/x/b', False, None),
+    ('out/**', 'out/x/y.py', False, True),
+    ('out/**', 'out', True, None),
+    ('file?.py', 'file1.py', False, True),
+    ('file?.py', 'file10.py', False, None),
+    ('[ab].py', 'a.py', False, True),
+    ('[ab].py', 'c.py', False, None),
+    ('[!ab].py', 'c.py', False, True),
+    ('[!ab].py', 'a.py', False, None),
+    ('\\#notes', '#notes', False, True),
+    ('\\!important', '!important', False, True),
+    ('trailing   ', 'trailing', False, True),
+    ('with.dot', 'withXdot', False, None),
+])
+def test_pattern_translation(pattern, path, is_directory, expected):
+    assert IgnoreRules('', [pattern]).match(path, is_directory) is expected
+
+
+def test_comments_and_blank_lines_are_skipped():
+    assert IgnoreRules('', ['# comment', '', '   ']).rules == []
+
+
+def test_last_matching_rule_wins():
+    rules: IgnoreRules = IgnoreRules('', ['*.log', '!keep.log'])
+    assert rules.match('debug.log', False) is True
+    assert rules.match('keep.log', False) is False
+    assert IgnoreRules('', ['!keep.log', '*.log']).match('keep.log', False) is True
+
+
+def test_rules_apply_below_their_directory_only():
+    rules: IgnoreRules = IgnoreRules('pkg', ['/generated', '*.tmp'])
+    assert rules.match('pkg/generated', True) is True
+    assert rules.match('pkg/sub/generated', True) is None
+    assert rules.match('pkg/sub/x.tmp', False) is True
+    assert rules.match('other/x.tmp', False) is None
+    assert rules.match('pkgx/x.tmp', False) is None
+
+
+def _write(path: str, content: str = 'x = 1\n') -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(content)
+
+
+def test_discovery_honours_nested_ignore_files_and_default_exclusions(tmp_path, logger):
+    root: str = str(tmp_path)
+    _write(os.path.join(root, '.gitignore'), '*.gen.py\nbuild/\n')
+    _write(os.path.join(root, 'a.py'))
+    _write(os.path.join(root, 'a.gen.py'))
+    _write(os.path.join(root, 'build', 'b.py'))
+    _write(os.path.join(root, 'node_modules', 'n.py'))
+    _write(os.path.join(root, 'pkg', '.gpt2codeignore'), '!keep.gen.py\nlocal.py\n')
+    _write(os.path.join(root, 'pkg', 'keep.gen.py'))
+    _write(os.path.join(root, 'pkg', 'local.py'))
+    _write(os.path.join(root, 'pkg', 'c.py'))
+    discovered = sorted(os.path.relpath(os.path.join(directory, file_name), root).replace(os.sep, '/')
+                        for directory, _, file_name in SourceDiscovery(root, logger).discover() if file_name.endswith('.py'))
+    assert discovered == ['a.py', 'pkg/c.py', 'pkg/keep.gen.py']
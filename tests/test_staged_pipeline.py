@@ -0,0 +1,117 @@
+"""
+@file test_staged_pipeline.py
+@brief Tests of the StagedPipeline: source order, dropped items, errors and the bound of the reorder window.
+"""
+
+import asyncio
+import random
+import threading
+import time
+
+import pytest
+
+from domain.staged_pipeline import PipelineStage, StagedPipeline
+
+
+def test_items_reach_the_sink_in_source_order(logger):
+    randomizer: random.Random = random.Random(1)
+    delays = [randomizer.uniform(0, 0.01) for _ in range(50)]
+
+    def slow_double(item):
+        time.sleep(delays[item['value']])
+        return {'value': item['value'] * 2}
+
+    received = []
+    pipeline = StagedPipeline([PipelineStage('double', slow_double, workers=4)], received.append, logger, queue_size=2)
+    pipeline.run({'value': value} for value in range(50))
+    assert [item['value'] for item in received] == [value * 2 for value in range(50)]
+
+
+def test_dropped_items_do_not_block_the_following_ones(logger):
+    received = []
+    pipeline = StagedPipeline([PipelineStage('odd', lambda item: item if item['value'] % 2 else None, workers=3),
+                               PipelineStage('identity', lambda item: item)], received.append, logger)
+    pipeline.run({'value': value} for value in range(20))
+    assert [item['value'] for item in received] == list(range(1, 20, 2))
+
+
+def test_asynchronous_stage_preserves_the_order(logger):
+    async def handler(item):
+        await asyncio.sleep(0.01 * (5 - item['value'] % 5))
+        return item
+
+    received = []
+    pipeline = StagedPipeline([PipelineStage('async', handler, workers=5)], received.append, logger)
+    pipeline.run({'value': value} for value in range(15))
+    assert [item['value'] for item in received] == list(range(15))
+
+
+def test_first_error_is_raised_and_stops_the_source(logger):
+    pulled = []
+
+    def source():
+        for value in range(10000):
+            pulled.append(value)
+            yield {'value': value}
+
+    def handler(item):
+        if item['value'] == 3:
+            raise ValueError('boom')
+        return item
+
+    pipeline = StagedPipeline([PipelineStage('fail', handler, workers=2)], lambda item: None, logger, queue_size=2)
+    with pytest.raises(ValueError, match='boom'):
+        pipeline.run(source())
+    assert len(pulled) < 100
+
+
+@pytest.mark.parametrize('workers, queue_size', [(1, 1), (2, 2), (4, 8)])
+def test_reorder_window_is_bounded_behind_a_slow_item(logger, workers, queue_size):
+    first_item_released: threading.Event = threading.Event()
+    pulled = []
+    pulled_at_first_sink = []
+
+    def source():
+        for value in range(2000):
+            pulled.append(value)
+            yield {'value': value}
+
+    def handler(item):
+        if item['value'] == 0:
+            # Leaves time for the source to be drained if nothing bounds the items in flight
+            first_item_released.wait(0.5)
+        return item
+
+    def sink(item):
+        if len(pulled_at_first_sink) == 0:
+            pulled_at_first_sink.append(len(pulled))
+
+    pipeline = StagedPipeline([PipelineStage('slow_first', handler, workers=workers)], sink, logger, queue_size=queue_size)
+    pipeline.run(source())
+    # The permits bound the items between the source and the sink, the source holds one more while waiting for a permit
+    assert pulled_at_first_sink[0] <= queue_size + workers + 1
+
+
+def test_unordered_pipeline_does_not_wait_for_slow_items(logger):
+    received = []
+
+    def handler(item):
+        if item['value'] == 0:
+            time.sleep(0.2)
+        return item
+
+    pipeline = StagedPipeline([PipelineStage('slow_first', handler, workers=2)], received.append, logger, preserve_order=False)
+    pipeline.run({'value': value} for value in range(5))
+    assert sorted(item['value'] for item in received) == list(range(5))
+    assert received[-1]['value'] == 0
+
+
+def test_run_sequentially_applies_every_stage(logger):
+    async def increment(item):
+        return {'value': item['value'] + 1}
+
+    received = []
+    pipeline = StagedPipeline([PipelineStage('increment', increment), PipelineStage('even', lambda item: item if item['value'] % 2 == 0 else None)],
+                              received.append, logger)
+    pipeline.run_sequentially({'value': value} for value in range(6))
+    assert [item['value'] for item in received] == [2, 4, 6]
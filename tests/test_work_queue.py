@@ -0,0 +1,99 @@
+"""
+@file test_work_queue.py
+@brief Tests of the leases of the SQLiteWorkQueue: claims, renewals, expiry, releases and completion.
+"""
+
+import os
+
+import pytest
+
+from infrastructure.work_queue import SQLiteWorkQueue
+
+
+@pytest.fixture
+def work_queue(tmp_path, logger):
+    work_queue: SQLiteWorkQueue = SQLiteWorkQueue(os.path.join(str(tmp_path), 'queue', 'run.sqlite'), logger, max_attempts=2)
+    yield work_queue
+    work_queue.close()
+
+
+def test_enqueue_skips_known_files_and_queues_failed_ones_again(work_queue):
+    assert work_queue.enqueue(['a.py', 'b.py', 'c.py']) == 3
+    assert work_queue.enqueue(['a.py', 'd.py']) == 1
+    items = work_queue.claim('w1', 2, 60)
+    work_queue.complete('w1', items[0]['item_id'], 'written', failed=False)
+    work_queue.complete('w1', items[1]['item_id'], 'failed', failed=True)
+    assert work_queue.enqueue(['a.py', 'b.py']) == 1
+    assert work_queue.get_status()['states'] == {'queued': 3, 'leased': 0, 'done': 1, 'failed': 0}
+
+
+def test_claims_lease_each_item_to_one_worker_in_order(work_queue):
+    work_queue.enqueue(['a.py', 'b.py', 'c.py'])
+    first = work_queue.claim('w1', 2, 60)
+    second = work_queue.claim('w2', 2, 60)
+    assert [item['source_file'] for item in first] == ['a.py', 'b.py']
+    assert [item['source_file'] for item in second] == ['c.py']
+    assert work_queue.claim('w3', 2, 60) == []
+    assert first[0]['attempts'] == 1
+
+
+def test_expired_lease_is_claimed_again_then_failed_after_max_attempts(work_queue):
+    work_queue.enqueue(['a.py'])
+    assert work_queue.claim('w1', 1, -1)[0]['attempts'] == 1
+    assert work_queue.get_status()['expired_leases'] == 1
+    retried = work_queue.claim('w2', 1, -1)
+    assert retried[0]['source_file'] == 'a.py' and retried[0]['attempts'] == 2
+    assert work_queue.claim('w3', 1, 60) == []
+    status = work_queue.get_status()
+    assert status['states']['failed'] == 1 and status['outcomes'] == {'lease_expired': 1}
+
+
+def test_renew_keeps_only_the_leases_still_held(work_queue):
+    work_queue.enqueue(['a.py', 'b.py'])
+    items = work_queue.claim('w1', 2, 60)
+    with work_queue._transaction():
+        work_queue._connection.execute("UPDATE items SET lease_expires_at = 0 WHERE item_id = ?", (items[0]['item_id'],))
+    taken_over = work_queue.claim('w2', 1, 60)
+    assert taken_over[0]['item_id'] == items[0]['item_id']
+    assert work_queue.renew('w1', [item['item_id'] for item in items], 60) == [items[1]['item_id']]
+    assert work_queue.renew('w2', [taken_over[0]['item_id']], 60) == [taken_over[0]['item_id']]
+
+
+def test_release_queues_the_item_again_until_max_attempts(work_queue):
+    work_queue.enqueue(['a.py'])
+    item_id = work_queue.claim('w1', 1, 60)[0]['item_id']
+    work_queue.release('w1', [item_id])
+    assert work_queue.get_status()['states']['queued'] == 1
+    work_queue.claim('w1', 1, 60)
+    # Another worker cannot give back a lease it does not hold
+    work_queue.release('w2', [item_id])
+    assert work_queue.get_status()['states']['leased'] == 1
+    work_queue.release('w1', [item_id])
+    assert work_queue.get_status()['states']['failed'] == 1
+
+
+def test_completion_after_the_lease_expired_is_recorded(work_queue):
+    work_queue.enqueue(['a.py'])
+    item_id = work_queue.claim('w1', 1, -1)[0]['item_id']
+    work_queue.complete('w1', item_id, 'written', failed=False)
+    status = work_queue.get_status()
+    assert status['states'] == {'queued': 0, 'leased': 0, 'done': 1, 'failed': 0}
+    assert status['progress'] == 1.0
+    assert [(worker['worker_id'], worker['claimed'], worker['completed']) for worker in status['workers']] == [('w1', 1, 1)]
+
+
+def test_two_connections_share_the_queue(logger, work_queue):
+    other: SQLiteWorkQueue = SQLiteWorkQueue(work_queue.queue_file, logger)
+    try:
+        work_queue.set_settings({'model_name': 'm', 'code_request_ids': [1, 2]})
+        assert other.get_settings() == {'model_name': 'm', 'code_request_ids': [1, 2]}
+        work_queue.enqueue(['a.py', 'b.py'])
+        claimed = work_queue.claim('w1', 1, 60) + other.claim('w2', 1, 60)
+        assert sorted(item['source_file'] for item in claimed) == ['a.py', 'b.py']
+    finally:
+        other.close()
+
+
+def test_status_of_an_empty_queue(work_queue):
+    status = work_queue.get_status()
+    assert status['items'] == 0 and status['progress'] is None and status['remaining_seconds'] is None